@@ -0,0 +1,6 @@
+"""Start up the website as an asynchronous (ASGI) app, e.g. with `uvicorn asgi:app`."""
+
+from schedules.frontend.async_app import create_async_app
+
+# Create app instance for the ASGI server
+app = create_async_app()
@@ -0,0 +1,97 @@
+"""Benchmark adding a person and their trips in one batch, against one request per change, with a SQLite database.
+
+Each single request is a transaction of its own and a new snapshot, as each form posted from the page is. Network
+round trips between client and server come on top of this, once per request, and only once for a batch.
+
+Run from the repository root with `python -m benchmarks.batch_requests`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import tempfile
+import time
+from typing import Any
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.requests import REQUEST_TYPE_ID, RequestType
+from schedules.logic.storage import Base, CalendarRepository
+
+START_DATE = dt.date(2025, 1, 1)
+
+
+def sample_requests(num_trips: int, person_idx: int, person_id: str | None = None) -> list[dict[str, Any]]:
+    """An ADD_PERSON request and ADD_TRIP requests for that person, by ID if known, else by alias."""
+    person_reference = {"person_id": person_id} if person_id else {"person_alias": f"person-{person_idx}"}
+    add_person = {
+        REQUEST_TYPE_ID: RequestType.ADD_PERSON,
+        "alias": f"person-{person_idx}",
+        "last_name": f"lastname-{person_idx:05}",  # Sorted in the order added
+        "first_name": "firstname",
+        "country": "NETHERLANDS",
+        "city": "amsterdam",
+    }
+    add_trips = [
+        {
+            REQUEST_TYPE_ID: RequestType.ADD_TRIP,
+            **person_reference,
+            "country": "SWITZERLAND",
+            "city": "zurich",
+            "start_date": (START_DATE + dt.timedelta(days=14 * trip_idx)).isoformat(),
+            "end_date": (START_DATE + dt.timedelta(days=14 * trip_idx + 3)).isoformat(),
+        }
+        for trip_idx in range(num_trips)
+    ]
+    return [add_person, *add_trips]
+
+
+def time_single_requests(calendar: FullCalendar, num_people: int, num_trips: int) -> float:
+    start_time = time.perf_counter()
+    for person_idx in range(num_people):
+        add_person, *_ = sample_requests(num_trips, person_idx)
+        calendar.process_frontend_request(add_person)
+        person_id = str(calendar.people_sorted_by_name[-1].unique_id)
+        for add_trip in sample_requests(num_trips, person_idx, person_id)[1:]:
+            assert calendar.process_frontend_request(add_trip).code == 200
+    return time.perf_counter() - start_time
+
+
+def time_batches(calendar: FullCalendar, num_people: int, num_trips: int) -> float:
+    start_time = time.perf_counter()
+    for person_idx in range(num_people):
+        assert calendar.process_frontend_requests(sample_requests(num_trips, person_idx)).code == 200
+    return time.perf_counter() - start_time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trips", type=int, nargs="+", default=[1, 10, 100], help="Trips per person")
+    parser.add_argument("--people", type=int, default=20, help="People added, each with their trips")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    for num_trips in args.trips:
+        times = dict()
+        for name, run in (("single requests", time_single_requests), ("batches", time_batches)):
+            with tempfile.TemporaryDirectory() as directory:
+                engine = create_engine(f"sqlite:///{directory}/database.db")
+                Base.metadata.create_all(engine)
+                with sessionmaker(bind=engine)() as session:
+                    calendar = FullCalendar(database_repository=CalendarRepository(session))
+                    times[name] = run(calendar, args.people, num_trips)
+                    assert calendar.version == CalendarRepository(session).get_version()
+                engine.dispose()
+        num_requests = args.people * (num_trips + 1)
+        print(
+            f"{num_trips:4} trips per person ({num_requests} requests): "
+            f"single requests {times['single requests'] * 1e3:8.1f} ms, "
+            f"batches {times['batches'] * 1e3:8.1f} ms "
+            f"({times['single requests'] / times['batches']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark adding and removing people and trips in a calendar that already holds many, without a repository.
+
+Each time is the median of several mutations, so it should stay about flat as the calendar grows. Run from the
+repository root with `python -m benchmarks.calendar_mutations`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import statistics
+import time
+from typing import Callable
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+
+
+def sample_person(person_idx: int) -> Person:
+    return Person(
+        unique_id=StrID(f"person-{person_idx}"),
+        last_name=StrID(f"lastname-{person_idx}"),
+        first_name=StrID("firstname"),
+        home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+    )
+
+
+def sample_trip(unique_id: str, trip_idx: int, offset_days: int = 0) -> Trip:
+    """A three-day trip in week `trip_idx`, starting `offset_days` into the week."""
+    start_date = dt.date(2020, 1, 1) + dt.timedelta(days=7 * trip_idx + offset_days)
+    return Trip(
+        unique_id=StrID(unique_id),
+        location=Location(Country.SWITZERLAND, StrID("zurich")),
+        start_date=start_date,
+        end_date=start_date + dt.timedelta(days=3),
+    )
+
+
+def time_median(mutate: Callable[[int], None], repeat: int) -> float:
+    timings = []
+    for idx in range(repeat):
+        start_time = time.perf_counter()
+        mutate(idx)
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def run(num_people: int, num_trips: int, repeat: int) -> dict[str, float]:
+    """Return the median time of each mutation, with `num_people` people and `num_trips` trips for one of them."""
+    calendar = FullCalendar()
+    for person_idx in range(num_people):
+        calendar._add_person(sample_person(person_idx))
+    person = sample_person(0)
+    for trip_idx in range(num_trips):
+        calendar._add_trip(person, sample_trip(f"trip-{trip_idx}", trip_idx))
+
+    # New trips go in the free days between existing trips in the middle, so neither end of the list is a shortcut
+    def add_trip(idx: int) -> None:
+        calendar._add_trip(person, sample_trip(f"new-trip-{idx}", num_trips // 2 - repeat // 2 + idx, offset_days=4))
+
+    def remove_trip(idx: int) -> None:
+        calendar._remove_trip(person.unique_id, StrID(f"new-trip-{idx}"))
+
+    return dict(
+        add_person=time_median(lambda idx: calendar._add_person(sample_person(num_people + idx)), repeat),
+        remove_person=time_median(lambda idx: calendar._remove_person(sample_person(num_people + idx)), repeat),
+        add_trip=time_median(add_trip, repeat),
+        remove_trip=time_median(remove_trip, repeat),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="People, and trips")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Logging every mutation would dominate the timings
+
+    for size in args.sizes:
+        timings = run(num_people=size, num_trips=size, repeat=args.repeat)
+        print(f"{size:>6} people and trips: " + ", ".join(f"{name} {t * 1e6:8.1f} us" for name, t in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark publishing a trip change to many idle viewers, and encoding its changed cells for one viewer, against
+building the whole daily calendars table again.
+
+Run from the repository root with `python -m benchmarks.change_feed`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import time
+
+from schedules.logic.calendar import CalendarState, FullCalendar
+from schedules.logic.change_feed import ChangeFeed, ChangeStream
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+
+START_DATE = dt.date(2025, 1, 1)
+
+
+def sample_calendar(feed: ChangeFeed, num_people: int, num_trips: int) -> FullCalendar:
+    calendar = FullCalendar(state=CalendarState(change_feed=feed))
+    for person_idx in range(num_people):
+        person = Person(
+            unique_id=StrID(f"person-{person_idx}"),
+            last_name=StrID(f"lastname-{person_idx}"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        calendar._add_person(person)
+        for trip_idx in range(num_trips):
+            start_date = START_DATE + dt.timedelta(days=14 * trip_idx + person_idx % 7)
+            trip = Trip(
+                unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                location=Location(Country.SWITZERLAND, StrID("zurich")),
+                start_date=start_date,
+                end_date=start_date + dt.timedelta(days=3),
+            )
+            calendar._add_trip(person, trip)
+    return calendar
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, default=100)
+    parser.add_argument("--trips", type=int, default=26, help="Trips per person")
+    parser.add_argument("--viewers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365, help="Days in each viewer's daily calendars")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    feed = ChangeFeed()
+    calendar = sample_calendar(feed, args.people, args.trips)
+    subscriptions = [feed.subscribe() for _ in range(args.viewers)]
+    person = calendar.snapshot.people_sorted_by_name[0]
+    trip = Trip(
+        unique_id=StrID("new-trip"),
+        location=Location(Country.UNITED_KINGDOM, StrID("london")),
+        start_date=START_DATE + dt.timedelta(days=104),
+        end_date=START_DATE + dt.timedelta(days=106),
+    )
+
+    start_time = time.perf_counter()
+    calendar._add_trip(person, trip)
+    publish_time = time.perf_counter() - start_time
+    dates = (START_DATE, START_DATE + dt.timedelta(days=args.days - 1))
+    change = subscriptions[0].get(timeout=0)
+
+    start_time = time.perf_counter()
+    event = ChangeStream(subscriptions[0], dates, None, calendar.version).next_event(change)
+    encode_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    calendar.snapshot.get_daily_calendars(*dates)
+    table_time = time.perf_counter() - start_time
+
+    print(f"{args.people} people, {args.trips} trips each, {args.viewers} viewers of {args.days} days")
+    print(f"add trip and publish to all viewers {publish_time * 1e3:8.2f} ms")
+    print(f"changed cells for one viewer        {encode_time * 1e3:8.2f} ms, {len(event)} bytes")
+    print(f"daily calendars table               {table_time * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark how long a new instance takes to get the full calendar ready, with and without a snapshot file.
+
+SQLite stands in for the remote database, with an optional simulated network round trip added to every query. Run from
+the repository root with `python -m benchmarks.cold_start`.
+"""
+
+import argparse
+import datetime as dt
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.calendar import CalendarState, FullCalendar
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.snapshot_file import read_snapshot_file, write_snapshot_file
+from schedules.logic.storage import Base, CalendarRepository
+
+
+def create_database(database_url: str, num_people: int, num_trips_per_person: int) -> None:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        repository = CalendarRepository(session)
+        for person_idx in range(num_people):
+            person = Person(
+                unique_id=StrID(f"person-{person_idx}"),
+                last_name=StrID(f"lastname-{person_idx}"),
+                first_name=StrID("firstname"),
+                home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+            )
+            repository.add_person(person)
+            for trip_idx in range(num_trips_per_person):
+                start_date = dt.date(2020, 1, 1) + dt.timedelta(days=7 * trip_idx)
+                trip = Trip(
+                    unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                    location=Location(Country.SWITZERLAND, StrID("zurich")),
+                    start_date=start_date,
+                    end_date=start_date + dt.timedelta(days=3),
+                )
+                repository.add_trip(person, trip)
+    engine.dispose()
+
+
+def connect(database_url: str, latency: float) -> sessionmaker:
+    engine = create_engine(database_url)
+    if latency:
+        event.listen(engine, "before_cursor_execute", lambda *args: time.sleep(latency))
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def start_with_full_load(database_url: str, latency: float) -> float:
+    start_time = time.perf_counter()
+    with connect(database_url, latency)() as session:
+        FullCalendar(database_repository=CalendarRepository(session)).load_from_repository()
+    return time.perf_counter() - start_time
+
+
+def start_with_snapshot_file(database_url: str, latency: float, snapshot_path: str) -> float:
+    start_time = time.perf_counter()
+    state = CalendarState()
+    snapshot = read_snapshot_file(snapshot_path)
+    with connect(database_url, latency)() as session:
+        repository = CalendarRepository(session)
+        calendar = FullCalendar(database_repository=repository, state=state)
+        assert snapshot is not None
+        state.snapshot = snapshot
+        if repository.get_version() != calendar.version:
+            calendar.load_from_repository()  # Fallback, should not happen here
+    return time.perf_counter() - start_time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--trips", type=int, default=50, help="Trips per person")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round trip to the database")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{directory}/database.db"
+        snapshot_path = os.path.join(directory, "calendar.snapshot")
+        create_database(database_url, args.people, args.trips)
+        with sessionmaker(bind=create_engine(database_url))() as session:
+            calendar = FullCalendar(database_repository=CalendarRepository(session))
+            calendar.load_from_repository()
+            write_snapshot_file(snapshot_path, calendar.snapshot)
+
+        latency = args.latency_ms / 1000
+        full_load = [start_with_full_load(database_url, latency) for _ in range(args.repeat)]
+        snapshot = [start_with_snapshot_file(database_url, latency, snapshot_path) for _ in range(args.repeat)]
+
+        print(f"{args.people} people, {args.trips} trips each, {args.latency_ms} ms database round trip")
+        print(f"snapshot file: {os.path.getsize(snapshot_path)} bytes")
+        print(f"    full load: {statistics.median(full_load) * 1000:8.1f} ms")
+        print(f"snapshot file: {statistics.median(snapshot) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
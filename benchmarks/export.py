@@ -0,0 +1,82 @@
+"""Benchmark exporting the daily calendar as CSV, against building the whole daily calendars table first.
+
+Run from the repository root with `python -m benchmarks.export`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import time
+import tracemalloc
+from typing import Callable
+
+from schedules.logic.calendar import CalendarSnapshot, SinglePersonCalendar
+from schedules.logic.export import ExportFormat, encode_chunks, iter_export
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+
+START_DATE = dt.date(2020, 1, 1)
+
+
+def sample_snapshot(num_people: int, num_trips: int) -> CalendarSnapshot:
+    calendars = {}
+    for person_idx in range(num_people):
+        person = Person(
+            unique_id=StrID(f"person-{person_idx}"),
+            last_name=StrID(f"lastname-{person_idx}"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        trips = []
+        for trip_idx in range(num_trips):
+            start_date = START_DATE + dt.timedelta(days=14 * trip_idx + person_idx % 7)
+            trips.append(
+                Trip(
+                    unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                    location=Location(Country.SWITZERLAND, StrID("zurich")),
+                    start_date=start_date,
+                    end_date=start_date + dt.timedelta(days=3),
+                )
+            )
+        calendars[person] = SinglePersonCalendar.from_valid_trips(person, trips)
+    return CalendarSnapshot.create(version=1, calendars=calendars)
+
+
+def time_and_peak_memory(function: Callable[[], None]) -> tuple[float, int]:
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, default=100)
+    parser.add_argument("--trips", type=int, default=260, help="Trips per person")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    snapshot = sample_snapshot(args.people, args.trips)
+    end_date = START_DATE + dt.timedelta(days=365 * args.years - 1)
+
+    def stream() -> None:
+        lines = iter_export(ExportFormat.DAILY_CSV, snapshot, START_DATE, end_date)
+        for _ in encode_chunks(lines, compress=args.gzip):
+            pass
+
+    def build_table() -> None:
+        snapshot.get_daily_calendars(START_DATE, end_date)
+
+    stream_time, stream_peak = time_and_peak_memory(stream)
+    table_time, table_peak = time_and_peak_memory(build_table)
+    print(f"{args.people} people, {args.trips} trips each, {args.years} years")
+    print(f"streamed CSV export {stream_time:8.2f} s, peak {stream_peak / 2**20:8.1f} MiB")
+    print(f"daily calendars table {table_time:8.2f} s, peak {table_peak / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
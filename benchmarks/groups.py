@@ -0,0 +1,105 @@
+"""Benchmark loading one group's calendar from a database shared by many groups, as the number of groups grows, and
+against loading everyone in the database, as before there were groups.
+
+Run from the repository root with `python -m benchmarks.groups`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.groups import GroupCache
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.storage import Base, CalendarRepository, PersonDBEntry, TripDBEntry, VersionDBEntry
+
+START_DATE = dt.date(2025, 1, 1)
+
+
+def create_database(database_url: str, num_groups: int, num_people: int, num_trips: int) -> None:
+    """Add the rows directly, one transaction per group, as adding them through the repository takes long."""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    home = Location(Country.NETHERLANDS, StrID("amsterdam"))
+    with sessionmaker(bind=engine)() as session:
+        for group_idx in range(num_groups):
+            group_id = f"group-{group_idx}"
+            for person_idx in range(num_people):
+                unique_id = f"{group_id}-person-{person_idx}"
+                person = Person(StrID(unique_id), StrID(f"lastname-{person_idx}"), StrID("firstname"), home)
+                session.add(PersonDBEntry.from_python(person, group_id))
+                for trip_idx in range(num_trips):
+                    start_date = START_DATE + dt.timedelta(days=14 * trip_idx + person_idx % 7)
+                    trip = Trip(
+                        unique_id=StrID(f"{unique_id}-trip-{trip_idx}"),
+                        location=Location(Country.SWITZERLAND, StrID("zurich")),
+                        start_date=start_date,
+                        end_date=start_date + dt.timedelta(days=3),
+                    )
+                    session.add(TripDBEntry.from_python(person, trip, group_id))
+            session.add(VersionDBEntry(group_id=group_id, version=1))
+            session.commit()
+    engine.dispose()
+
+
+def load_group(session_maker: sessionmaker, group_id: str) -> FullCalendar:
+    with session_maker() as session:
+        calendar = FullCalendar(database_repository=CalendarRepository(session, group_id=group_id))
+        calendar.load_from_repository()
+    return calendar
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--people", type=int, default=10, help="People per group")
+    parser.add_argument("--trips", type=int, default=10, help="Trips per person")
+    parser.add_argument("--cached", type=int, default=100, help="Groups whose calendars are kept in memory")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    for num_groups in args.groups:
+        with tempfile.TemporaryDirectory() as directory:
+            database_url = f"sqlite:///{directory}/database.db"
+            create_database(database_url, num_groups, args.people, args.trips)
+            session_maker = sessionmaker(bind=create_engine(database_url))
+            group_ids = [f"group-{(idx * 7919) % num_groups}" for idx in range(args.repeat)]
+
+            load_times = []
+            for group_id in group_ids:
+                start_time = time.perf_counter()
+                load_group(session_maker, group_id)
+                load_times.append(time.perf_counter() - start_time)
+
+            # Every row in the database, as a process without groups would load
+            start_time = time.perf_counter()
+            with session_maker() as session:
+                people = [entry.to_python() for entry in session.query(PersonDBEntry)]
+                trips = [entry.to_python() for entry in session.query(TripDBEntry)]
+            all_rows_time = time.perf_counter() - start_time
+
+            # Requests spread over all groups, with only some of them kept in memory
+            cache = GroupCache(lambda group_id: load_group(session_maker, group_id), max_groups=args.cached)
+            start_time = time.perf_counter()
+            for idx in range(10 * args.repeat):
+                cache.get(f"group-{(idx * idx) % num_groups}")
+            requests_time = time.perf_counter() - start_time
+
+            print(
+                f"{num_groups:5} groups ({len(people)} people, {len(trips)} trips): "
+                f"load one group {statistics.median(load_times) * 1e3:7.2f} ms, "
+                f"read all rows {all_rows_time * 1e3:8.2f} ms, "
+                f"{10 * args.repeat} requests with {args.cached} cached {requests_time * 1e3:8.2f} ms "
+                f"({cache.num_evicted} evicted)"
+            )
+
+
+if __name__ == "__main__":
+    main()
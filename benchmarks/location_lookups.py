@@ -0,0 +1,70 @@
+"""Benchmark looking up where a person is on single dates: with a one-day daily calendar, or with `location_on`.
+
+Run from the repository root with `python -m benchmarks.location_lookups`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import random
+import time
+
+from schedules.logic.calendar import SinglePersonCalendar
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+
+START_DATE = dt.date(2020, 1, 1)
+
+
+def sample_calendar(num_trips: int) -> SinglePersonCalendar:
+    person = Person(
+        unique_id=StrID("person"),
+        last_name=StrID("lastname"),
+        first_name=StrID("firstname"),
+        home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+    )
+    trips = []
+    for trip_idx in range(num_trips):
+        start_date = START_DATE + dt.timedelta(days=7 * trip_idx)
+        trips.append(
+            Trip(
+                unique_id=StrID(f"trip-{trip_idx}"),
+                location=Location(Country.SWITZERLAND, StrID("zurich")),
+                start_date=start_date,
+                end_date=start_date + dt.timedelta(days=3),
+            )
+        )
+    return SinglePersonCalendar.from_valid_trips(person, trips)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trips", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    calendar = sample_calendar(args.trips)
+    rng = random.Random(0)
+    dates = [START_DATE + dt.timedelta(days=rng.randrange(7 * args.trips)) for _ in range(args.lookups)]
+
+    start_time = time.perf_counter()
+    expected = [calendar.get_daily_calendar(date, date)[date] for date in dates]
+    daily_calendar_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    day_locations = [calendar.location_on(date) for date in dates]
+    location_on_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    all_day_locations = calendar.locations_on(dates)
+    locations_on_time = time.perf_counter() - start_time
+    assert all_day_locations == day_locations == expected
+
+    print(f"{args.trips} trips, {args.lookups} lookups")
+    print(f"one-day daily calendar {daily_calendar_time * 1e6 / args.lookups:8.2f} us per lookup")
+    print(f"location_on {location_on_time * 1e6 / args.lookups:8.2f} us per lookup (first one computes the changes)")
+    print(f"locations_on {locations_on_time * 1e6 / args.lookups:8.2f} us per date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark where-is-everyone queries for a date range: from the segment table, or by loading and computing calendars.
+
+Also times adding a trip with and without maintaining the segment table. Run from the repository root with
+`python -m benchmarks.location_queries`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.database import create_database_engine
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.storage import Base, CalendarRepository
+
+START_DATE = dt.date(2020, 1, 1)
+
+
+def sample_person(person_idx: int) -> Person:
+    return Person(
+        unique_id=StrID(f"person-{person_idx}"),
+        last_name=StrID(f"lastname-{person_idx}"),
+        first_name=StrID("firstname"),
+        home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+    )
+
+
+def sample_trip(unique_id: str, trip_idx: int) -> Trip:
+    start_date = START_DATE + dt.timedelta(days=7 * trip_idx)
+    return Trip(
+        unique_id=StrID(unique_id),
+        location=Location(Country.SWITZERLAND, StrID("zurich")),
+        start_date=start_date,
+        end_date=start_date + dt.timedelta(days=3),
+    )
+
+
+def time_median(function: Callable[[int], object], repeat: int) -> float:
+    timings = []
+    for idx in range(repeat):
+        start_time = time.perf_counter()
+        function(idx)
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, default=100)
+    parser.add_argument("--trips", type=int, default=100, help="Trips per person")
+    parser.add_argument("--days", type=int, default=30, help="Days in each query")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Logging every trip would dominate the timings
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_database_engine(f"sqlite:///{directory}/database.db")
+        Base.metadata.create_all(engine)
+        with sessionmaker(bind=engine)() as session:
+            repository = CalendarRepository(session, maintain_segments=True)
+            for person_idx in range(args.people):
+                person = sample_person(person_idx)
+                repository.add_person(person)
+                repository.add_trips(
+                    person, [sample_trip(f"trip-{person_idx}-{idx}", idx) for idx in range(args.trips)]
+                )
+
+            # Query dates in the middle of the trips
+            start_date = START_DATE + dt.timedelta(days=7 * args.trips // 2)
+            end_date = start_date + dt.timedelta(days=args.days - 1)
+
+            def compute(_: int) -> None:
+                calendar = FullCalendar(database_repository=repository)
+                calendar.load_from_repository()
+                calendar.snapshot.get_daily_calendars(start_date, end_date)
+
+            query_time = time_median(lambda _: repository.get_segments(start_date, end_date), args.repeat)
+            compute_time = time_median(compute, args.repeat)
+
+            # Add trips after all others, with and without the segment table
+            def add_trip(idx: int) -> None:
+                repository.add_trip(sample_person(idx % args.people), sample_trip(f"new-{idx}", args.trips + idx))
+
+            add_time_segments = time_median(add_trip, args.repeat)
+            repository.maintain_segments = False
+            add_time = time_median(lambda idx: add_trip(args.repeat + idx), args.repeat)
+        engine.dispose()
+
+    print(f"{args.people} people, {args.trips} trips each, {args.days} days")
+    print(f"segment table query {query_time * 1000:8.2f} ms, load and compute {compute_time * 1000:8.2f} ms")
+    print(f"add trip {add_time * 1000:8.2f} ms, maintaining segment table {add_time_segments * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
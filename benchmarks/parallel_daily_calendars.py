@@ -0,0 +1,72 @@
+"""Benchmark computing everyone's daily calendars in the calling thread, and spread over worker processes.
+
+Run from the repository root with `python -m benchmarks.parallel_daily_calendars`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import os
+import time
+
+from schedules.logic.calendar import CalendarSnapshot, SinglePersonCalendar
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.parallel import ParallelDailyCalendars, ParallelSettings
+
+START_DATE = dt.date(2024, 1, 1)
+
+
+def sample_snapshot(num_people: int, num_trips: int) -> CalendarSnapshot:
+    calendars = {}
+    for person_idx in range(num_people):
+        person = Person(
+            unique_id=StrID(f"person-{person_idx}"),
+            last_name=StrID(f"lastname-{person_idx}"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        trips = []
+        for trip_idx in range(num_trips):
+            start_date = START_DATE + dt.timedelta(days=14 * trip_idx + person_idx % 7)
+            trips.append(
+                Trip(
+                    unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                    location=Location(Country.SWITZERLAND, StrID("zurich")),
+                    start_date=start_date,
+                    end_date=start_date + dt.timedelta(days=3),
+                )
+            )
+        calendars[person] = SinglePersonCalendar.from_valid_trips(person, trips)
+    return CalendarSnapshot.create(version=1, calendars=calendars)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, default=2000)
+    parser.add_argument("--trips", type=int, default=50, help="Trips per person")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    snapshot = sample_snapshot(args.people, args.trips)
+    end_date = START_DATE + dt.timedelta(days=args.days - 1)
+    parallel = ParallelDailyCalendars(ParallelSettings(num_workers=args.workers, min_person_days=0))
+    snapshot.get_daily_calendars(START_DATE, START_DATE + dt.timedelta(days=1), parallel)  # Start the workers
+
+    start_time = time.perf_counter()
+    expected = snapshot.get_daily_calendars(START_DATE, end_date)
+    sequential_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    daily_calendars = snapshot.get_daily_calendars(START_DATE, end_date, parallel)
+    parallel_time = time.perf_counter() - start_time
+    parallel.shut_down()
+    assert daily_calendars == expected
+
+    print(f"{args.people} people, {args.trips} trips each, {args.days} days")
+    print(f"calling thread {sequential_time:8.2f} s, {args.workers} worker processes {parallel_time:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
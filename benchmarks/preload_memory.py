@@ -0,0 +1,135 @@
+"""Benchmark the memory of each worker serving a large calendar, when each worker loads the calendar itself, against
+loading it once before forking the workers, as gunicorn does with `--preload`.
+
+Each worker is forked from this process, as gunicorn forks them, and serves the home page and a month of daily
+calendars before its memory is read from `/proc` (Linux only). `Rss` counts shared pages in full, `Pss` splits them
+between the processes sharing them, and `Private` is what the worker has to itself.
+
+Run from the repository root with `python -m benchmarks.preload_memory`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import multiprocessing
+import os
+import statistics
+import tempfile
+from typing import Any
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from schedules.frontend import create_app
+from schedules.frontend.app_with_calendar import AppWithCalendar
+from schedules.logic.groups import DEFAULT_GROUP_ID
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.storage import Base, PersonDBEntry, TripDBEntry, VersionDBEntry
+
+START_DATE = dt.date(2025, 1, 1)
+MEMORY_FIELDS = ("Rss", "Pss", "Private")
+
+
+def create_database(database_url: str, num_people: int, num_trips: int) -> None:
+    """Add the rows directly, as adding them through the repository takes long."""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    home = Location(Country.NETHERLANDS, StrID("amsterdam"))
+    with sessionmaker(bind=engine)() as session:
+        for person_idx in range(num_people):
+            person = Person(StrID(f"person-{person_idx}"), StrID(f"lastname-{person_idx}"), StrID("firstname"), home)
+            session.add(PersonDBEntry.from_python(person))
+            for trip_idx in range(num_trips):
+                start_date = START_DATE + dt.timedelta(days=14 * trip_idx + person_idx % 7)
+                trip = Trip(
+                    unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                    location=Location(Country.SWITZERLAND, StrID("zurich")),
+                    start_date=start_date,
+                    end_date=start_date + dt.timedelta(days=3),
+                )
+                session.add(TripDBEntry.from_python(person, trip))
+        session.add(VersionDBEntry(group_id=DEFAULT_GROUP_ID, version=1))
+        session.commit()
+    engine.dispose()
+
+
+def read_memory() -> dict[str, int]:
+    """Memory of this process in kB, from `/proc/self/smaps_rollup`."""
+    memory = dict.fromkeys(MEMORY_FIELDS, 0)
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                memory[name] = int(value.split()[0])
+            elif name in ("Private_Clean", "Private_Dirty"):
+                memory["Private"] += int(value.split()[0])
+    return memory
+
+
+def run_worker(app: AppWithCalendar | None, barrier: Any, results: Any) -> None:
+    """Serve as a gunicorn worker would, then report memory while all workers are still running."""
+    if app is None:
+        app = create_app()
+    else:
+        app.after_fork()
+    app.warm_up()
+    with app.test_client() as client:
+        assert client.get("/").status_code == 200
+        assert client.get("/export/daily.csv?start=2025-06-01&end=2025-06-30").status_code == 200
+    barrier.wait()
+    results.put(read_memory())
+    barrier.wait()  # Others still measuring share pages with this worker
+
+
+def measure(preload: bool, num_workers: int, output: Any) -> None:
+    """Put the memory of this process, as gunicorn's master process, and of each worker in `output`."""
+    context = multiprocessing.get_context("fork")
+    barrier, results = context.Barrier(num_workers), context.Queue()
+    app = None
+    if preload:
+        app = create_app()
+        app.preload()
+    workers = [context.Process(target=run_worker, args=(app, barrier, results)) for _ in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    worker_memory = [results.get() for _ in workers]
+    master_memory = read_memory()
+    for worker in workers:
+        worker.join()
+    output.put((master_memory, worker_memory))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, default=1000)
+    parser.add_argument("--trips", type=int, default=20, help="Trips per person")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = f"sqlite:///{directory}/database.db"
+        os.environ.setdefault("FLASK_KEY", "benchmark")
+        create_database(os.environ["DATABASE_URL"], args.people, args.trips)
+        print(f"{args.people} people, {args.people * args.trips} trips, {args.workers} workers, memory in MB:")
+        for preload in (False, True):
+            # Each run in its own process, so the second doesn't start from what the first imported and loaded
+            context = multiprocessing.get_context("fork")
+            output = context.Queue()
+            master = context.Process(target=measure, args=(preload, args.workers, output))
+            master.start()
+            master_memory, worker_memory = output.get()
+            master.join()
+            per_worker = ", ".join(
+                f"{name} {statistics.mean(memory[name] for memory in worker_memory) / 1024:6.1f}"
+                for name in MEMORY_FIELDS
+            )
+            total = (master_memory["Pss"] + sum(memory["Pss"] for memory in worker_memory)) / 1024
+            print(
+                f"{'with' if preload else 'without':>7} preload: per worker {per_worker}; "
+                f"master Rss {master_memory['Rss'] / 1024:6.1f}; total Pss {total:7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
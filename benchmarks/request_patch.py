@@ -0,0 +1,88 @@
+"""Benchmark answering a new trip with a patch to the page, against rendering the whole page again, as the number of
+people grows.
+
+Run from the repository root with `python -m benchmarks.request_patch`.
+"""
+
+import argparse
+import datetime as dt
+import logging
+import pathlib
+import time
+from typing import Any
+
+import jinja2
+
+from schedules.frontend.cache import FragmentCache
+from schedules.frontend.rendering import get_fragments, get_patch
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.requests import Response
+
+START_DATE = dt.date(2025, 1, 1)
+TEMPLATES_DIRECTORY = pathlib.Path(__file__).parents[1] / "schedules" / "frontend" / "templates"
+
+
+def sample_calendar(num_people: int, num_trips: int) -> FullCalendar:
+    calendar = FullCalendar()
+    for person_idx in range(num_people):
+        person = Person(
+            unique_id=StrID(f"person-{person_idx}"),
+            last_name=StrID(f"lastname-{person_idx}"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        calendar._add_person(person)
+        for trip_idx in range(num_trips):
+            start_date = START_DATE + dt.timedelta(days=14 * trip_idx + person_idx % 7)
+            trip = Trip(
+                unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                location=Location(Country.SWITZERLAND, StrID("zurich")),
+                start_date=start_date,
+                end_date=start_date + dt.timedelta(days=3),
+            )
+            calendar._add_trip(person, trip)
+    return calendar
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--trips", type=int, default=26, help="Trips per person")
+    parser.add_argument("--days", type=int, default=90, help="Days in the daily calendars")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    templates = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATES_DIRECTORY), autoescape=True)
+
+    def render_template(template_name: str, **context: Any) -> str:
+        return templates.get_template(template_name).render(**context)
+
+    dates = (START_DATE, START_DATE + dt.timedelta(days=args.days - 1))
+    for num_people in args.people:
+        calendar = sample_calendar(num_people, args.trips)
+        calendar.set_daily_calendars_dates(*dates)
+        person = calendar.snapshot.people_sorted_by_name[0]
+        trip = Trip(
+            unique_id=StrID("new-trip"),
+            location=Location(Country.UNITED_KINGDOM, StrID("london")),
+            start_date=START_DATE + dt.timedelta(days=18),
+            end_date=START_DATE + dt.timedelta(days=20),
+        )
+        calendar._add_trip(person, trip)
+        for person_calendar in calendar.single_person_calendars:
+            person_calendar.location_on(START_DATE)  # As in a running app, where the lookups were used before
+        response = Response(code=200, message="Added trip.")
+
+        start_time = time.perf_counter()
+        get_patch(render_template, calendar.snapshot, calendar.last_change, response, dates)
+        patch_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        get_fragments(render_template, FragmentCache(max_bytes=0), calendar.snapshot, dates)
+        page_time = time.perf_counter() - start_time
+        print(f"{num_people:5} people: patch {patch_time * 1e3:8.2f} ms, whole page {page_time * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
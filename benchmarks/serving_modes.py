@@ -0,0 +1,131 @@
+"""Benchmark the synchronous (WSGI) app against the asynchronous (ASGI) app, with a slow database.
+
+SQLite (via aiosqlite for the asynchronous app) stands in for the remote database, with a simulated network round trip
+added to every repository call. Run from the repository root with `python -m benchmarks.serving_modes`.
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from schedules.frontend import create_app
+from schedules.frontend.async_app import create_async_app
+from schedules.logic.async_storage import AsyncCalendarRepository
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.storage import CalendarRepository
+
+
+def add_sample_data(repository: CalendarRepository, num_people: int) -> None:
+    for person_idx in range(num_people):
+        person = Person(
+            unique_id=StrID(f"person-{person_idx}"),
+            last_name=StrID(f"lastname-{person_idx}"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        repository.add_person(person)
+        for month in range(1, 13):
+            trip = Trip(
+                unique_id=StrID(f"trip-{person_idx}-{month}"),
+                location=Location(Country.SWITZERLAND, StrID("zurich")),
+                start_date=dt.date(2025, month, 1),
+                end_date=dt.date(2025, month, 5),
+            )
+            repository.add_trip(person, trip)
+
+
+def add_latency(repository_class: type, latency: float, is_async: bool) -> None:
+    """Make every repository call wait for a simulated network round trip."""
+    for name in ("get_version", "get_all_people", "get_trips_for_person", "add_person", "add_trip"):
+        method = getattr(repository_class, name)
+        if is_async:
+
+            async def slow_method(*args, _method=method):
+                await asyncio.sleep(latency)
+                return await _method(*args)
+
+        else:
+
+            def slow_method(*args, _method=method):
+                time.sleep(latency)
+                return _method(*args)
+
+        setattr(repository_class, name, slow_method)
+
+
+def run_sync(num_requests: int, num_threads: int) -> tuple[list[float], float]:
+    """Serve requests with the synchronous app, with as many at a time as the server has threads."""
+    app = create_app()
+
+    def get_page(_: int) -> float:
+        start_time = time.perf_counter()
+        with app.test_client() as client:
+            assert client.get("/").status_code == 200
+        return time.perf_counter() - start_time
+
+    get_page(0)  # Warm up: load calendar and render fragments
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        latencies = list(executor.map(get_page, range(num_requests)))
+    return (latencies, time.perf_counter() - start_time)
+
+
+async def run_async(num_requests: int, num_concurrent: int) -> tuple[list[float], float]:
+    """Serve requests with the asynchronous app, with up to `num_concurrent` open connections at a time."""
+    app = create_async_app()
+    semaphore = asyncio.Semaphore(num_concurrent)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+
+            async def get_page() -> float:
+                async with semaphore:
+                    start_time = time.perf_counter()
+                    assert (await client.get("/")).status_code == 200
+                    return time.perf_counter() - start_time
+
+            await get_page()  # Warm up: load calendar and render fragments
+            start_time = time.perf_counter()
+            latencies = await asyncio.gather(*(get_page() for _ in range(num_requests)))
+            return (latencies, time.perf_counter() - start_time)
+
+
+def report(name: str, latencies: list[float], duration: float) -> None:
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    print(
+        f"{name:>6}: {len(latencies) / duration:8.1f} requests/s, "
+        f"median {statistics.median(latencies_ms):7.1f} ms, p99 {latencies_ms[int(len(latencies_ms) * 0.99)]:7.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100, help="Concurrent connections")
+    parser.add_argument("--threads", type=int, default=8, help="Threads of the synchronous server")
+    parser.add_argument("--people", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated round trip to the database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.setdefault("FLASK_KEY", "benchmark")
+        os.environ["DATABASE_URL"] = f"sqlite:///{directory}/database.db"
+        with create_app().database_session_maker() as session:
+            add_sample_data(CalendarRepository(session), args.people)
+
+        add_latency(CalendarRepository, args.latency_ms / 1000, is_async=False)
+        add_latency(AsyncCalendarRepository, args.latency_ms / 1000, is_async=True)
+        print(f"{args.requests} requests, {args.concurrency} concurrent, {args.latency_ms} ms database round trip")
+
+        report("sync", *run_sync(args.requests, args.threads))
+        report("async", *asyncio.run(run_async(args.requests, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark reads and writes from several processes sharing one SQLite file, with and without the tuned SQLite mode.
+
+Each process stands in for a gunicorn worker. Writers add and remove trips, readers check the version and load the calendar, as
+the home page does. Run from the repository root with `python -m benchmarks.sqlite_modes`.
+"""
+
+import argparse
+import dataclasses
+import datetime as dt
+import logging
+import multiprocessing
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.database import PoolSettings, create_database_engine, create_read_only_engine
+from schedules.logic.errors import CalendarError
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.storage import Base, CalendarRepository
+
+NUM_PEOPLE = 20
+NUM_TRIPS_PER_PERSON = 20
+
+
+def sample_person(person_idx: int) -> Person:
+    return Person(
+        unique_id=StrID(f"person-{person_idx}"),
+        last_name=StrID(f"lastname-{person_idx}"),
+        first_name=StrID("firstname"),
+        home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+    )
+
+
+def sample_trip(unique_id: str, trip_idx: int) -> Trip:
+    start_date = dt.date(2020, 1, 1) + dt.timedelta(days=7 * trip_idx)
+    return Trip(
+        unique_id=StrID(unique_id),
+        location=Location(Country.SWITZERLAND, StrID("zurich")),
+        start_date=start_date,
+        end_date=start_date + dt.timedelta(days=3),
+    )
+
+
+def create_database(database_url: str, settings: PoolSettings) -> None:
+    engine = create_database_engine(database_url, settings)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        repository = CalendarRepository(session)
+        for person_idx in range(NUM_PEOPLE):
+            person = sample_person(person_idx)
+            repository.add_person(person)
+            for trip_idx in range(NUM_TRIPS_PER_PERSON):
+                repository.add_trip(person, sample_trip(f"trip-{person_idx}-{trip_idx}", trip_idx))
+    engine.dispose()
+
+
+def run_worker(database_url: str, settings: PoolSettings, writer_idx: int | None, duration: float) -> dict:
+    logging.disable(logging.INFO)  # Logging every trip would dominate the timings
+    engine = create_database_engine(database_url, settings)
+    read_engine = create_read_only_engine(database_url, settings)
+    session_maker = sessionmaker(bind=engine)
+    read_session_maker = sessionmaker(bind=read_engine) if read_engine else None
+    num_operations = 0
+    num_errors = 0
+
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        with session_maker() as session:
+            read_session = read_session_maker() if read_session_maker else None
+            repository = CalendarRepository(session, read_session=read_session)
+            try:
+                if writer_idx is not None:
+                    # Add and remove a trip after all others, so the amount of data readers load stays the same
+                    trip = sample_trip(f"new-trip-{writer_idx}", NUM_TRIPS_PER_PERSON)
+                    repository.add_trip(sample_person(writer_idx % NUM_PEOPLE), trip)
+                    repository.remove_trip(trip)
+                    num_operations += 2
+                else:
+                    repository.get_version()
+                    FullCalendar(database_repository=repository).load_from_repository()
+                    num_operations += 1
+            except CalendarError:
+                num_errors += 1
+            finally:
+                if read_session:
+                    read_session.close()
+    return dict(is_writer=writer_idx is not None, num_operations=num_operations, num_errors=num_errors)
+
+
+def run(settings: PoolSettings, num_writers: int, num_readers: int, duration: float) -> tuple[float, float, int]:
+    """Return writes per second, reads per second and the number of failed operations."""
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{directory}/database.db"
+        create_database(database_url, settings)
+        arguments = [
+            (database_url, settings, worker_idx if worker_idx < num_writers else None, duration)
+            for worker_idx in range(num_writers + num_readers)
+        ]
+        with multiprocessing.get_context("spawn").Pool(len(arguments)) as pool:
+            results = pool.starmap(run_worker, arguments)
+
+    writes = sum(result["num_operations"] for result in results if result["is_writer"])
+    reads = sum(result["num_operations"] for result in results if not result["is_writer"])
+    errors = sum(result["num_errors"] for result in results)
+    return writes / duration, reads / duration, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=2, help="Writing processes")
+    parser.add_argument("--readers", type=int, default=4, help="Reading processes")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run each mode")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writing and {args.readers} reading processes, {args.duration} s each mode")
+    for name, sqlite_tuned in (("default", False), ("tuned", True)):
+        settings = dataclasses.replace(PoolSettings.from_environment(), sqlite_tuned=sqlite_tuned)
+        writes_per_second, reads_per_second, errors = run(settings, args.writers, args.readers, args.duration)
+        print(f"{name:>8}: {writes_per_second:8.1f} writes/s {reads_per_second:8.1f} reads/s {errors:5} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark how long the app takes to import, to create, and to serve its first request.
+
+Each measurement runs in a new Python process, so that nothing is imported yet. Run from the repository root with
+`python -m benchmarks.startup`; add `--importtime` to see which modules take longest to import.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Run in a new process; prints the timings as JSON
+MEASURE_STARTUP = """
+import json, sys, time
+
+start_time = time.perf_counter()
+from schedules.frontend import create_app
+import_time = time.perf_counter() - start_time
+
+start_time = time.perf_counter()
+app = create_app()
+create_time = time.perf_counter() - start_time
+imported_sqlalchemy = "sqlalchemy" in sys.modules
+
+start_time = time.perf_counter()
+assert app.test_client().get("/").status_code == 200
+first_request_time = time.perf_counter() - start_time
+
+print(json.dumps(dict(
+    import_time=import_time,
+    create_time=create_time,
+    first_request_time=first_request_time,
+    imported_sqlalchemy=imported_sqlalchemy,
+)))
+"""
+
+
+def measure_startup(database_url: str) -> dict:
+    environment = dict(os.environ, FLASK_KEY=os.environ.get("FLASK_KEY", "benchmark"), DATABASE_URL=database_url)
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_STARTUP], env=environment, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def print_slowest_imports(num_modules: int) -> None:
+    """Print the modules with the largest cumulative import time, according to `python -X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import schedules.frontend"], capture_output=True, text=True
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((int(parts[1]), parts[2].rstrip()))
+    for cumulative_us, module in sorted(imports, reverse=True)[:num_modules]:
+        print(f"{cumulative_us / 1000:8.1f} ms {module}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{directory}/database.db"
+        results = [measure_startup(database_url) for _ in range(args.repeat)]
+
+    for name in ("import_time", "create_time", "first_request_time"):
+        print(f"{name:>18}: {statistics.median(result[name] for result in results) * 1000:8.1f} ms")
+    print(f"SQLAlchemy imported by create_app: {any(result['imported_sqlalchemy'] for result in results)}")
+    if args.importtime:
+        print_slowest_imports(num_modules=20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark loading and writing a calendar with each repository, to separate the calendar logic from storage costs.
+
+The in-memory repository has no storage cost, so its timings are the cost of the calendar logic alone. Run from the
+repository root with `python -m benchmarks.storage_backends`.
+"""
+
+import argparse
+import contextlib
+import datetime as dt
+import logging
+import statistics
+import tempfile
+import time
+from typing import Callable, Iterator
+
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.database import create_database_engine
+from schedules.logic.file_storage import AppendOnlyFileRepository
+from schedules.logic.journal import WriteBehindRepository
+from schedules.logic.memory_storage import InMemoryRepository
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.repository import Repository
+from schedules.logic.storage import Base, CalendarRepository
+
+
+@contextlib.contextmanager
+def open_database(directory: str) -> Iterator[Repository]:
+    engine = create_database_engine(f"sqlite:///{directory}/database.db")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield CalendarRepository(session)
+    engine.dispose()
+
+
+@contextlib.contextmanager
+def open_file(directory: str) -> Iterator[Repository]:
+    repository = AppendOnlyFileRepository(f"{directory}/calendar.jsonl")
+    yield repository
+    repository.close()
+
+
+@contextlib.contextmanager
+def open_memory(directory: str) -> Iterator[Repository]:
+    yield InMemoryRepository()
+
+
+@contextlib.contextmanager
+def open_journal(directory: str) -> Iterator[Repository]:
+    engine = create_database_engine(f"sqlite:///{directory}/database.db")
+    Base.metadata.create_all(engine)
+
+    @contextlib.contextmanager
+    def open_repository() -> Iterator[CalendarRepository]:
+        with sessionmaker(bind=engine)() as session:
+            yield CalendarRepository(session)
+
+    repository = WriteBehindRepository(open_repository, f"{directory}/journal")
+    yield repository
+    repository.close()
+    engine.dispose()
+
+
+BACKENDS: dict[str, Callable[[str], contextlib.AbstractContextManager[Repository]]] = dict(
+    memory=open_memory, file=open_file, sqlite=open_database, journal=open_journal
+)
+
+
+def fill(repository: Repository, num_people: int, num_trips_per_person: int) -> None:
+    for person_idx in range(num_people):
+        person = Person(
+            unique_id=StrID(f"person-{person_idx}"),
+            last_name=StrID(f"lastname-{person_idx}"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        trips = []
+        for trip_idx in range(num_trips_per_person):
+            start_date = dt.date(2020, 1, 1) + dt.timedelta(days=7 * trip_idx)
+            trips.append(
+                Trip(
+                    unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                    location=Location(Country.SWITZERLAND, StrID("zurich")),
+                    start_date=start_date,
+                    end_date=start_date + dt.timedelta(days=3),
+                )
+            )
+        repository.add_person(person)
+        repository.add_trips(person, trips)
+
+
+def time_load(repository: Repository, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        FullCalendar(database_repository=repository).load_from_repository()
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def time_writes(repository: Repository, num_writes: int) -> float:
+    """Median time of adding a trip through the calendar, including the calendar's own checks."""
+    calendar = FullCalendar(database_repository=repository)
+    calendar.load_from_repository()
+    person = calendar.people_sorted_by_name[0]
+    timings = []
+    for write_idx in range(num_writes):
+        start_date = dt.date(2100, 1, 1) + dt.timedelta(days=7 * write_idx)
+        request = dict(
+            request_type="ADD_TRIP",
+            person_id=person.unique_id,
+            country="SWITZERLAND",
+            city="zurich",
+            start_date=start_date.isoformat(),
+            end_date=(start_date + dt.timedelta(days=3)).isoformat(),
+        )
+        start_time = time.perf_counter()
+        calendar.process_frontend_request(request)
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--trips", type=int, default=50, help="Trips per person")
+    parser.add_argument("--writes", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Logging every trip would dominate the timings
+
+    print(f"{args.people} people, {args.trips} trips each")
+    for name, open_backend in BACKENDS.items():
+        with tempfile.TemporaryDirectory() as directory, open_backend(directory) as repository:
+            fill(repository, args.people, args.trips)
+            load_time = time_load(repository, args.repeat)
+            write_time = time_writes(repository, args.writes)
+        print(f"{name:>8}: load {load_time * 1000:8.1f} ms, add trip {write_time * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Gunicorn settings, read automatically when gunicorn starts in this directory."""
+
+import os
+
+# Load the calendar once in the master process, which the workers then share, rather than once in each worker
+preload_app = os.environ.get("GUNICORN_PRELOAD", "").lower() in ("1", "true", "yes")
+
+
+def when_ready(server) -> None:
+    # With `preload_app` or `--preload`, the app is already imported; load the calendar before forking the workers
+    if server.cfg.preload_app:
+        server.app.wsgi().preload()
+
+
+def post_fork(server, worker) -> None:
+    if server.cfg.preload_app:
+        worker.app.wsgi().after_fork()
+
+
+def post_worker_init(worker) -> None:
+    # Connect to the database and load the calendar before serving, rather than during the first request
+    worker.wsgi.warm_up()
+
+
+def worker_exit(server, worker) -> None:
+    # Flush writes that are still in the journal, if there is one
+    worker.wsgi.shut_down()
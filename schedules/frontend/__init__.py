@@ -1,14 +1,14 @@
 import os
 
-from dotenv import load_dotenv
-
 from schedules.frontend.app_with_calendar import AppWithCalendar
+from schedules.frontend.commands import archive_trips, export, purge_orphaned_trips, rebuild_segments
 from schedules.frontend.pages import pages
 
-load_dotenv()
-
 
 def create_app() -> AppWithCalendar:
+    from dotenv import load_dotenv  # Imported here, to keep importing this package fast
+
+    load_dotenv()
     app = AppWithCalendar(__name__)
 
     # Set up flask key
@@ -19,5 +19,9 @@ def create_app() -> AppWithCalendar:
 
     # Generate pages
     app.register_blueprint(pages, url_prefix="/")
+    app.cli.add_command(purge_orphaned_trips)
+    app.cli.add_command(archive_trips)
+    app.cli.add_command(rebuild_segments)
+    app.cli.add_command(export)
 
     return app
@@ -1,25 +1,355 @@
 """Base objects used in frontend."""
 
+import contextlib
+import gc
+import logging
 import os
-from flask import Flask
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import threading
+from typing import Iterator, NamedTuple, TYPE_CHECKING
+from flask import Flask, render_template
+from markupsafe import Markup
 
-from schedules.logic.storage import Base
+from schedules.frontend.cache import FragmentCache
+from schedules.frontend.coalescing import SingleFlight
+from schedules.frontend.rendering import get_fragments
+from schedules.logic.calendar import CalendarState, FullCalendar
+from schedules.logic.change_feed import DEFAULT_KEEP_ALIVE_SECONDS, DEFAULT_MAX_QUEUED_CHANGES, ChangeFeed
+from schedules.logic.groups import DEFAULT_GROUP_ID, DEFAULT_MAX_GROUPS, GroupCache, is_valid_group_id
+from schedules.logic.parallel import ParallelDailyCalendars, ParallelSettings
+from schedules.logic.requests import DEFAULT_MAX_BATCH_REQUESTS
+from schedules.logic.snapshot_file import DEFAULT_SNAPSHOT_INTERVAL_SECONDS, SnapshotWriter, read_snapshot_file
+from schedules.logic.version_check import DEFAULT_VERSION_CHECK_INTERVAL_SECONDS, VersionChecker, VersionFile
+
+if TYPE_CHECKING:
+    from sqlalchemy import Engine
+    from sqlalchemy.orm import Session, sessionmaker
+    from schedules.logic.database import PoolMetrics, PoolSettings
+    from schedules.logic.file_storage import AppendOnlyFileRepository
+    from schedules.logic.journal import WriteBehindRepository
+    from schedules.logic.repository import Repository
+    from schedules.logic.storage import CalendarRepository, RecentWrites
+
+DEFAULT_DATABASE_URL = "sqlite:///data/database.db"
+DEFAULT_FRAGMENT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+class _Database(NamedTuple):
+    engine: "Engine"
+    session_maker: "sessionmaker[Session]"
+    read_engine: "Engine"
+    read_session_maker: "sessionmaker[Session] | None"
+    recent_writes: "RecentWrites | None"  # Only with a read replica
+
+
+class CalendarGroup(NamedTuple):
+    """Calendar data of one group, shared between requests and only reloaded when the group's version changes. Every
+    change is published to the change feed, which viewers follow to update their page.
+    """
+
+    group_id: str
+    calendar_state: CalendarState
+    change_feed: ChangeFeed
+    version_checker: VersionChecker
 
 
 class AppWithCalendar(Flask):
-    """An app, with a calendar object attached."""
+    """An app, with a calendar object attached.
+
+    The database is only set up when it is first used, or in `warm_up`, so creating the app stays fast.
+    """
 
     def __init__(self, import_name: str):
         super().__init__(import_name)
+        self._database: "_Database | None" = None
+        self._database_lock = threading.Lock()
+        self.storage_file = os.environ.get("CALENDAR_STORAGE_FILE") or None  # Replaces the database, if set
+        self._file_repository: "AppendOnlyFileRepository | None" = None
+        self.journal_directory = os.environ.get("CALENDAR_JOURNAL_DIR") or None  # Writes go to the database later
+        self.maintain_segments = is_segments_table_enabled()
+        self._write_behind_repository: "WriteBehindRepository | None" = None
+        self.database_pool_settings: "PoolSettings | None" = None
+        self.database_pool_metrics: "PoolMetrics | None" = None  # Checkout waits, once the database is set up
+
+        # Calendar data of the default group, which stays in memory, and of the most recently used other groups
+        self.default_group = create_calendar_group(DEFAULT_GROUP_ID)
+        self.change_feed = self.default_group.change_feed
+        self.calendar_state = self.default_group.calendar_state
+        self.version_checker = self.default_group.version_checker
+        self.groups = get_group_cache()
+        self.calendar_load_single_flight: SingleFlight[None] = SingleFlight()
+
+        # Optionally start from a snapshot file, so the first request only needs to check the version
+        self.snapshot_writer = start_snapshot_file(self.calendar_state)
+
+        # Rendered page fragments, shared between requests
+        max_bytes = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", DEFAULT_FRAGMENT_CACHE_MAX_BYTES))
+        self.fragment_cache = FragmentCache(max_bytes=max_bytes)
+        self.fragment_single_flight: SingleFlight[dict[str, Markup]] = SingleFlight()  # Shares concurrent renders
+        self.parallel_daily_calendars = get_parallel_daily_calendars()
+        self.max_batch_requests = int(os.environ.get("CALENDAR_MAX_BATCH_REQUESTS", DEFAULT_MAX_BATCH_REQUESTS))
+        self.change_stream = is_change_stream_enabled()  # Open pages only follow `/changes` if it is served
+
+    def _set_up_database(self) -> "_Database":
+        # Imported here, as SQLAlchemy and the ORM models are slow to import
+        from sqlalchemy.orm import sessionmaker
+        from schedules.logic.database import (
+            PoolMetrics,
+            PoolSettings,
+            create_database_engine,
+            create_read_only_engine,
+            create_replica_engine,
+        )
+        from schedules.logic.storage import DEFAULT_PRIMARY_AFTER_WRITE_SECONDS, RecentWrites, create_schema
 
         # Set up database - use PostgreSQL if DATABASE_URL is set, otherwise SQLite
-        database_url = os.environ.get("DATABASE_URL")
-        if database_url:
-            database_engine = create_engine(database_url)
+        database_url = os.environ.get("DATABASE_URL") or DEFAULT_DATABASE_URL
+        self.database_pool_settings = PoolSettings.from_environment()
+        self.database_pool_metrics = PoolMetrics()
+        engine = create_database_engine(database_url, self.database_pool_settings, self.database_pool_metrics)
+        with engine.begin() as connection:
+            create_schema(connection)
+
+        # Reads go to the read replica if there is one, except shortly after a write. Otherwise SQLite files get a
+        # separate pool for reading, which doesn't wait for writes.
+        replica_url = os.environ.get("DATABASE_READ_REPLICA_URL")
+        recent_writes = None
+        if replica_url:
+            read_engine = create_replica_engine(replica_url, self.database_pool_settings, self.database_pool_metrics)
+            recent_writes = RecentWrites(
+                float(os.environ.get("DATABASE_PRIMARY_AFTER_WRITE_SECONDS", DEFAULT_PRIMARY_AFTER_WRITE_SECONDS))
+            )
+        else:
+            read_engine = create_read_only_engine(
+                database_url, self.database_pool_settings, self.database_pool_metrics
+            )
+        return _Database(
+            engine=engine,
+            session_maker=sessionmaker(bind=engine),
+            read_engine=read_engine or engine,
+            read_session_maker=sessionmaker(bind=read_engine) if read_engine else None,
+            recent_writes=recent_writes,
+        )
+
+    def _get_database(self) -> "_Database":
+        if self._database is None:
+            with self._database_lock:
+                if self._database is None:
+                    self._database = self._set_up_database()
+        return self._database
+
+    @property
+    def database_engine(self) -> "Engine":
+        return self._get_database().engine
+
+    @property
+    def database_read_engine(self) -> "Engine":
+        """The engine used for reading, which is `database_engine` unless reads have their own pool."""
+        return self._get_database().read_engine
+
+    @property
+    def database_session_maker(self) -> "sessionmaker[Session]":
+        return self._get_database().session_maker
+
+    @property
+    def supports_groups(self) -> bool:
+        """Whether there can be groups besides the default group, which needs the database without a journal."""
+        return not self.storage_file and not self.journal_directory
+
+    def get_group(self, group_id: str) -> CalendarGroup | None:
+        """Get a group's calendar data, or None if there can't be such a group."""
+        if group_id == DEFAULT_GROUP_ID:
+            return self.default_group
+        if not self.supports_groups or not is_valid_group_id(group_id):
+            return None
+        return self.groups.get(group_id)
+
+    @contextlib.contextmanager
+    def calendar_repository(self, group_id: str = DEFAULT_GROUP_ID) -> Iterator["Repository"]:
+        """Get a repository of a group with its own database sessions, which are closed afterwards.
+
+        With a storage file or a journal, all requests share the same repository instead, of the default group.
+        """
+        if group_id != DEFAULT_GROUP_ID and not self.supports_groups:
+            raise ValueError("Groups need a database, without a storage file or journal.")
+        if self.storage_file:
+            yield self._get_file_repository(self.storage_file)
+        elif self.journal_directory:
+            yield self._get_write_behind_repository(self.journal_directory)
         else:
-            database_engine = create_engine("sqlite:///data/database.db")
+            with self._database_repository(group_id) as repository:
+                yield repository
+
+    @contextlib.contextmanager
+    def _database_repository(self, group_id: str = DEFAULT_GROUP_ID) -> Iterator["CalendarRepository"]:
+        from schedules.logic.storage import CalendarRepository
+
+        database = self._get_database()
+        with contextlib.ExitStack() as stack:
+            session = stack.enter_context(database.session_maker())
+            read_session = stack.enter_context(database.read_session_maker()) if database.read_session_maker else None
+            yield CalendarRepository(
+                session,
+                read_session=read_session,
+                maintain_segments=self.maintain_segments,
+                recent_writes=database.recent_writes,
+                group_id=group_id,
+            )
+
+    def _get_file_repository(self, path: str) -> "AppendOnlyFileRepository":
+        if self._file_repository is None:
+            with self._database_lock:
+                if self._file_repository is None:
+                    from schedules.logic.file_storage import AppendOnlyFileRepository
+
+                    self._file_repository = AppendOnlyFileRepository(path)
+        return self._file_repository
+
+    def _get_write_behind_repository(self, journal_directory: str) -> "WriteBehindRepository":
+        if self._write_behind_repository is None:
+            with self._database_lock:
+                if self._write_behind_repository is None:
+                    from schedules.logic.journal import DEFAULT_FLUSH_INTERVAL_SECONDS, WriteBehindRepository
+
+                    flush_interval = float(
+                        os.environ.get("CALENDAR_JOURNAL_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL_SECONDS)
+                    )
+                    self._write_behind_repository = WriteBehindRepository(
+                        self._database_repository, journal_directory, flush_interval=flush_interval
+                    )
+        return self._write_behind_repository
+
+    def shut_down(self) -> None:
+        """Flush writes that are still in the journal to the database, and stop the daily calendar workers."""
+        if self._write_behind_repository is not None:
+            self._write_behind_repository.close()
+        if self.parallel_daily_calendars is not None:
+            self.parallel_daily_calendars.shut_down()
+
+    def warm_up(self) -> None:
+        """Set up the database, open connections and load the calendar before the first request, not during it."""
+        if not self.storage_file:
+            from schedules.logic.database import warm_up_pool
+
+            database = self._get_database()
+            if self.database_pool_settings is not None:
+                warm_up_pool(database.engine, self.database_pool_settings.warm_up_connections)
+                if database.read_engine is not database.engine:
+                    warm_up_pool(database.read_engine, self.database_pool_settings.warm_up_connections)
+        with self.calendar_repository() as repository:
+            calendar = FullCalendar(database_repository=repository, state=self.calendar_state)
+            version = repository.get_version()
+            self.version_checker.checked()
+            if version != calendar.version:
+                calendar.load_from_repository()
+
+    def preload(self) -> None:
+        """Load the calendar before gunicorn forks the workers, which then share its memory until they write to it.
+
+        The home page's fragments are rendered as well, for viewers without daily calendar dates. The connections are
+        closed again, as processes must not share them, and everything loaded is frozen, so that garbage collection in
+        the workers doesn't write to the shared memory. Workers check the version before they serve, as usual, and
+        only load and render again if something changed since.
+        """
+        if self.storage_file or self.journal_directory:
+            logging.warning("Not preloading the calendar, as each worker opens the storage file or journal itself.")
+            return
+        self.warm_up()
+        with self.test_request_context("/"):
+            get_fragments(render_template, self.fragment_cache, self.calendar_state.snapshot, (None, None))
+        database = self._get_database()
+        database.engine.dispose()
+        if database.read_engine is not database.engine:
+            database.read_engine.dispose()
+        gc.collect()
+        gc.freeze()
+        logging.info("Preloaded calendar at version %s.", self.calendar_state.snapshot.version)
+
+    def after_fork(self) -> None:
+        """In a worker forked after `preload`, start the background threads again, which don't survive forking."""
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.start()
+
+
+def is_segments_table_enabled() -> bool:
+    """Whether database writes also maintain the segment table, which `CALENDAR_SEGMENTS_TABLE` turns on."""
+    return os.environ.get("CALENDAR_SEGMENTS_TABLE", "").lower() in ("1", "true", "yes")
+
+
+def is_change_stream_enabled() -> bool:
+    """Whether the synchronous app serves `/changes`, which `CALENDAR_CHANGE_STREAM` turns on.
+
+    Every open stream holds a worker thread for as long as the page is open, so only turn it on with threaded or
+    asynchronous gunicorn workers, e.g. `--worker-class gthread --threads 100`. The asynchronous app always serves it.
+    """
+    return os.environ.get("CALENDAR_CHANGE_STREAM", "").lower() in ("1", "true", "yes")
+
+
+def get_parallel_daily_calendars() -> ParallelDailyCalendars | None:
+    """Get workers for large daily calendars, if `CALENDAR_PARALLEL_WORKERS` is more than one.
+
+    The workers only start when a daily calendar is first large enough to need them.
+    """
+    settings = ParallelSettings.from_environment()
+    return ParallelDailyCalendars(settings) if settings.num_workers > 1 else None
+
+
+def get_version_checker(group_id: str = DEFAULT_GROUP_ID) -> VersionChecker:
+    """Get the checker deciding when requests read a group's data version, configured from the environment.
+
+    `CALENDAR_VERSION_CHECK_INTERVAL` is the most seconds between checks, by default 0, i.e. every request. Writes by
+    other processes are only noticed at the next check, unless they share `CALENDAR_VERSION_FILE`, which every write
+    updates. Other groups than the default group have their own version file, with the group ID appended.
+    """
+    interval = float(os.environ.get("CALENDAR_VERSION_CHECK_INTERVAL", DEFAULT_VERSION_CHECK_INTERVAL_SECONDS))
+    version_file_path = os.environ.get("CALENDAR_VERSION_FILE")
+    if version_file_path and group_id != DEFAULT_GROUP_ID:
+        version_file_path = f"{version_file_path}-{group_id}"
+    return VersionChecker(interval, VersionFile(version_file_path) if version_file_path else None)
+
+
+def get_change_feed() -> ChangeFeed:
+    """Get the feed of changes that viewers follow, configured from the environment.
+
+    `CALENDAR_CHANGE_QUEUE_SIZE` is how many changes a viewer may fall behind before it is evicted, and
+    `CALENDAR_CHANGE_KEEP_ALIVE` how many seconds an idle stream waits before sending a keep-alive comment.
+    """
+    max_queued = int(os.environ.get("CALENDAR_CHANGE_QUEUE_SIZE", DEFAULT_MAX_QUEUED_CHANGES))
+    keep_alive_seconds = float(os.environ.get("CALENDAR_CHANGE_KEEP_ALIVE", DEFAULT_KEEP_ALIVE_SECONDS))
+    return ChangeFeed(max_queued=max_queued, keep_alive_seconds=keep_alive_seconds)
+
+
+def create_calendar_group(group_id: str) -> CalendarGroup:
+    change_feed = get_change_feed()
+    return CalendarGroup(
+        group_id=group_id,
+        calendar_state=CalendarState(change_feed=change_feed),
+        change_feed=change_feed,
+        version_checker=get_version_checker(group_id),
+    )
+
+
+def get_group_cache() -> GroupCache[CalendarGroup]:
+    """Get the cache of other groups' calendar data, which keeps at most `CALENDAR_MAX_GROUPS` in memory.
+
+    Viewers following an evicted group's changes are told to reload, which loads the group again.
+    """
+    max_groups = int(os.environ.get("CALENDAR_MAX_GROUPS", DEFAULT_MAX_GROUPS))
+    return GroupCache(create_calendar_group, max_groups, evict=lambda group: group.change_feed.close())
+
+
+def start_snapshot_file(state: CalendarState) -> SnapshotWriter | None:
+    """Read the snapshot file into the state, if there is one, and keep writing it as the data changes.
 
-        Base.metadata.create_all(database_engine)
-        self.database_session_maker = sessionmaker(bind=database_engine)
+    Only used if `CALENDAR_SNAPSHOT_PATH` is set. If the snapshot is out of date, the version check on the first
+    request loads everything from the database as usual.
+    """
+    snapshot_path = os.environ.get("CALENDAR_SNAPSHOT_PATH")
+    if not snapshot_path:
+        return None
+    snapshot = read_snapshot_file(snapshot_path)
+    if snapshot is not None:
+        state.snapshot = snapshot
+    interval = float(os.environ.get("CALENDAR_SNAPSHOT_INTERVAL", DEFAULT_SNAPSHOT_INTERVAL_SECONDS))
+    snapshot_writer = SnapshotWriter(state, snapshot_path, interval=interval)
+    snapshot_writer.start()
+    return snapshot_writer
@@ -0,0 +1,379 @@
+"""An asynchronous (ASGI) version of the app, which keeps serving other requests while it waits for the database.
+
+Database queries run in the event loop, with an asynchronous driver. Calendar computations and rendering run in a
+thread pool, using the same `FullCalendar` as the synchronous app.
+"""
+
+import asyncio
+import contextlib
+import os
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+import json
+from typing import Any, AsyncIterator, Callable, Final, TypeVar
+
+import jinja2
+from dotenv import load_dotenv
+from markupsafe import Markup
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.requests import Request as HTTPRequest
+from starlette.exceptions import HTTPException
+from starlette.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from schedules.logic import objects
+from schedules.logic.async_storage import AsyncCalendarRepository, BlockingCalendarRepository, get_async_database_url
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.change_feed import ChangeStream
+from schedules.logic.database import PoolMetrics, PoolSettings, create_async_database_engine, warm_up_async_pool
+from schedules.logic.export import ExportFormat, encode_chunks, iter_export
+from schedules.logic.groups import DEFAULT_GROUP_ID, is_valid_group_id
+from schedules.logic.errors import RequestError
+from schedules.logic.requests import DEFAULT_MAX_BATCH_REQUESTS, RequestType, Response, parse_batch
+from schedules.logic.storage import create_schema
+from schedules.frontend.app_with_calendar import (
+    DEFAULT_DATABASE_URL,
+    DEFAULT_FRAGMENT_CACHE_MAX_BYTES,
+    CalendarGroup,
+    create_calendar_group,
+    get_group_cache,
+    get_parallel_daily_calendars,
+    is_segments_table_enabled,
+    start_snapshot_file,
+)
+from schedules.frontend.cache import FragmentCache
+from schedules.frontend.coalescing import AsyncSingleFlight
+from schedules.frontend.rendering import (
+    CHANGE_STREAM_HEADERS,
+    accepts_gzip,
+    get_export_dates,
+    get_batch_result,
+    get_export_headers,
+    get_fragments,
+    get_group_path,
+    get_known_version,
+    get_patch,
+    get_session_dates,
+    pop_session_response,
+    set_session_dates,
+    set_session_response,
+)
+
+load_dotenv()
+
+FRONTEND_DIRECTORY: Final[pathlib.Path] = pathlib.Path(__file__).parent
+DEFAULT_CALENDAR_THREADS: Final[int] = 4
+
+T = TypeVar("T")
+
+
+def _url_for(endpoint: str, filename: str) -> str:
+    """Stand-in for Flask's `url_for`, which the templates use for static files."""
+    if endpoint != "static":
+        raise ValueError(f"Unknown endpoint: {endpoint}.")
+    return f"/static/{filename}"
+
+
+class AsyncAppState:
+    """Everything the asynchronous app shares between requests."""
+
+    def __init__(self, database_url: str) -> None:
+        self.database_pool_settings = PoolSettings.from_environment()
+        self.database_pool_metrics = PoolMetrics()
+        self.database_engine = create_async_database_engine(
+            get_async_database_url(database_url), self.database_pool_settings, self.database_pool_metrics
+        )
+        self.database_session_maker = async_sessionmaker(self.database_engine, expire_on_commit=False)
+        self.maintain_segments = is_segments_table_enabled()
+
+        # Calendar data of the default group, which stays in memory, and of the most recently used other groups
+        self.default_group = create_calendar_group(DEFAULT_GROUP_ID)
+        self.change_feed = self.default_group.change_feed
+        self.calendar_state = self.default_group.calendar_state
+        self.version_checker = self.default_group.version_checker
+        self.groups = get_group_cache()
+        self.calendar_load_single_flight: AsyncSingleFlight[None] = AsyncSingleFlight()
+        self.snapshot_writer = start_snapshot_file(self.calendar_state)
+
+        # Rendered page fragments, shared between requests
+        max_bytes = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", DEFAULT_FRAGMENT_CACHE_MAX_BYTES))
+        self.fragment_cache = FragmentCache(max_bytes=max_bytes)
+        self.fragment_single_flight: AsyncSingleFlight[dict[str, Markup]] = AsyncSingleFlight()
+
+        # Threads for calendar computations and rendering, which would otherwise block the event loop
+        num_threads = int(os.environ.get("CALENDAR_THREADS", DEFAULT_CALENDAR_THREADS))
+        self.executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="calendar")
+        self.parallel_daily_calendars = get_parallel_daily_calendars()  # For large daily calendars, on more cores
+        self.max_batch_requests = int(os.environ.get("CALENDAR_MAX_BATCH_REQUESTS", DEFAULT_MAX_BATCH_REQUESTS))
+        self.templates = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(FRONTEND_DIRECTORY / "templates"), autoescape=jinja2.select_autoescape()
+        )
+        self.templates.globals["url_for"] = _url_for
+
+    def render_template(self, template_name: str, **context: Any) -> str:
+        return self.templates.get_template(template_name).render(**context)
+
+    async def run_in_thread(self, function: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def get_group(self, group_id: str) -> CalendarGroup | None:
+        """Get a group's calendar data, or None if there can't be such a group."""
+        if group_id == DEFAULT_GROUP_ID:
+            return self.default_group
+        return self.groups.get(group_id) if is_valid_group_id(group_id) else None
+
+    def get_repository(self, session_db: AsyncSession, group: CalendarGroup) -> AsyncCalendarRepository:
+        return AsyncCalendarRepository(session_db, maintain_segments=self.maintain_segments, group_id=group.group_id)
+
+
+def _get_group(http_request: HTTPRequest) -> CalendarGroup:
+    """Get the calendar data of the request's group, or answer 404 if there can't be such a group."""
+    state: AsyncAppState = http_request.app.state.calendar_app
+    group = state.get_group(http_request.path_params.get("group_id", DEFAULT_GROUP_ID))
+    if group is None:
+        raise HTTPException(status_code=404)
+    return group
+
+
+async def _load_group(state: AsyncAppState, group: CalendarGroup) -> None:
+    """Load a group's shared calendar in a database session of its own, rather than that of the request that started
+    the load, which may be cancelled and close its session while other requests still wait for the load.
+    """
+    async with state.database_session_maker() as session_db:
+        repository = BlockingCalendarRepository(state.get_repository(session_db, group), asyncio.get_running_loop())
+        calendar = FullCalendar(database_repository=repository, state=group.calendar_state)
+        await state.run_in_thread(calendar.load_from_repository)
+
+
+async def _load_if_changed(
+    state: AsyncAppState, group: CalendarGroup, repository: AsyncCalendarRepository, calendar: FullCalendar
+) -> None:
+    """Only load if someone changed the data since the shared calendar was loaded, and then only once at a time."""
+    if group.version_checker.is_check_due(calendar.version):
+        version = await repository.get_version()
+        group.version_checker.checked()
+        if version != calendar.version:
+            await state.calendar_load_single_flight.do((group.group_id, version), lambda: _load_group(state, group))
+
+
+async def _process_request(
+    state: AsyncAppState, group: CalendarGroup, http_request: HTTPRequest, process: Callable[[FullCalendar], T]
+) -> tuple[FullCalendar, T]:
+    """Apply requests to the group's shared calendar with `process`, the same as the synchronous app."""
+    async with state.database_session_maker() as session_db:
+        repository = state.get_repository(session_db, group)
+        blocking_repository = BlockingCalendarRepository(repository, asyncio.get_running_loop())
+        calendar = FullCalendar(database_repository=blocking_repository, state=group.calendar_state)
+        start_date, end_date = get_session_dates(http_request.session)
+        if start_date and end_date:
+            calendar.set_daily_calendars_dates(start_date, end_date)
+        await _load_if_changed(state, group, repository, calendar)
+        loaded_version = calendar.version
+        response = await state.run_in_thread(process, calendar)
+
+        # Save daily calendar dates to session if they were updated
+        set_session_dates(http_request.session, calendar.get_daily_calendars_dates())
+        if calendar.version > loaded_version:  # Only announce actual writes, not failed or no-op requests
+            group.version_checker.notify(calendar.version)
+        if state.snapshot_writer and group is state.default_group:
+            state.snapshot_writer.notify()
+    return calendar, response
+
+
+async def home(http_request: HTTPRequest) -> HTMLResponse | RedirectResponse:
+    """Show the home page. Forms post to it and are redirected back, so reloading the page doesn't post them again."""
+    state: AsyncAppState = http_request.app.state.calendar_app
+    group = _get_group(http_request)
+    if http_request.method == "POST":
+        form = dict(await http_request.form())
+        _, response = await _process_request(
+            state, group, http_request, lambda calendar: calendar.process_frontend_request(form)
+        )
+        set_session_response(http_request.session, response)
+        return RedirectResponse(f"{get_group_path(group.group_id)}/", status_code=303)
+
+    async with state.database_session_maker() as session_db:
+        repository = state.get_repository(session_db, group)
+        blocking_repository = BlockingCalendarRepository(repository, asyncio.get_running_loop())
+        calendar = FullCalendar(
+            database_repository=blocking_repository,
+            state=group.calendar_state,
+            parallel=state.parallel_daily_calendars,
+        )
+        start_date, end_date = get_session_dates(http_request.session)
+        if start_date and end_date:
+            calendar.set_daily_calendars_dates(start_date, end_date)
+        await _load_if_changed(state, group, repository, calendar)
+
+    # Render from one snapshot, so all fragments show the same version even if someone writes meanwhile
+    snapshot = calendar.snapshot
+    dates = calendar.get_daily_calendars_dates()
+    fragments = await state.fragment_single_flight.do(
+        (group.group_id, snapshot.version, *dates),
+        lambda: state.run_in_thread(
+            get_fragments,
+            state.render_template,
+            state.fragment_cache,
+            snapshot,
+            dates,
+            state.parallel_daily_calendars,
+            group.group_id,
+        ),
+    )
+    html = state.render_template(
+        "home.html",
+        fragments=fragments,
+        objects=objects,
+        RequestType=RequestType,
+        response=pop_session_response(http_request.session),
+        version=snapshot.version,
+        group_path=get_group_path(group.group_id),
+        change_stream=True,  # Streams wait in the event loop, not in a thread each
+    )
+    return HTMLResponse(html)
+
+
+async def request_patch(http_request: HTTPRequest) -> JSONResponse:
+    """Process the request in a form, and answer with a patch to the page as JSON, the same as the synchronous app."""
+    state: AsyncAppState = http_request.app.state.calendar_app
+    group = _get_group(http_request)
+    form = dict(await http_request.form())
+    calendar, response = await _process_request(
+        state, group, http_request, lambda calendar: calendar.process_frontend_request(form)
+    )
+    patch = await state.run_in_thread(
+        get_patch,
+        state.render_template,
+        calendar.snapshot,
+        calendar.last_change,
+        response,
+        calendar.get_daily_calendars_dates(),
+    )
+    return JSONResponse(patch, status_code=response.code)
+
+
+async def batch(http_request: HTTPRequest) -> JSONResponse:
+    """Process a batch of requests sent as JSON, in one transaction, the same as the synchronous app."""
+    state: AsyncAppState = http_request.app.state.calendar_app
+    group = _get_group(http_request)
+    try:
+        body = await http_request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        body = None
+    try:
+        requests_raw, atomic = parse_batch(body, state.max_batch_requests)
+    except RequestError as err:
+        response = Response(code=400, message=f"Failed to parse batch: {err}")
+        return JSONResponse({"code": response.code, "message": response.frontend_message}, status_code=response.code)
+    calendar, batch_response = await _process_request(
+        state, group, http_request, lambda calendar: calendar.process_frontend_requests(requests_raw, atomic)
+    )
+    return JSONResponse(get_batch_result(batch_response, calendar.version), status_code=batch_response.code)
+
+
+async def export(http_request: HTTPRequest) -> StreamingResponse:
+    """Stream an export of the current data, the same as the synchronous app."""
+    state: AsyncAppState = http_request.app.state.calendar_app
+    group = _get_group(http_request)
+    try:
+        export_format = ExportFormat(http_request.path_params["export_name"])
+    except ValueError:
+        raise HTTPException(status_code=404)
+    try:
+        start_date, end_date = get_export_dates(http_request.query_params)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    async with state.database_session_maker() as session_db:
+        repository = state.get_repository(session_db, group)
+        blocking_repository = BlockingCalendarRepository(repository, asyncio.get_running_loop())
+        calendar = FullCalendar(database_repository=blocking_repository, state=group.calendar_state)
+        await _load_if_changed(state, group, repository, calendar)
+    try:
+        lines = iter_export(export_format, calendar.snapshot, start_date, end_date)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+
+    # Starlette runs the synchronous generator in a thread, so the event loop keeps serving meanwhile
+    compress = accepts_gzip(http_request.headers.get("Accept-Encoding", ""))
+    return StreamingResponse(
+        encode_chunks(lines, compress=compress),
+        media_type=export_format.media_type,
+        headers=get_export_headers(export_format, compress),
+    )
+
+
+async def _iter_change_events(state: AsyncAppState, group: CalendarGroup, stream: ChangeStream) -> AsyncIterator[str]:
+    """Events of a stream, waiting for changes in the event loop, and working out the changed cells in a thread."""
+    try:
+        for event in stream.start():
+            yield event
+        while not stream.is_done:
+            change = await stream.subscription.get_async(timeout=group.change_feed.keep_alive_seconds)
+            if change is None:
+                yield stream.next_event(None)
+            else:
+                yield await state.run_in_thread(stream.next_event, change)
+    finally:
+        stream.subscription.close()
+
+
+async def changes(http_request: HTTPRequest) -> StreamingResponse:
+    """Stream changes as Server-Sent Events, the same as the synchronous app, but without a thread per viewer."""
+    state: AsyncAppState = http_request.app.state.calendar_app
+    group = _get_group(http_request)
+    subscription = group.change_feed.subscribe(asyncio.get_running_loop())
+    stream = ChangeStream(
+        subscription,
+        get_session_dates(http_request.session),
+        get_known_version(http_request.headers, http_request.query_params),
+        group.calendar_state.snapshot.version,
+        group.version_checker.get_announced_version,
+    )
+    return StreamingResponse(
+        _iter_change_events(state, group, stream), media_type="text/event-stream", headers=CHANGE_STREAM_HEADERS
+    )
+
+
+@contextlib.asynccontextmanager
+async def _lifespan(app: Starlette) -> AsyncIterator[None]:
+    state: AsyncAppState = app.state.calendar_app
+    async with state.database_engine.begin() as connection:
+        await connection.run_sync(create_schema)
+    await warm_up_async_pool(state.database_engine, state.database_pool_settings.warm_up_connections)
+    yield
+    await state.database_engine.dispose()
+    state.executor.shutdown()
+    if state.parallel_daily_calendars is not None:
+        state.parallel_daily_calendars.shut_down()
+
+
+def create_async_app() -> Starlette:
+    # Sign sessions with the same key as the synchronous app. Starlette's session cookie differs from Flask's, so
+    # sessions are per app: viewers switched from one app to the other start again with the default dates.
+    secret_key = os.environ.get("FLASK_KEY")
+    if secret_key is None:
+        raise RuntimeError("Secret key not defined. Create .env file of form:\n\nFLASK_KEY='<MY_SECRET_KEY>'\n\n")
+
+    app = Starlette(
+        routes=[
+            Route("/", home, methods=["GET", "POST"]),
+            Route("/requests", request_patch, methods=["POST"]),
+            Route("/batch", batch, methods=["POST"]),
+            Route("/export/{export_name}", export),
+            Route("/changes", changes),
+            Route("/groups/{group_id}/", home, methods=["GET", "POST"]),
+            Route("/groups/{group_id}/requests", request_patch, methods=["POST"]),
+            Route("/groups/{group_id}/batch", batch, methods=["POST"]),
+            Route("/groups/{group_id}/export/{export_name}", export),
+            Route("/groups/{group_id}/changes", changes),
+            Mount("/static", StaticFiles(directory=FRONTEND_DIRECTORY / "static"), name="static"),
+        ],
+        middleware=[Middleware(SessionMiddleware, secret_key=secret_key)],
+        lifespan=_lifespan,
+    )
+    app.state.calendar_app = AsyncAppState(database_url=os.environ.get("DATABASE_URL") or DEFAULT_DATABASE_URL)
+    return app
@@ -0,0 +1,70 @@
+"""Cache of rendered page fragments."""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class FragmentCache:
+    """A least-recently-used cache of rendered fragments, bounded by their total size in bytes.
+
+    Keys should contain the data version, so that entries for old versions are never served and simply age out.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[str, int]] = OrderedDict()  # Key -> (fragment, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"FragmentCache({len(self)} entries, {self._total_bytes}/{self.max_bytes} bytes)"
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, key: Hashable) -> str | None:
+        """Get a fragment, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, fragment: str) -> None:
+        """Cache a fragment, evicting the least recently used fragments if the cache is full."""
+        size = len(fragment.encode("utf-8"))
+        if size > self.max_bytes:
+            logging.info("Not caching fragment %s of %s bytes, larger than cache.", key, size)
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (fragment, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        """Get a fragment, rendering and caching it first if it is not cached."""
+        fragment = self.get(key)
+        if fragment is None:
+            fragment = render()
+            self.put(key, fragment)
+        return fragment
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
@@ -0,0 +1,92 @@
+"""Coalescing of concurrent identical computations."""
+
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    """A computation in flight, which other threads can wait on."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+        self.num_waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """Run each computation only once at a time, sharing its result with all threads that ask for it meanwhile.
+
+    Unlike a cache, results are forgotten as soon as the computation finishes.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call[T]] = dict()
+        self._lock = threading.Lock()
+        self.num_computed = 0
+        self.num_shared = 0
+
+    def do(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Compute the result for `key`, or wait for the result if another thread is already computing it."""
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.num_computed += 1
+            else:
+                call.num_waiters += 1
+                self.num_shared += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore
+
+        try:
+            call.result = compute()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.num_waiters:
+                logging.info("Shared result for %s with %s waiting requests.", key, call.num_waiters)
+        return call.result
+
+
+class AsyncSingleFlight(Generic[T]):
+    """Like `SingleFlight`, for coroutines running in one event loop.
+
+    Each computation runs in a task of its own, so it finishes for the other waiters even if the coroutine that started
+    it is cancelled, e.g. because its client disconnected.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: dict[Hashable, asyncio.Future[T]] = dict()
+        self.num_computed = 0
+        self.num_shared = 0
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """Compute the result for `key`, or wait for the result if another coroutine is already computing it."""
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda done_task: self._forget(key, done_task))
+            self.num_computed += 1
+        else:
+            self.num_shared += 1
+        return await asyncio.shield(task)  # Don't cancel the computation if this waiter is cancelled
+
+    def _forget(self, key: Hashable, task: asyncio.Future[T]) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved, in case every waiter was cancelled
@@ -0,0 +1,94 @@
+"""Maintenance commands, run with `flask --app schedules.frontend <command>`."""
+
+import datetime as dt
+from typing import BinaryIO, cast
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from schedules.frontend.app_with_calendar import AppWithCalendar
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.export import ExportFormat, encode_chunks, iter_export
+from schedules.logic.groups import DEFAULT_GROUP_ID
+
+# Commands that read or write people and trips only do so for one group
+group_option = click.option("--group", "group_id", default=DEFAULT_GROUP_ID, show_default=True, help="Group ID.")
+
+
+@click.command("purge-orphaned-trips")
+@click.option("--batch-size", type=int, default=None, help="Trips to delete per transaction.")
+@with_appcontext
+def purge_orphaned_trips(batch_size: int | None) -> None:
+    """Delete trips of people who are no longer in the database."""
+    # Imported here, as SQLAlchemy and the ORM models are slow to import
+    from schedules.logic.storage import ORPHAN_PURGE_BATCH_SIZE, CalendarRepository
+
+    app = cast(AppWithCalendar, current_app)
+    with app.database_session_maker() as session:
+        result = CalendarRepository(session).purge_orphaned_trips(batch_size=batch_size or ORPHAN_PURGE_BATCH_SIZE)
+    click.echo(f"Purged {result.num_trips} orphaned trips, {result.num_bytes} bytes of data.")
+
+
+@click.command("rebuild-segments")
+@group_option
+@with_appcontext
+def rebuild_segments(group_id: str) -> None:
+    """Recompute the segment table from all people and trips of a group."""
+    from schedules.logic.storage import CalendarRepository
+
+    app = cast(AppWithCalendar, current_app)
+    with app.database_session_maker() as session:
+        num_segments = CalendarRepository(session, group_id=group_id).rebuild_segments()
+    click.echo(f"Rebuilt {num_segments} segments.")
+
+
+@click.command("archive-trips")
+@click.option(
+    "--before", "cutoff", type=click.DateTime(formats=["%Y-%m-%d"]), required=True, help="Cutoff date, YYYY-MM-DD."
+)
+@click.option("--batch-size", type=int, default=None, help="Trips to move per transaction.")
+@group_option
+@with_appcontext
+def archive_trips(cutoff: dt.datetime, batch_size: int | None, group_id: str) -> None:
+    """Move a group's trips that end before a cutoff date to the archive, so calendars no longer load them."""
+    from schedules.logic.storage import ARCHIVE_BATCH_SIZE, CalendarRepository
+
+    app = cast(AppWithCalendar, current_app)
+    with app.database_session_maker() as session:
+        repository = CalendarRepository(session, maintain_segments=app.maintain_segments, group_id=group_id)
+        result = repository.archive_trips(cutoff.date(), batch_size=batch_size or ARCHIVE_BATCH_SIZE)
+    click.echo(f"Archived {result.num_trips} trips of {result.num_people} people.")
+
+
+@click.command("export")
+@click.argument("export_name", type=click.Choice([export_format.value for export_format in ExportFormat]))
+@click.option("--start", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="First date, YYYY-MM-DD.")
+@click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Last date, YYYY-MM-DD.")
+@click.option("--output", type=click.File("wb"), default="-", help="File to write to, by default standard output.")
+@click.option("--gzip", "compress", is_flag=True, help="Compress with gzip.")
+@group_option
+@with_appcontext
+def export(
+    export_name: str,
+    start: dt.datetime | None,
+    end: dt.datetime | None,
+    output: BinaryIO,
+    compress: bool,
+    group_id: str,
+) -> None:
+    """Write a group's trips as iCalendar events (trips.ics), or where everyone is between two dates as iCalendar
+    events (segments.ics) or CSV rows (daily.csv).
+    """
+    app = cast(AppWithCalendar, current_app)
+    if group_id != DEFAULT_GROUP_ID and not app.supports_groups:
+        raise click.UsageError("Groups need a database, without a storage file or journal.")
+    with app.calendar_repository(group_id) as repository:
+        calendar = FullCalendar(database_repository=repository)
+        calendar.load_from_repository()
+    try:
+        lines = iter_export(ExportFormat(export_name), calendar.snapshot, start and start.date(), end and end.date())
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    for chunk in encode_chunks(lines, compress=compress):
+        output.write(chunk)
@@ -1,42 +1,212 @@
 """Define the pages of the website."""
 
-import datetime as dt
-from typing import cast
-from flask import Blueprint, current_app, render_template, request as flask_request, session
+from typing import Any, Callable, TypeVar, cast
+from flask import Blueprint, abort, current_app, redirect, render_template, request as flask_request, session, url_for
+from flask import Response as FlaskResponse
+from werkzeug.wrappers import Response as WerkzeugResponse
 
 from schedules.logic import objects
 from schedules.logic.calendar import FullCalendar
-from schedules.logic.storage import CalendarRepository
-from schedules.frontend.app_with_calendar import AppWithCalendar
-from schedules.logic.requests import RequestType, Response
+from schedules.logic.change_feed import ChangeStream, iter_change_events
+from schedules.logic.export import ExportFormat, encode_chunks, iter_export
+from schedules.logic.groups import DEFAULT_GROUP_ID
+from schedules.logic.repository import Repository
+from schedules.frontend.app_with_calendar import AppWithCalendar, CalendarGroup
+from schedules.frontend.rendering import (
+    CHANGE_STREAM_HEADERS,
+    accepts_gzip,
+    get_export_dates,
+    get_batch_result,
+    get_export_headers,
+    get_fragments,
+    get_group_path,
+    get_known_version,
+    get_patch,
+    get_session_dates,
+    pop_session_response,
+    set_session_dates,
+    set_session_response,
+)
+from schedules.logic.errors import RequestError
+from schedules.logic.requests import RequestType, Response, parse_batch
 
 pages = Blueprint("pages", __name__)
 
+T = TypeVar("T")
 
-@pages.route("/", methods=["GET", "POST"])
-def home() -> str:
+
+def _get_group(app: AppWithCalendar, group_id: str) -> CalendarGroup:
+    """Get a group's calendar data, or answer 404 if there can't be such a group."""
+    group = app.get_group(group_id)
+    if group is None:
+        abort(404)
+    return group
+
+
+def _load_if_changed(
+    app: AppWithCalendar, group: CalendarGroup, repository: Repository, calendar: FullCalendar
+) -> None:
+    """Only load if someone changed the data since the shared calendar was loaded, and then only once at a time."""
+    if group.version_checker.is_check_due(calendar.version):
+        version = repository.get_version()
+        group.version_checker.checked()
+        if version != calendar.version:
+            app.calendar_load_single_flight.do((group.group_id, version), calendar.load_from_repository)
+
+
+def _process_request(
+    app: AppWithCalendar, group: CalendarGroup, repository: Repository, process: Callable[[FullCalendar], T]
+) -> tuple[FullCalendar, T]:
+    """Apply requests to the group's shared calendar with `process`, e.g. the request in a form, and tell other
+    processes and the snapshot file about it.
+    """
+    calendar = FullCalendar(database_repository=repository, state=group.calendar_state)
+    start_date, end_date = get_session_dates(session)
+    if start_date and end_date:
+        calendar.set_daily_calendars_dates(start_date, end_date)
+    _load_if_changed(app, group, repository, calendar)
+    loaded_version = calendar.version
+    response = process(calendar)
+
+    # Save daily calendar dates to session if they were updated
+    set_session_dates(session, calendar.get_daily_calendars_dates())
+    if calendar.version > loaded_version:  # Only announce actual writes, not failed or no-op requests
+        group.version_checker.notify(calendar.version)
+    if app.snapshot_writer and group is app.default_group:
+        app.snapshot_writer.notify()
+    return calendar, response
+
+
+@pages.route("/", methods=["GET", "POST"], defaults={"group_id": DEFAULT_GROUP_ID})
+@pages.route("/groups/<group_id>/", methods=["GET", "POST"])
+def home(group_id: str) -> str | WerkzeugResponse:
+    """Show the home page. Forms post to it and are redirected back, so reloading the page doesn't post them again."""
     app = cast(AppWithCalendar, current_app)
-    with app.database_session_maker() as session_db:
-        repository = CalendarRepository(session_db)
-        calendar = FullCalendar(database_repository=repository)
-        calendar.load_from_repository()
-
-        # Restore daily calendar dates from session if they exist
-        if "daily_calendar_start_date" in session and "daily_calendar_end_date" in session:
-            start_date = dt.date.fromisoformat(session["daily_calendar_start_date"])
-            end_date = dt.date.fromisoformat(session["daily_calendar_end_date"])
+    group = _get_group(app, group_id)
+    if flask_request.method == "POST":
+        form = flask_request.form.to_dict()
+        with app.calendar_repository(group_id) as repository:
+            _, response = _process_request(
+                app, group, repository, lambda calendar: calendar.process_frontend_request(form)
+            )
+        set_session_response(session, response)
+        return redirect(url_for("pages.home", group_id=group_id), code=303)
+
+    with app.calendar_repository(group_id) as repository:
+        calendar = FullCalendar(
+            database_repository=repository, state=group.calendar_state, parallel=app.parallel_daily_calendars
+        )
+        start_date, end_date = get_session_dates(session)
+        if start_date and end_date:
             calendar.set_daily_calendars_dates(start_date, end_date)
+        _load_if_changed(app, group, repository, calendar)
 
-        response = Response(code=200, message="Ready")
-        if flask_request.method == "POST":
-            response = calendar.process_frontend_request(flask_request.form.to_dict())
-            
-            # Save daily calendar dates to session if they were updated
-            start_date, end_date = calendar.get_daily_calendars_dates()
-            if start_date and end_date:
-                session["daily_calendar_start_date"] = start_date.isoformat()
-                session["daily_calendar_end_date"] = end_date.isoformat()
-
-        return render_template(
-            "home.html", calendar=calendar, objects=objects, RequestType=RequestType, response=response
+    # Render from one snapshot, so all fragments show the same version even if someone writes meanwhile.
+    # Concurrent requests for the same page wait for one of them to render, instead of all doing so.
+    snapshot = calendar.snapshot
+    dates = calendar.get_daily_calendars_dates()
+    fragments = app.fragment_single_flight.do(
+        (group_id, snapshot.version, *dates),
+        lambda: get_fragments(
+            render_template, app.fragment_cache, snapshot, dates, app.parallel_daily_calendars, group_id
+        ),
+    )
+    return render_template(
+        "home.html",
+        fragments=fragments,
+        objects=objects,
+        RequestType=RequestType,
+        response=pop_session_response(session),
+        version=snapshot.version,
+        group_path=get_group_path(group_id),
+        change_stream=app.change_stream,
+    )
+
+
+@pages.route("/requests", methods=["POST"], defaults={"group_id": DEFAULT_GROUP_ID})
+@pages.route("/groups/<group_id>/requests", methods=["POST"])
+def request_patch(group_id: str) -> tuple[dict[str, Any], int]:
+    """Process the request in a form, and answer with a patch to the page as JSON, rather than the whole page."""
+    app = cast(AppWithCalendar, current_app)
+    group = _get_group(app, group_id)
+    form = flask_request.form.to_dict()
+    with app.calendar_repository(group_id) as repository:
+        calendar, response = _process_request(
+            app, group, repository, lambda calendar: calendar.process_frontend_request(form)
         )
+    dates = calendar.get_daily_calendars_dates()
+    return get_patch(render_template, calendar.snapshot, calendar.last_change, response, dates), response.code
+
+
+@pages.route("/batch", methods=["POST"], defaults={"group_id": DEFAULT_GROUP_ID})
+@pages.route("/groups/<group_id>/batch", methods=["POST"])
+def batch(group_id: str) -> tuple[dict[str, Any], int]:
+    """Process a batch of requests sent as JSON, in one transaction, and answer with a response to each."""
+    app = cast(AppWithCalendar, current_app)
+    group = _get_group(app, group_id)
+    try:
+        requests_raw, atomic = parse_batch(flask_request.get_json(silent=True), app.max_batch_requests)
+    except RequestError as err:
+        response = Response(code=400, message=f"Failed to parse batch: {err}")
+        return {"code": response.code, "message": response.frontend_message}, response.code
+    with app.calendar_repository(group_id) as repository:
+        calendar, batch_response = _process_request(
+            app, group, repository, lambda calendar: calendar.process_frontend_requests(requests_raw, atomic)
+        )
+    return get_batch_result(batch_response, calendar.version), batch_response.code
+
+
+@pages.route("/export/<export_name>", defaults={"group_id": DEFAULT_GROUP_ID})
+@pages.route("/groups/<group_id>/export/<export_name>")
+def export(export_name: str, group_id: str) -> FlaskResponse:
+    """Stream an export of the current data, e.g. `/export/daily.csv?start=2025-01-01&end=2025-12-31`."""
+    app = cast(AppWithCalendar, current_app)
+    group = _get_group(app, group_id)
+    try:
+        export_format = ExportFormat(export_name)
+    except ValueError:
+        abort(404)
+    try:
+        start_date, end_date = get_export_dates(flask_request.args)
+    except ValueError as err:
+        abort(400, description=str(err))
+    with app.calendar_repository(group_id) as repository:
+        calendar = FullCalendar(database_repository=repository, state=group.calendar_state)
+        _load_if_changed(app, group, repository, calendar)
+    try:
+        lines = iter_export(export_format, calendar.snapshot, start_date, end_date)
+    except ValueError as err:
+        abort(400, description=str(err))
+
+    compress = accepts_gzip(flask_request.headers.get("Accept-Encoding", ""))
+    return FlaskResponse(
+        encode_chunks(lines, compress=compress),
+        mimetype=export_format.media_type,
+        headers=get_export_headers(export_format, compress),
+    )
+
+
+@pages.route("/changes", defaults={"group_id": DEFAULT_GROUP_ID})
+@pages.route("/groups/<group_id>/changes")
+def changes(group_id: str) -> FlaskResponse:
+    """Stream changes as Server-Sent Events, with the cells they changed between the session's daily calendar dates.
+
+    Every open stream holds a worker thread, so it is only served if turned on, see `is_change_stream_enabled`.
+    """
+    app = cast(AppWithCalendar, current_app)
+    if not app.change_stream:
+        abort(404)
+    group = _get_group(app, group_id)
+    subscription = group.change_feed.subscribe()  # Before reading the version, so no change is missed in between
+    stream = ChangeStream(
+        subscription,
+        get_session_dates(session),
+        get_known_version(flask_request.headers, flask_request.args),
+        group.calendar_state.snapshot.version,
+        group.version_checker.get_announced_version,
+    )
+    return FlaskResponse(
+        iter_change_events(stream, group.change_feed.keep_alive_seconds),
+        mimetype="text/event-stream",
+        headers=CHANGE_STREAM_HEADERS,
+    )
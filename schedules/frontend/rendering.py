@@ -0,0 +1,173 @@
+"""Rendering of the home page and of patches to it, and details of export responses, shared by the synchronous
+(WSGI) and asynchronous (ASGI) apps.
+"""
+
+import datetime as dt
+import functools
+from typing import Any, Callable, Final, Mapping, MutableMapping, TYPE_CHECKING
+from markupsafe import Markup
+
+from schedules.logic.calendar import CalendarSnapshot, is_everyone_together
+from schedules.logic.change_feed import Change, ChangeKind, get_change_data, parse_version
+from schedules.logic.export import ExportFormat
+from schedules.logic.groups import DEFAULT_GROUP_ID
+from schedules.logic.requests import BatchResponse, RequestType, Response
+from schedules.frontend.cache import FragmentCache
+
+if TYPE_CHECKING:
+    from schedules.logic.parallel import ParallelDailyCalendars
+
+Dates = tuple[dt.date | None, dt.date | None]
+RenderTemplate = Callable[..., str]  # Renders a template, given its name and context as keyword arguments
+
+# Fragments of the home page that only depend on the data, and ones that also depend on the daily calendar dates
+VERSIONED_FRAGMENTS: Final[tuple[str, ...]] = ("members_table", "person_options", "trips_table")
+DATED_FRAGMENTS: Final[tuple[str, ...]] = ("daily_calendars_table",)
+
+# Change streams must reach the browser straight away, not be cached or buffered by a proxy
+CHANGE_STREAM_HEADERS: Final[dict[str, str]] = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def get_session_dates(session: MutableMapping[str, Any]) -> Dates:
+    """Get the daily calendar dates the user last asked for."""
+    if "daily_calendar_start_date" in session and "daily_calendar_end_date" in session:
+        start_date = dt.date.fromisoformat(session["daily_calendar_start_date"])
+        end_date = dt.date.fromisoformat(session["daily_calendar_end_date"])
+        return (start_date, end_date)
+    return (None, None)
+
+
+def set_session_dates(session: MutableMapping[str, Any], dates: Dates) -> None:
+    start_date, end_date = dates
+    if start_date and end_date:
+        session["daily_calendar_start_date"] = start_date.isoformat()
+        session["daily_calendar_end_date"] = end_date.isoformat()
+
+
+def set_session_response(session: MutableMapping[str, Any], response: Response) -> None:
+    """Keep the response to a form, to show on the page the browser is redirected to."""
+    session["response_code"] = response.code
+    session["response_message"] = response.message
+
+
+def pop_session_response(session: MutableMapping[str, Any]) -> Response:
+    """Get the response to the last form, only once."""
+    code, message = session.pop("response_code", None), session.pop("response_message", None)
+    if code is None or message is None:
+        return Response(code=200, message="Ready")
+    return Response(code=int(code), message=str(message))
+
+
+def render_fragment(
+    render_template: RenderTemplate,
+    name: str,
+    snapshot: CalendarSnapshot,
+    dates: Dates,
+    parallel: "ParallelDailyCalendars | None" = None,
+) -> str:
+    start_date, end_date = dates
+    daily_calendars = {}
+    if name in DATED_FRAGMENTS and start_date and end_date:
+        daily_calendars = snapshot.get_daily_calendars(start_date, end_date, parallel)
+    return render_template(
+        f"fragments/{name}.html",
+        calendar=snapshot,
+        daily_calendars=daily_calendars,
+        is_everyone_together=is_everyone_together,
+        RequestType=RequestType,
+    )
+
+
+def get_fragments(
+    render_template: RenderTemplate,
+    cache: FragmentCache,
+    snapshot: CalendarSnapshot,
+    dates: Dates,
+    parallel: "ParallelDailyCalendars | None" = None,
+    group_id: str = DEFAULT_GROUP_ID,
+) -> dict[str, Markup]:
+    """Get rendered fragments of a group's home page, only rendering the ones that are not cached."""
+    fragments = {}
+    for name in VERSIONED_FRAGMENTS:
+        render = functools.partial(render_fragment, render_template, name, snapshot, dates)
+        fragments[name] = Markup(cache.get_or_render((name, group_id, snapshot.version), render))
+    for name in DATED_FRAGMENTS:
+        render = functools.partial(render_fragment, render_template, name, snapshot, dates, parallel)
+        fragments[name] = Markup(cache.get_or_render((name, group_id, snapshot.version, *dates), render))
+    return fragments
+
+
+def get_group_path(group_id: str) -> str:
+    """Get the path the pages of a group are under, which is the root for the default group."""
+    return "" if group_id == DEFAULT_GROUP_ID else f"/groups/{group_id}"
+
+
+def get_patch(
+    render_template: RenderTemplate,
+    snapshot: CalendarSnapshot,
+    change: Change | None,
+    response: Response,
+    dates: Dates,
+) -> dict[str, Any]:
+    """Get what a page needs to show the result of a request without loading it again.
+
+    For a trip change, that is the changed cells between the page's dates, and the new trip's row with the ID of the
+    trip it goes before, so it only takes the changed dates to make. Other changes affect every row or column, so the
+    page is loaded again instead.
+    """
+    patch: dict[str, Any] = {"code": response.code, "message": response.frontend_message, "version": snapshot.version}
+    if change is None or change.kind not in (ChangeKind.TRIP_ADDED, ChangeKind.TRIP_REMOVED):
+        patch["reload"] = response.code == 200
+        return patch
+    patch["reload"] = False
+    patch["kind"] = change.kind
+    patch["change"] = get_change_data(change, *dates)
+    if change.kind is ChangeKind.TRIP_ADDED and change.person is not None and change.trip is not None:
+        patch["trip_row"] = render_template(
+            "fragments/trip_row.html", person=change.person, trip=change.trip, RequestType=RequestType
+        )
+        trip_after = change.snapshot.get_trip_after(change.person, change.trip)
+        patch["before_trip_id"] = str(trip_after.unique_id) if trip_after is not None else None
+    return patch
+
+
+def get_batch_result(batch_response: BatchResponse, version: int) -> dict[str, Any]:
+    """Get the responses to a batch as JSON, with the IDs of the people added under an alias and the new version."""
+    return {
+        "code": batch_response.code,
+        "num_applied": batch_response.num_applied,
+        "responses": [
+            {"code": response.code, "message": response.frontend_message} for response in batch_response.responses
+        ],
+        "person_ids": dict(batch_response.person_ids),
+        "version": version,
+    }
+
+
+def get_known_version(headers: Mapping[str, str], query: Mapping[str, str]) -> int | None:
+    """Get the version of a viewer's page: from `Last-Event-ID` when a browser reconnects, else the `version` query
+    parameter.
+    """
+    return parse_version(headers.get("Last-Event-ID") or query.get("version"))
+
+
+def get_export_dates(query: Mapping[str, str]) -> Dates:
+    """Get the dates of an export from the `start` and `end` query parameters, which are optional."""
+    start, end = query.get("start"), query.get("end")
+    return (dt.date.fromisoformat(start) if start else None, dt.date.fromisoformat(end) if end else None)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an `Accept-Encoding` header allows gzip, which exports then use."""
+    for coding in accept_encoding.split(","):
+        name, _, parameters = coding.partition(";")
+        if name.strip().lower() == "gzip":
+            return parameters.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def get_export_headers(export_format: ExportFormat, compress: bool) -> dict[str, str]:
+    headers = {"Content-Disposition": f'attachment; filename="{export_format.value}"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return headers
@@ -0,0 +1,108 @@
+// Keep the page up to date without loading it again: forms are sent to `/requests`, which answers with a patch, and
+// the change feed brings changes by others. Changes to people, and anything else a patch can't describe, load the
+// page again instead. A group's page uses the same paths under the group's path. The change feed is only followed if
+// the server says it serves one, as a synchronous server may hold a whole worker for each open stream.
+(function () {
+    const groupPath = document.body.dataset.groupPath || "";
+    const source = "changeStream" in document.body.dataset
+        ? new EventSource(`${groupPath}/changes?version=${document.body.dataset.version}`)
+        : null;
+
+    function reload() {
+        if (source) {
+            source.close();
+        }
+        window.location.assign(`${groupPath}/`);  // Not `reload`, which would submit a form again
+    }
+
+    function setStatus(message) {
+        const status = document.querySelector(".status-message");
+        if (status) {
+            status.textContent = message;
+        }
+    }
+
+    function updateCells(data) {
+        const person = CSS.escape(data.person_id);
+        for (const cell of data.cells) {
+            const td = document.querySelector(`tr[data-date="${cell.date}"] td[data-person="${person}"]`);
+            if (td) {
+                td.textContent = cell.end;
+            }
+        }
+        for (const [date, together] of Object.entries(data.together)) {
+            const div = document.querySelector(`tr[data-date="${date}"] td:first-child div`);
+            if (div) {
+                div.className = together
+                    ? "daily-calendars-table-date-together"
+                    : "daily-calendars-table-date-not-together";
+            }
+        }
+    }
+
+    function findTripRow(tripId) {
+        const input = document.querySelector(`input[name="trip_id"][value="${CSS.escape(tripId)}"]`);
+        return input ? input.closest("tr") : null;
+    }
+
+    function insertTripRow(html, beforeTripId) {
+        const body = document.querySelector(".trips-table tbody");
+        const template = document.createElement("template");
+        template.innerHTML = html.trim();
+        const before = beforeTripId ? findTripRow(beforeTripId) : null;
+        body.insertBefore(template.content.firstChild, before);
+    }
+
+    function removeTripRow(tripId) {
+        const row = findTripRow(tripId);
+        if (row) {
+            row.remove();
+        }
+    }
+
+    document.addEventListener("submit", async function (event) {
+        const form = event.target;
+        event.preventDefault();
+        let patch;
+        try {
+            const body = new URLSearchParams(new FormData(form));
+            const response = await fetch(`${groupPath}/requests`, {method: "POST", body: body});
+            patch = await response.json();
+        } catch (error) {
+            form.submit();  // Post the whole page instead
+            return;
+        }
+        if (patch.reload) {
+            reload();
+            return;
+        }
+        setStatus(patch.message);
+        if (patch.change) {
+            updateCells(patch.change);
+        }
+        if (patch.kind === "trip_added" && !findTripRow(patch.change.trip_id)) {
+            insertTripRow(patch.trip_row, patch.before_trip_id);
+        } else if (patch.kind === "trip_removed") {
+            removeTripRow(patch.change.trip_id);
+        }
+    });
+
+    if (!source) {
+        return;
+    }
+    source.addEventListener("trip_added", function (event) {
+        const data = JSON.parse(event.data);
+        updateCells(data);
+        if (!findTripRow(data.trip_id)) {
+            setStatus(`New trip for ${data.name}, reload to see it in the trips table.`);
+        }
+    });
+    source.addEventListener("trip_removed", function (event) {
+        const data = JSON.parse(event.data);
+        updateCells(data);
+        removeTripRow(data.trip_id);
+    });
+    for (const kind of ["person_added", "person_removed", "reload"]) {
+        source.addEventListener(kind, reload);
+    }
+})();
@@ -0,0 +1,291 @@
+"""Asynchronous interaction with persistent storage, for the asynchronous (ASGI) app."""
+
+import asyncio
+import contextlib
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Final, Iterator, Sequence
+
+from sqlalchemy import delete, make_url, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from schedules.logic.errors import CalendarError
+from schedules.logic.groups import DEFAULT_GROUP_ID
+from schedules.logic.objects import Person, StrID, Trip
+from schedules.logic.storage import (
+    ARCHIVE_DB_ENTRY_CLASSES,
+    BUSY_RETRY_ATTEMPTS,
+    BUSY_RETRY_BACKOFF_SECONDS,
+    TRIP_DB_ENTRY_CLASSES,
+    PersonDBEntry,
+    VersionDBEntry,
+    get_trip_db_entry_class,
+    is_database_busy,
+    trip_to_db_entry,
+    update_segments,
+)
+
+# Asynchronous drivers to use for each database, in place of the default synchronous ones
+ASYNC_DRIVERS: Final[dict[str, str]] = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Convert a database URL for a synchronous driver to one for an asynchronous driver."""
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    query = dict(url.query)
+    if drivername == "postgresql+asyncpg":
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")  # asyncpg's name for the same setting
+        query.pop("channel_binding", None)  # Not supported by asyncpg
+    return url.set(drivername=drivername, query=query).render_as_string(hide_password=False)
+
+
+class AsyncCalendarRepository:
+    """Handles all database operations for the calendar, without blocking the event loop.
+
+    Has the same methods as `CalendarRepository`, as coroutines, and is likewise scoped to one group.
+    """
+
+    def __init__(self, session: AsyncSession, maintain_segments: bool = False, group_id: str = DEFAULT_GROUP_ID):
+        self.group_id = group_id
+        self.session = session
+        self.maintain_segments = maintain_segments
+        self._in_batch = False
+
+    async def _update_segments(self, person_id: str, changed_trips: Sequence[Trip] = ()) -> None:
+        if self.maintain_segments:
+            await self.session.run_sync(update_segments, person_id, changed_trips)
+
+    @contextlib.asynccontextmanager
+    async def batch(self) -> AsyncIterator[None]:
+        """Commit all writes in the block in one transaction, or none if any fails. Like `CalendarRepository.batch`."""
+        self._in_batch = True
+        try:
+            yield
+            await self.session.commit()
+        except BaseException:
+            await self.session.rollback()
+            raise
+        finally:
+            self._in_batch = False
+
+    async def get_version(self) -> int:
+        """Get the data version, which changes whenever anything is written to the database."""
+        statement = select(VersionDBEntry.version).filter_by(group_id=self.group_id)
+        version = (await self.session.execute(statement)).scalar()
+        return version or 0
+
+    async def _bump_version(self) -> int:
+        """Increment the data version in the current transaction and return the new version."""
+        result = await self.session.execute(
+            update(VersionDBEntry).filter_by(group_id=self.group_id).values(version=VersionDBEntry.version + 1)
+        )
+        if result.rowcount == 0:  # First write to this group
+            self.session.add(VersionDBEntry(group_id=self.group_id, version=1))
+        return await self.get_version()
+
+    async def _write(self, write: Callable[[], Awaitable[None]]) -> int:
+        """Run `write` and bump the version in one transaction, trying again while the database is busy.
+
+        Like `CalendarRepository._write`.
+        """
+        if self._in_batch:
+            await write()
+            return await self._bump_version()
+        for attempt in range(BUSY_RETRY_ATTEMPTS):
+            try:
+                await write()
+                version = await self._bump_version()
+                await self.session.commit()
+                break
+            except OperationalError as err:
+                await self.session.rollback()
+                if not is_database_busy(err) or attempt == BUSY_RETRY_ATTEMPTS - 1:
+                    raise
+                logging.info(f"Database busy, trying again (attempt {attempt + 2} of {BUSY_RETRY_ATTEMPTS}).")
+                await asyncio.sleep(BUSY_RETRY_BACKOFF_SECONDS * 2**attempt)
+            except BaseException:
+                await self.session.rollback()
+                raise
+        return version
+
+    async def add_person(self, person: Person) -> int:
+        """Save a person to the database and return the new data version."""
+
+        async def write() -> None:
+            self.session.add(PersonDBEntry.from_python(person, self.group_id))
+            await self._update_segments(str(person.unique_id))
+
+        try:
+            version = await self._write(write)
+        except (OperationalError, IntegrityError) as err:
+            raise CalendarError(message=f"Failed to add person to database: {err}") from err
+        logging.info(f"Saved {person} to database, id {person.unique_id}.")
+        return version
+
+    async def add_people(self, people: Sequence[Person]) -> int:
+        """Save several people to the database at once and return the new data version."""
+
+        async def write() -> None:
+            self.session.add_all([PersonDBEntry.from_python(person, self.group_id) for person in people])
+            for person in people:
+                await self._update_segments(str(person.unique_id))
+
+        try:
+            version = await self._write(write)
+        except (OperationalError, IntegrityError) as err:
+            raise CalendarError(message=f"Failed to add people to database: {err}") from err
+        logging.info(f"Saved {len(people)} people to database.")
+        return version
+
+    async def get_all_people(self) -> list[Person]:
+        """Load all people of the group from the database."""
+        statement = select(PersonDBEntry).filter_by(group_id=self.group_id)
+        person_db_entries = (await self.session.execute(statement)).scalars().all()
+        return [entry.to_python() for entry in person_db_entries]
+
+    async def remove_person(self, person: Person) -> int:
+        """Remove a person and all their trips from the database and return the new data version."""
+
+        async def write() -> None:
+            statement = delete(PersonDBEntry).filter_by(id=str(person.unique_id), group_id=self.group_id)
+            result = await self.session.execute(statement)
+            if result.rowcount == 0:
+                raise CalendarError(message=f"Person with id {person.unique_id} not found in database.")
+            for entry_class in (*TRIP_DB_ENTRY_CLASSES, *ARCHIVE_DB_ENTRY_CLASSES):
+                await self.session.execute(delete(entry_class).filter_by(person_id=str(person.unique_id)))
+            await self._update_segments(str(person.unique_id))
+
+        try:
+            version = await self._write(write)
+        except OperationalError as err:
+            raise CalendarError(message=f"Failed to remove person from database: {err}") from err
+        logging.info(f"Removed {person} from database, id {person.unique_id}.")
+        return version
+
+    async def add_trip(self, person: Person, trip: Trip) -> int:
+        """Save a trip for a person to the database and return the new data version."""
+
+        async def write() -> None:
+            self.session.add(trip_to_db_entry(person, trip, self.group_id))
+            await self._update_segments(str(person.unique_id), [trip])
+
+        try:
+            version = await self._write(write)
+        except (OperationalError, IntegrityError) as err:
+            raise CalendarError(message=f"Failed to add trip to database: {err}") from err
+        logging.info(f"Saved trip {trip}, id {trip.unique_id} for person {person} to database.")
+        return version
+
+    async def add_trips(self, person: Person, trips: Sequence[Trip]) -> int:
+        """Save several trips for a person to the database at once and return the new data version."""
+
+        async def write() -> None:
+            self.session.add_all([trip_to_db_entry(person, trip, self.group_id) for trip in trips])
+            await self._update_segments(str(person.unique_id), trips)
+
+        try:
+            version = await self._write(write)
+        except (OperationalError, IntegrityError) as err:
+            raise CalendarError(message=f"Failed to add trips to database: {err}") from err
+        logging.info(f"Saved {len(trips)} trips for person {person} to database.")
+        return version
+
+    async def get_trips_for_person(self, person: Person) -> list[Trip]:
+        """Load all trips for a specific person from the database."""
+        trips: list[Trip] = []
+        for entry_class in TRIP_DB_ENTRY_CLASSES:
+            statement = select(entry_class).filter_by(group_id=self.group_id, person_id=str(person.unique_id))
+            trips += [entry.to_python() for entry in (await self.session.execute(statement)).scalars().all()]
+        return trips
+
+    async def get_all_trips(self) -> dict[StrID, list[Trip]]:
+        """Load all trips of the group from the database in one query, by the unique id of their person."""
+        trips: dict[StrID, list[Trip]] = dict()
+        for entry_class in TRIP_DB_ENTRY_CLASSES:
+            statement = select(entry_class).filter_by(group_id=self.group_id)
+            for entry in (await self.session.execute(statement)).scalars().all():
+                trips.setdefault(StrID(str(entry.person_id)), []).append(entry.to_python())
+        return trips
+
+    async def remove_trip(self, trip: Trip) -> int:
+        """Remove a trip from the database and return the new data version."""
+
+        async def write() -> None:
+            entry_class = get_trip_db_entry_class(trip)
+            statement = (
+                delete(entry_class)
+                .filter_by(id=str(trip.unique_id), group_id=self.group_id)
+                .returning(entry_class.person_id)
+            )
+            person_id = (await self.session.execute(statement)).scalar()
+            if person_id is None:
+                raise CalendarError(message=f"Trip with id {trip.unique_id} not found in database.")
+            await self._update_segments(person_id, [trip])
+
+        try:
+            version = await self._write(write)
+        except OperationalError as err:
+            raise CalendarError(message=f"Failed to remove trip from database: {err}") from err
+        logging.info(f"Removed trip {trip.unique_id} from database.")
+        return version
+
+
+class BlockingCalendarRepository:
+    """A `Repository` for calendars running in worker threads, which runs its queries in the event loop.
+
+    The worker thread waits for each query, but the event loop stays free to serve other requests meanwhile.
+    Must not be used from the event loop's own thread.
+    """
+
+    def __init__(self, repository: AsyncCalendarRepository, loop: asyncio.AbstractEventLoop):
+        self._repository = repository
+        self._loop = loop
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        in_transaction = self._repository.batch()
+        asyncio.run_coroutine_threadsafe(in_transaction.__aenter__(), self._loop).result()
+        try:
+            yield
+        except BaseException as err:
+            asyncio.run_coroutine_threadsafe(
+                in_transaction.__aexit__(type(err), err, err.__traceback__), self._loop
+            ).result()
+            raise
+        asyncio.run_coroutine_threadsafe(in_transaction.__aexit__(None, None, None), self._loop).result()
+
+    def get_version(self) -> int:
+        return asyncio.run_coroutine_threadsafe(self._repository.get_version(), self._loop).result()
+
+    def add_person(self, person: Person) -> int:
+        return asyncio.run_coroutine_threadsafe(self._repository.add_person(person), self._loop).result()
+
+    def add_people(self, people: Sequence[Person]) -> int:
+        return asyncio.run_coroutine_threadsafe(self._repository.add_people(people), self._loop).result()
+
+    def get_all_people(self) -> list[Person]:
+        return asyncio.run_coroutine_threadsafe(self._repository.get_all_people(), self._loop).result()
+
+    def remove_person(self, person: Person) -> int:
+        return asyncio.run_coroutine_threadsafe(self._repository.remove_person(person), self._loop).result()
+
+    def add_trip(self, person: Person, trip: Trip) -> int:
+        return asyncio.run_coroutine_threadsafe(self._repository.add_trip(person, trip), self._loop).result()
+
+    def add_trips(self, person: Person, trips: Sequence[Trip]) -> int:
+        return asyncio.run_coroutine_threadsafe(self._repository.add_trips(person, trips), self._loop).result()
+
+    def get_trips_for_person(self, person: Person) -> list[Trip]:
+        return asyncio.run_coroutine_threadsafe(self._repository.get_trips_for_person(person), self._loop).result()
+
+    def get_all_trips(self) -> dict[StrID, list[Trip]]:
+        return asyncio.run_coroutine_threadsafe(self._repository.get_all_trips(), self._loop).result()
+
+    def remove_trip(self, trip: Trip) -> int:
+        return asyncio.run_coroutine_threadsafe(self._repository.remove_trip(trip), self._loop).result()
@@ -1,20 +1,39 @@
 """The calendar, which holds one person's schedule."""
 
+import bisect
+import contextlib
+import copy
+import dataclasses
 import datetime as dt
 import logging
-from typing import Any, OrderedDict, TYPE_CHECKING
+import math
+import threading
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping, OrderedDict, Sequence, TYPE_CHECKING
 
-from schedules.logic.requests import Mapping, Request, RequestType, Response
+from schedules.logic.change_feed import Change, ChangeKind
+from schedules.logic.requests import ALIAS_ID, PERSON_ALIAS_ID, BatchResponse, Request, RequestType, Response
 from schedules.logic.errors import (
     CalendarBaseException,
     CalendarError,
     RequestError,
     get_message_from_handled_error_else_raise,
 )
-from schedules.logic.objects import DayLocation, Location, Person, StrID, Trip
+from schedules.logic.objects import DayLocation, Location, LocationSegment, Person, RecurringTrip, StrID, Trip
+from schedules.logic.repository import BatchRepository
 
 if TYPE_CHECKING:
-    from schedules.logic.storage import CalendarRepository
+    from schedules.logic.change_feed import ChangeFeed
+    from schedules.logic.parallel import ParallelDailyCalendars
+    from schedules.logic.repository import Repository
+
+
+def _start_date(trip: Trip) -> dt.date:
+    return trip.start_date
+
+
+def _end_date(trip: Trip) -> dt.date:
+    return trip.end_date
 
 
 class SinglePersonCalendar:
@@ -23,47 +42,150 @@ class SinglePersonCalendar:
     def __init__(self, person: Person) -> None:
         self.person: Person = person
         self._home: Location = person.home
-        self._trips: set[Trip] = set()
-        self._trip_list_cache: list[Trip] | None = None  # Cache sorted list, cleared whenever new trip is added
+        self._trips: dict[StrID, Trip] = dict()  # By unique id, including recurring trips
+        self._trip_list: list[Trip] = []  # One-off trips by start date, which no two trips share
+        self._trips_by_end_date: list[Trip] = []  # By end date, which no two trips share either
+        self._recurring_trips: dict[StrID, RecurringTrip] = dict()  # Their occurrences don't touch any other trip
+        self._change_points: tuple[list[dt.date], list[DayLocation]] | None = None  # Memoized, see `location_on`
         logging.info("Created calendar for %s", self.person)
 
     def __repr__(self):
         return f"SinglePersonCalendar({self.person})"
 
+    @classmethod
+    def from_valid_trips(cls, person: Person, trips: Iterable[Trip]) -> "SinglePersonCalendar":
+        """Create a calendar from trips that were already checked, e.g. because they were saved from a calendar."""
+        calendar = cls.__new__(cls)
+        calendar.person = person
+        calendar._home = person.home
+        calendar._trips = {trip.unique_id: trip for trip in trips}
+        calendar._recurring_trips = {
+            trip.unique_id: trip for trip in calendar._trips.values() if isinstance(trip, RecurringTrip)
+        }
+        one_off_trips = [trip for trip in calendar._trips.values() if not isinstance(trip, RecurringTrip)]
+        calendar._trip_list = sorted(one_off_trips, key=_start_date)
+        calendar._trips_by_end_date = sorted(one_off_trips, key=_end_date)
+        calendar._change_points = None
+        return calendar
+
+    def copy(self) -> "SinglePersonCalendar":
+        """Copy this calendar, so that the copy can be changed without affecting readers of the original."""
+        new_calendar = copy.copy(self)
+        new_calendar._trips = dict(self._trips)
+        new_calendar._trip_list = list(self._trip_list)
+        new_calendar._trips_by_end_date = list(self._trips_by_end_date)
+        new_calendar._recurring_trips = dict(self._recurring_trips)
+        return new_calendar
+
     def _raise_if_invalid_trip(self, candidate: Trip) -> None:
-        """Check candidate new trip against existing trips and raise if it is invalid."""
-        for existing in self._trips:
+        """Check candidate new trip against existing trips and raise if it is invalid.
+
+        A candidate may fall entirely within an existing trip, but no existing trip may start or end during it. The
+        occurrences of recurring trips may not share a day with any other trip.
+        """
+        if candidate.unique_id in self._trips:
+            raise CalendarError(f"Trip with id {candidate.unique_id} is already in calendar for {self.person}.")
+        if isinstance(candidate, RecurringTrip):
+            self._raise_if_invalid_recurring_trip(candidate)
+            return
+
+        # Recurring trips only need to check their occurrences during the candidate
+        for recurring_trip in self._recurring_trips.values():
+            if occurrence := recurring_trip.get_first_occurrence(candidate.start_date, candidate.end_date):
+                raise CalendarError(f"Candidate {candidate} touches {occurrence} of {recurring_trip}.")
+
+        # First trip starting on or after the candidate's start
+        trip_idx = bisect.bisect_left(self._trip_list, candidate.start_date, key=_start_date)
+        if trip_idx < len(self._trip_list) and (existing := self._trip_list[trip_idx]).start_date < candidate.end_date:
             if candidate.start_date == existing.start_date:
                 raise CalendarError(f"Candidate {candidate} has same start date as {existing}.")
+            raise CalendarError(f"Candidate {candidate} falls partially in {existing}.")
+
+        # First trip ending after the candidate's start
+        trip_idx = bisect.bisect_right(self._trips_by_end_date, candidate.start_date, key=_end_date)
+        if trip_idx < len(self._trips_by_end_date):
+            existing = self._trips_by_end_date[trip_idx]
             if candidate.end_date == existing.end_date:
                 raise CalendarError(f"Candidate {candidate} has same end date as {existing}.")
-            if candidate.start_date < existing.start_date and candidate.end_date > existing.start_date:
-                raise CalendarError(f"Candidate {candidate} falls partially in {existing}.")
-            if candidate.start_date < existing.end_date and candidate.end_date > existing.end_date:
+            if existing.end_date < candidate.end_date:
                 raise CalendarError(f"Candidate {candidate} falls partially in {existing}.")
 
+    def _raise_if_invalid_recurring_trip(self, candidate: RecurringTrip) -> None:
+        """Check candidate new recurring trip against existing trips and raise if any occurrence touches one of them.
+
+        Checks each one-off trip up to the candidate's last occurrence in constant time, however many occurrences it
+        spans, and other recurring trips over one cycle of both, after which their occurrences line up the same again.
+        """
+        last_idx = bisect.bisect_right(self._trip_list, candidate.last_end_date, key=_start_date)
+        for existing in self._trip_list[:last_idx]:
+            if existing.end_date >= candidate.start_date:
+                if occurrence := candidate.get_first_occurrence(existing.start_date, existing.end_date):
+                    raise CalendarError(f"Candidate {occurrence} of {candidate} touches {existing}.")
+
+        for existing_recurring in self._recurring_trips.values():
+            start_date = max(candidate.start_date, existing_recurring.start_date)
+            cycle = dt.timedelta(weeks=math.lcm(candidate.every_weeks, existing_recurring.every_weeks))
+            end_date = min(
+                candidate.last_end_date,
+                existing_recurring.last_end_date,
+                start_date + cycle + max(candidate.period, existing_recurring.period),
+            )
+            for existing in existing_recurring.get_occurrences(start_date, end_date):
+                if occurrence := candidate.get_first_occurrence(existing.start_date, existing.end_date):
+                    raise CalendarError(
+                        f"Candidate {occurrence} of {candidate} touches {existing} of {existing_recurring}."
+                    )
+
     @property
     def trip_list(self) -> list[Trip]:
-        """Get list of trips, in order from earliest to latest."""
-        if self._trip_list_cache is None:
-            self._trip_list_cache = sorted(self._trips, key=lambda trip: (trip.start_date, trip.end_date))
-        return self._trip_list_cache
+        """Get list of one-off trips, in order from earliest to latest."""
+        return self._trip_list
 
-    def add_trip(self, trip: Trip) -> None:
-        self._trip_list_cache = None  # Clear cache whenever new trip is added, needs to be recalculated
-        self._raise_if_invalid_trip(candidate=trip)
-        logging.info("Adding trip %s to calendar %s", trip, self)
-        self._trips.add(trip)
+    @property
+    def recurring_trips(self) -> list[RecurringTrip]:
+        """Get list of recurring trips, in order of their first occurrence."""
+        return sorted(self._recurring_trips.values(), key=_start_date)
 
-    def remove_trip(self, trip_id: StrID) -> None:
-        """Remove a trip from this calendar by its unique ID."""
+    @property
+    def all_trips(self) -> list[Trip]:
+        """Get list of one-off and recurring trips, in order of their (first) start date."""
+        if not self._recurring_trips:
+            return self._trip_list
+        return sorted([*self._trip_list, *self._recurring_trips.values()], key=_start_date)
+
+    def get_trip(self, trip_id: StrID) -> Trip:
+        """Get a trip in this calendar by its unique ID."""
         try:
-            trip_to_remove = next(trip for trip in self._trips if trip.unique_id == trip_id)
-        except StopIteration:
+            return self._trips[trip_id]
+        except KeyError:
             raise CalendarError(f"Trip with id {trip_id} not found in calendar for {self.person}.")
-        self._trips.remove(trip_to_remove)
-        self._trip_list_cache = None  # Clear cache
+
+    def add_trip(self, trip: Trip) -> None:
+        self._raise_if_invalid_trip(candidate=trip)
+        logging.info("Adding trip %s to calendar %s", trip, self)
+        self._trips[trip.unique_id] = trip
+        if isinstance(trip, RecurringTrip):
+            self._recurring_trips[trip.unique_id] = trip
+            return
+        bisect.insort(self._trip_list, trip, key=_start_date)
+        bisect.insort(self._trips_by_end_date, trip, key=_end_date)
+        self._change_points = None
+
+    def remove_trip(self, trip_id: StrID) -> Trip:
+        """Remove a trip from this calendar by its unique ID, and return it."""
+        trip_to_remove = self.get_trip(trip_id)
+        del self._trips[trip_id]
+        if isinstance(trip_to_remove, RecurringTrip):
+            del self._recurring_trips[trip_id]
+            logging.info("Removed trip %s from calendar %s", trip_to_remove, self)
+            return trip_to_remove
+        del self._trip_list[bisect.bisect_left(self._trip_list, trip_to_remove.start_date, key=_start_date)]
+        del self._trips_by_end_date[
+            bisect.bisect_left(self._trips_by_end_date, trip_to_remove.end_date, key=_end_date)
+        ]
+        self._change_points = None
         logging.info("Removed trip %s from calendar %s", trip_to_remove, self)
+        return trip_to_remove
 
     def _get_travel_start_of_trip(self, trip_idx: int) -> DayLocation:
         trip = self.trip_list[trip_idx]
@@ -99,25 +221,72 @@ class SinglePersonCalendar:
         # Else travel to home
         return DayLocation(start=trip.location, end=self._home)
 
-    def _get_travel_days(self) -> dict[dt.date, DayLocation]:
-        """Determine the days at which travel occurs."""
-        if not self._trips:
-            return dict()
-
+    def _get_one_off_travel_days(self) -> dict[dt.date, DayLocation]:
         travel_days: dict[dt.date, DayLocation] = {}
         for trip_idx, trip in enumerate(self.trip_list):
             travel_days[trip.start_date] = self._get_travel_start_of_trip(trip_idx)
             travel_days[trip.end_date] = self._get_travel_end_of_trip(trip_idx)
+        return travel_days
+
+    def _get_travel_days(
+        self, start_date: dt.date = dt.date.min, end_date: dt.date = dt.date.max
+    ) -> dict[dt.date, DayLocation]:
+        """Determine the days at which travel occurs, with recurring trips only expanded from start to end date.
+
+        Leaving out other occurrences changes nothing in between: as they touch no other trip, the person is at home
+        before and after each of them either way.
+        """
+        if not self._trips:
+            return dict()
+
+        travel_days = self._get_one_off_travel_days()
+        for recurring_trip in self._recurring_trips.values():
+            for occurrence in recurring_trip.get_occurrences(start_date, end_date):
+                travel_days[occurrence.start_date] = DayLocation(start=self._home, end=occurrence.location)
+                travel_days[occurrence.end_date] = DayLocation(start=occurrence.location, end=self._home)
 
         return travel_days
 
+    def get_changed_dates(self, changed_trips: Iterable[Trip]) -> tuple[dt.date, dt.date]:
+        """Get the first and last date whose travel may change when `changed_trips` were added to or removed from this
+        calendar: the travel of a trip only depends on the trips directly before and after it. Recurring trips only
+        change their own occurrences, as those touch no other trip.
+        """
+        dates = []
+        for trip in changed_trips:
+            if isinstance(trip, RecurringTrip):
+                dates += [trip.start_date, trip.last_end_date]
+                continue
+            trip_idx = bisect.bisect_left(self._trip_list, trip.start_date, key=_start_date)
+            for neighbour in (trip, *self._trip_list[max(trip_idx - 1, 0) : trip_idx + 2]):
+                dates += [neighbour.start_date, neighbour.end_date]
+        return min(dates), max(dates)
+
+    def get_segments(self) -> list[LocationSegment]:
+        """Split all days into segments with the same location: each travel day, and the stays between them.
+
+        The first segment starts at `dt.date.min`, and the last ends at `dt.date.max`.
+        """
+        travel_days = self._get_travel_days()
+        segments = []
+        stay = DayLocation(start=self._home, end=self._home)
+        from_date = dt.date.min
+        for day in sorted(travel_days):
+            if from_date < day:
+                segments.append(LocationSegment(from_date, day - dt.timedelta(days=1), stay))
+            segments.append(LocationSegment(day, day, travel_days[day]))
+            stay = DayLocation(start=travel_days[day].end, end=travel_days[day].end)
+            from_date = day + dt.timedelta(days=1)
+        segments.append(LocationSegment(from_date, dt.date.max, stay))
+        return segments
+
     def get_daily_calendar(self, start_date: dt.date, end_date: dt.date) -> dict[dt.date, DayLocation]:
         """Construct a calendar of where the person is on every day."""
         num_days = (end_date - start_date).days + 1  # Include endpoints
         daily_calendar: dict[dt.date, DayLocation] = {}
 
         # Determine where person starts and ends each day
-        travel_days = self._get_travel_days()
+        travel_days = self._get_travel_days(start_date, end_date)
         for day in (start_date + dt.timedelta(days=i) for i in range(num_days)):
             if not travel_days or day < min(travel_days) or day > max(travel_days):
                 daily_calendar[day] = DayLocation(start=self._home, end=self._home)
@@ -130,40 +299,425 @@ class SinglePersonCalendar:
 
         return daily_calendar
 
+    def _get_change_points(self) -> tuple[list[dt.date], list[DayLocation]]:
+        """Get the travel days of one-off trips in order, with where the person is on each.
+
+        Computed on first use after the one-off trips change. Readers of a snapshot may race to compute it, which is
+        harmless, as they all compute the same and swap it in with a single assignment.
+        """
+        change_points = self._change_points
+        if change_points is None:
+            travel_days = self._get_one_off_travel_days()
+            dates = sorted(travel_days)
+            change_points = (dates, [travel_days[date] for date in dates])
+            self._change_points = change_points
+        return change_points
+
+    def _get_occurrence_location(self, occurrence: Trip, date: dt.date) -> DayLocation:
+        """Get where the person is on a day of an occurrence of a recurring trip, which goes from and to home."""
+        if date == occurrence.start_date:
+            return DayLocation(start=self._home, end=occurrence.location)
+        if date == occurrence.end_date:
+            return DayLocation(start=occurrence.location, end=self._home)
+        return DayLocation(start=occurrence.location, end=occurrence.location)
+
+    def _get_one_off_location(
+        self, dates: list[dt.date], day_locations: list[DayLocation], change_idx: int, date: dt.date
+    ) -> DayLocation:
+        """Get where the person is on a day, from the last change point on or before it at `change_idx`, if any."""
+        if change_idx < 0 or (change_idx == len(dates) - 1 and dates[change_idx] < date):
+            return DayLocation(start=self._home, end=self._home)
+        if dates[change_idx] == date:
+            return day_locations[change_idx]
+        stay = day_locations[change_idx].end
+        return DayLocation(start=stay, end=stay)
+
+    def location_on(self, date: dt.date) -> DayLocation:
+        """Get where the person starts and ends a day, the same as in their daily calendar.
+
+        Takes logarithmic time in the number of one-off trips, plus constant time for each recurring trip.
+        """
+        for recurring_trip in self._recurring_trips.values():
+            if occurrence := recurring_trip.get_first_occurrence(date, date):
+                return self._get_occurrence_location(occurrence, date)
+
+        # As no occurrence touches a one-off trip, the one-off trips alone decide where the person is otherwise
+        dates, day_locations = self._get_change_points()
+        return self._get_one_off_location(dates, day_locations, bisect.bisect_right(dates, date) - 1, date)
+
+    def locations_on(self, dates: Iterable[dt.date]) -> list[DayLocation]:
+        """Get where the person starts and ends each of many days, in the same order as `dates`.
+
+        Sorts the dates once, and sweeps them along the change points of the one-off trips and the occurrences of
+        recurring trips between the first and last date, rather than looking up each date on its own.
+        """
+        dates = list(dates)
+        if not dates:
+            return []
+        order = sorted(range(len(dates)), key=dates.__getitem__)
+        first_date, last_date = dates[order[0]], dates[order[-1]]
+        occurrences = sorted(
+            (
+                occurrence
+                for recurring_trip in self._recurring_trips.values()
+                for occurrence in recurring_trip.get_occurrences(first_date, last_date)
+            ),
+            key=_start_date,
+        )
+        change_dates, day_locations = self._get_change_points()
+
+        locations: list[DayLocation] = [None] * len(dates)  # type: ignore[list-item]
+        occurrence_idx = 0
+        change_idx = -1  # Last change point on or before the date
+        for date_idx in order:
+            date = dates[date_idx]
+            while occurrence_idx < len(occurrences) and occurrences[occurrence_idx].end_date < date:
+                occurrence_idx += 1
+            while change_idx + 1 < len(change_dates) and change_dates[change_idx + 1] <= date:
+                change_idx += 1
+            if occurrence_idx < len(occurrences) and occurrences[occurrence_idx].start_date <= date:
+                locations[date_idx] = self._get_occurrence_location(occurrences[occurrence_idx], date)
+            else:
+                locations[date_idx] = self._get_one_off_location(change_dates, day_locations, change_idx, date)
+        return locations
+
+
+def _person_sort_key(person: Person) -> tuple[str, str]:
+    return (person.last_name, person.first_name)
+
+
+def is_everyone_together(people_days: Mapping[Person, DayLocation]) -> bool:
+    """Check whether everyone ends a day in the same location."""
+    return len(set(day.end for day in people_days.values())) == 1
+
+
+@dataclasses.dataclass(frozen=True)
+class CalendarSnapshot:
+    """The people and trips in a full calendar at one data version.
+
+    Snapshots are never changed after they are created, so they can be read from any thread without locking.
+    """
+
+    version: int
+    calendars: MappingProxyType[Person, SinglePersonCalendar]
+    id_to_person: MappingProxyType[str, Person]
+    people_sorted_by_name: tuple[Person, ...]
+
+    @classmethod
+    def create(
+        cls,
+        version: int,
+        calendars: dict[Person, SinglePersonCalendar],
+        people_sorted_by_name: tuple[Person, ...] | None = None,
+        id_to_person: MappingProxyType[str, Person] | None = None,
+    ) -> "CalendarSnapshot":
+        """Create a snapshot, taking ownership of `calendars`, which must not be changed afterwards.
+
+        The sorted people and the index by id are derived from `calendars` unless given, e.g. from a snapshot with the
+        same people.
+        """
+        if people_sorted_by_name is None:
+            people_sorted_by_name = tuple(sorted(calendars.keys(), key=_person_sort_key))
+        if id_to_person is None:
+            id_to_person = MappingProxyType({str(person.unique_id): person for person in calendars.keys()})
+        return cls(
+            version=version,
+            calendars=MappingProxyType(calendars),
+            id_to_person=id_to_person,
+            people_sorted_by_name=people_sorted_by_name,
+        )
 
-class FullCalendar:
-    """A full calendar, with multiple people and support for interacting with frontend."""
+    @property
+    def single_person_calendars(self) -> list[SinglePersonCalendar]:
+        """Get list of single-person calendars, sorted by name."""
+        return [self.calendars[person] for person in self.people_sorted_by_name]
+
+    def get_trips_to_display(self) -> list[tuple[Person, Trip]]:
+        """Get all trips sorted by person last name, then trip start date."""
+        return [(person, trip) for person in self.people_sorted_by_name for trip in self.calendars[person].all_trips]
+
+    def get_trip_after(self, person: Person, trip: Trip) -> Trip | None:
+        """Get the trip right after one of a person's trips in `get_trips_to_display`, or None if it is the last."""
+        trips = self.calendars[person].all_trips
+        trip_idx = bisect.bisect_right(trips, trip.start_date, key=_start_date)
+        if trip_idx < len(trips):
+            return trips[trip_idx]
+        person_idx = bisect.bisect_right(self.people_sorted_by_name, _person_sort_key(person), key=_person_sort_key)
+        for next_person in self.people_sorted_by_name[person_idx:]:
+            if next_trips := self.calendars[next_person].all_trips:
+                return next_trips[0]
+        return None
+
+    def get_daily_calendars(
+        self, start_date: dt.date, end_date: dt.date, parallel: "ParallelDailyCalendars | None" = None
+    ) -> OrderedDict[dt.date, OrderedDict[Person, DayLocation]]:
+        """Get where everyone is on every day, in format that can be used by frontend.
+
+        With `parallel`, people are spread over its workers if there are enough people and days to be worthwhile.
+        """
+        days = [start_date + dt.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        if parallel is not None and parallel.is_worthwhile(len(self.people_sorted_by_name), len(days)):
+            calendars = self.single_person_calendars
+            daily_calendars = dict(
+                zip(self.people_sorted_by_name, parallel.get_daily_calendars(calendars, start_date, end_date))
+            )
+        else:
+            daily_calendars = {
+                person: self.calendars[person].get_daily_calendar(start_date, end_date)
+                for person in self.people_sorted_by_name
+            }
+        return OrderedDict({
+            day: OrderedDict({person: daily_calendars[person][day] for person in self.people_sorted_by_name})
+            for day in days
+        })  # fmt: skip
+
+
+class CalendarState:
+    """The current snapshot of a full calendar, which can be shared between threads.
+
+    Readers take the current snapshot without locking. Writers hold the write lock while they build a new snapshot
+    from the current one, then swap it in with a single assignment, and publish the change to the change feed, if any.
+    """
+
+    def __init__(self, change_feed: "ChangeFeed | None" = None) -> None:
+        self.snapshot = CalendarSnapshot.create(version=0, calendars=dict())
+        self.write_lock = threading.RLock()
+        self.change_feed = change_feed
 
-    def __init__(self, database_repository: "CalendarRepository | None" = None) -> None:
-        self.calendars: dict[Person, SinglePersonCalendar] = dict()
-        self._id_to_person: dict[str, Person] = dict()
+
+class _BatchPlan:
+    """The people and trips as they will be after the requests of a batch checked so far, and the changes to get there.
+
+    Starts from a snapshot, and copies a person's calendar before its first change, so the snapshot stays the same.
+    """
+
+    def __init__(self, snapshot: CalendarSnapshot) -> None:
+        self.snapshot = snapshot
+        self.calendars = snapshot.calendars.copy()
+        self.id_to_person = snapshot.id_to_person.copy()
+        self.aliases: dict[str, Person] = dict()
+        self.changes: list[tuple[ChangeKind, Person, Trip | None]] = []
+        self.dates: tuple[dt.date, dt.date] | None = None
+        self.people_changed = False
+        self._copied: set[Person] = set()
+
+    def _get_person(self, payload: Mapping[str, Any]) -> Person:
+        """Get the person a request refers to, by ID or by the alias they were added under earlier in the batch."""
+        alias = payload.get(PERSON_ALIAS_ID)
+        if alias is None:
+            return self.id_to_person[payload["person_id"]]
+        if alias not in self.aliases:
+            raise RequestError(f"No person added with alias {alias} earlier in batch.")
+        return self.aliases[alias]
+
+    def _get_calendar_to_change(self, person: Person) -> SinglePersonCalendar:
+        if person not in self.calendars:
+            raise CalendarError(f"Person {person} is not in calendar.")
+        if person not in self._copied:
+            self.calendars[person] = self.calendars[person].copy()
+            self._copied.add(person)
+        return self.calendars[person]
+
+    def check(self, request_raw: Mapping[str, Any]) -> Response:
+        """Check a request against the plan so far and add its change, with the same responses as
+        `FullCalendar.process_frontend_request`. Nothing changes if it fails.
+        """
+        try:
+            request = Request(request_raw)
+        except RequestError as err:
+            return Response(code=400, message=f"Failed to parse request: {err}")
+
+        if request.request_type == RequestType.ADD_PERSON:
+            try:
+                person = Person.from_request(request)
+                alias = request.payload.get(ALIAS_ID)
+                if alias is not None and alias in self.aliases:
+                    raise RequestError(f"Alias {alias} is already used in batch.")
+                if person in self.calendars:
+                    raise CalendarError(f"Person {person} is already in calendar.")
+                self.calendars[person] = SinglePersonCalendar(person)
+                self._copied.add(person)
+                self.id_to_person[str(person.unique_id)] = person
+                if alias is not None:
+                    self.aliases[alias] = person
+                self.changes.append((ChangeKind.PERSON_ADDED, person, None))
+                self.people_changed = True
+                return Response(code=200, message=f"Added person {person}.")
+            except CalendarBaseException as err:
+                message = get_message_from_handled_error_else_raise(err)
+                return Response(code=400, message=f"Failed to add person: {message}")
+
+        if request.request_type == RequestType.REMOVE_PERSON:
+            try:
+                person = self._get_person(request.payload)
+                if person not in self.calendars:
+                    raise CalendarError(f"Person {person} is not in calendar.")
+                del self.calendars[person]
+                del self.id_to_person[str(person.unique_id)]
+                self.changes.append((ChangeKind.PERSON_REMOVED, person, None))
+                self.people_changed = True
+                return Response(code=200, message=f"Removed person {person}.")
+            except (CalendarBaseException, KeyError) as err:
+                message = get_message_from_handled_error_else_raise(err)
+                return Response(code=400, message=f"Failed to remove person: {message}")
+
+        if request.request_type == RequestType.ADD_TRIP:
+            try:
+                person = self._get_person(request.payload)
+                trip_class = RecurringTrip if request.payload.get("until_date") else Trip
+                trip = trip_class.from_request(request)
+                self._get_calendar_to_change(person).add_trip(trip)
+                self.changes.append((ChangeKind.TRIP_ADDED, person, trip))
+                return Response(code=200, message=f"Added {trip} to calendar for {person}.")
+            except (CalendarBaseException, KeyError) as err:
+                message = get_message_from_handled_error_else_raise(err)
+                return Response(code=400, message=f"Failed to add trip: {message}")
+
+        if request.request_type == RequestType.REMOVE_TRIP:
+            try:
+                person = self._get_person(request.payload)
+                trip = self._get_calendar_to_change(person).remove_trip(request.payload["trip_id"])
+                self.changes.append((ChangeKind.TRIP_REMOVED, person, trip))
+                return Response(code=200, message=f"Removed trip {trip}.")
+            except (CalendarBaseException, KeyError) as err:
+                message = get_message_from_handled_error_else_raise(err)
+                return Response(code=400, message=f"Failed to remove trip: {message}")
+
+        if request.request_type == RequestType.UPDATE_DAILY_CALENDARS_DATES:
+            try:
+                start_date = dt.date.strptime(request.payload["start_date"], "%Y-%m-%d")
+                end_date = dt.date.strptime(request.payload["end_date"], "%Y-%m-%d")
+                self.dates = (start_date, end_date)
+                return Response(code=200, message=f"Updated daily calendars dates, {start_date} to {end_date}.")
+            except (CalendarBaseException, KeyError) as err:
+                message = get_message_from_handled_error_else_raise(err)
+                return Response(code=400, message=f"Failed to update daily calendar: {message}")
+
+        return Response(code=400, message=f"Unknown request type: {request.request_type}.")
+
+    def get_writes(self) -> list[tuple[ChangeKind, Person, list[Any]]]:
+        """Get the changes as repository writes: consecutive people added, and consecutive trips added for the same
+        person, are written at once. Each write has the people added, or else the trips added or removed.
+        """
+        writes: list[tuple[ChangeKind, Person, list[Any]]] = []
+        for kind, person, trip in self.changes:
+            item = trip if trip is not None else person
+            if (
+                writes
+                and kind in (ChangeKind.PERSON_ADDED, ChangeKind.TRIP_ADDED)
+                and writes[-1][0] is kind
+                and (kind is ChangeKind.PERSON_ADDED or writes[-1][1] == person)
+            ):
+                writes[-1][2].append(item)
+            else:
+                writes.append((kind, person, [item]))
+        return writes
+
+
+class FullCalendar:
+    """A full calendar, with multiple people and support for interacting with frontend.
+
+    The people and trips live in a `CalendarState`, which may be shared with other full calendars in other threads.
+    The daily calendar dates belong to this full calendar only.
+    """
+
+    def __init__(
+        self,
+        database_repository: "Repository | None" = None,
+        state: CalendarState | None = None,
+        parallel: "ParallelDailyCalendars | None" = None,
+    ) -> None:
+        self._state = state if state is not None else CalendarState()
         self._database_repository = database_repository  # Optional, for persistence
-        self._people_sorted_cache: list[Person] | None = None
+        self._parallel = parallel  # Optional, for computing daily calendars on several cores
         self._daily_calendars_start_date: dt.date | None = None
         self._daily_calendars_end_date: dt.date | None = None
         self._daily_calendars_to_display: OrderedDict[dt.date, OrderedDict[Person, DayLocation]] | None = None
+        self._daily_calendars_snapshot: CalendarSnapshot | None = None  # Snapshot daily calendars were made from
+        self.last_change: Change | None = None  # The last change made through this full calendar
+
+    @property
+    def snapshot(self) -> CalendarSnapshot:
+        """The current people and trips, which will not change even if the calendar does."""
+        return self._state.snapshot
+
+    @property
+    def version(self) -> int:
+        """Data version, changes whenever people or trips change."""
+        return self._state.snapshot.version
+
+    @property
+    def calendars(self) -> Mapping[Person, SinglePersonCalendar]:
+        return self._state.snapshot.calendars
+
+    def _publish(
+        self,
+        calendars: dict[Person, SinglePersonCalendar],
+        people_sorted_by_name: tuple[Person, ...] | None,
+        repository_version: int | None,
+        id_to_person: MappingProxyType[str, Person] | None = None,
+        num_writes: int = 1,
+    ) -> bool:
+        """Swap in a new snapshot after a change, made in `num_writes` writes to the repository, if any. Must be
+        called while holding the write lock.
+
+        Returns False if everything was reloaded from the repository instead.
+        """
+        version = self._state.snapshot.version
+        if repository_version is None or repository_version == version + num_writes:
+            new_version = version + num_writes if repository_version is None else repository_version
+            self._state.snapshot = CalendarSnapshot.create(new_version, calendars, people_sorted_by_name, id_to_person)
+            return True
+        # Someone else wrote to the repository since we loaded, so our copy is out of date
+        logging.info("Repository version %s does not follow %s, reloading.", repository_version, version)
+        self.load_from_repository()
+        return False
+
+    def _notify(self, kind: ChangeKind, person: Person | None = None, trip: Trip | None = None) -> None:
+        """Publish the change that led to the current snapshot. Must be called while holding the write lock."""
+        self.last_change = Change(kind, self._state.snapshot, person, trip)
+        if self._state.change_feed is not None:
+            self._state.change_feed.publish(self.last_change)
 
     def _add_person(self, person: Person) -> None:
-        if any(person == existing_person for existing_person in self.calendars.keys()):
-            raise CalendarError(f"Person {person} is already in calendar.")
-        self.calendars[person] = SinglePersonCalendar(person)
-        self._id_to_person[str(person.unique_id)] = person
-        self._people_sorted_cache = None  # Needs to be recalculated
-        self._daily_calendars_to_display = None  # Needs to be recalculated
-        if self._database_repository:
-            self._database_repository.add_person(person)
+        with self._state.write_lock:
+            snapshot = self._state.snapshot
+            if person in snapshot.calendars:
+                raise CalendarError(f"Person {person} is already in calendar.")
+            repository_version = None
+            if self._database_repository:
+                repository_version = self._database_repository.add_person(person)
+            # Copying the dicts behind the snapshot's mappings reuses their hashes, rather than hashing every key again
+            calendars = snapshot.calendars.copy()
+            calendars[person] = SinglePersonCalendar(person)
+            id_to_person = snapshot.id_to_person.copy()
+            id_to_person[str(person.unique_id)] = person
+            people_sorted_by_name = list(snapshot.people_sorted_by_name)
+            bisect.insort(people_sorted_by_name, person, key=_person_sort_key)
+            if self._publish(
+                calendars, tuple(people_sorted_by_name), repository_version, MappingProxyType(id_to_person)
+            ):
+                self._notify(ChangeKind.PERSON_ADDED, person)
         logging.info("Added %s to calendar", person)
 
     def _remove_person(self, person: Person) -> None:
         """Remove a person from the calendar and database."""
-        if person not in self.calendars:
-            raise CalendarError(f"Person {person} is not in calendar.")
-        del self.calendars[person]
-        del self._id_to_person[str(person.unique_id)]
-        self._people_sorted_cache = None  # Needs to be recalculated
-        self._daily_calendars_to_display = None  # Needs to be recalculated
-        if self._database_repository:
-            self._database_repository.remove_person(person)
+        with self._state.write_lock:
+            snapshot = self._state.snapshot
+            if person not in snapshot.calendars:
+                raise CalendarError(f"Person {person} is not in calendar.")
+            repository_version = None
+            if self._database_repository:
+                repository_version = self._database_repository.remove_person(person)
+            calendars = snapshot.calendars.copy()
+            del calendars[person]
+            id_to_person = snapshot.id_to_person.copy()
+            del id_to_person[str(snapshot.calendars[person].person.unique_id)]
+            people = snapshot.people_sorted_by_name
+            person_idx = bisect.bisect_left(people, _person_sort_key(person), key=_person_sort_key)
+            people_sorted_by_name = people[:person_idx] + people[person_idx + 1 :]
+            if self._publish(calendars, people_sorted_by_name, repository_version, MappingProxyType(id_to_person)):
+                self._notify(ChangeKind.PERSON_REMOVED, person)
         logging.info(f"Removed {person} from calendar")
 
     def load_from_repository(self) -> None:
@@ -172,46 +726,57 @@ class FullCalendar:
             logging.warning("No database repository set. Performing no action.")
             return
 
-        # Load people from database
-        people = self._database_repository.get_all_people()
-        for person in people:
-            # Add person without persisting again (no repository call)
-            self.calendars[person] = SinglePersonCalendar(person)
-            self._id_to_person[str(person.unique_id)] = person
+        with self._state.write_lock:
+            # Read version before data, so the data is never older than the version it is labelled with
+            version = self._database_repository.get_version()
 
-        # Load trips for each person from database
-        for person in people:
-            trips = self._database_repository.get_trips_for_person(person)
-            for trip in trips:
-                self.calendars[person].add_trip(trip)
+            # Load people from database
+            people = self._database_repository.get_all_people()
+            calendars = {person: SinglePersonCalendar(person) for person in people}
 
-        self._people_sorted_cache = None  # Needs to be recalculated
-        self._daily_calendars_to_display = None  # Needs to be recalculated
+            # Load trips for all people at once, rather than one query per person
+            trips_by_person_id = self._database_repository.get_all_trips()
+            for person in people:
+                for trip in trips_by_person_id.get(person.unique_id, []):
+                    calendars[person].add_trip(trip)
+
+            self._state.snapshot = CalendarSnapshot.create(version, calendars)
+            self._notify(ChangeKind.RELOAD)
         logging.info(f"Loaded {len(people)} people from repository.")
 
     def _add_trip(self, person: Person, trip: Trip) -> None:
-        self.calendars[person].add_trip(trip)
-        self._daily_calendars_to_display = None  # Needs to be recalculated
-        if self._database_repository:
-            self._database_repository.add_trip(person, trip)
+        with self._state.write_lock:
+            snapshot = self._state.snapshot
+            if person not in snapshot.calendars:
+                raise CalendarError(f"Person {person} is not in calendar.")
+            person_calendar = snapshot.calendars[person].copy()
+            person_calendar.add_trip(trip)
+            repository_version = None
+            if self._database_repository:
+                repository_version = self._database_repository.add_trip(person, trip)
+            calendars = snapshot.calendars.copy()
+            calendars[person] = person_calendar
+            if self._publish(calendars, snapshot.people_sorted_by_name, repository_version, snapshot.id_to_person):
+                self._notify(ChangeKind.TRIP_ADDED, person, trip)
         logging.info(f"Added {trip} to calendar for {person}.")
 
     def _remove_trip(self, person_id: StrID, trip_id: StrID) -> Trip:
         """Remove a trip from the calendar and database."""
-        person = self._id_to_person.get(str(person_id))
-        if person is None:
-            raise CalendarError(f"Person with id {person_id} not found in calendar.")
-
-        # Find the trip object before removing it (needed for database removal)
-        try:
-            trip_to_remove = next(trip for trip in self.calendars[person].trip_list if trip.unique_id == trip_id)
-        except StopIteration:
-            raise CalendarError(f"Trip with id {trip_id} not found for person {person}.")
-
-        self.calendars[person].remove_trip(trip_id)
-        self._daily_calendars_to_display = None  # Needs to be recalculated
-        if self._database_repository:
-            self._database_repository.remove_trip(trip_to_remove)
+        with self._state.write_lock:
+            snapshot = self._state.snapshot
+            person = snapshot.id_to_person.get(str(person_id))
+            if person is None:
+                raise CalendarError(f"Person with id {person_id} not found in calendar.")
+
+            person_calendar = snapshot.calendars[person].copy()
+            trip_to_remove = person_calendar.remove_trip(trip_id)
+            repository_version = None
+            if self._database_repository:
+                repository_version = self._database_repository.remove_trip(trip_to_remove)
+            calendars = snapshot.calendars.copy()
+            calendars[person] = person_calendar
+            if self._publish(calendars, snapshot.people_sorted_by_name, repository_version, snapshot.id_to_person):
+                self._notify(ChangeKind.TRIP_REMOVED, person, trip_to_remove)
         logging.info(f"Removed {trip_to_remove} from calendar for {person}.")
         return trip_to_remove
 
@@ -234,7 +799,7 @@ class FullCalendar:
 
         if request.request_type == RequestType.REMOVE_PERSON:
             try:
-                person = self._id_to_person[request.payload["person_id"]]
+                person = self.snapshot.id_to_person[request.payload["person_id"]]
                 self._remove_person(person)
                 return Response(code=200, message=f"Removed person {person}.")
             except (CalendarBaseException, KeyError) as err:
@@ -243,8 +808,9 @@ class FullCalendar:
 
         if request.request_type == RequestType.ADD_TRIP:
             try:
-                person = self._id_to_person[request.payload["person_id"]]
-                trip = Trip.from_request(request)
+                person = self.snapshot.id_to_person[request.payload["person_id"]]
+                trip_class = RecurringTrip if request.payload.get("until_date") else Trip
+                trip = trip_class.from_request(request)
                 self._add_trip(person=person, trip=trip)
                 return Response(code=200, message=f"Added {trip} to calendar for {person}.")
             except (CalendarBaseException, KeyError) as err:
@@ -273,18 +839,86 @@ class FullCalendar:
 
         return Response(code=400, message=f"Unknown request type: {request.request_type}.")
 
+    def process_frontend_requests(
+        self, requests_raw: Sequence[Mapping[str, Any]], atomic: bool = True
+    ) -> BatchResponse:
+        """Process a batch of requests from the frontend, in order, and return a response to each.
+
+        An ADD_PERSON request may name the person with an `alias`, which later requests in the batch use as
+        `person_alias` in place of `person_id`. Every request is checked against the calendar as the requests before it
+        leave it, before anything is written. The changes are then written in one transaction, if the repository
+        supports it, and published as one new snapshot. If `atomic`, nothing is applied unless every request is valid;
+        otherwise the valid requests are applied and the others are not.
+        """
+        logging.info("Processing batch of %s requests", len(requests_raw))
+        with self._state.write_lock:
+            plan = _BatchPlan(self._state.snapshot)
+            responses = [plan.check(request_raw) for request_raw in requests_raw]
+            if atomic and any(response.code != 200 for response in responses):
+                not_applied = Response(code=400, message="Not applied, as another request in the batch failed.")
+                return BatchResponse(
+                    tuple(not_applied if response.code == 200 else response for response in responses)
+                )
+
+            if plan.changes:
+                try:
+                    self._apply_batch(plan)
+                except CalendarError as err:
+                    message = get_message_from_handled_error_else_raise(err)
+                    failed = Response(code=400, message=f"Failed to save batch: {message}")
+                    return BatchResponse(tuple(response if response.code != 200 else failed for response in responses))
+            if plan.dates is not None:
+                self._update_daily_calendars_dates(*plan.dates)
+        person_ids = {alias: str(person.unique_id) for alias, person in plan.aliases.items()}
+        logging.info("Applied %s changes of batch", len(plan.changes))
+        return BatchResponse(tuple(responses), person_ids)
+
+    def _apply_batch(self, plan: _BatchPlan) -> None:
+        """Write the changes of a batch to the repository, in one transaction if it supports that, and publish the
+        result. Must be called while holding the write lock.
+        """
+        writes = plan.get_writes()
+        repository_version = None
+        if self._database_repository:
+            repository = self._database_repository
+            in_transaction = (
+                repository.batch() if isinstance(repository, BatchRepository) else contextlib.nullcontext()
+            )
+            try:
+                with in_transaction:
+                    for kind, person, items in writes:
+                        if kind is ChangeKind.PERSON_ADDED:
+                            repository_version = repository.add_people(items)
+                        elif kind is ChangeKind.TRIP_ADDED:
+                            repository_version = repository.add_trips(person, items)
+                        elif kind is ChangeKind.PERSON_REMOVED:
+                            repository_version = repository.remove_person(person)
+                        else:
+                            repository_version = repository.remove_trip(items[0])
+            except CalendarError:
+                # Without a transaction, some of the writes may have been made
+                if not isinstance(repository, BatchRepository):
+                    self.load_from_repository()
+                raise
+        people_sorted_by_name = None if plan.people_changed else plan.snapshot.people_sorted_by_name
+        id_to_person = MappingProxyType(plan.id_to_person)
+        if not self._publish(plan.calendars, people_sorted_by_name, repository_version, id_to_person, len(writes)):
+            return
+        if plan.people_changed:
+            # Viewers load the whole page again for changes to people, and later changes may be to people since removed
+            self._notify(ChangeKind.RELOAD)
+            return
+        for kind, person, trip in plan.changes:
+            self._notify(kind, person, trip)
+
     @property
     def people_sorted_by_name(self) -> list[Person]:
-        if not self._people_sorted_cache:
-            self._people_sorted_cache = sorted(
-                self.calendars.keys(), key=lambda person: (person.last_name, person.first_name)
-            )
-        return self._people_sorted_cache
+        return list(self.snapshot.people_sorted_by_name)
 
     @property
     def single_person_calendars(self) -> list[SinglePersonCalendar]:
         """Get list of single-person calendars, sorted by name."""
-        return [self.calendars[person] for person in self.people_sorted_by_name]
+        return self.snapshot.single_person_calendars
 
     def _update_daily_calendars_dates(self, start_date: dt.date, end_date: dt.date) -> None:
         self._daily_calendars_start_date = start_date
@@ -303,22 +937,16 @@ class FullCalendar:
         end_date = self._daily_calendars_end_date
         if start_date is None or end_date is None:
             raise CalendarError(f"Both start_date and end_date must be set: {start_date}, {end_date}.")
-        days = [start_date + dt.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
-        daily_calendars = {
-            person: self.calendars[person].get_daily_calendar(start_date, end_date)
-            for person in self.people_sorted_by_name
-        }
-        self._daily_calendars_to_display = OrderedDict({
-            day: OrderedDict({person: daily_calendars[person][day] for person in self.people_sorted_by_name})
-            for day in days
-        })  # fmt: skip
+        snapshot = self.snapshot
+        self._daily_calendars_to_display = snapshot.get_daily_calendars(start_date, end_date, self._parallel)
+        self._daily_calendars_snapshot = snapshot
         logging.info("Updated daily calendars.")
 
     def get_daily_calendars_to_display(self) -> OrderedDict[dt.date, OrderedDict[Person, DayLocation]]:
         """Get daily calendars for all calendar members in format that can be used by frontend."""
         if self._daily_calendars_start_date is None or self._daily_calendars_end_date is None:
             return OrderedDict(OrderedDict())
-        if self._daily_calendars_to_display is None:
+        if self._daily_calendars_to_display is None or self._daily_calendars_snapshot is not self.snapshot:
             self._update_daily_calendars()
         if self._daily_calendars_to_display is None:
             raise CalendarError("Failed to update daily calendars.")
@@ -327,7 +955,7 @@ class FullCalendar:
     def is_everyone_together(self, date: dt.date) -> bool:
         daily_calendars = self.get_daily_calendars_to_display()
         try:
-            return len(set(day.end for day in daily_calendars[date].values())) == 1
+            return is_everyone_together(daily_calendars[date])
         except KeyError:
             raise CalendarError(
                 f"Date {date} outside daily calendar range {min(daily_calendars.keys())}-{max(daily_calendars.keys())}."
@@ -335,4 +963,4 @@ class FullCalendar:
 
     def get_trips_to_display(self) -> list[tuple[Person, Trip]]:
         """Get all trips sorted by person last name, then trip start date."""
-        return [(person, trip) for person in self.people_sorted_by_name for trip in self.calendars[person].trip_list]
+        return self.snapshot.get_trips_to_display()
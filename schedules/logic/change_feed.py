@@ -0,0 +1,285 @@
+"""A feed of changes to a full calendar, streamed to viewers as Server-Sent Events so they don't reload the page.
+
+Every write to a `FullCalendar` publishes a `Change`, holding the snapshot just after it, to each `Subscription` of
+its `ChangeFeed`. Publishing only appends the change to each subscription's queue, so many idle viewers stay cheap.
+The cells that changed are worked out later, by each viewer for its own daily calendar dates and only over the dates
+the change can affect. A viewer that falls too far behind is evicted, and told to reload instead.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import datetime as dt
+import enum
+import json
+import logging
+import threading
+from typing import Any, Callable, Final, Iterator, TYPE_CHECKING
+
+from schedules.logic.objects import Person, Trip
+
+if TYPE_CHECKING:
+    from schedules.logic.calendar import CalendarSnapshot, SinglePersonCalendar
+
+DEFAULT_MAX_QUEUED_CHANGES: Final[int] = 64
+DEFAULT_KEEP_ALIVE_SECONDS: Final[float] = 15.0
+RETRY_MILLISECONDS: Final[int] = 3000  # How long browsers wait before reconnecting
+KEEP_ALIVE_EVENT: Final[str] = ": keep-alive\n\n"  # A comment, which keeps proxies from closing idle connections
+
+
+class ChangeKind(enum.StrEnum):
+    PERSON_ADDED = "person_added"
+    PERSON_REMOVED = "person_removed"
+    TRIP_ADDED = "trip_added"
+    TRIP_REMOVED = "trip_removed"
+    RELOAD = "reload"  # Anything may have changed, e.g. after loading writes by another process
+
+
+@dataclasses.dataclass(frozen=True)
+class Change:
+    kind: ChangeKind
+    snapshot: "CalendarSnapshot"  # Just after the change
+    person: Person | None = None
+    trip: Trip | None = None
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    def get_changed_dates(self) -> tuple[dt.date, dt.date] | None:
+        """Get the first and last date whose cells may have changed, if only one person's trips changed."""
+        if self.person is None or self.trip is None:
+            return None
+        return self.snapshot.calendars[self.person].get_changed_dates([self.trip])
+
+
+def encode_event(kind: str, data: dict[str, Any], version: int) -> str:
+    """Encode an event, with the version as its ID, which browsers send back when they reconnect."""
+    return f"id: {version}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _is_everyone_together(calendars: list["SinglePersonCalendar"], day: dt.date) -> bool:
+    """Check whether everyone ends a day in the same location, stopping at the first who doesn't."""
+    ends = (calendar.location_on(day).end for calendar in calendars)
+    first_end = next(ends, None)
+    return first_end is not None and all(end == first_end for end in ends)
+
+
+def _get_cells(
+    snapshot: "CalendarSnapshot", person: Person, from_date: dt.date, to_date: dt.date
+) -> tuple[list[dict[str, str]], dict[str, bool]]:
+    """Get where a person is on each day, and whether everyone is together then, the same as the daily calendars."""
+    calendar = snapshot.calendars[person]
+    calendars = snapshot.single_person_calendars
+    cells, together = [], dict()
+    for day_idx in range((to_date - from_date).days + 1):
+        day = from_date + dt.timedelta(days=day_idx)
+        day_location = calendar.location_on(day)
+        cells.append({
+            "date": day.isoformat(),
+            "start": day_location.start.display_name_frontend,
+            "end": day_location.end.display_name_frontend,
+        })  # fmt: skip
+        together[day.isoformat()] = _is_everyone_together(calendars, day)
+    return cells, together
+
+
+def get_change_data(change: Change, start_date: dt.date | None, end_date: dt.date | None) -> dict[str, Any]:
+    """Describe a change for a viewer, with the cells it changed between the viewer's dates, if it shows any."""
+    data: dict[str, Any] = {"version": change.version}
+    if change.person is not None:
+        data["person_id"] = str(change.person.unique_id)
+        data["name"] = change.person.display_name_frontend
+    if change.trip is not None:
+        data["trip_id"] = str(change.trip.unique_id)
+        data["cells"], data["together"] = [], dict()
+    changed_dates = change.get_changed_dates()
+    if change.person is not None and changed_dates is not None and start_date and end_date:
+        from_date, to_date = max(changed_dates[0], start_date), min(changed_dates[1], end_date)
+        if from_date <= to_date:
+            data["cells"], data["together"] = _get_cells(change.snapshot, change.person, from_date, to_date)
+    return data
+
+
+def encode_change(change: Change, start_date: dt.date | None, end_date: dt.date | None) -> str:
+    return encode_event(change.kind, get_change_data(change, start_date, end_date), change.version)
+
+
+def parse_version(value: str | None) -> int | None:
+    """Parse the version a viewer has, from a `Last-Event-ID` header or query parameter, or None if invalid."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+class Subscription:
+    """A viewer's queue of changes, which holds at most `max_queued` and is read from a thread or an event loop.
+
+    Only subscriptions made with an event loop can be read with `get_async`.
+    """
+
+    def __init__(self, feed: "ChangeFeed", max_queued: int, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        self._feed = feed
+        self._max_queued = max_queued
+        self._changes: collections.deque[Change] = collections.deque()
+        self._condition = threading.Condition()
+        self._loop = loop
+        self._ready = asyncio.Event() if loop is not None else None
+        self.is_closed = False
+        self.is_evicted = False
+
+    def _wake(self) -> None:
+        if self._loop is not None and self._ready is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                pass  # The event loop is closed, so no one is waiting
+
+    def offer(self, change: Change) -> bool:
+        """Queue a change, or evict the subscription if its queue is full. Returns whether it is still subscribed."""
+        with self._condition:
+            if not self.is_closed and len(self._changes) >= self._max_queued:
+                self.is_evicted = self.is_closed = True
+                self._changes.clear()  # The viewer reloads instead
+            elif not self.is_closed:
+                self._changes.append(change)
+            self._condition.notify_all()
+        self._wake()
+        return not self.is_closed
+
+    def _pop(self) -> Change | None:
+        with self._condition:
+            return self._changes.popleft() if self._changes else None
+
+    def get(self, timeout: float | None = None) -> Change | None:
+        """Wait up to `timeout` seconds for the next change. Returns None if there is none by then, or once closed."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._changes or self.is_closed, timeout)
+            return self._changes.popleft() if self._changes else None
+
+    async def get_async(self, timeout: float | None = None) -> Change | None:
+        """The same as `get`, but waiting without blocking the event loop."""
+        if self._ready is None:
+            raise RuntimeError("Subscription was made without an event loop.")
+        self._ready.clear()  # Before checking the queue, so a change offered meanwhile sets it again
+        change = self._pop()
+        if change is not None or self.is_closed:
+            return change
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except TimeoutError:
+            return None
+        return self._pop()
+
+    def close(self) -> None:
+        with self._condition:
+            self.is_closed = True
+            self._condition.notify_all()
+        self._wake()
+        self._feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """Publishes changes to all current subscriptions, evicting those whose queue is full.
+
+    Changes are published while holding the calendar's write lock, so every subscription gets them in order.
+    """
+
+    def __init__(
+        self, max_queued: int = DEFAULT_MAX_QUEUED_CHANGES, keep_alive_seconds: float = DEFAULT_KEEP_ALIVE_SECONDS
+    ) -> None:
+        self.max_queued = max_queued
+        self.keep_alive_seconds = keep_alive_seconds  # How often streams send something while nothing changes
+        self._subscriptions: set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.num_evicted = 0
+
+    def __repr__(self) -> str:
+        return f"ChangeFeed(max_queued={self.max_queued}, num_subscriptions={self.num_subscriptions})"
+
+    @property
+    def num_subscriptions(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, loop: asyncio.AbstractEventLoop | None = None) -> Subscription:
+        subscription = Subscription(self, self.max_queued, loop)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, change: Change) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        evicted = [subscription for subscription in subscriptions if not subscription.offer(change)]
+        if evicted:
+            with self._lock:
+                self._subscriptions.difference_update(evicted)
+                self.num_evicted += len(evicted)
+            logging.warning("Evicted %s slow subscriptions from the change feed.", len(evicted))
+
+    def close(self) -> None:
+        """Close all subscriptions, e.g. when their calendar is dropped from memory, so their viewers reload."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class ChangeStream:
+    """The events for one viewer: a reload if its page is already out of date, then the changes from its
+    subscription, with cells between the viewer's daily calendar dates, and keep-alive comments while nothing changes.
+
+    After a reload event the stream is done, as the viewer loads the whole page again.
+    """
+
+    def __init__(
+        self,
+        subscription: Subscription,
+        dates: tuple[dt.date | None, dt.date | None],
+        known_version: int | None,
+        version: int,
+        get_announced_version: Callable[[], int | None] | None = None,
+    ) -> None:
+        self.subscription = subscription
+        self._start_date, self._end_date = dates
+        self._known_version = known_version  # The version of the viewer's page, if it told us
+        self._version = version  # The version when subscribing, and then that of the last change
+        self._get_announced_version = get_announced_version  # The latest version written by any process on the host
+        self.is_done = False
+
+    def _reload(self) -> str:
+        self.is_done = True
+        return encode_event(ChangeKind.RELOAD, {"version": self._version}, self._version)
+
+    def start(self) -> list[str]:
+        events = [f"retry: {RETRY_MILLISECONDS}\n\n"]
+        if self._known_version is not None and self._known_version != self._version:
+            events.append(self._reload())
+        return events
+
+    def next_event(self, change: Change | None) -> str:
+        """Get the event for the next change from the subscription, or None if there was none in time."""
+        if change is not None:
+            self._version = change.version
+            return encode_change(change, self._start_date, self._end_date)
+        if self.subscription.is_closed:
+            return self._reload()
+        announced_version = self._get_announced_version() if self._get_announced_version else None
+        if announced_version is not None and announced_version > self._version:
+            return self._reload()  # Another process wrote, which this one only loads on the next request
+        return KEEP_ALIVE_EVENT
+
+
+def iter_change_events(stream: ChangeStream, keep_alive_seconds: float) -> Iterator[str]:
+    """Events of a stream, waiting for changes in the calling thread. Unsubscribes when closed."""
+    try:
+        yield from stream.start()
+        while not stream.is_done:
+            yield stream.next_event(stream.subscription.get(timeout=keep_alive_seconds))
+    finally:
+        stream.subscription.close()
@@ -0,0 +1,216 @@
+"""Database engine and connection pool configuration."""
+
+import contextlib
+import dataclasses
+import logging
+import os
+import threading
+import time
+from typing import Any, Final, Mapping, TYPE_CHECKING
+
+from sqlalchemy import Engine, create_engine, event, make_url, text
+from sqlalchemy.pool import Pool
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Checkouts waiting longer than this for a free connection are logged
+SLOW_CHECKOUT_SECONDS: Final[float] = 0.1
+
+# Pragmas for SQLite files: readers don't block the writer (or each other) with WAL, and syncing only at checkpoints is
+# still safe with WAL, but a power loss may lose the last transactions
+SQLITE_PRAGMAS: Final[dict[str, str | int]] = dict(
+    journal_mode="WAL",
+    synchronous="NORMAL",
+    mmap_size=256 * 1024 * 1024,
+    cache_size=-16 * 1024,  # Negative means KiB rather than pages
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class PoolSettings:
+    """Engine and connection pool settings. Settings that are None keep SQLAlchemy's defaults."""
+
+    pool_size: int | None = None
+    max_overflow: int | None = None
+    pool_timeout: float | None = None  # Seconds to wait for a free connection before giving up
+    pool_recycle: int | None = None  # Seconds after which connections are replaced, before the server drops them
+    pool_pre_ping: bool = False  # Check connections before using them, in case the server dropped them
+    statement_cache_size: int | None = None
+    warm_up_connections: int = 0  # Connections to open before serving
+    sqlite_tuned: bool = True  # For SQLite files, use `SQLITE_PRAGMAS` and a separate pool for reading
+
+    @classmethod
+    def from_environment(cls, environment: Mapping[str, str] = os.environ) -> "PoolSettings":
+        def get(name: str) -> str | None:
+            return environment.get(name) or None
+
+        def get_int(name: str) -> int | None:
+            value = get(name)
+            return None if value is None else int(value)
+
+        def get_bool(name: str, default: bool) -> bool:
+            value = get(name)
+            return default if value is None else value.lower() in ("1", "true", "yes")
+
+        pool_timeout = get("DATABASE_POOL_TIMEOUT")
+        return cls(
+            pool_size=get_int("DATABASE_POOL_SIZE"),
+            max_overflow=get_int("DATABASE_MAX_OVERFLOW"),
+            pool_timeout=None if pool_timeout is None else float(pool_timeout),
+            pool_recycle=get_int("DATABASE_POOL_RECYCLE"),
+            pool_pre_ping=get_bool("DATABASE_POOL_PRE_PING", default=False),
+            statement_cache_size=get_int("DATABASE_STATEMENT_CACHE_SIZE"),
+            warm_up_connections=get_int("DATABASE_WARM_UP_CONNECTIONS") or 0,
+            sqlite_tuned=get_bool("DATABASE_SQLITE_TUNED", default=True),
+        )
+
+    def engine_arguments(self, database_url: str) -> dict[str, Any]:
+        """Keyword arguments for `create_engine` or `create_async_engine`."""
+        arguments: dict[str, Any] = dict(pool_pre_ping=self.pool_pre_ping)
+        for name in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle"):
+            if getattr(self, name) is not None:
+                arguments[name] = getattr(self, name)
+        if self.statement_cache_size is not None:
+            arguments["query_cache_size"] = self.statement_cache_size
+            if make_url(database_url).drivername == "postgresql+asyncpg":
+                # asyncpg also caches prepared statements on the server, which breaks behind PgBouncer-style poolers
+                arguments["connect_args"] = dict(prepared_statement_cache_size=self.statement_cache_size)
+        return arguments
+
+
+class PoolMetrics:
+    """How long requests waited to check a connection out of the pool."""
+
+    def __init__(self) -> None:
+        self.num_checkouts = 0
+        self.num_slow_checkouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return (
+            f"PoolMetrics({self.num_checkouts} checkouts, {self.num_slow_checkouts} slow, "
+            f"mean wait {self.mean_wait_seconds * 1000:.1f} ms, max wait {self.max_wait_seconds * 1000:.1f} ms)"
+        )
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        return self.total_wait_seconds / self.num_checkouts if self.num_checkouts else 0.0
+
+    def record_checkout(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.num_checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            if wait_seconds > SLOW_CHECKOUT_SECONDS:
+                self.num_slow_checkouts += 1
+        if wait_seconds > SLOW_CHECKOUT_SECONDS:
+            logging.info(f"Waited {wait_seconds * 1000:.1f} ms for a database connection.")
+
+
+def _get_timed_pool_class(database_url: str, metrics: PoolMetrics) -> type[Pool]:
+    """Get the pool class SQLAlchemy would use for this database, extended to record checkout waits in `metrics`.
+
+    The metrics are on the class rather than the pool, so they survive `Engine.dispose`, which replaces the pool.
+    """
+    url = make_url(database_url)
+    pool_class = url.get_dialect().get_pool_class(url)
+
+    def connect(self: Pool) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return pool_class.connect(self)
+        finally:
+            metrics.record_checkout(time.perf_counter() - start_time)
+
+    return type(f"Timed{pool_class.__name__}", (pool_class,), dict(connect=connect))
+
+
+def is_sqlite_file(database_url: str) -> bool:
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def set_sqlite_pragmas(engine: Engine, pragmas: Mapping[str, str | int] = SQLITE_PRAGMAS) -> None:
+    """Set the pragmas on every new connection of the engine."""
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_database_engine(
+    database_url: str, settings: PoolSettings = PoolSettings(), metrics: PoolMetrics | None = None
+) -> Engine:
+    """Create an engine with the given pool settings, recording checkout waits in `metrics` if given."""
+    arguments = settings.engine_arguments(database_url)
+    if metrics is not None:
+        arguments["poolclass"] = _get_timed_pool_class(database_url, metrics)
+    engine = create_engine(database_url, **arguments)
+    if settings.sqlite_tuned and is_sqlite_file(database_url):
+        set_sqlite_pragmas(engine)
+    return engine
+
+
+def create_read_only_engine(
+    database_url: str, settings: PoolSettings = PoolSettings(), metrics: PoolMetrics | None = None
+) -> Engine | None:
+    """Create an engine with its own pool for reading a tuned SQLite file, or None for other databases.
+
+    With WAL, reading from these connections doesn't wait for the writer, so readers never queue behind writes for a
+    connection.
+    """
+    if not (settings.sqlite_tuned and is_sqlite_file(database_url)):
+        return None
+    engine = create_database_engine(database_url, settings, metrics)
+    set_sqlite_pragmas(engine, dict(query_only="ON"))
+    return engine
+
+
+def create_replica_engine(
+    replica_url: str, settings: PoolSettings = PoolSettings(), metrics: PoolMetrics | None = None
+) -> Engine:
+    """Create an engine for reading from a read replica, which for a SQLite file refuses to write."""
+    engine = create_database_engine(replica_url, settings, metrics)
+    if is_sqlite_file(replica_url):
+        set_sqlite_pragmas(engine, dict(query_only="ON"))
+    return engine
+
+
+def create_async_database_engine(
+    database_url: str, settings: PoolSettings = PoolSettings(), metrics: PoolMetrics | None = None
+) -> "AsyncEngine":
+    """Like `create_database_engine`, for a URL with an asynchronous driver."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    arguments = settings.engine_arguments(database_url)
+    if metrics is not None:
+        arguments["poolclass"] = _get_timed_pool_class(database_url, metrics)
+    engine = create_async_engine(database_url, **arguments)
+    if settings.sqlite_tuned and is_sqlite_file(database_url):
+        set_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
+def warm_up_pool(engine: Engine, num_connections: int) -> None:
+    """Open connections and return them to the pool, so the first requests don't have to wait for them."""
+    with contextlib.ExitStack() as stack:
+        for _ in range(num_connections):
+            stack.enter_context(engine.connect()).execute(text("SELECT 1"))
+    if num_connections:
+        logging.info(f"Opened {num_connections} database connections.")
+
+
+async def warm_up_async_pool(engine: "AsyncEngine", num_connections: int) -> None:
+    """Like `warm_up_pool`, for an asynchronous engine."""
+    async with contextlib.AsyncExitStack() as stack:
+        for _ in range(num_connections):
+            connection = await stack.enter_async_context(engine.connect())
+            await connection.execute(text("SELECT 1"))
+    if num_connections:
+        logging.info(f"Opened {num_connections} database connections.")
@@ -0,0 +1,193 @@
+"""Exports of a calendar snapshot as iCalendar events or CSV rows, produced lazily so any date range fits in memory.
+
+Every export is a generator of text lines, which `encode_chunks` turns into chunks of bytes for a response or file,
+compressed on the fly if asked to. Only one person's trips or segments are ever held at a time, and daily rows are
+looked up one day at a time.
+"""
+
+import csv
+import datetime as dt
+import enum
+import io
+import zlib
+from typing import Final, Iterable, Iterator
+
+from schedules.logic.calendar import CalendarSnapshot
+from schedules.logic.objects import Location, Person, RecurringTrip, Trip
+
+CHUNK_SIZE: Final[int] = 64 * 1024  # Bytes per chunk written to a response or file
+ICS_LINE_OCTETS: Final[int] = 75  # Longer iCalendar lines are folded
+PRODUCT_ID: Final[str] = "-//When Will I See My Friends//Calendar Export//EN"
+
+
+class ExportFormat(enum.StrEnum):
+    TRIPS_ICS = "trips.ics"  # One event per trip, with recurring trips as repeating events
+    SEGMENTS_ICS = "segments.ics"  # One event per run of days away from home with the same locations
+    DAILY_CSV = "daily.csv"  # One row per person and day
+
+    @property
+    def media_type(self) -> str:
+        return "text/csv" if self is ExportFormat.DAILY_CSV else "text/calendar"
+
+    @property
+    def needs_dates(self) -> bool:
+        return self is not ExportFormat.TRIPS_ICS
+
+
+def _escape_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> str:
+    """Fold an iCalendar line into lines of at most 75 octets, without splitting a character."""
+    if len(line.encode("utf-8")) <= ICS_LINE_OCTETS:
+        return line + "\r\n"
+    folded, num_octets = [], 0
+    for char in line:
+        char_octets = len(char.encode("utf-8"))
+        if num_octets + char_octets > ICS_LINE_OCTETS:
+            folded.append("\r\n ")
+            num_octets = 1  # The leading space
+        folded.append(char)
+        num_octets += char_octets
+    return "".join(folded) + "\r\n"
+
+
+def _format_date(date: dt.date) -> str:
+    return date.strftime("%Y%m%d")
+
+
+def _event(uid: str, start_date: dt.date, end_date: dt.date, summary: str, stamp: dt.datetime) -> list[str]:
+    """Lines of an all-day event from the start to the end date, both included."""
+    return [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;VALUE=DATE:{_format_date(start_date)}",
+        f"DTEND;VALUE=DATE:{_format_date(end_date + dt.timedelta(days=1))}",  # The end is excluded in iCalendar
+        f"SUMMARY:{_escape_text(summary)}",
+    ]
+
+
+def _trip_event(person: Person, trip: Trip, stamp: dt.datetime) -> list[str]:
+    summary = f"{person.display_name_frontend} in {trip.location.display_name_frontend}"
+    lines = _event(f"trip-{trip.unique_id}@schedules", trip.start_date, trip.end_date, summary, stamp)
+    if isinstance(trip, RecurringTrip):
+        lines.append(f"RRULE:FREQ=WEEKLY;INTERVAL={trip.every_weeks};COUNT={trip.num_occurrences}")
+    return [*lines, "END:VEVENT"]
+
+
+def _describe_day(start: Location, end: Location) -> str:
+    if start == end:
+        return f"in {start.display_name_frontend}"
+    return f"from {start.display_name_frontend} to {end.display_name_frontend}"
+
+
+def _calendar(events: Iterable[list[str]]) -> Iterator[str]:
+    yield from ("BEGIN:VCALENDAR\r\n", "VERSION:2.0\r\n", f"PRODID:{PRODUCT_ID}\r\n", "CALSCALE:GREGORIAN\r\n")
+    for event in events:
+        yield from (_fold(line) for line in event)
+    yield "END:VCALENDAR\r\n"
+
+
+def iter_trips_ics(snapshot: CalendarSnapshot, stamp: dt.datetime) -> Iterator[str]:
+    """Lines of an iCalendar file with an event for each trip, people by name and trips by start date."""
+    return _calendar(
+        _trip_event(person, trip, stamp)
+        for person in snapshot.people_sorted_by_name
+        for trip in snapshot.calendars[person].all_trips
+    )
+
+
+def _iter_segment_events(
+    snapshot: CalendarSnapshot, start_date: dt.date, end_date: dt.date, stamp: dt.datetime
+) -> Iterator[list[str]]:
+    for person in snapshot.people_sorted_by_name:
+        for segment in snapshot.calendars[person].get_segments():
+            if segment.to_date < start_date or segment.from_date > end_date:
+                continue
+            location = segment.location
+            if location.start == location.end == person.home:
+                continue
+            from_date, to_date = max(segment.from_date, start_date), min(segment.to_date, end_date)
+            summary = f"{person.display_name_frontend} {_describe_day(location.start, location.end)}"
+            uid = f"segment-{person.unique_id}-{_format_date(from_date)}@schedules"
+            yield [*_event(uid, from_date, to_date, summary, stamp), "END:VEVENT"]
+
+
+def iter_segments_ics(
+    snapshot: CalendarSnapshot, start_date: dt.date, end_date: dt.date, stamp: dt.datetime
+) -> Iterator[str]:
+    """Lines of an iCalendar file with an event for each run of days away from home, cut off at the dates."""
+    return _calendar(_iter_segment_events(snapshot, start_date, end_date, stamp))
+
+
+def iter_daily_csv(snapshot: CalendarSnapshot, start_date: dt.date, end_date: dt.date) -> Iterator[str]:
+    """Lines of a CSV file with where each person starts and ends each day, by day and then by name."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def row(*values: str) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield row("date", "person_id", "first_name", "last_name", "start_country", "start_city", "end_country", "end_city")
+    people = snapshot.people_sorted_by_name
+    calendars = [snapshot.calendars[person] for person in people]
+    for day_idx in range((end_date - start_date).days + 1):
+        day = start_date + dt.timedelta(days=day_idx)
+        for person, calendar in zip(people, calendars):
+            day_location = calendar.location_on(day)
+            yield row(
+                day.isoformat(),
+                person.unique_id,
+                person.first_name,
+                person.last_name,
+                day_location.start.country.value,
+                day_location.start.city,
+                day_location.end.country.value,
+                day_location.end.city,
+            )
+
+
+def iter_export(
+    export_format: ExportFormat,
+    snapshot: CalendarSnapshot,
+    start_date: dt.date | None = None,
+    end_date: dt.date | None = None,
+    stamp: dt.datetime | None = None,
+) -> Iterator[str]:
+    """Lines of an export. Exports other than `TRIPS_ICS` need both dates."""
+    stamp = stamp or dt.datetime.now(dt.UTC)
+    if export_format is ExportFormat.TRIPS_ICS:
+        return iter_trips_ics(snapshot, stamp)
+    if start_date is None or end_date is None or end_date < start_date:
+        raise ValueError(f"Export {export_format} needs a start date on or before its end date.")
+    if export_format is ExportFormat.SEGMENTS_ICS:
+        return iter_segments_ics(snapshot, start_date, end_date, stamp)
+    return iter_daily_csv(snapshot, start_date, end_date)
+
+
+def encode_chunks(lines: Iterable[str], compress: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode lines as UTF-8 in chunks of about `chunk_size` bytes, gzip-compressed on the fly if `compress`."""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 means a gzip header and trailer
+    pending: list[bytes] = []
+    num_pending = 0
+    for line in lines:
+        encoded = line.encode("utf-8")
+        pending.append(encoded)
+        num_pending += len(encoded)
+        if num_pending >= chunk_size:
+            chunk = b"".join(pending)
+            pending, num_pending = [], 0
+            if compressor is None:
+                yield chunk
+            elif compressed := compressor.compress(chunk):
+                yield compressed
+    chunk = b"".join(pending)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
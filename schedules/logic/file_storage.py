@@ -0,0 +1,171 @@
+"""Storage in an append-only file, without a database.
+
+Every write is appended to the file as one line of JSON, e.g.
+    {"operation": "add_trips", "person_id": "...", "trips": [{"unique_id": "...", "country": "CHE", ...}]}
+and replaying all lines gives the current people and trips. The data version is the number of lines.
+"""
+
+import datetime as dt
+import fcntl
+import json
+import logging
+import os
+import pathlib
+from typing import Any
+
+from schedules.logic.errors import CalendarError
+from schedules.logic.memory_storage import InMemoryRepository
+from schedules.logic.objects import Country, Location, Person, RecurringTrip, StrID, Trip
+
+
+def person_to_json(person: Person) -> dict[str, str]:
+    return dict(
+        unique_id=person.unique_id,
+        last_name=person.last_name,
+        first_name=person.first_name,
+        country=person.home.country.value,
+        city=person.home.city,
+    )
+
+
+def person_from_json(value: dict[str, str]) -> Person:
+    return Person(
+        unique_id=StrID(value["unique_id"]),
+        last_name=StrID(value["last_name"]),
+        first_name=StrID(value["first_name"]),
+        home=Location(country=Country(value["country"]), city=StrID(value["city"])),
+    )
+
+
+def trip_to_json(trip: Trip) -> dict[str, Any]:
+    value: dict[str, Any] = dict(
+        unique_id=trip.unique_id,
+        country=trip.location.country.value,
+        city=trip.location.city,
+        start_date=trip.start_date.isoformat(),
+        end_date=trip.end_date.isoformat(),
+    )
+    if isinstance(trip, RecurringTrip):
+        value.update(until_date=trip.until_date.isoformat(), every_weeks=trip.every_weeks)
+    return value
+
+
+def trip_from_json(value: dict[str, Any]) -> Trip:
+    trip = Trip(
+        unique_id=StrID(value["unique_id"]),
+        location=Location(country=Country(value["country"]), city=StrID(value["city"])),
+        start_date=dt.date.fromisoformat(value["start_date"]),
+        end_date=dt.date.fromisoformat(value["end_date"]),
+    )
+    if "until_date" not in value:
+        return trip
+    return RecurringTrip(
+        unique_id=trip.unique_id,
+        location=trip.location,
+        start_date=trip.start_date,
+        end_date=trip.end_date,
+        until_date=dt.date.fromisoformat(value["until_date"]),
+        every_weeks=value["every_weeks"],
+    )
+
+
+def _encode(operation: str, arguments: tuple[Any, ...]) -> dict[str, Any]:
+    if operation == "add_people":
+        (people,) = arguments
+        return dict(operation=operation, people=[person_to_json(person) for person in people])
+    if operation == "add_trips":
+        person_id, trips = arguments
+        return dict(operation=operation, person_id=person_id, trips=[trip_to_json(trip) for trip in trips])
+    if operation == "remove_person":
+        (person_id,) = arguments
+        return dict(operation=operation, person_id=person_id)
+    if operation == "remove_trip":
+        (trip_id,) = arguments
+        return dict(operation=operation, trip_id=trip_id)
+    raise ValueError(f"Unknown operation: {operation}.")
+
+
+def _decode(record: dict[str, Any]) -> tuple[str, tuple[Any, ...]]:
+    operation = record["operation"]
+    if operation == "add_people":
+        return operation, (tuple(person_from_json(person) for person in record["people"]),)
+    if operation == "add_trips":
+        trips = tuple(trip_from_json(trip) for trip in record["trips"])
+        return operation, (StrID(record["person_id"]), trips)
+    if operation == "remove_person":
+        return operation, (StrID(record["person_id"]),)
+    if operation == "remove_trip":
+        return operation, (StrID(record["trip_id"]),)
+    raise ValueError(f"Unknown operation: {operation}.")
+
+
+class AppendOnlyFileRepository(InMemoryRepository):
+    """A `Repository` that keeps people and trips in memory, and appends every write to a file.
+
+    Several processes, e.g. gunicorn workers, can share the file. Each write locks the file and first replays what
+    others appended, and `get_version` replays it too, so the version check on every request notices their writes.
+    """
+
+    def __init__(self, path: str | os.PathLike, fsync: bool = True) -> None:
+        super().__init__()
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fsync = fsync  # Without, the last writes may be lost on a power failure, but not on a crash
+        self._file = open(self.path, "a+b")
+        self._offset = 0  # Bytes of the file replayed so far
+        with self._lock:
+            self._replay()
+        logging.info(f"Loaded {self._version} writes from {self.path}.")
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _replay(self) -> None:
+        """Apply the complete lines appended since the last replay. Must be called while holding the lock."""
+        size = os.fstat(self._file.fileno()).st_size
+        if size <= self._offset:
+            return
+        data = os.pread(self._file.fileno(), size - self._offset, self._offset)
+        end = data.rfind(b"\n") + 1  # Another process may be in the middle of appending the last line
+        for line in data[:end].splitlines():
+            try:
+                operation, arguments = _decode(json.loads(line))
+                super()._write(operation, *arguments)
+            except (CalendarError, KeyError, ValueError) as err:
+                # Every process skips the same lines, so they still agree on the data and its version
+                logging.warning(f"Skipping invalid line in {self.path}: {line[:100]!r} ({err}).")
+        self._offset += end
+
+    def _write(self, operation: str, *arguments: Any) -> int:
+        line = (json.dumps(_encode(operation, arguments)) + "\n").encode("utf-8")
+        with self._lock:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)  # Other processes wait until this line is appended
+            try:
+                self._replay()
+                version = super()._write(operation, *arguments)
+                try:
+                    os.write(self._file.fileno(), line)
+                    if self._fsync:
+                        os.fsync(self._file.fileno())
+                except OSError as err:
+                    # Undo the write in memory, and any part of the line that made it into the file
+                    os.ftruncate(self._file.fileno(), self._offset)
+                    self._reload()
+                    raise CalendarError(message=f"Failed to write to {self.path}: {err}") from err
+                self._offset += len(line)
+                return version
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _reload(self) -> None:
+        self._people.clear()
+        self._trips.clear()
+        self._version = 0
+        self._offset = 0
+        self._replay()
+
+    def get_version(self) -> int:
+        """Get the data version, including writes by other processes."""
+        with self._lock:
+            self._replay()
+            return self._version
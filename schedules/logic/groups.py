@@ -0,0 +1,62 @@
+"""Groups, which each have their own people and trips, so that one process can serve many separate calendars.
+
+Everything written before groups existed belongs to the default group.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Final, Generic, TypeVar
+
+DEFAULT_GROUP_ID: Final[str] = "default"
+DEFAULT_MAX_GROUPS: Final[int] = 1000  # Groups whose calendars are kept in memory, besides the default group
+GROUP_ID_PATTERN: Final[re.Pattern[str]] = re.compile(r"[A-Za-z0-9_-]{1,64}")  # Safe in URLs and file names
+
+T = TypeVar("T")
+
+
+def is_valid_group_id(group_id: str) -> bool:
+    return GROUP_ID_PATTERN.fullmatch(group_id) is not None
+
+
+class GroupCache(Generic[T]):
+    """What a process keeps for each group, e.g. its calendar, for the `max_groups` most recently used groups.
+
+    Entries are made by `create` when a group is first used, or again after being evicted, and handed to `evict`
+    when they are evicted, e.g. to tell anyone still holding them.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[str], T],
+        max_groups: int = DEFAULT_MAX_GROUPS,
+        evict: Callable[[T], None] | None = None,
+    ) -> None:
+        self.max_groups = max_groups
+        self._create = create
+        self._evict = evict
+        self._entries: OrderedDict[str, T] = OrderedDict()
+        self._lock = threading.Lock()
+        self.num_evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"GroupCache({len(self)}/{self.max_groups} groups)"
+
+    def get(self, group_id: str) -> T:
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry is not None:
+                self._entries.move_to_end(group_id)
+                return entry
+            entry = self._entries[group_id] = self._create(group_id)
+            while len(self._entries) > self.max_groups:
+                evicted.append(self._entries.popitem(last=False)[1])
+                self.num_evicted += 1
+        if self._evict is not None:
+            for evicted_entry in evicted:
+                self._evict(evicted_entry)
+        return entry
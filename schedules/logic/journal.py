@@ -0,0 +1,333 @@
+"""Write-behind storage: writes go to a local journal file first, and reach the database in the background.
+
+Each process appends its writes to its own journal file, e.g.
+    {"operation": "add_trips", "person": {...}, "trips": [{...}]}
+and holds a lock file for as long as it runs. A process that finds the lock file of another journal unlocked knows
+that process stopped, so it takes over the journal and flushes it to the database.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import uuid
+from typing import Any, Callable, ContextManager, Final, Sequence
+
+from sqlalchemy.exc import OperationalError
+
+from schedules.logic.errors import CalendarError
+from schedules.logic.file_storage import person_from_json, person_to_json, trip_from_json, trip_to_json
+from schedules.logic.objects import Person, StrID, Trip
+from schedules.logic.storage import CalendarRepository
+
+DEFAULT_FLUSH_INTERVAL_SECONDS: Final[float] = 1.0
+DEFAULT_FLUSH_BATCH_SIZE: Final[int] = 100
+
+_Operation = tuple[str, tuple[Any, ...]]  # Name of a `Repository` write method, and its arguments
+
+
+def _encode(operation: _Operation) -> bytes:
+    name, arguments = operation
+    if name == "add_people":
+        record: dict[str, Any] = dict(people=[person_to_json(person) for person in arguments[0]])
+    elif name == "remove_person":
+        record = dict(person=person_to_json(arguments[0]))
+    elif name == "add_trips":
+        record = dict(person=person_to_json(arguments[0]), trips=[trip_to_json(trip) for trip in arguments[1]])
+    elif name == "remove_trip":
+        record = dict(trip=trip_to_json(arguments[0]))
+    else:
+        raise ValueError(f"Unknown operation: {name}.")
+    return (json.dumps(dict(operation=name, **record)) + "\n").encode("utf-8")
+
+
+def _decode(line: bytes) -> _Operation:
+    record = json.loads(line)
+    name = record["operation"]
+    if name == "add_people":
+        return name, (tuple(person_from_json(person) for person in record["people"]),)
+    if name == "remove_person":
+        return name, (person_from_json(record["person"]),)
+    if name == "add_trips":
+        return name, (person_from_json(record["person"]), tuple(trip_from_json(trip) for trip in record["trips"]))
+    if name == "remove_trip":
+        return name, (trip_from_json(record["trip"]),)
+    raise ValueError(f"Unknown operation: {name}.")
+
+
+def _apply(
+    people: dict[StrID, Person], trips: dict[StrID, tuple[StrID, Trip]], operations: Sequence[_Operation]
+) -> None:
+    """Apply operations to people and trips read from the database.
+
+    Operations that the database already contains, because they were flushed while it was being read, change nothing.
+    """
+    for name, arguments in operations:
+        if name == "add_people":
+            for person in arguments[0]:
+                people.setdefault(person.unique_id, person)
+        elif name == "remove_person":
+            people.pop(arguments[0].unique_id, None)
+            person_trip_ids = [
+                trip_id for trip_id, (person_id, _) in trips.items() if person_id == arguments[0].unique_id
+            ]
+            for trip_id in person_trip_ids:
+                del trips[trip_id]
+        elif name == "add_trips":
+            for trip in arguments[1]:
+                trips.setdefault(trip.unique_id, (arguments[0].unique_id, trip))
+        elif name == "remove_trip":
+            trips.pop(arguments[0].unique_id, None)
+
+
+def _is_unavailable(err: Exception) -> bool:
+    """Whether writing failed because of the database (e.g. it is busy or unreachable) rather than the data."""
+    return isinstance(err, OperationalError) or isinstance(err.__cause__, OperationalError)
+
+
+class WriteBehindRepository:
+    """A `Repository` that acknowledges writes once they are in a local journal, and flushes them to the database.
+
+    A background thread flushes the journal in batches, each in one transaction. Reads combine the database with the
+    writes that are not in it yet, and the data version counts those writes, so it doesn't change when they are
+    flushed. It goes up when the database rejects a write, so calendars that showed the write load again. Other
+    processes only see the writes once they are flushed.
+    """
+
+    def __init__(
+        self,
+        open_repository: Callable[[], ContextManager[CalendarRepository]],
+        journal_directory: str | os.PathLike,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        flush_batch_size: int = DEFAULT_FLUSH_BATCH_SIZE,
+    ) -> None:
+        self._open_repository = open_repository
+        self._flush_interval = flush_interval
+        self._flush_batch_size = flush_batch_size
+        self._pending: list[_Operation] = []  # Acknowledged, but not in the database yet
+        self._last_version = 0
+        self._version_offset = 0  # Added to the database version, so dropped writes don't take the version back
+        self._num_flushing = 0  # Pending operations being committed to the database right now
+        self._flush_generation = 0  # Incremented whenever a flush starts
+        self._lock = threading.Lock()
+        self._flush_done = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # Only one flush at a time
+        self._wake_up = threading.Event()
+        self._closed = False
+
+        # Hold the lock file for as long as this repository is open, so no other process takes over the journal
+        self.directory = pathlib.Path(journal_directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"journal-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock_file = open(self.directory / f"{name}.lock", "w")
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        self.journal_path = self.directory / f"{name}.jsonl"
+        self._journal = open(self.journal_path, "ab")
+        self._take_over_stopped_journals()
+
+        self._thread = threading.Thread(target=self._run, name="journal-flush", daemon=True)
+        self._thread.start()
+
+    @property
+    def num_pending(self) -> int:
+        return len(self._pending)
+
+    def _take_over_stopped_journals(self) -> None:
+        for lock_path in sorted(self.directory.glob("journal-*.lock")):
+            if lock_path.name == pathlib.Path(self._lock_file.name).name:
+                continue
+            try:
+                with open(lock_path, "r") as lock_file:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    journal_path = lock_path.with_suffix(".jsonl")
+                    lines = journal_path.read_bytes().splitlines() if journal_path.exists() else []
+                    for line in lines:
+                        try:
+                            self._append(_decode(line))
+                        except (KeyError, ValueError) as err:
+                            logging.warning(f"Skipping invalid line in {journal_path}: {line[:100]!r} ({err}).")
+                    journal_path.unlink(missing_ok=True)
+                    lock_path.unlink(missing_ok=True)
+            except (BlockingIOError, FileNotFoundError):
+                continue  # Still in use by a running process, or another process just took it over
+            logging.info(f"Took over {len(lines)} writes from stopped journal {journal_path}.")
+
+    def _append(self, operation: _Operation) -> int:
+        """Durably add an operation to the journal, and return the new data version."""
+        line = _encode(operation)
+        with self._lock:
+            if self._closed:
+                raise CalendarError(message="Journal is closed.")
+            try:
+                os.write(self._journal.fileno(), line)
+                os.fsync(self._journal.fileno())
+            except OSError as err:
+                raise CalendarError(message=f"Failed to write to journal {self.journal_path}: {err}") from err
+            self._pending.append(operation)
+            self._last_version += 1
+            version = self._last_version
+            if len(self._pending) >= self._flush_batch_size:
+                self._wake_up.set()
+        return version
+
+    def _rewrite_journal(self) -> None:
+        """Replace the journal with one holding only the pending operations. Must be called while holding the lock."""
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as file:
+            for operation in self._pending:
+                file.write(_encode(operation))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(file.name, self.journal_path)
+        self._journal.close()
+        self._journal = open(self.journal_path, "ab")
+
+    def _commit(self, operations: Sequence[_Operation]) -> tuple[int, int]:
+        """Write operations to the database, and return how many are done with, i.e. written or rejected, and how many
+        of those were rejected.
+
+        Writes everything in one transaction if possible, else one by one to find the operations that the database
+        rejects. Rejected operations are dropped, so they don't block all later ones.
+        """
+        try:
+            with self._open_repository() as repository, repository.batch():
+                for name, arguments in operations:
+                    getattr(repository, name)(*arguments)
+            return len(operations), 0
+        except (CalendarError, OperationalError) as err:
+            if _is_unavailable(err):
+                logging.warning(f"Database unavailable, flushing again later: {err}")
+                return 0, 0
+            logging.warning(f"Failed to flush {len(operations)} writes at once, trying one by one: {err}")
+
+        num_dropped = 0
+        for num_done, (name, arguments) in enumerate(operations):
+            try:
+                with self._open_repository() as repository:
+                    getattr(repository, name)(*arguments)
+            except (CalendarError, OperationalError) as err:
+                if _is_unavailable(err):
+                    logging.warning(f"Database unavailable, flushing again later: {err}")
+                    return num_done, num_dropped
+                logging.error(f"Dropping write {name} rejected by the database: {err}")
+                num_dropped += 1
+        return len(operations), num_dropped
+
+    def flush(self) -> int:
+        """Write the oldest pending operations to the database, and return how many are done with."""
+        with self._flush_lock:
+            with self._lock:
+                operations = self._pending[: self._flush_batch_size]
+                if not operations:
+                    return 0
+                self._num_flushing = len(operations)
+                self._flush_generation += 1
+            num_done = num_dropped = 0
+            try:
+                num_done, num_dropped = self._commit(operations)
+            finally:
+                with self._lock:
+                    del self._pending[:num_done]
+                    if num_dropped:
+                        # Dropped writes never reach the database version. Count them, and move the version on by one,
+                        # so that calendars which still show them load again.
+                        self._version_offset += num_dropped + 1
+                        self._last_version += 1
+                    if num_done:
+                        self._rewrite_journal()
+                    self._num_flushing = 0
+                    self._flush_done.notify_all()
+            logging.info(f"Flushed {num_done} writes to database, {len(self._pending)} pending.")
+            return num_done
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake_up.wait(timeout=self._flush_interval)
+            self._wake_up.clear()
+            if self._closed:
+                break  # `close` flushes what is left
+            try:
+                while self._pending and self.flush() == self._flush_batch_size:
+                    pass  # A full batch, so there may be more
+            except Exception:
+                logging.exception("Failed to flush journal, trying again later.")
+
+    def close(self) -> None:
+        """Stop the background thread and flush what is left. What can't be flushed stays in the journal."""
+        self._closed = True
+        self._wake_up.set()
+        self._thread.join()
+        while self._pending and self.flush():
+            pass
+        self._journal.close()
+        if not self._pending:
+            self.journal_path.unlink(missing_ok=True)
+            pathlib.Path(self._lock_file.name).unlink(missing_ok=True)
+        self._lock_file.close()  # Releases the lock, so another process can take over what is left
+
+    def get_version(self) -> int:
+        """Get the data version: the database version, plus the writes that are not in the database yet, and the
+        writes that the database rejected.
+        """
+        while True:
+            with self._lock:
+                while self._num_flushing:
+                    self._flush_done.wait()
+                generation = self._flush_generation
+            with self._open_repository() as repository:
+                database_version = repository.get_version()
+            with self._lock:
+                if generation == self._flush_generation and not self._num_flushing:
+                    self._last_version = database_version + len(self._pending) + self._version_offset
+                    return self._last_version
+            # A flush started while reading the database version, so it may or may not include the flushed writes
+
+    def _read_people(self) -> dict[StrID, Person]:
+        with self._open_repository() as repository:
+            people = {person.unique_id: person for person in repository.get_all_people()}
+        with self._lock:
+            _apply(people, dict(), self._pending)
+        return people
+
+    def _read_trips(self) -> dict[StrID, tuple[StrID, Trip]]:
+        with self._open_repository() as repository:
+            trips = {
+                trip.unique_id: (person_id, trip)
+                for person_id, person_trips in repository.get_all_trips().items()
+                for trip in person_trips
+            }
+        with self._lock:
+            _apply(dict(), trips, self._pending)
+        return trips
+
+    def get_all_people(self) -> list[Person]:
+        return list(self._read_people().values())
+
+    def get_trips_for_person(self, person: Person) -> list[Trip]:
+        return [trip for person_id, trip in self._read_trips().values() if person_id == person.unique_id]
+
+    def get_all_trips(self) -> dict[StrID, list[Trip]]:
+        trips: dict[StrID, list[Trip]] = dict()
+        for person_id, trip in self._read_trips().values():
+            trips.setdefault(person_id, []).append(trip)
+        return trips
+
+    def add_person(self, person: Person) -> int:
+        return self._append(("add_people", ((person,),)))
+
+    def add_people(self, people: Sequence[Person]) -> int:
+        return self._append(("add_people", (tuple(people),)))
+
+    def remove_person(self, person: Person) -> int:
+        return self._append(("remove_person", (person,)))
+
+    def add_trip(self, person: Person, trip: Trip) -> int:
+        return self._append(("add_trips", (person, (trip,))))
+
+    def add_trips(self, person: Person, trips: Sequence[Trip]) -> int:
+        return self._append(("add_trips", (person, tuple(trips))))
+
+    def remove_trip(self, trip: Trip) -> int:
+        return self._append(("remove_trip", (trip,)))
@@ -0,0 +1,112 @@
+"""Storage in memory, without a database."""
+
+import logging
+import threading
+from typing import Any, Container, Sequence
+
+from schedules.logic.errors import CalendarError
+from schedules.logic.objects import Person, StrID, Trip
+
+
+def _has_duplicates(existing_ids: Container[StrID], new_ids: Sequence[StrID]) -> bool:
+    return len(set(new_ids)) != len(new_ids) or any(unique_id in existing_ids for unique_id in new_ids)
+
+
+class InMemoryRepository:
+    """A `Repository` that keeps people and trips in memory, e.g. for tests and benchmarks of the calendar logic.
+
+    Behaves like `CalendarRepository`, including the data version, but the data is lost when the process ends.
+    Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._people: dict[StrID, Person] = dict()
+        self._trips: dict[StrID, tuple[StrID, Trip]] = dict()  # Trip id -> (person id, trip)
+        self._version = 0
+        self._lock = threading.RLock()
+
+    def _write(self, operation: str, *arguments: Any) -> int:
+        """Apply `_<operation>(*arguments)` and return the new data version.
+
+        Each operation checks everything before changing anything, so a failed write changes nothing.
+        """
+        with self._lock:
+            getattr(self, f"_{operation}")(*arguments)
+            self._version += 1
+            return self._version
+
+    def _add_people(self, people: Sequence[Person]) -> None:
+        person_ids = [person.unique_id for person in people]
+        if _has_duplicates(self._people, person_ids):
+            raise CalendarError(message=f"Failed to add people, unique id already exists: {person_ids}.")
+        for person in people:
+            self._people[person.unique_id] = person
+
+    def _remove_person(self, person_id: StrID) -> None:
+        if self._people.pop(person_id, None) is None:
+            raise CalendarError(message=f"Person with id {person_id} not found in repository.")
+        person_trip_ids = [
+            trip_id for trip_id, (trip_person_id, _) in self._trips.items() if trip_person_id == person_id
+        ]
+        for trip_id in person_trip_ids:
+            del self._trips[trip_id]
+
+    def _add_trips(self, person_id: StrID, trips: Sequence[Trip]) -> None:
+        trip_ids = [trip.unique_id for trip in trips]
+        if _has_duplicates(self._trips, trip_ids):
+            raise CalendarError(message=f"Failed to add trips, unique id already exists: {trip_ids}.")
+        for trip in trips:
+            self._trips[trip.unique_id] = (person_id, trip)
+
+    def _remove_trip(self, trip_id: StrID) -> None:
+        if self._trips.pop(trip_id, None) is None:
+            raise CalendarError(message=f"Trip with id {trip_id} not found in repository.")
+
+    def get_version(self) -> int:
+        """Get the data version, which changes whenever anything is written."""
+        return self._version
+
+    def add_person(self, person: Person) -> int:
+        version = self._write("add_people", (person,))
+        logging.info(f"Saved {person} to repository, id {person.unique_id}.")
+        return version
+
+    def add_people(self, people: Sequence[Person]) -> int:
+        version = self._write("add_people", tuple(people))
+        logging.info(f"Saved {len(people)} people to repository.")
+        return version
+
+    def get_all_people(self) -> list[Person]:
+        with self._lock:
+            return list(self._people.values())
+
+    def remove_person(self, person: Person) -> int:
+        version = self._write("remove_person", person.unique_id)
+        logging.info(f"Removed {person} from repository, id {person.unique_id}.")
+        return version
+
+    def add_trip(self, person: Person, trip: Trip) -> int:
+        version = self._write("add_trips", person.unique_id, (trip,))
+        logging.info(f"Saved trip {trip}, id {trip.unique_id} for person {person} to repository.")
+        return version
+
+    def add_trips(self, person: Person, trips: Sequence[Trip]) -> int:
+        version = self._write("add_trips", person.unique_id, tuple(trips))
+        logging.info(f"Saved {len(trips)} trips for person {person} to repository.")
+        return version
+
+    def get_trips_for_person(self, person: Person) -> list[Trip]:
+        with self._lock:
+            return [trip for person_id, trip in self._trips.values() if person_id == person.unique_id]
+
+    def get_all_trips(self) -> dict[StrID, list[Trip]]:
+        with self._lock:
+            trips: dict[StrID, list[Trip]] = dict()
+            for person_id, trip in self._trips.values():
+                trips.setdefault(person_id, []).append(trip)
+            return trips
+
+    def remove_trip(self, trip: Trip) -> int:
+        version = self._write("remove_trip", trip.unique_id)
+        logging.info(f"Removed trip {trip.unique_id} from repository.")
+        return version
@@ -2,13 +2,17 @@
 
 import dataclasses
 import datetime as dt
+import functools
 from enum import StrEnum
-from typing import Self
+from typing import Final, Self
 import uuid
 
 from schedules.logic.requests import Request
 from schedules.logic.errors import CalendarError, RequestError
 
+MAX_SHARED_VALUES: Final[int] = 4096  # Distinct locations and dates kept for trips loaded in bulk to share
+MAX_EVERY_WEEKS: Final[int] = 52 * 10  # Longest gap between occurrences of a recurring trip
+
 
 class Country(StrEnum):
     AUSTRIA = "AUT"
@@ -29,7 +33,7 @@ class StrID(str):
         return self.lower()
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class Location:
     country: Country
     city: StrID
@@ -53,13 +57,34 @@ class Location:
         return f"{self.city.title()}, {self.country.title().replace('_', ' ')}"
 
 
-@dataclasses.dataclass(frozen=True)
+@functools.lru_cache(maxsize=MAX_SHARED_VALUES)
+def get_shared_location(country: Country, city: str) -> Location:
+    """Get a location as the same object for every trip loaded to that place, rather than a copy for each trip."""
+    return Location(country=country, city=StrID(city))
+
+
+@functools.lru_cache(maxsize=MAX_SHARED_VALUES)
+def get_shared_date(ordinal: int) -> dt.date:
+    """Get a date as the same object for every trip loaded on that day, like `get_shared_location`."""
+    return dt.date.fromordinal(ordinal)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class DayLocation:
     start: Location
     end: Location
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
+class LocationSegment:
+    """Consecutive days, from and to dates included, on each of which a person starts and ends at the same places."""
+
+    from_date: dt.date
+    to_date: dt.date
+    location: DayLocation
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class Person:
     unique_id: StrID
     last_name: StrID
@@ -79,6 +104,10 @@ class Person:
         except AttributeError:
             return False
 
+    def __hash__(self) -> int:
+        # Consistent with `__eq__`, so sets and dicts of people find a person by name
+        return hash((self.last_name, self.first_name))
+
     @property
     def display_name_frontend(self) -> str:
         return f"{self.first_name.title()} {self.last_name.title()}"
@@ -93,7 +122,7 @@ class Person:
         )
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class Trip:
     unique_id: StrID
     location: Location
@@ -112,3 +141,85 @@ class Trip:
             start_date=dt.date.strptime(request.payload["start_date"], "%Y-%m-%d"),
             end_date=dt.date.strptime(request.payload["end_date"], "%Y-%m-%d"),
         )
+
+    @property
+    def recurrence_display_frontend(self) -> str:
+        return ""
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class RecurringTrip(Trip):
+    """A trip that repeats every `every_weeks` weeks, on the same weekdays, for as long as it starts by `until_date`.
+
+    `start_date` and `end_date` are those of the first occurrence. Occurrences are only expanded when asked for.
+    """
+
+    until_date: dt.date
+    every_weeks: int = 1
+
+    def __post_init__(self) -> None:
+        Trip.__post_init__(self)  # Not `super()`, which slotted dataclasses do not support before Python 3.14
+        if not 1 <= self.every_weeks <= MAX_EVERY_WEEKS:
+            raise RequestError(f"Trip must repeat every 1 to {MAX_EVERY_WEEKS} weeks: `{self.every_weeks}`.")
+        if not (self.end_date - self.start_date) < self.period:
+            raise CalendarError(f"Trip must end before it repeats: `{self.start_date}`, `{self.end_date}`.")
+        if self.until_date < self.start_date:
+            raise CalendarError(f"Trip must repeat until after its start date: `{self.until_date}`.")
+
+    @classmethod
+    def from_request(cls, request: Request) -> Self:
+        trip = Trip.from_request(request)
+        try:
+            every_weeks = int(request.payload.get("every_weeks") or 1)
+        except ValueError as err:
+            raise RequestError(
+                f"Weeks between occurrences must be a number: `{request.payload['every_weeks']}`."
+            ) from err
+        return cls(
+            unique_id=trip.unique_id,
+            location=trip.location,
+            start_date=trip.start_date,
+            end_date=trip.end_date,
+            until_date=dt.date.strptime(request.payload["until_date"], "%Y-%m-%d"),
+            every_weeks=every_weeks,
+        )
+
+    @property
+    def period(self) -> dt.timedelta:
+        return dt.timedelta(weeks=self.every_weeks)
+
+    @property
+    def num_occurrences(self) -> int:
+        return (self.until_date - self.start_date) // self.period + 1
+
+    @property
+    def last_end_date(self) -> dt.date:
+        return self.end_date + (self.num_occurrences - 1) * self.period
+
+    def get_occurrence(self, occurrence_idx: int) -> Trip:
+        offset = occurrence_idx * self.period
+        return Trip(
+            unique_id=StrID(f"{self.unique_id}-{occurrence_idx}"),
+            location=self.location,
+            start_date=self.start_date + offset,
+            end_date=self.end_date + offset,
+        )
+
+    def _get_occurrence_indices(self, start_date: dt.date, end_date: dt.date) -> range:
+        first_idx = max(-((self.end_date - start_date) // self.period), 0)  # First that ends on or after start date
+        last_idx = min((end_date - self.start_date) // self.period, self.num_occurrences - 1)
+        return range(first_idx, last_idx + 1)
+
+    def get_occurrences(self, start_date: dt.date, end_date: dt.date) -> list[Trip]:
+        """Get the occurrences with any day from `start_date` to `end_date`, in time proportional to those dates."""
+        return [self.get_occurrence(idx) for idx in self._get_occurrence_indices(start_date, end_date)]
+
+    def get_first_occurrence(self, start_date: dt.date, end_date: dt.date) -> Trip | None:
+        """Get the first occurrence with any day from `start_date` to `end_date`, if any, in constant time."""
+        indices = self._get_occurrence_indices(start_date, end_date)
+        return self.get_occurrence(indices[0]) if indices else None
+
+    @property
+    def recurrence_display_frontend(self) -> str:
+        every = "week" if self.every_weeks == 1 else f"{self.every_weeks} weeks"
+        return f"Every {every} until {self.until_date}"
@@ -0,0 +1,186 @@
+"""Computing the daily calendars of many people on several cores.
+
+Each worker gets a chunk of people in a compact form, with only strings and date ordinals, and returns each person's
+days as runs of equal days, with locations as indices into the person's own locations. The results are then merged
+back in the original order, with the caller's own `Location` objects.
+"""
+
+import concurrent.futures
+import dataclasses
+import datetime as dt
+import logging
+import multiprocessing
+import os
+import threading
+from typing import Final, Mapping, Sequence
+
+from schedules.logic.calendar import SinglePersonCalendar
+from schedules.logic.objects import Country, DayLocation, Location, Person, RecurringTrip, StrID, Trip
+
+# Below this many person-days, computing in the calling thread is faster than sending the work to other workers
+DEFAULT_MIN_PERSON_DAYS: Final[int] = 200_000
+CHUNKS_PER_WORKER: Final[int] = 4  # More chunks than workers, so a chunk of people with many trips doesn't hold up all
+
+CompactTrip = tuple[str, str, int, int]  # Country, city, start and end date ordinals
+CompactRecurringTrip = tuple[str, str, int, int, int, int]  # The same for the first occurrence, until date, weeks
+CompactCalendar = tuple[str, str, str, str, tuple[CompactTrip, ...], tuple[CompactRecurringTrip, ...]]
+Run = tuple[int, int, int]  # Number of days, and indices of the start and end locations
+
+
+def _get_locations(calendar: SinglePersonCalendar) -> list[Location]:
+    """Get the locations a person can be at: their home, then the location of each trip and recurring trip in order."""
+    trips = [*calendar.trip_list, *calendar.recurring_trips]
+    return [calendar.person.home, *(trip.location for trip in trips)]
+
+
+def _to_compact(calendar: SinglePersonCalendar) -> CompactCalendar:
+    person = calendar.person
+    trips = tuple(
+        (trip.location.country.value, str(trip.location.city), trip.start_date.toordinal(), trip.end_date.toordinal())
+        for trip in calendar.trip_list
+    )
+    recurring_trips = tuple(
+        (
+            trip.location.country.value,
+            str(trip.location.city),
+            trip.start_date.toordinal(),
+            trip.end_date.toordinal(),
+            trip.until_date.toordinal(),
+            trip.every_weeks,
+        )
+        for trip in calendar.recurring_trips
+    )
+    home = person.home
+    return (str(person.last_name), str(person.first_name), home.country.value, str(home.city), trips, recurring_trips)
+
+
+def _from_compact(compact: CompactCalendar) -> SinglePersonCalendar:
+    last_name, first_name, home_country, home_city, trips, recurring_trips = compact
+    home = Location(Country(home_country), StrID(home_city))
+    person = Person(unique_id=StrID(""), last_name=StrID(last_name), first_name=StrID(first_name), home=home)
+    all_trips: list[Trip] = [
+        Trip(
+            unique_id=StrID(f"trip-{trip_idx}"),
+            location=Location(Country(country), StrID(city)),
+            start_date=dt.date.fromordinal(start_ordinal),
+            end_date=dt.date.fromordinal(end_ordinal),
+        )
+        for trip_idx, (country, city, start_ordinal, end_ordinal) in enumerate(trips)
+    ]
+    all_trips += [
+        RecurringTrip(
+            unique_id=StrID(f"recurring-trip-{trip_idx}"),
+            location=Location(Country(country), StrID(city)),
+            start_date=dt.date.fromordinal(start_ordinal),
+            end_date=dt.date.fromordinal(end_ordinal),
+            until_date=dt.date.fromordinal(until_ordinal),
+            every_weeks=every_weeks,
+        )
+        for trip_idx, (country, city, start_ordinal, end_ordinal, until_ordinal, every_weeks) in enumerate(
+            recurring_trips
+        )
+    ]
+    return SinglePersonCalendar.from_valid_trips(person, all_trips)
+
+
+def _get_runs(calendar: SinglePersonCalendar, start_date: dt.date, end_date: dt.date) -> list[Run]:
+    location_indices = {location: idx for idx, location in enumerate(_get_locations(calendar))}
+    runs: list[Run] = []
+    for day_location in calendar.get_daily_calendar(start_date, end_date).values():
+        indices = (location_indices[day_location.start], location_indices[day_location.end])
+        if runs and runs[-1][1:] == indices:
+            runs[-1] = (runs[-1][0] + 1, *indices)
+        else:
+            runs.append((1, *indices))
+    return runs
+
+
+def _get_chunk_runs(chunk: Sequence[CompactCalendar], start_ordinal: int, end_ordinal: int) -> list[list[Run]]:
+    """Get the runs of each person in a chunk. Runs in a worker, so only gets and returns compact data."""
+    start_date, end_date = dt.date.fromordinal(start_ordinal), dt.date.fromordinal(end_ordinal)
+    return [_get_runs(_from_compact(compact), start_date, end_date) for compact in chunk]
+
+
+def _from_runs(calendar: SinglePersonCalendar, runs: list[Run], days: Sequence[dt.date]) -> dict[dt.date, DayLocation]:
+    locations = _get_locations(calendar)
+    daily_calendar: dict[dt.date, DayLocation] = {}
+    day_idx = 0
+    for num_days, start_idx, end_idx in runs:
+        day_location = DayLocation(start=locations[start_idx], end=locations[end_idx])
+        for day in days[day_idx : day_idx + num_days]:
+            daily_calendar[day] = day_location
+        day_idx += num_days
+    return daily_calendar
+
+
+@dataclasses.dataclass(frozen=True)
+class ParallelSettings:
+    """How to spread daily calendars over workers. With no workers, everything is computed in the calling thread."""
+
+    num_workers: int = 0
+    use_processes: bool = True  # Threads only help on a free-threaded Python, where they don't share the GIL
+    min_person_days: int = DEFAULT_MIN_PERSON_DAYS  # Number of people times number of days
+
+    @classmethod
+    def from_environment(cls, environment: Mapping[str, str] = os.environ) -> "ParallelSettings":
+        return cls(
+            num_workers=int(environment.get("CALENDAR_PARALLEL_WORKERS") or 0),
+            use_processes=(environment.get("CALENDAR_PARALLEL_KIND") or "process").lower() != "thread",
+            min_person_days=int(environment.get("CALENDAR_PARALLEL_MIN_PERSON_DAYS") or DEFAULT_MIN_PERSON_DAYS),
+        )
+
+
+class ParallelDailyCalendars:
+    """Computes daily calendars on a pool of workers, which is only started when it is first needed."""
+
+    def __init__(self, settings: ParallelSettings) -> None:
+        self.settings = settings
+        self._executor: concurrent.futures.Executor | None = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"ParallelDailyCalendars({self.settings})"
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.settings.use_processes:
+                    # Spawned rather than forked, as forking a process with threads running can deadlock the child
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.settings.num_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.settings.num_workers, thread_name_prefix="daily-calendars"
+                    )
+                logging.info(f"Started {self.settings.num_workers} workers for daily calendars.")
+            return self._executor
+
+    def is_worthwhile(self, num_people: int, num_days: int) -> bool:
+        return (
+            self.settings.num_workers > 1 and num_people > 1 and num_people * num_days >= self.settings.min_person_days
+        )
+
+    def get_daily_calendars(
+        self, calendars: Sequence[SinglePersonCalendar], start_date: dt.date, end_date: dt.date
+    ) -> list[dict[dt.date, DayLocation]]:
+        """Get the daily calendar of each person, in the same order as `calendars`."""
+        days = [start_date + dt.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        num_chunks = min(len(calendars), self.settings.num_workers * CHUNKS_PER_WORKER)
+        chunk_size = -(-len(calendars) // num_chunks)  # Rounded up
+        chunks = [
+            [_to_compact(calendar) for calendar in calendars[idx : idx + chunk_size]]
+            for idx in range(0, len(calendars), chunk_size)
+        ]
+        futures = [
+            self._get_executor().submit(_get_chunk_runs, chunk, start_date.toordinal(), end_date.toordinal())
+            for chunk in chunks
+        ]
+        all_runs = [runs for future in futures for runs in future.result()]
+        return [_from_runs(calendar, runs, days) for calendar, runs in zip(calendars, all_runs)]
+
+    def shut_down(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,44 @@
+"""The interface between calendars and persistent storage."""
+
+from typing import ContextManager, Protocol, Sequence, runtime_checkable
+
+from schedules.logic.objects import Person, StrID, Trip
+
+
+class Repository(Protocol):
+    """Storage for people and trips, e.g. `CalendarRepository` for a database or `InMemoryRepository`.
+
+    Every write returns the new data version, which changes whenever anything is written, also by other processes.
+    Bulk writes are a single write, so they change the version once.
+    """
+
+    def get_version(self) -> int: ...
+
+    def add_person(self, person: Person) -> int: ...
+
+    def add_people(self, people: Sequence[Person]) -> int: ...
+
+    def get_all_people(self) -> list[Person]: ...
+
+    def remove_person(self, person: Person) -> int: ...
+
+    def add_trip(self, person: Person, trip: Trip) -> int: ...
+
+    def add_trips(self, person: Person, trips: Sequence[Trip]) -> int: ...
+
+    def get_trips_for_person(self, person: Person) -> list[Trip]: ...
+
+    def get_all_trips(self) -> dict[StrID, list[Trip]]:
+        """Get all trips, by the unique id of the person they belong to."""
+        ...
+
+    def remove_trip(self, trip: Trip) -> int: ...
+
+
+@runtime_checkable
+class BatchRepository(Repository, Protocol):
+    """A repository that can make several writes in one transaction, e.g. `CalendarRepository`."""
+
+    def batch(self) -> ContextManager[None]:
+        """Commit all writes in the block at once, or none if any fails. Each write still returns a new version."""
+        ...
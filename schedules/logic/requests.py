@@ -1,7 +1,7 @@
 """HTTP request utils."""
 
 from copy import copy
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import StrEnum
 from typing import Any, Final, Mapping
 
@@ -10,6 +10,12 @@ from schedules.logic.errors import RequestError
 
 REQUEST_TYPE_ID: Final[str] = "request_type"  # Key used in HTTP requests to indicate the type of request
 
+# In a batch, a person added by one request can be referred to by later ones, which don't know the person's ID yet
+ALIAS_ID: Final[str] = "alias"  # Key naming the person an ADD_PERSON request adds
+PERSON_ALIAS_ID: Final[str] = "person_alias"  # Key referring to that person, instead of `person_id`
+
+DEFAULT_MAX_BATCH_REQUESTS: Final[int] = 1000
+
 
 class RequestType(StrEnum):
     """Request types (e.g. GET or POST) sent between frontend and backend"""
@@ -49,3 +55,37 @@ class Response:
             return f"Success: {self.message}"
         else:
             return f"Error ({self.code}): {self.message}"
+
+
+@dataclass(frozen=True)
+class BatchResponse:
+    """Responses to a batch of requests, in the same order, and the IDs of the people added under each alias."""
+
+    responses: tuple[Response, ...]
+    person_ids: Mapping[str, str] = field(default_factory=dict)
+
+    @property
+    def code(self) -> int:
+        return 200 if all(response.code == 200 for response in self.responses) else 400
+
+    @property
+    def num_applied(self) -> int:
+        return sum(response.code == 200 for response in self.responses)
+
+
+def parse_batch(body: Any, max_requests: int = DEFAULT_MAX_BATCH_REQUESTS) -> tuple[list[dict[str, str]], bool]:
+    """Parse a batch sent as JSON: `{"requests": [...], "atomic": true}`, where each request has the same fields as a
+    form, as strings. Returns the requests, and whether to apply none of them unless all are valid (the default).
+    """
+    if not isinstance(body, dict) or not isinstance(body.get("requests"), list):
+        raise RequestError("Batch must be a JSON object with a list of `requests`.")
+    atomic = body.get("atomic", True)
+    if not isinstance(atomic, bool):
+        raise RequestError(f"Batch `atomic` must be true or false: {atomic}.")
+    requests_raw = body["requests"]
+    if len(requests_raw) > max_requests:
+        raise RequestError(f"Batch has {len(requests_raw)} requests, more than {max_requests}.")
+    for request_raw in requests_raw:
+        if not isinstance(request_raw, dict) or not all(isinstance(value, str) for value in request_raw.values()):
+            raise RequestError(f"Batch request {request_raw} must be a JSON object with string values.")
+    return requests_raw, atomic
@@ -0,0 +1,217 @@
+"""Snapshot files, which hold all people and trips of a full calendar at one data version.
+
+A new instance of the app can read the snapshot file instead of loading everything from the database, as long as the
+data version in the file is still the version in the database.
+
+Format, with all integers little-endian:
+    header: magic (8 bytes), data version (u64), payload length (u64), payload CRC-32 (u32)
+    payload: number of people (u32), then for each person
+        unique id, last name, first name, home country, home city (strings), number of trips (u32), then for each trip
+            unique id, country, city (strings), start date, end date (u32 proleptic Gregorian ordinals)
+        number of recurring trips (u32), then for each recurring trip
+            the same as a trip for its first occurrence, then until date (u32 ordinal), weeks between occurrences (u16)
+    strings: length in bytes (u16), then UTF-8 bytes
+"""
+
+import datetime as dt
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import tempfile
+import threading
+import zlib
+from typing import Final
+
+from schedules.logic.calendar import CalendarSnapshot, CalendarState, SinglePersonCalendar
+from schedules.logic.objects import Country, Person, RecurringTrip, StrID, Trip, get_shared_date, get_shared_location
+
+MAGIC: Final[bytes] = b"CALSNAP2"
+DEFAULT_SNAPSHOT_INTERVAL_SECONDS: Final[float] = 60.0
+
+_HEADER = struct.Struct("<8sQQI")
+_COUNT = struct.Struct("<I")
+_STRING_LENGTH = struct.Struct("<H")
+_DATES = struct.Struct("<II")
+_RECURRENCE = struct.Struct("<IH")
+_MAX_STRING_BYTES: Final[int] = 2**16 - 1  # Longest string whose length fits in `_STRING_LENGTH`
+
+
+def _pack_string(buffer: bytearray, value: str) -> None:
+    encoded = value.encode("utf-8")
+    if len(encoded) > _MAX_STRING_BYTES:
+        raise ValueError(f"String of {len(encoded)} bytes is too long for a snapshot file: {value[:100]!r}.")
+    buffer += _STRING_LENGTH.pack(len(encoded))
+    buffer += encoded
+
+
+def _pack_trip(buffer: bytearray, trip: Trip) -> None:
+    for value in (trip.unique_id, trip.location.country.value, trip.location.city):
+        _pack_string(buffer, value)
+    buffer += _DATES.pack(trip.start_date.toordinal(), trip.end_date.toordinal())
+
+
+def _pack_snapshot(snapshot: CalendarSnapshot) -> bytes:
+    buffer = bytearray(_COUNT.pack(len(snapshot.people_sorted_by_name)))
+    for person in snapshot.people_sorted_by_name:
+        for value in (person.unique_id, person.last_name, person.first_name, person.home.country.value):
+            _pack_string(buffer, value)
+        _pack_string(buffer, person.home.city)
+        trip_list = snapshot.calendars[person].trip_list
+        buffer += _COUNT.pack(len(trip_list))
+        for trip in trip_list:
+            _pack_trip(buffer, trip)
+        recurring_trips = snapshot.calendars[person].recurring_trips
+        buffer += _COUNT.pack(len(recurring_trips))
+        for recurring_trip in recurring_trips:
+            _pack_trip(buffer, recurring_trip)
+            buffer += _RECURRENCE.pack(recurring_trip.until_date.toordinal(), recurring_trip.every_weeks)
+    return bytes(buffer)
+
+
+class _Reader:
+    """Reads values from a buffer one after the other."""
+
+    def __init__(self, buffer: memoryview) -> None:
+        self._buffer = buffer
+        self._offset = 0
+
+    def count(self) -> int:
+        (value,) = _COUNT.unpack_from(self._buffer, self._offset)
+        self._offset += _COUNT.size
+        return value
+
+    def string(self) -> str:
+        (length,) = _STRING_LENGTH.unpack_from(self._buffer, self._offset)
+        start = self._offset + _STRING_LENGTH.size
+        self._offset = start + length
+        return str(self._buffer[start : self._offset], "utf-8")
+
+    def dates(self) -> tuple[dt.date, dt.date]:
+        start, end = _DATES.unpack_from(self._buffer, self._offset)
+        self._offset += _DATES.size
+        return (get_shared_date(start), get_shared_date(end))
+
+    def trip(self) -> Trip:
+        unique_id = StrID(self.string())
+        location = get_shared_location(Country(self.string()), self.string())
+        start_date, end_date = self.dates()
+        return Trip(unique_id=unique_id, location=location, start_date=start_date, end_date=end_date)
+
+    def recurring_trip(self) -> RecurringTrip:
+        trip = self.trip()
+        until, every_weeks = _RECURRENCE.unpack_from(self._buffer, self._offset)
+        self._offset += _RECURRENCE.size
+        return RecurringTrip(
+            unique_id=trip.unique_id,
+            location=trip.location,
+            start_date=trip.start_date,
+            end_date=trip.end_date,
+            until_date=get_shared_date(until),
+            every_weeks=every_weeks,
+        )
+
+
+def _unpack_snapshot(version: int, payload: memoryview) -> CalendarSnapshot:
+    reader = _Reader(payload)
+    calendars: dict[Person, SinglePersonCalendar] = {}
+    people_sorted_by_name = []
+    for _ in range(reader.count()):
+        person = Person(
+            unique_id=StrID(reader.string()),
+            last_name=StrID(reader.string()),
+            first_name=StrID(reader.string()),
+            home=get_shared_location(Country(reader.string()), reader.string()),
+        )
+        trips = [reader.trip() for _ in range(reader.count())]
+        trips += [reader.recurring_trip() for _ in range(reader.count())]
+        calendars[person] = SinglePersonCalendar.from_valid_trips(person, trips)
+        people_sorted_by_name.append(person)
+    return CalendarSnapshot.create(version, calendars, tuple(people_sorted_by_name))
+
+
+def write_snapshot_file(path: str | os.PathLike, snapshot: CalendarSnapshot) -> None:
+    """Write a snapshot file, replacing any existing one in a single step so readers never see a partial file.
+
+    Raises `ValueError` if the snapshot holds a value that the format can't, before touching any file.
+    """
+    path = pathlib.Path(path)
+    payload = _pack_snapshot(snapshot)
+    header = _HEADER.pack(MAGIC, snapshot.version, len(payload), zlib.crc32(payload))
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix=".tmp", delete=False) as file:
+        file.write(header)
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(file.name, path)
+    logging.info("Wrote snapshot of version %s to %s, %s bytes.", snapshot.version, path, len(header) + len(payload))
+
+
+def read_snapshot_file(path: str | os.PathLike) -> CalendarSnapshot | None:
+    """Read a snapshot file, or return None if there is no usable one."""
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as buffer:
+                magic, version, payload_length, crc = _HEADER.unpack_from(buffer)
+                with buffer[_HEADER.size : _HEADER.size + payload_length] as payload:
+                    if magic != MAGIC or len(payload) != payload_length or zlib.crc32(payload) != crc:
+                        logging.warning("Snapshot file %s is invalid, ignoring it.", path)
+                        return None
+                    snapshot = _unpack_snapshot(version, payload)
+    except (OSError, ValueError, struct.error) as err:
+        logging.info("No usable snapshot file %s: %s", path, err)
+        return None
+    logging.info("Read snapshot of version %s from %s.", snapshot.version, path)
+    return snapshot
+
+
+class SnapshotWriter:
+    """Writes a calendar state's snapshot to a file in the background, whenever its version changed.
+
+    Checks every `interval` seconds, or straight away after `notify`.
+    """
+
+    def __init__(
+        self,
+        state: CalendarState,
+        path: str | os.PathLike,
+        interval: float = DEFAULT_SNAPSHOT_INTERVAL_SECONDS,
+    ) -> None:
+        self._state = state
+        self._path = path
+        self._interval = interval
+        self._written_version: int | None = None
+        self._wake_up = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start writing in the background. Call again in a forked process, which has none of its parent's threads."""
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def notify(self) -> None:
+        """Tell the writer the data changed, e.g. after a write."""
+        self._wake_up.set()
+
+    def write_if_changed(self) -> None:
+        snapshot = self._state.snapshot
+        if snapshot.version != self._written_version:
+            try:
+                write_snapshot_file(self._path, snapshot)
+            except ValueError as err:
+                # Only a later version can fit again, so don't try this one again. Instances then load from the
+                # database, as the version of the existing file is out of date.
+                logging.error("Skipping snapshot of version %s: %s", snapshot.version, err)
+            self._written_version = snapshot.version
+
+    def _run(self) -> None:
+        while True:
+            self._wake_up.wait(timeout=self._interval)
+            self._wake_up.clear()
+            try:
+                self.write_if_changed()
+            except OSError as err:
+                logging.warning("Failed to write snapshot to %s: %s", self._path, err)
+            except Exception:
+                logging.exception("Failed to write snapshot to %s, trying again later.", self._path)
@@ -1,33 +1,70 @@
 """Interaction with persistenst storage, e.g. database."""
 
+import contextlib
 import datetime as dt
+import functools
+import itertools
 import logging
+import time
 
-from typing import Self
-from sqlalchemy import Column, Integer, String
+from typing import Callable, Final, Iterator, NamedTuple, Self, Sequence
+from sqlalchemy import Column, Connection, Index, Integer, String, delete, inspect, select, text, update
 from sqlalchemy.orm import declarative_base, Session
 from sqlalchemy.exc import IntegrityError, OperationalError
 
+from schedules.logic.calendar import SinglePersonCalendar
 from schedules.logic.errors import CalendarError
-from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.groups import DEFAULT_GROUP_ID
+from schedules.logic.objects import (
+    MAX_SHARED_VALUES,
+    Country,
+    DayLocation,
+    Location,
+    LocationSegment,
+    Person,
+    RecurringTrip,
+    StrID,
+    Trip,
+    get_shared_location,
+)
 
 Base = declarative_base()
 
+# Writes that find the database locked by another connection are tried again, waiting twice as long each time
+BUSY_RETRY_ATTEMPTS: Final[int] = 5
+BUSY_RETRY_BACKOFF_SECONDS: Final[float] = 0.01
+
+# Orphaned trips are deleted in batches, each in its own transaction, to keep locks short
+ORPHAN_PURGE_BATCH_SIZE: Final[int] = 1000
+
+# Trips are archived in batches, each in its own transaction, like purging orphaned trips
+ARCHIVE_BATCH_SIZE: Final[int] = 1000
+
+# After a write, reads stay on the primary for this long, as a read replica may not have the write yet
+DEFAULT_PRIMARY_AFTER_WRITE_SECONDS: Final[float] = 5.0
+
+
+def is_database_busy(err: OperationalError) -> bool:
+    """Whether the error means another connection held a lock (SQLite only), so trying again may succeed."""
+    return "database is locked" in str(err) or "database table is locked" in str(err)
+
 
 class PersonDBEntry(Base):
     """A database entry for a Person."""
 
     __tablename__ = "person"
     id = Column(String, primary_key=True)
+    group_id = Column(String, nullable=False, default=DEFAULT_GROUP_ID, index=True)
     last_name = Column(String, nullable=False)
     first_name = Column(String, nullable=False)
     country = Column(String, nullable=False)
     city = Column(String, nullable=False)
 
     @classmethod
-    def from_python(cls, person: Person) -> Self:
+    def from_python(cls, person: Person, group_id: str = DEFAULT_GROUP_ID) -> Self:
         return cls(
             id=person.unique_id,
+            group_id=group_id,
             last_name=person.last_name,
             first_name=person.first_name,
             country=person.home.country,
@@ -39,7 +76,7 @@ class PersonDBEntry(Base):
             unique_id=StrID(str(self.id)),
             last_name=StrID(str(self.last_name)),
             first_name=StrID(str(self.first_name)),
-            home=Location(country=Country(self.country), city=StrID(str(self.city))),
+            home=get_shared_location(Country(self.country), str(self.city)),
         )
 
 
@@ -47,17 +84,20 @@ class TripDBEntry(Base):
     """A database entry for a Trip."""
 
     __tablename__ = "trip"
+    __table_args__ = (Index("ix_trip_group_id_person_id", "group_id", "person_id"),)
     id = Column(String, primary_key=True)
-    person_id = Column(String, nullable=False)
+    group_id = Column(String, nullable=False, default=DEFAULT_GROUP_ID)
+    person_id = Column(String, nullable=False, index=True)
     country = Column(String, nullable=False)
     city = Column(String, nullable=False)
     start_date = Column(Integer, nullable=False)
     end_date = Column(Integer, nullable=False)
 
     @classmethod
-    def from_python(cls, person: Person, trip: Trip) -> Self:
+    def from_python(cls, person: Person, trip: Trip, group_id: str = DEFAULT_GROUP_ID) -> Self:
         return cls(
             id=str(trip.unique_id),
+            group_id=group_id,
             person_id=str(person.unique_id),
             country=trip.location.country,
             city=trip.location.city,
@@ -68,69 +108,657 @@ class TripDBEntry(Base):
     def to_python(self) -> Trip:
         return Trip(
             unique_id=StrID(str(self.id)),
-            location=Location(country=Country(self.country), city=StrID(str(self.city))),
-            start_date=dt.datetime.strptime(str(self.start_date), "%Y%m%d").date(),
-            end_date=dt.datetime.strptime(str(self.end_date), "%Y%m%d").date(),
+            location=get_shared_location(Country(self.country), str(self.city)),
+            start_date=_date_from_int(int(self.start_date)),  # type: ignore[arg-type]
+            end_date=_date_from_int(int(self.end_date)),  # type: ignore[arg-type]
+        )
+
+    @property
+    def num_bytes(self) -> int:
+        """Approximate size of the row's data: its strings, and 8 bytes per integer."""
+        strings = (self.id, self.person_id, self.country, self.city)
+        return sum(len(str(string).encode("utf-8")) for string in strings) + 2 * 8
+
+
+class RecurringTripDBEntry(Base):
+    """A database entry for a RecurringTrip, which takes one row however often it repeats."""
+
+    __tablename__ = "recurring_trip"
+    __table_args__ = (Index("ix_recurring_trip_group_id_person_id", "group_id", "person_id"),)
+    id = Column(String, primary_key=True)
+    group_id = Column(String, nullable=False, default=DEFAULT_GROUP_ID)
+    person_id = Column(String, nullable=False, index=True)
+    country = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+    start_date = Column(Integer, nullable=False)
+    end_date = Column(Integer, nullable=False)
+    until_date = Column(Integer, nullable=False)
+    every_weeks = Column(Integer, nullable=False)
+
+    @classmethod
+    def from_python(  # type: ignore[override]
+        cls, person: Person, trip: RecurringTrip, group_id: str = DEFAULT_GROUP_ID
+    ) -> Self:
+        return cls(
+            id=str(trip.unique_id),
+            group_id=group_id,
+            person_id=str(person.unique_id),
+            country=trip.location.country,
+            city=trip.location.city,
+            start_date=_date_to_int(trip.start_date),
+            end_date=_date_to_int(trip.end_date),
+            until_date=_date_to_int(trip.until_date),
+            every_weeks=trip.every_weeks,
+        )
+
+    def to_python(self) -> RecurringTrip:
+        return RecurringTrip(
+            unique_id=StrID(str(self.id)),
+            location=get_shared_location(Country(self.country), str(self.city)),
+            start_date=_date_from_int(int(self.start_date)),  # type: ignore[arg-type]
+            end_date=_date_from_int(int(self.end_date)),  # type: ignore[arg-type]
+            until_date=_date_from_int(int(self.until_date)),  # type: ignore[arg-type]
+            every_weeks=int(self.every_weeks),  # type: ignore[arg-type]
         )
 
+    @property
+    def num_bytes(self) -> int:
+        """Approximate size of the row's data: its strings, and 8 bytes per integer."""
+        strings = (self.id, self.person_id, self.country, self.city)
+        return sum(len(str(string).encode("utf-8")) for string in strings) + 4 * 8
+
+
+# One-off and recurring trips are in separate tables, so the trip table stays as it was
+TRIP_DB_ENTRY_CLASSES: Final[tuple[type[TripDBEntry], type[RecurringTripDBEntry]]] = (
+    TripDBEntry,
+    RecurringTripDBEntry,
+)
+
+
+def get_trip_db_entry_class(trip: Trip) -> type[TripDBEntry] | type[RecurringTripDBEntry]:
+    return RecurringTripDBEntry if isinstance(trip, RecurringTrip) else TripDBEntry
+
+
+def trip_to_db_entry(
+    person: Person, trip: Trip, group_id: str = DEFAULT_GROUP_ID
+) -> TripDBEntry | RecurringTripDBEntry:
+    return get_trip_db_entry_class(trip).from_python(person, trip, group_id)  # type: ignore[arg-type]
+
+
+class ArchivedTripDBEntry(Base):
+    """A database entry for a one-off or recurring trip that ended before an archive cutoff, so that it is no longer
+    loaded with the calendar. Recurring trips have an until date and weeks between occurrences.
+    """
+
+    __tablename__ = "archived_trip"
+    __table_args__ = (Index("ix_archived_trip_group_id_person_id", "group_id", "person_id"),)
+    id = Column(String, primary_key=True)
+    group_id = Column(String, nullable=False, default=DEFAULT_GROUP_ID)
+    person_id = Column(String, nullable=False, index=True)
+    country = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+    start_date = Column(Integer, nullable=False)
+    end_date = Column(Integer, nullable=False)
+    until_date = Column(Integer, nullable=True)
+    every_weeks = Column(Integer, nullable=True)
+
+    @classmethod
+    def from_python(cls, person_id: str, trip: Trip, group_id: str = DEFAULT_GROUP_ID) -> Self:
+        is_recurring = isinstance(trip, RecurringTrip)
+        return cls(
+            id=str(trip.unique_id),
+            group_id=group_id,
+            person_id=person_id,
+            country=trip.location.country,
+            city=trip.location.city,
+            start_date=_date_to_int(trip.start_date),
+            end_date=_date_to_int(trip.end_date),
+            until_date=_date_to_int(trip.until_date) if is_recurring else None,
+            every_weeks=trip.every_weeks if is_recurring else None,
+        )
+
+    def to_python(self) -> Trip:
+        location = get_shared_location(Country(self.country), str(self.city))
+        start_date = _date_from_int(int(self.start_date))  # type: ignore[arg-type]
+        end_date = _date_from_int(int(self.end_date))  # type: ignore[arg-type]
+        if self.until_date is None:
+            return Trip(unique_id=StrID(str(self.id)), location=location, start_date=start_date, end_date=end_date)
+        return RecurringTrip(
+            unique_id=StrID(str(self.id)),
+            location=location,
+            start_date=start_date,
+            end_date=end_date,
+            until_date=_date_from_int(int(self.until_date)),  # type: ignore[arg-type]
+            every_weeks=int(self.every_weeks),  # type: ignore[arg-type]
+        )
+
+
+# Archived data is removed with the person, like their trips
+ARCHIVE_DB_ENTRY_CLASSES: Final[tuple[type[ArchivedTripDBEntry]]] = (ArchivedTripDBEntry,)
+
+
+def _get_last_end_date(trip: Trip) -> dt.date:
+    return trip.last_end_date if isinstance(trip, RecurringTrip) else trip.end_date
+
+
+class PurgeResult(NamedTuple):
+    num_trips: int
+    num_bytes: int
+
+
+class ArchiveResult(NamedTuple):
+    num_trips: int
+    num_people: int
+
+
+def _date_to_int(date: dt.date) -> int:
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+@functools.lru_cache(maxsize=MAX_SHARED_VALUES)
+def _date_from_int(value: int) -> dt.date:
+    """The same date object for every trip loaded on that day, like `get_shared_location`."""
+    return dt.date(value // 10000, value // 100 % 100, value % 100)
+
+
+class SegmentDBEntry(Base):
+    """A database entry for a LocationSegment, derived from a person's trips, so that other readers of the database
+    don't need the calendar's travel rules.
+    """
+
+    __tablename__ = "segment"
+    __table_args__ = (Index("ix_segment_group_id_to_date", "group_id", "to_date"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    group_id = Column(String, nullable=False, default=DEFAULT_GROUP_ID)
+    person_id = Column(String, nullable=False, index=True)
+    from_date = Column(Integer, nullable=False)
+    to_date = Column(Integer, nullable=False, index=True)
+    start_country = Column(String, nullable=False)
+    start_city = Column(String, nullable=False)
+    end_country = Column(String, nullable=False)
+    end_city = Column(String, nullable=False)
+
+    @classmethod
+    def from_python(cls, person_id: str, segment: LocationSegment, group_id: str = DEFAULT_GROUP_ID) -> Self:
+        return cls(
+            person_id=person_id,
+            group_id=group_id,
+            from_date=_date_to_int(segment.from_date),
+            to_date=_date_to_int(segment.to_date),
+            start_country=segment.location.start.country,
+            start_city=segment.location.start.city,
+            end_country=segment.location.end.country,
+            end_city=segment.location.end.city,
+        )
+
+    def to_python(self) -> LocationSegment:
+        return LocationSegment(
+            from_date=_date_from_int(int(self.from_date)),  # type: ignore[arg-type]
+            to_date=_date_from_int(int(self.to_date)),  # type: ignore[arg-type]
+            location=DayLocation(
+                start=Location(country=Country(self.start_country), city=StrID(str(self.start_city))),
+                end=Location(country=Country(self.end_country), city=StrID(str(self.end_city))),
+            ),
+        )
+
+
+def update_segments(session: Session, person_id: str, changed_trips: Sequence[Trip] = ()) -> None:
+    """Recompute a person's segments in the current transaction, after their trips changed.
+
+    Only replaces the segments around `changed_trips`, which were just added or removed, if given, else all of them.
+    """
+    session.flush()
+    segment_rows = delete(SegmentDBEntry).filter_by(person_id=person_id)
+    person_db_entry = session.get(PersonDBEntry, person_id)
+    if person_db_entry is None:
+        session.execute(segment_rows)
+        return
+
+    trips = [
+        entry.to_python()
+        for entry_class in TRIP_DB_ENTRY_CLASSES
+        for entry in session.query(entry_class).filter_by(person_id=person_id)
+    ]
+    calendar = SinglePersonCalendar.from_valid_trips(person_db_entry.to_python(), trips)
+    segments = calendar.get_segments()
+    if changed_trips:
+        from_date, to_date = calendar.get_changed_dates(changed_trips)
+        # A day wider, so the stays just before and after the changed dates are replaced too
+        from_date -= dt.timedelta(days=1)
+        to_date += dt.timedelta(days=1)
+        segment_rows = segment_rows.where(
+            SegmentDBEntry.to_date >= _date_to_int(from_date), SegmentDBEntry.from_date <= _date_to_int(to_date)
+        )
+        segments = [segment for segment in segments if segment.to_date >= from_date and segment.from_date <= to_date]
+    session.execute(segment_rows)
+    group_id = str(person_db_entry.group_id)
+    session.add_all([SegmentDBEntry.from_python(person_id, segment, group_id) for segment in segments])
+
+
+class VersionDBEntry(Base):
+    """A database entry holding a group's data version, bumped in the same transaction as every write to the group."""
+
+    __tablename__ = "group_version"
+    group_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+
+# Tables that only got a group column once there were groups, which `upgrade_schema` adds to older databases
+GROUP_DB_ENTRY_CLASSES: Final[tuple[type[Base], ...]] = (  # type: ignore[valid-type]
+    PersonDBEntry,
+    *TRIP_DB_ENTRY_CLASSES,
+    *ARCHIVE_DB_ENTRY_CLASSES,
+    SegmentDBEntry,
+)
+OLD_VERSION_TABLE: Final[str] = "calendar_version"  # Held the only version, before there were groups
+
+
+def upgrade_schema(connection: Connection) -> None:
+    """Bring a database made before there were groups up to date, with all its data in the default group.
+
+    Adds the group column and its indexes to each table that lacks it, and carries over the data version, so that
+    running processes notice the change. Does nothing to a database that is already up to date.
+    """
+    inspector = inspect(connection)
+    for entry_class in GROUP_DB_ENTRY_CLASSES:
+        table = entry_class.__table__
+        if "group_id" in {column["name"] for column in inspector.get_columns(table.name)}:
+            continue
+        connection.execute(
+            text(f"ALTER TABLE {table.name} ADD COLUMN group_id VARCHAR NOT NULL DEFAULT '{DEFAULT_GROUP_ID}'")
+        )
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+        logging.info(f"Added groups to table {table.name}.")
+
+    if inspector.has_table(OLD_VERSION_TABLE) and connection.execute(select(VersionDBEntry)).first() is None:
+        old_version = connection.execute(text(f"SELECT MAX(version) FROM {OLD_VERSION_TABLE}")).scalar()
+        if old_version is not None:
+            connection.execute(
+                VersionDBEntry.__table__.insert().values(group_id=DEFAULT_GROUP_ID, version=old_version)
+            )
+
+
+def create_schema(connection: Connection) -> None:
+    """Create the tables that don't exist yet, and upgrade the ones made by older versions."""
+    Base.metadata.create_all(connection)
+    upgrade_schema(connection)
+
+
+class RecentWrites:
+    """When a process last wrote, so that its reads can stay on the primary until a read replica has the write.
+
+    Shared by all repositories of the process, which usually only live for one request each.
+    """
+
+    def __init__(
+        self, window: float = DEFAULT_PRIMARY_AFTER_WRITE_SECONDS, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.window = window
+        self._clock = clock
+        self._last_write_time: float | None = None
+
+    def record_write(self) -> None:
+        self._last_write_time = self._clock()
+
+    def is_recent(self) -> bool:
+        return self._last_write_time is not None and self._clock() - self._last_write_time < self.window
+
 
 class CalendarRepository:
-    """Handles all database operations for the calendar."""
+    """Handles all database operations for the calendar.
+
+    Reads go through `read_session` if given, e.g. one from a separate read-only pool or a read replica, and writes
+    through `session`. With `recent_writes`, reads go through `session` too for a while after any write, so that they
+    see the write even if `read_session` is on a replica that lags behind. With `maintain_segments`, every write also
+    updates the segment table in the same transaction.
 
-    def __init__(self, session: Session):
+    Only reads and writes the people and trips of one group, which has its own data version. Ids are unique across
+    all groups.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        read_session: Session | None = None,
+        maintain_segments: bool = False,
+        recent_writes: RecentWrites | None = None,
+        group_id: str = DEFAULT_GROUP_ID,
+    ):
+        self.group_id = group_id
         self.session = session
+        self.read_session = read_session or session
+        self.maintain_segments = maintain_segments
+        self.recent_writes = recent_writes
+        self._in_batch = False
+
+    @property
+    def _reader(self) -> Session:
+        if self.recent_writes is not None and self.recent_writes.is_recent():
+            return self.session
+        return self.read_session
 
-    def add_person(self, person: Person) -> None:
-        """Save a person to the database."""
+    def _end_write(self) -> None:
+        """After committing a write, make sure later reads see it."""
+        if self.recent_writes is not None:
+            self.recent_writes.record_write()
+        if self.read_session is not self.session:
+            self.read_session.rollback()  # End the read transaction, so that later reads see this write
+
+    def _update_segments(self, person_id: str, changed_trips: Sequence[Trip] = ()) -> None:
+        if self.maintain_segments:
+            update_segments(self.session, person_id, changed_trips)
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """Commit all writes in the block in one transaction, or none if any fails. Busy databases are not retried."""
+        self._in_batch = True
         try:
-            person_db_entry = PersonDBEntry.from_python(person)
-            self.session.add(person_db_entry)
+            yield
             self.session.commit()
-            logging.info(f"Saved {person} to database, id {person_db_entry.id}.")
+        except BaseException:
+            self.session.rollback()
+            raise
+        finally:
+            self._in_batch = False
+        self._end_write()
+
+    def get_version(self) -> int:
+        """Get the data version, which changes whenever anything is written to the database."""
+        version = self._reader.execute(select(VersionDBEntry.version).filter_by(group_id=self.group_id)).scalar()
+        return version or 0
+
+    def _bump_version(self) -> int:
+        """Increment the data version in the current transaction and return the new version."""
+        result = self.session.execute(
+            update(VersionDBEntry).filter_by(group_id=self.group_id).values(version=VersionDBEntry.version + 1)
+        )
+        if result.rowcount == 0:  # First write to this group
+            self.session.add(VersionDBEntry(group_id=self.group_id, version=1))
+        return self.session.execute(select(VersionDBEntry.version).filter_by(group_id=self.group_id)).scalar_one()
+
+    def _write(self, write: Callable[[], None]) -> int:
+        """Run `write` and bump the version in one transaction, and return the new version.
+
+        If another process holds the database lock, rolls back and tries again with exponential backoff. In a
+        `batch`, only runs `write` and bumps the version, and the batch commits.
+        """
+        if self._in_batch:
+            write()
+            return self._bump_version()
+        for attempt in range(BUSY_RETRY_ATTEMPTS):
+            try:
+                write()
+                version = self._bump_version()
+                self.session.commit()
+                break
+            except OperationalError as err:
+                self.session.rollback()
+                if not is_database_busy(err) or attempt == BUSY_RETRY_ATTEMPTS - 1:
+                    raise
+                logging.info(f"Database busy, trying again (attempt {attempt + 2} of {BUSY_RETRY_ATTEMPTS}).")
+                time.sleep(BUSY_RETRY_BACKOFF_SECONDS * 2**attempt)
+            except BaseException:
+                self.session.rollback()
+                raise
+        self._end_write()
+        return version
+
+    def add_person(self, person: Person) -> int:
+        """Save a person to the database and return the new data version."""
+
+        def write() -> None:
+            self.session.add(PersonDBEntry.from_python(person, self.group_id))
+            self._update_segments(str(person.unique_id))
+
+        try:
+            version = self._write(write)
         except (OperationalError, IntegrityError) as err:
             raise CalendarError(message=f"Failed to add person to database: {err}") from err
+        logging.info(f"Saved {person} to database, id {person.unique_id}.")
+        return version
+
+    def add_people(self, people: Sequence[Person]) -> int:
+        """Save several people to the database at once and return the new data version."""
+
+        def write() -> None:
+            self.session.add_all([PersonDBEntry.from_python(person, self.group_id) for person in people])
+            for person in people:
+                self._update_segments(str(person.unique_id))
+
+        try:
+            version = self._write(write)
+        except (OperationalError, IntegrityError) as err:
+            raise CalendarError(message=f"Failed to add people to database: {err}") from err
+        logging.info(f"Saved {len(people)} people to database.")
+        return version
 
     def get_all_people(self) -> list[Person]:
-        """Load all people from the database."""
-        person_db_entries = self.session.query(PersonDBEntry).all()
+        """Load all people of the group from the database."""
+        person_db_entries = self._reader.query(PersonDBEntry).filter_by(group_id=self.group_id).all()
         return [entry.to_python() for entry in person_db_entries]
 
-    def remove_person(self, person: Person) -> None:
-        """Remove a person from the database."""
-        try:
-            person_db_entry = self.session.query(PersonDBEntry).filter_by(id=str(person.unique_id)).first()
+    def remove_person(self, person: Person) -> int:
+        """Remove a person and all their trips from the database and return the new data version."""
+
+        def write() -> None:
+            person_db_entry = (
+                self.session.query(PersonDBEntry).filter_by(id=str(person.unique_id), group_id=self.group_id).first()
+            )
             if not person_db_entry:
                 raise CalendarError(message=f"Person with id {person.unique_id} not found in database.")
-            if person_db_entry:
-                self.session.delete(person_db_entry)
-                self.session.commit()
-                logging.info(f"Removed {person} from database, id {person_db_entry.id}.")
+            self.session.delete(person_db_entry)
+            for entry_class in (*TRIP_DB_ENTRY_CLASSES, *ARCHIVE_DB_ENTRY_CLASSES):
+                self.session.execute(delete(entry_class).filter_by(person_id=str(person.unique_id)))
+            self._update_segments(str(person.unique_id))
+
+        try:
+            version = self._write(write)
         except OperationalError as err:
             raise CalendarError(message=f"Failed to remove person from database: {err}") from err
+        logging.info(f"Removed {person} from database, id {person.unique_id}.")
+        return version
+
+    def add_trip(self, person: Person, trip: Trip) -> int:
+        """Save a trip for a person to the database and return the new data version."""
+
+        def write() -> None:
+            self.session.add(trip_to_db_entry(person, trip, self.group_id))
+            self._update_segments(str(person.unique_id), [trip])
 
-    def add_trip(self, person: Person, trip: Trip) -> None:
-        """Save a trip for a person to the database."""
         try:
-            trip_db_entry = TripDBEntry.from_python(person, trip)
-            self.session.add(trip_db_entry)
-            self.session.commit()
-            logging.info(f"Saved trip {trip}, id {trip.unique_id} for person {person} to database.")
+            version = self._write(write)
         except (OperationalError, IntegrityError) as err:
             raise CalendarError(message=f"Failed to add trip to database: {err}") from err
+        logging.info(f"Saved trip {trip}, id {trip.unique_id} for person {person} to database.")
+        return version
+
+    def add_trips(self, person: Person, trips: Sequence[Trip]) -> int:
+        """Save several trips for a person to the database at once and return the new data version."""
+
+        def write() -> None:
+            self.session.add_all([trip_to_db_entry(person, trip, self.group_id) for trip in trips])
+            self._update_segments(str(person.unique_id), trips)
+
+        try:
+            version = self._write(write)
+        except (OperationalError, IntegrityError) as err:
+            raise CalendarError(message=f"Failed to add trips to database: {err}") from err
+        logging.info(f"Saved {len(trips)} trips for person {person} to database.")
+        return version
 
     def get_trips_for_person(self, person: Person) -> list[Trip]:
         """Load all trips for a specific person from the database."""
-        trip_db_entries = self.session.query(TripDBEntry).filter_by(person_id=str(person.unique_id)).all()
-        return [entry.to_python() for entry in trip_db_entries]
+        return [
+            entry.to_python()
+            for entry_class in TRIP_DB_ENTRY_CLASSES
+            for entry in self._reader.query(entry_class)
+            .filter_by(group_id=self.group_id, person_id=str(person.unique_id))
+            .all()
+        ]
 
-    def remove_trip(self, trip: Trip) -> None:
-        """Remove a trip from the database."""
-        try:
-            trip_db_entry = self.session.query(TripDBEntry).filter_by(id=str(trip.unique_id)).first()
+    def get_all_trips(self) -> dict[StrID, list[Trip]]:
+        """Load all trips of the group from the database in one query, by the unique id of their person."""
+        trips: dict[StrID, list[Trip]] = dict()
+        for entry_class in TRIP_DB_ENTRY_CLASSES:
+            for entry in self._reader.query(entry_class).filter_by(group_id=self.group_id).all():
+                trips.setdefault(StrID(str(entry.person_id)), []).append(entry.to_python())
+        return trips
+
+    def remove_trip(self, trip: Trip) -> int:
+        """Remove a trip from the database and return the new data version."""
+
+        def write() -> None:
+            trip_db_entry = (
+                self.session.query(get_trip_db_entry_class(trip))
+                .filter_by(id=str(trip.unique_id), group_id=self.group_id)
+                .first()
+            )
             if not trip_db_entry:
                 raise CalendarError(message=f"Trip with id {trip.unique_id} not found in database.")
             self.session.delete(trip_db_entry)
-            self.session.commit()
-            logging.info(f"Removed trip {trip.unique_id} from database.")
+            self._update_segments(str(trip_db_entry.person_id), [trip])
+
+        try:
+            version = self._write(write)
         except OperationalError as err:
             raise CalendarError(message=f"Failed to remove trip from database: {err}") from err
+        logging.info(f"Removed trip {trip.unique_id} from database.")
+        return version
+
+    def purge_orphaned_trips(self, batch_size: int = ORPHAN_PURGE_BATCH_SIZE) -> PurgeResult:
+        """Delete trips whose person no longer exists, e.g. left behind by older versions that didn't delete them.
+
+        Deletes in batches, each in its own transaction, and returns how many trips and bytes of data were deleted.
+        Checks the trips of all groups, as no group has them any more.
+        """
+        num_trips = num_bytes = 0
+        for entry_class in TRIP_DB_ENTRY_CLASSES:
+            orphaned_trips = (
+                select(entry_class).where(entry_class.person_id.not_in(select(PersonDBEntry.id))).limit(batch_size)
+            )
+            while True:
+                entries = self.session.execute(orphaned_trips).scalars().all()
+                if not entries:
+                    break
+                delete_batch = delete(entry_class).where(entry_class.id.in_([entry.id for entry in entries]))
+                try:
+                    self._write(lambda: self.session.execute(delete_batch))
+                except OperationalError as err:
+                    raise CalendarError(message=f"Failed to purge orphaned trips from database: {err}") from err
+                num_trips += len(entries)
+                num_bytes += sum(entry.num_bytes for entry in entries)
+                logging.info(f"Purged {num_trips} orphaned trips from database so far.")
+        return PurgeResult(num_trips=num_trips, num_bytes=num_bytes)
+
+    def archive_trips(self, cutoff_date: dt.date, batch_size: int = ARCHIVE_BATCH_SIZE) -> ArchiveResult:
+        """Move trips that end before `cutoff_date` to the archive, so that calendars no longer load or check them.
+
+        Recurring trips are moved once their last occurrence ends before the cutoff. One-off trips are moved from the
+        first on, up to the first that ends on or after the cutoff: the travel of a trip depends on the trip starting
+        before it, so a trip before the cutoff but within one that goes past it stays, as do the trips after it. That
+        way days from the cutoff on stay the same without any record of the archived trips. Moves up to `batch_size`
+        trips per transaction, and returns how many trips of how many people of the group were moved.
+        """
+        cutoff = _date_to_int(cutoff_date)
+        candidate_person_ids = (
+            select(TripDBEntry.person_id)
+            .filter_by(group_id=self.group_id)
+            .where(TripDBEntry.end_date < cutoff)
+            .union(
+                select(RecurringTripDBEntry.person_id)
+                .filter_by(group_id=self.group_id)
+                .where(RecurringTripDBEntry.until_date < cutoff)
+            )
+        )
+        num_trips = num_people = 0
+        for person_id in self.session.execute(candidate_person_ids).scalars().all():
+            person_db_entry = self.session.get(PersonDBEntry, person_id)
+            if person_db_entry is None:
+                continue  # Orphaned trips are for `purge_orphaned_trips`
+            trips = [
+                entry.to_python()
+                for entry_class in TRIP_DB_ENTRY_CLASSES
+                for entry in self.session.query(entry_class).filter_by(person_id=person_id)
+            ]
+            calendar = SinglePersonCalendar.from_valid_trips(person_db_entry.to_python(), trips)
+            trips_to_archive = [
+                *itertools.takewhile(lambda trip: trip.end_date < cutoff_date, calendar.trip_list),
+                *(trip for trip in calendar.recurring_trips if trip.last_end_date < cutoff_date),
+            ]
+            if not trips_to_archive:
+                continue
+
+            for batch_idx in range(0, len(trips_to_archive), batch_size):
+                batch = trips_to_archive[batch_idx : batch_idx + batch_size]
+                self._archive_batch(person_id, batch)
+                num_trips += len(batch)
+                logging.info(f"Archived {num_trips} trips before {cutoff_date} so far.")
+            num_people += 1
+        return ArchiveResult(num_trips=num_trips, num_people=num_people)
+
+    def _archive_batch(self, person_id: str, trips: Sequence[Trip]) -> None:
+        """Move some of a person's trips to the archive in one transaction."""
+
+        def write() -> None:
+            for trip in trips:
+                self.session.execute(delete(get_trip_db_entry_class(trip)).filter_by(id=str(trip.unique_id)))
+            self.session.add_all([ArchivedTripDBEntry.from_python(person_id, trip, self.group_id) for trip in trips])
+            self._update_segments(person_id, trips)
+
+        try:
+            self._write(write)
+        except (OperationalError, IntegrityError) as err:
+            raise CalendarError(message=f"Failed to archive trips in database: {err}") from err
+
+    def get_archived_trips(
+        self, person: Person, start_date: dt.date = dt.date.min, end_date: dt.date = dt.date.max
+    ) -> list[Trip]:
+        """Load a person's archived trips that start by `end_date` and end on or after `start_date`, by start date.
+
+        Recurring trips are compared by their first occurrence's start and last occurrence's end.
+        """
+        query = (
+            select(ArchivedTripDBEntry)
+            .filter_by(group_id=self.group_id, person_id=str(person.unique_id))
+            .where(ArchivedTripDBEntry.start_date <= _date_to_int(end_date))
+            .order_by(ArchivedTripDBEntry.start_date)
+        )
+        trips = [entry.to_python() for entry in self._reader.execute(query).scalars()]
+        return [trip for trip in trips if _get_last_end_date(trip) >= start_date]
+
+    def rebuild_segments(self) -> int:
+        """Recompute the segments of all people of the group, e.g. after turning on `maintain_segments`, and return how
+        many there are.
+        """
+
+        def write() -> None:
+            self.session.execute(delete(SegmentDBEntry).filter_by(group_id=self.group_id))
+            people = select(PersonDBEntry.id).filter_by(group_id=self.group_id)
+            for person_id in self.session.execute(people).scalars().all():
+                update_segments(self.session, person_id)
+
+        try:
+            self._write(write)
+        except OperationalError as err:
+            raise CalendarError(message=f"Failed to rebuild segments in database: {err}") from err
+        num_segments = self.session.query(SegmentDBEntry).filter_by(group_id=self.group_id).count()
+        logging.info(f"Rebuilt {num_segments} segments in database.")
+        return num_segments
+
+    def get_segments(self, start_date: dt.date, end_date: dt.date) -> dict[StrID, list[LocationSegment]]:
+        """Load the segments overlapping the dates in one query, by the unique id of the person they belong to.
+
+        Only up to date if every write went through a repository with `maintain_segments`.
+        """
+        query = (
+            select(SegmentDBEntry)
+            .filter_by(group_id=self.group_id)
+            .where(SegmentDBEntry.to_date >= _date_to_int(start_date))
+            .where(SegmentDBEntry.from_date <= _date_to_int(end_date))
+            .order_by(SegmentDBEntry.person_id, SegmentDBEntry.from_date)
+        )
+        segments: dict[StrID, list[LocationSegment]] = dict()
+        for entry in self._reader.execute(query).scalars():
+            segments.setdefault(StrID(str(entry.person_id)), []).append(entry.to_python())
+        return segments
@@ -0,0 +1,110 @@
+"""Deciding when to check the data version in the repository, so that not every request has to.
+
+Every write bumps the version in the same transaction, so reading it is enough to tell whether a calendar loaded
+earlier is out of date. A `VersionChecker` only lets that read happen every `interval` seconds, or sooner when another
+process on the same host announces a newer version in a `VersionFile`.
+"""
+
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from typing import Callable, Final
+
+DEFAULT_VERSION_CHECK_INTERVAL_SECONDS: Final[float] = 0.0  # Check on every request
+
+
+class VersionFile:
+    """A small file holding the latest data version, which processes on the same host use to tell each other of writes.
+
+    Reading it only takes a `stat` unless it changed since the last read.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self._path = pathlib.Path(path)
+        self._last_stat: tuple[int, int] | None = None  # Inode and modification time of the last read
+        self._last_version: int | None = None
+
+    def publish(self, version: int) -> None:
+        """Announce a version, replacing the file in a single step so readers never see a partial one.
+
+        Versions that are not newer than the announced one are left out, e.g. from a process whose calendar is older.
+        Two processes publishing at once may still both replace the file, which at worst delays a check until the
+        interval is up.
+        """
+        announced_version = self.read()
+        if announced_version is not None and version <= announced_version:
+            return
+        try:
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self._path.parent, prefix=self._path.name, suffix=".tmp", delete=False
+            ) as file:
+                file.write(str(version))
+            os.replace(file.name, self._path)
+        except OSError as err:
+            logging.warning(f"Failed to publish version {version} to {self._path}: {err}")
+
+    def read(self) -> int | None:
+        """Get the latest announced version, or None if there is none."""
+        try:
+            stat = self._path.stat()
+            if (stat.st_ino, stat.st_mtime_ns) != self._last_stat:
+                self._last_version = int(self._path.read_text())
+                self._last_stat = (stat.st_ino, stat.st_mtime_ns)
+        except (OSError, ValueError):
+            return None
+        return self._last_version
+
+
+class VersionChecker:
+    """Tells readers when to check the data version in the repository: at most every `interval` seconds, unless the
+    version file announces a newer version than the one they have.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_VERSION_CHECK_INTERVAL_SECONDS,
+        version_file: VersionFile | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.interval = interval
+        self.version_file = version_file
+        self._clock = clock
+        self._last_check_time: float | None = None
+        self._lock = threading.Lock()
+        self.num_checks = 0
+        self.num_skipped = 0
+
+    def __repr__(self) -> str:
+        return f"VersionChecker(interval={self.interval}, version_file={self.version_file is not None})"
+
+    def is_check_due(self, known_version: int) -> bool:
+        """Whether a reader holding `known_version` should read the version from the repository now."""
+        with self._lock:
+            is_due = self._last_check_time is None or self._clock() - self._last_check_time >= self.interval
+            if not is_due and self.version_file is not None:
+                announced_version = self.version_file.read()
+                is_due = announced_version is not None and announced_version > known_version
+            if is_due:
+                self.num_checks += 1
+            else:
+                self.num_skipped += 1
+            return is_due
+
+    def checked(self) -> None:
+        """Record that the version was just read from the repository."""
+        with self._lock:
+            self._last_check_time = self._clock()
+
+    def get_announced_version(self) -> int | None:
+        """Get the latest version announced by any process on the same host, if there is a version file."""
+        return self.version_file.read() if self.version_file is not None else None
+
+    def notify(self, version: int) -> None:
+        """Tell other processes on the same host about a write, if there is a version file and `version` is newer
+        than the one announced.
+        """
+        if self.version_file is not None:
+            self.version_file.publish(version)
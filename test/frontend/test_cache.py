@@ -0,0 +1,59 @@
+"""Test the cache of rendered page fragments."""
+
+from schedules.frontend.cache import FragmentCache
+
+
+class TestFragmentCache:
+    def test_miss_then_hit(self):
+        cache = FragmentCache(max_bytes=1000)
+        assert cache.get(("trips_table", 1)) is None
+        cache.put(("trips_table", 1), "<table></table>")
+        assert cache.get(("trips_table", 1)) == "<table></table>"
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_get_or_render_only_renders_once(self):
+        cache = FragmentCache(max_bytes=1000)
+        renders = []
+
+        def render() -> str:
+            renders.append(1)
+            return "<table></table>"
+
+        for _ in range(3):
+            assert cache.get_or_render(("trips_table", 1), render) == "<table></table>"
+        assert len(renders) == 1
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    def test_new_version_is_a_miss(self):
+        cache = FragmentCache(max_bytes=1000)
+        cache.put(("trips_table", 1), "old")
+        assert cache.get(("trips_table", 2)) is None
+
+    def test_evicts_least_recently_used_by_size(self):
+        cache = FragmentCache(max_bytes=10)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", "cccc")
+        assert cache.get("b") is None
+        assert cache.get("a") == "aaaa"
+        assert cache.get("c") == "cccc"
+        assert cache.total_bytes == 8
+
+    def test_size_counts_bytes_not_characters(self):
+        cache = FragmentCache(max_bytes=10)
+        cache.put("a", "zürich")  # 7 bytes in utf-8
+        assert cache.total_bytes == 7
+
+    def test_does_not_cache_fragment_larger_than_cache(self):
+        cache = FragmentCache(max_bytes=3)
+        cache.put("a", "aaaa")
+        assert len(cache) == 0
+        assert cache.total_bytes == 0
+
+    def test_replace_entry(self):
+        cache = FragmentCache(max_bytes=10)
+        cache.put("a", "aaaa")
+        cache.put("a", "aa")
+        assert cache.get("a") == "aa"
+        assert cache.total_bytes == 2
@@ -0,0 +1,209 @@
+"""Test coalescing of concurrent identical computations."""
+
+import asyncio
+import datetime as dt
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import event
+
+from schedules.frontend import create_app
+from schedules.frontend.coalescing import AsyncSingleFlight, SingleFlight
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.storage import CalendarRepository
+
+NUM_CONCURRENT_REQUESTS = 16
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_computation(self):
+        single_flight: SingleFlight[int] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        num_computed = 0
+
+        def compute() -> int:
+            nonlocal num_computed
+            num_computed += 1
+            started.set()
+            release.wait()
+            return 42
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(single_flight.do, "key", compute)
+            started.wait()
+            followers = [executor.submit(single_flight.do, "key", compute) for _ in range(3)]
+            while single_flight.num_shared < 3:
+                time.sleep(0.001)
+            release.set()
+            results = [leader.result()] + [follower.result() for follower in followers]
+
+        assert results == [42, 42, 42, 42]
+        assert num_computed == 1
+
+    def test_sequential_calls_compute_again(self):
+        single_flight: SingleFlight[int] = SingleFlight()
+        assert single_flight.do("key", lambda: 1) == 1
+        assert single_flight.do("key", lambda: 2) == 2
+        assert single_flight.num_computed == 2
+
+    def test_error_is_shared_and_forgotten(self):
+        single_flight: SingleFlight[int] = SingleFlight()
+
+        def fail() -> int:
+            raise ValueError("failed")
+
+        with pytest.raises(ValueError):
+            single_flight.do("key", fail)
+        assert single_flight.do("key", lambda: 1) == 1
+
+
+class TestCoalescedPageLoads:
+    """Load test: many people opening the page at the same time."""
+
+    @pytest.fixture(autouse=True)
+    def set_up(self, tmp_path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setenv("FLASK_KEY", "testkey")
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+        self.app = create_app()
+        with self.app.database_session_maker() as session:
+            repository = CalendarRepository(session)
+            for i in range(20):
+                person = Person(
+                    unique_id=StrID(f"person-{i}"),
+                    last_name=StrID(f"lastname-{i}"),
+                    first_name=StrID("firstname"),
+                    home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+                )
+                repository.add_person(person)
+                repository.add_trip(
+                    person,
+                    Trip(
+                        unique_id=StrID(f"trip-{i}"),
+                        location=Location(Country.SWITZERLAND, StrID("zurich")),
+                        start_date=dt.date(2025, 1, 1),
+                        end_date=dt.date(2025, 1, 5),
+                    ),
+                )
+
+        # Make loading slow, like a remote database, so that the requests overlap
+        load_from_repository = FullCalendar.load_from_repository
+        self.num_loads = 0
+
+        def slow_load_from_repository(calendar: FullCalendar) -> None:
+            self.num_loads += 1
+            time.sleep(0.2)
+            load_from_repository(calendar)
+
+        monkeypatch.setattr(FullCalendar, "load_from_repository", slow_load_from_repository)
+
+        self.num_queries = 0
+
+        @event.listens_for(self.app.database_read_engine, "before_cursor_execute")
+        def count_query(*args) -> None:
+            self.num_queries += 1
+
+    def get_page(self) -> int:
+        with self.app.test_client() as client:
+            return client.get("/").status_code
+
+    def test_concurrent_page_loads_query_database_once(self):
+        # A single request, to know how many queries a request that loads the calendar makes
+        assert self.get_page() == 200
+        queries_per_request = self.num_queries
+
+        # Someone else, e.g. another worker, changes the data, so the next requests need to load it again
+        with self.app.database_session_maker() as session:
+            repository = CalendarRepository(session)
+            person = repository.get_all_people()[0]
+            repository.add_trip(
+                person,
+                Trip(
+                    unique_id=StrID("new-trip"),
+                    location=Location(Country.ICELAND, StrID("reykjavik")),
+                    start_date=dt.date(2025, 2, 1),
+                    end_date=dt.date(2025, 2, 5),
+                ),
+            )
+        self.num_queries = 0
+        self.num_loads = 0
+
+        with ThreadPoolExecutor(max_workers=NUM_CONCURRENT_REQUESTS) as executor:
+            status_codes = list(executor.map(lambda _: self.get_page(), range(NUM_CONCURRENT_REQUESTS)))
+
+        assert status_codes == [200] * NUM_CONCURRENT_REQUESTS
+        assert self.num_loads == 1
+        # Every request reads the version, only one loads the calendar
+        assert self.num_queries == NUM_CONCURRENT_REQUESTS + queries_per_request - 1
+        assert self.num_queries < NUM_CONCURRENT_REQUESTS * queries_per_request
+
+    def test_unchanged_data_is_not_loaded_again(self):
+        assert self.get_page() == 200
+        self.num_queries = 0
+        self.num_loads = 0
+
+        with ThreadPoolExecutor(max_workers=NUM_CONCURRENT_REQUESTS) as executor:
+            list(executor.map(lambda _: self.get_page(), range(NUM_CONCURRENT_REQUESTS)))
+
+        assert self.num_loads == 0
+        assert self.num_queries == NUM_CONCURRENT_REQUESTS  # Only the version reads
+
+
+class TestAsyncSingleFlight:
+    def test_concurrent_calls_share_one_computation(self):
+        single_flight: AsyncSingleFlight[int] = AsyncSingleFlight()
+        num_computed = 0
+
+        async def compute() -> int:
+            nonlocal num_computed
+            num_computed += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        async def run() -> list[int]:
+            return await asyncio.gather(*(single_flight.do("key", compute) for _ in range(4)))
+
+        assert asyncio.run(run()) == [42, 42, 42, 42]
+        assert num_computed == 1
+
+    def test_error_is_shared_and_forgotten(self):
+        single_flight: AsyncSingleFlight[int] = AsyncSingleFlight()
+
+        async def fail() -> int:
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        async def succeed() -> int:
+            return 1
+
+        async def run() -> list[int | BaseException]:
+            results = await asyncio.gather(*(single_flight.do("key", fail) for _ in range(2)), return_exceptions=True)
+            return results + [await single_flight.do("key", succeed)]
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results[:2])
+        assert results[2] == 1
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        single_flight: AsyncSingleFlight[int] = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def compute() -> int:
+            await release.wait()
+            return 42
+
+        async def run() -> int:
+            leader = asyncio.create_task(single_flight.do("key", compute))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(single_flight.do("key", compute))
+            await asyncio.sleep(0)
+            leader.cancel()  # E.g. its client disconnected
+            await asyncio.sleep(0)
+            release.set()
+            return await follower
+
+        assert asyncio.run(run()) == 42
+        assert (single_flight.num_computed, single_flight.num_shared) == (1, 1)
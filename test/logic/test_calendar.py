@@ -1,14 +1,24 @@
+import contextlib
+import dataclasses
 import datetime as dt
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from uuid import uuid4
 
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 
 from schedules.logic import objects
-from schedules.logic.calendar import FullCalendar, SinglePersonCalendar
+from schedules.logic.calendar import CalendarSnapshot, CalendarState, FullCalendar, SinglePersonCalendar
 from schedules.logic.errors import CalendarError
-from schedules.logic.objects import Country, DayLocation, Location, Person, StrID, Trip
+from schedules.logic.objects import Country, DayLocation, Location, Person, RecurringTrip, StrID, Trip
 from schedules.logic.requests import REQUEST_TYPE_ID, RequestType
+from schedules.logic.storage import Base, CalendarRepository
 
 
 def sample_home_location() -> Location:
@@ -146,6 +156,85 @@ class TestSinglePersonCalendar:
         self.calendar.add_trip(trip_2)
         assert self.calendar.trip_list == [trip_1, trip_2]
 
+    def test_raises_if_containing_existing_trip(self):
+        trip_1 = Trip(
+            StrID(str(uuid4())),
+            Location(Country.SWITZERLAND, StrID("Zurich")),
+            dt.date(2024, 6, 23),
+            dt.date(2024, 6, 24),
+        )
+        trip_2 = Trip(
+            StrID(str(uuid4())),
+            Location(Country.UNITED_KINGDOM, StrID("London")),
+            dt.date(2024, 6, 22),
+            dt.date(2024, 6, 25),
+        )
+        self.calendar.add_trip(trip_1)
+        with pytest.raises(CalendarError):
+            self.calendar.add_trip(trip_2)
+
+    def test_raises_if_same_id(self):
+        trip_1 = Trip(
+            StrID("trip"), Location(Country.SWITZERLAND, StrID("Zurich")), dt.date(2024, 6, 23), dt.date(2024, 6, 24)
+        )
+        trip_2 = Trip(
+            StrID("trip"), Location(Country.SWITZERLAND, StrID("Zurich")), dt.date(2024, 7, 23), dt.date(2024, 7, 24)
+        )
+        self.calendar.add_trip(trip_1)
+        with pytest.raises(CalendarError):
+            self.calendar.add_trip(trip_2)
+
+    def test_remove_trip(self):
+        trips = [
+            Trip(
+                StrID(f"trip-{day}"),
+                Location(Country.SWITZERLAND, StrID("Zurich")),
+                dt.date(2024, 6, day),
+                dt.date(2024, 6, day + 1),
+            )
+            for day in (25, 21, 23)
+        ]
+        for trip in trips:
+            self.calendar.add_trip(trip)
+        assert self.calendar.remove_trip(StrID("trip-23")) == trips[2]
+        assert self.calendar.trip_list == [trips[1], trips[0]]
+        with pytest.raises(CalendarError):
+            self.calendar.remove_trip(StrID("trip-23"))
+
+        # The freed dates can be used again
+        self.calendar.add_trip(trips[2])
+        assert self.calendar.trip_list == [trips[1], trips[2], trips[0]]
+
+    def test_same_checks_as_comparing_every_pair(self):
+        """Checking with the sorted trips accepts exactly the trips that comparing with every existing trip accepts."""
+
+        def is_valid(candidate: Trip, existing_trips: list[Trip]) -> bool:
+            return not any(
+                candidate.start_date == existing.start_date
+                or candidate.end_date == existing.end_date
+                or candidate.start_date < existing.start_date < candidate.end_date
+                or candidate.start_date < existing.end_date < candidate.end_date
+                for existing in existing_trips
+            )
+
+        rng = random.Random(0)
+        added: list[Trip] = []
+        for trip_idx in range(500):
+            start_date = dt.date(2024, 1, 1) + dt.timedelta(days=rng.randrange(100))
+            end_date = start_date + dt.timedelta(days=rng.randrange(1, 20))
+            candidate = Trip(
+                StrID(f"trip-{trip_idx}"), Location(Country.SWITZERLAND, StrID("Zurich")), start_date, end_date
+            )
+            if is_valid(candidate, added):
+                self.calendar.add_trip(candidate)
+                added.append(candidate)
+            else:
+                with pytest.raises(CalendarError):
+                    self.calendar.add_trip(candidate)
+            if added and rng.random() < 0.2:
+                self.calendar.remove_trip(added.pop(rng.randrange(len(added))).unique_id)
+        assert self.calendar.trip_list == sorted(added, key=lambda trip: trip.start_date)
+
 
 class TestDailyCalendar:
 
@@ -277,6 +366,203 @@ class TestDailyCalendar:
         assert daily_calendar_actual == daily_calendar_expected
 
 
+def sample_commute(until_date: dt.date = dt.date(2025, 3, 31), every_weeks: int = 1) -> RecurringTrip:
+    """Monday to Friday in Zurich, from the first week of 2025."""
+    return RecurringTrip(
+        StrID("commute"),
+        Location(Country.SWITZERLAND, StrID("Zurich")),
+        dt.date(2025, 1, 6),
+        dt.date(2025, 1, 10),
+        until_date=until_date,
+        every_weeks=every_weeks,
+    )
+
+
+class TestRecurringTrips:
+
+    @pytest.fixture(autouse=True)
+    def set_up(self):
+        self.calendar = SinglePersonCalendar(sample_person())
+
+    def trip(self, unique_id: str, start_date: dt.date, end_date: dt.date) -> Trip:
+        return Trip(StrID(unique_id), Location(Country.AUSTRIA, StrID("Vienna")), start_date, end_date)
+
+    def test_same_as_adding_every_occurrence(self):
+        self.calendar.add_trip(sample_commute())
+        self.calendar.add_trip(self.trip("weekend", dt.date(2025, 2, 1), dt.date(2025, 2, 2)))
+        expanded_calendar = SinglePersonCalendar(sample_person())
+        for trip in [*self.calendar.trip_list, *sample_commute().get_occurrences(dt.date.min, dt.date.max)]:
+            expanded_calendar.add_trip(trip)
+
+        assert len(expanded_calendar.trip_list) == 13 + 1
+        for start_date, end_date in [
+            (dt.date(2024, 12, 1), dt.date(2025, 5, 1)),
+            (dt.date(2025, 1, 8), dt.date(2025, 1, 8)),
+            (dt.date(2025, 2, 2), dt.date(2025, 2, 12)),
+            (dt.date(2025, 4, 1), dt.date(2025, 4, 30)),
+        ]:
+            daily_calendar = self.calendar.get_daily_calendar(start_date, end_date)
+            assert daily_calendar == expanded_calendar.get_daily_calendar(start_date, end_date)
+        assert self.calendar.get_segments() == expanded_calendar.get_segments()
+
+    def test_raises_if_trip_touches_occurrence(self):
+        self.calendar.add_trip(sample_commute())
+
+        # Leaving on the day of the last occurrence
+        with pytest.raises(CalendarError):
+            self.calendar.add_trip(self.trip("trip", dt.date(2025, 3, 7), dt.date(2025, 3, 8)))
+        # The weekend after it is fine, as is any later day
+        self.calendar.add_trip(self.trip("trip-1", dt.date(2025, 3, 8), dt.date(2025, 3, 9)))
+        self.calendar.add_trip(self.trip("trip-2", dt.date(2025, 4, 7), dt.date(2025, 4, 8)))
+
+    def test_raises_if_occurrence_touches_trip(self):
+        """Also if the trip contains the occurrence, and starts before a shorter trip that doesn't."""
+        self.calendar.add_trip(self.trip("long", dt.date(2025, 1, 1), dt.date(2025, 6, 1)))
+        self.calendar.add_trip(self.trip("short", dt.date(2025, 5, 1), dt.date(2025, 5, 3)))
+
+        with pytest.raises(CalendarError):
+            self.calendar.add_trip(sample_commute(until_date=dt.date(2025, 1, 6)))
+        assert not self.calendar.recurring_trips
+
+    def test_recurring_trips_on_alternate_weeks(self):
+        self.calendar.add_trip(sample_commute(until_date=dt.date(2100, 1, 1), every_weeks=2))
+        other_weeks = RecurringTrip(
+            StrID("other-weeks"),
+            Location(Country.SWITZERLAND, StrID("Bern")),
+            dt.date(2025, 1, 13),
+            dt.date(2025, 1, 17),
+            until_date=dt.date(2100, 1, 1),
+            every_weeks=2,
+        )
+        self.calendar.add_trip(other_weeks)
+
+        with pytest.raises(CalendarError):
+            every_three_weeks = dataclasses.replace(other_weeks, unique_id=StrID("every-three-weeks"), every_weeks=3)
+            self.calendar.add_trip(every_three_weeks)
+
+        daily_calendar = self.calendar.get_daily_calendar(dt.date(2099, 12, 21), dt.date(2099, 12, 21))
+        assert daily_calendar[dt.date(2099, 12, 21)].end.city in ("zurich", "bern")
+
+    def test_remove_recurring_trip(self):
+        self.calendar.add_trip(sample_commute())
+        assert self.calendar.remove_trip(StrID("commute")) == sample_commute()
+        assert not self.calendar.recurring_trips
+        self.calendar.add_trip(self.trip("trip", dt.date(2025, 1, 7), dt.date(2025, 1, 8)))
+
+    def test_same_checks_and_days_as_every_occurrence(self):
+        """Random recurring trips are accepted exactly if no occurrence shares a day with another trip, and the daily
+        calendar is the same as with every occurrence added as a trip.
+        """
+        rng = random.Random(0)
+        for trip_idx in range(10):
+            start_date = dt.date(2024, 1, 1) + dt.timedelta(days=rng.randrange(300))
+            trip = Trip(
+                StrID(f"trip-{trip_idx}"),
+                Location(Country.AUSTRIA, StrID(f"city-{trip_idx}")),
+                start_date,
+                start_date + dt.timedelta(days=rng.randrange(1, 10)),
+            )
+            with contextlib.suppress(CalendarError):
+                self.calendar.add_trip(trip)
+
+        occurrences: list[Trip] = []
+        for recurring_idx in range(30):
+            start_date = dt.date(2024, 1, 1) + dt.timedelta(days=rng.randrange(300))
+            every_weeks = rng.randrange(1, 4)
+            candidate = RecurringTrip(
+                StrID(f"recurring-{recurring_idx}"),
+                Location(Country.SWITZERLAND, StrID(f"city-{recurring_idx}")),
+                start_date,
+                start_date + dt.timedelta(days=rng.randrange(1, 3)),
+                until_date=start_date + dt.timedelta(days=rng.randrange(60)),
+                every_weeks=every_weeks,
+            )
+            candidate_occurrences = candidate.get_occurrences(dt.date.min, dt.date.max)
+            is_valid = not any(
+                occurrence.start_date <= existing.end_date and existing.start_date <= occurrence.end_date
+                for occurrence in candidate_occurrences
+                for existing in [*self.calendar.trip_list, *occurrences]
+            )
+            if is_valid:
+                self.calendar.add_trip(candidate)
+                occurrences += candidate_occurrences
+            else:
+                with pytest.raises(CalendarError):
+                    self.calendar.add_trip(candidate)
+        assert len(self.calendar.recurring_trips) == 8
+
+        expanded_calendar = SinglePersonCalendar(sample_person())
+        for trip in [*self.calendar.trip_list, *occurrences]:
+            expanded_calendar.add_trip(trip)
+        for _ in range(20):
+            start_date = dt.date(2024, 1, 1) + dt.timedelta(days=rng.randrange(400))
+            end_date = start_date + dt.timedelta(days=rng.randrange(30))
+            daily_calendar = self.calendar.get_daily_calendar(start_date, end_date)
+            assert daily_calendar == expanded_calendar.get_daily_calendar(start_date, end_date)
+
+
+class TestLocationOn:
+
+    @pytest.fixture(autouse=True)
+    def set_up(self):
+        self.calendar = SinglePersonCalendar(sample_person())
+
+    def trip(self, unique_id: str, start_date: dt.date, end_date: dt.date, city: str = "Vienna") -> Trip:
+        return Trip(StrID(unique_id), Location(Country.AUSTRIA, StrID(city)), start_date, end_date)
+
+    def test_no_trips(self):
+        home = DayLocation(start=sample_home_location(), end=sample_home_location())
+        assert self.calendar.location_on(dt.date(2025, 1, 1)) == home
+        assert self.calendar.locations_on([dt.date.min, dt.date.max]) == [home, home]
+
+    def test_same_as_daily_calendar(self):
+        self.calendar.add_trip(sample_commute())
+        for trip in [
+            self.trip("long", dt.date(2024, 12, 20), dt.date(2025, 1, 5)),
+            self.trip("nested", dt.date(2024, 12, 24), dt.date(2024, 12, 26), city="Graz"),
+            self.trip("weekend", dt.date(2025, 2, 1), dt.date(2025, 2, 2)),
+            self.trip("connected", dt.date(2025, 4, 12), dt.date(2025, 4, 15)),
+            self.trip("onward", dt.date(2025, 4, 15), dt.date(2025, 4, 19), city="Graz"),
+        ]:
+            self.calendar.add_trip(trip)
+
+        start_date, end_date = dt.date(2024, 12, 1), dt.date(2025, 5, 1)
+        daily_calendar = self.calendar.get_daily_calendar(start_date, end_date)
+        for day, day_location in daily_calendar.items():
+            assert self.calendar.location_on(day) == day_location
+        assert self.calendar.locations_on(reversed(daily_calendar)) == list(reversed(daily_calendar.values()))
+
+    def test_locations_on_unsorted_dates_with_duplicates(self):
+        self.calendar.add_trip(sample_commute(every_weeks=2))
+        for trip in [
+            self.trip("long", dt.date(2024, 12, 20), dt.date(2025, 1, 5)),
+            self.trip("nested", dt.date(2024, 12, 24), dt.date(2024, 12, 26), city="Graz"),
+            self.trip("connected", dt.date(2025, 4, 12), dt.date(2025, 4, 15)),
+            self.trip("onward", dt.date(2025, 4, 15), dt.date(2025, 4, 19), city="Graz"),
+        ]:
+            self.calendar.add_trip(trip)
+
+        daily_calendar = self.calendar.get_daily_calendar(dt.date(2024, 12, 1), dt.date(2025, 5, 1))
+        rng = random.Random(0)
+        days = rng.choices(list(daily_calendar), k=300)  # In random order, with many days more than once
+        assert self.calendar.locations_on(days) == [daily_calendar[day] for day in days]
+        assert self.calendar.locations_on([]) == []
+
+    def test_follows_trip_changes(self):
+        day = dt.date(2025, 1, 2)
+        self.calendar.add_trip(self.trip("trip", dt.date(2025, 1, 1), dt.date(2025, 1, 5)))
+        assert self.calendar.location_on(day).end.city == "vienna"
+
+        # A copy's changes don't affect the original
+        calendar_copy = self.calendar.copy()
+        calendar_copy.add_trip(self.trip("nested", day, day + dt.timedelta(days=1), city="Graz"))
+        assert calendar_copy.location_on(day).end.city == "graz"
+        assert self.calendar.location_on(day).end.city == "vienna"
+
+        self.calendar.remove_trip(StrID("trip"))
+        assert self.calendar.location_on(day).end == sample_home_location()
+
+
 class TestFullCalendar:
     @pytest.fixture(autouse=True)
     def set_up(self):
@@ -362,6 +648,47 @@ class TestFullCalendar:
         assert trip.start_date == dt.date(2025, 11, 25)
         assert trip.end_date == dt.date(2025, 11, 28)
 
+    def test_add_recurring_trip(self):
+        self.calendar.process_frontend_request(self.add_person_request)
+        person = list(self.calendar.calendars.keys())[0]
+
+        add_trip_request = {
+            "request_type": "ADD_TRIP",
+            "person_id": str(person.unique_id),
+            "country": "SWITZERLAND",
+            "city": "Zurich",
+            "start_date": "2025-01-06",
+            "end_date": "2025-01-10",
+            "until_date": "2025-03-31",
+            "every_weeks": "2",
+        }
+        response = self.calendar.process_frontend_request(add_trip_request)
+
+        assert response.code == 200
+        assert self.calendar.calendars[person].trip_list == []
+        [(_, trip)] = self.calendar.get_trips_to_display()
+        assert isinstance(trip, RecurringTrip)
+        assert (trip.until_date, trip.every_weeks) == (dt.date(2025, 3, 31), 2)
+        assert trip.recurrence_display_frontend == "Every 2 weeks until 2025-03-31"
+
+    def test_add_recurring_trip_out_of_range(self):
+        self.calendar.process_frontend_request(self.add_person_request)
+        person = list(self.calendar.calendars.keys())[0]
+        add_trip_request = {
+            "request_type": "ADD_TRIP",
+            "person_id": str(person.unique_id),
+            "country": "SWITZERLAND",
+            "city": "Zurich",
+            "start_date": "2025-01-06",
+            "end_date": "2025-01-10",
+            "until_date": "2025-03-31",
+        }
+        for every_weeks in ("70000", "0", "two"):
+            response = self.calendar.process_frontend_request({**add_trip_request, "every_weeks": every_weeks})
+            assert response.code == 400
+            assert "Failed to add trip" in response.message
+        assert self.calendar.get_trips_to_display() == []
+
     def test_remove_trip(self):
         # Add person and trip
         self.calendar.process_frontend_request(self.add_person_request)
@@ -509,3 +836,277 @@ class TestFullCalendar:
         assert not self.calendar.is_everyone_together(dt.date(2025, 12, 1))
         assert self.calendar.is_everyone_together(dt.date(2025, 12, 2))
         assert not self.calendar.is_everyone_together(dt.date(2025, 12, 3))
+
+
+class TestFullCalendarVersion:
+    @pytest.fixture(autouse=True)
+    def set_up(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+        Base.metadata.create_all(engine)
+        self.session_maker = sessionmaker(bind=engine)
+        self.add_person_request: dict[str, Any] = {
+            REQUEST_TYPE_ID: RequestType.ADD_PERSON,
+            "last_name": "lastname",
+            "first_name": "firstname",
+            "country": objects.Country.NETHERLANDS.name,
+            "city": "Amsterdam",
+        }
+
+    def test_version_without_repository(self):
+        calendar = FullCalendar()
+        assert calendar.version == 0
+        calendar.process_frontend_request(self.add_person_request)
+        assert calendar.version == 1
+
+    def test_failed_request_does_not_change_version(self):
+        calendar = FullCalendar()
+        calendar.process_frontend_request(self.add_person_request)
+        calendar.process_frontend_request(self.add_person_request)  # Duplicate, fails
+        assert calendar.version == 1
+
+    def test_version_follows_repository(self):
+        with self.session_maker() as session:
+            calendar = FullCalendar(database_repository=CalendarRepository(session))
+            calendar.load_from_repository()
+            calendar.process_frontend_request(self.add_person_request)
+            assert calendar.version == 1
+
+        with self.session_maker() as session:
+            calendar = FullCalendar(database_repository=CalendarRepository(session))
+            calendar.load_from_repository()
+            assert calendar.version == 1
+
+    def test_reloads_if_other_writer_got_in_between(self):
+        with self.session_maker() as session_1, self.session_maker() as session_2:
+            calendar_1 = FullCalendar(database_repository=CalendarRepository(session_1))
+            calendar_2 = FullCalendar(database_repository=CalendarRepository(session_2))
+            calendar_1.load_from_repository()
+            calendar_2.load_from_repository()
+
+            calendar_1.process_frontend_request(self.add_person_request)
+            calendar_2.process_frontend_request({**self.add_person_request, "last_name": "familyname"})
+
+            assert calendar_2.version == 2
+            assert len(calendar_2.calendars) == 2
+
+
+class TestFullCalendarConcurrency:
+    """Stress test: full calendars sharing one state, with concurrent readers and writers."""
+
+    NUM_WRITERS = 4
+    NUM_READERS = 8
+    NUM_PEOPLE_PER_WRITER = 25
+
+    def check_invariants(self, snapshot: CalendarSnapshot) -> None:
+        assert len(snapshot.calendars) == len(snapshot.id_to_person) == len(snapshot.people_sorted_by_name)
+        assert list(snapshot.people_sorted_by_name) == sorted(
+            snapshot.calendars.keys(), key=lambda person: (person.last_name, person.first_name)
+        )
+        for person in snapshot.people_sorted_by_name:
+            assert snapshot.id_to_person[str(person.unique_id)] is person
+            trip_list = snapshot.calendars[person].trip_list
+            assert trip_list == sorted(trip_list, key=lambda trip: (trip.start_date, trip.end_date))
+        assert len(snapshot.get_trips_to_display()) == sum(
+            len(calendar.trip_list) for calendar in snapshot.calendars.values()
+        )
+
+    def test_concurrent_readers_and_writers(self):
+        state = CalendarState()
+        writers_done = threading.Event()
+        num_reads: list[int] = []
+
+        def write(writer_idx: int) -> None:
+            calendar = FullCalendar(state=state)
+            for person_idx in range(self.NUM_PEOPLE_PER_WRITER):
+                person = Person(
+                    unique_id=StrID(f"person-{writer_idx}-{person_idx}"),
+                    last_name=StrID(f"lastname-{person_idx}"),
+                    first_name=StrID(f"firstname-{writer_idx}"),
+                    home=sample_home_location(),
+                )
+                calendar._add_person(person)
+                for month in range(1, 4):
+                    trip = Trip(
+                        StrID(str(uuid4())),
+                        Location(Country.SWITZERLAND, StrID("Zurich")),
+                        dt.date(2025, month, 1),
+                        dt.date(2025, month, 5),
+                    )
+                    calendar._add_trip(person, trip)
+                if person_idx % 2:
+                    calendar._remove_trip(person.unique_id, trip.unique_id)
+                if person_idx % 5 == 0:
+                    calendar._remove_person(person)
+
+        def read() -> None:
+            calendar = FullCalendar(state=state)
+            calendar.set_daily_calendars_dates(dt.date(2025, 1, 1), dt.date(2025, 1, 7))
+            last_version = -1
+            reads = 0
+            while not writers_done.is_set():
+                snapshot = calendar.snapshot
+                assert snapshot.version >= last_version
+                last_version = snapshot.version
+                self.check_invariants(snapshot)
+                daily_calendars = snapshot.get_daily_calendars(dt.date(2025, 1, 1), dt.date(2025, 1, 7))
+                assert all(len(people_days) == len(snapshot.calendars) for people_days in daily_calendars.values())
+                reads += 1
+            num_reads.append(reads)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.NUM_WRITERS + self.NUM_READERS) as executor:
+            readers = [executor.submit(read) for _ in range(self.NUM_READERS)]
+            writers = [executor.submit(write, writer_idx) for writer_idx in range(self.NUM_WRITERS)]
+            for writer in writers:
+                writer.result()
+            writers_done.set()
+            for reader in readers:
+                reader.result()
+        duration = time.perf_counter() - start_time
+
+        people_indices = range(self.NUM_PEOPLE_PER_WRITER)
+        num_removed_people = len([idx for idx in people_indices if idx % 5 == 0])
+        num_removed_trips = len([idx for idx in people_indices if idx % 2])
+        num_writes = self.NUM_WRITERS * (len(people_indices) * 4 + num_removed_trips + num_removed_people)
+        assert state.snapshot.version == num_writes
+        assert len(state.snapshot.calendars) == self.NUM_WRITERS * (len(people_indices) - num_removed_people)
+        self.check_invariants(state.snapshot)
+        assert all(reads > 0 for reads in num_reads)  # No reader was blocked for the whole run
+        logging.info("%s writes/s, %s reads/s", round(num_writes / duration), round(sum(num_reads) / duration))
+
+    def test_snapshot_does_not_change(self):
+        calendar = FullCalendar()
+        calendar._add_person(sample_person())
+        snapshot = calendar.snapshot
+        trip = Trip(
+            StrID(str(uuid4())),
+            Location(Country.SWITZERLAND, StrID("Zurich")),
+            dt.date(2025, 1, 1),
+            dt.date(2025, 1, 5),
+        )
+        calendar._add_trip(sample_person(), trip)
+
+        assert snapshot.calendars[sample_person()].trip_list == []
+        assert calendar.snapshot.calendars[sample_person()].trip_list == [trip]
+        assert calendar.snapshot.version == snapshot.version + 1
+
+    def test_failed_write_does_not_change_snapshot(self):
+        calendar = FullCalendar()
+        calendar._add_person(sample_person())
+        snapshot = calendar.snapshot
+        with pytest.raises(CalendarError):
+            calendar._add_person(sample_person())
+        assert calendar.snapshot is snapshot
+
+
+class TestFullCalendarBatch:
+    @pytest.fixture(autouse=True)
+    def set_up(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+        Base.metadata.create_all(engine)
+        self.session_maker = sessionmaker(bind=engine)
+        self.add_person_request: dict[str, Any] = {
+            REQUEST_TYPE_ID: RequestType.ADD_PERSON,
+            "last_name": "lastname",
+            "first_name": "firstname",
+            "country": objects.Country.NETHERLANDS.name,
+            "city": "Amsterdam",
+            "alias": "new",
+        }
+
+    def add_trip_request(self, start_date: str, end_date: str) -> dict[str, Any]:
+        return {
+            REQUEST_TYPE_ID: RequestType.ADD_TRIP,
+            "person_alias": "new",
+            "country": "SWITZERLAND",
+            "city": "Zurich",
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+
+    def test_later_requests_refer_to_new_person_by_alias(self):
+        calendar = FullCalendar()
+        batch_response = calendar.process_frontend_requests([
+            self.add_person_request,
+            self.add_trip_request("2025-01-01", "2025-01-05"),
+            self.add_trip_request("2025-02-01", "2025-02-05"),
+        ])  # fmt: skip
+
+        assert batch_response.code == 200
+        assert batch_response.num_applied == 3
+        person = calendar.snapshot.id_to_person[batch_response.person_ids["new"]]
+        assert [trip.start_date for trip in calendar.calendars[person].trip_list] == [
+            dt.date(2025, 1, 1),
+            dt.date(2025, 2, 1),
+        ]
+
+    def test_atomic_batch_applies_nothing_if_any_request_fails(self):
+        calendar = FullCalendar()
+        batch_response = calendar.process_frontend_requests([
+            self.add_person_request,
+            self.add_trip_request("2025-01-01", "2025-01-05"),
+            self.add_trip_request("2025-01-03", "2025-01-08"),  # Overlaps the first trip
+        ])  # fmt: skip
+
+        assert [response.code for response in batch_response.responses] == [400, 400, 400]
+        assert "Not applied" in batch_response.responses[0].message
+        assert "Failed to add trip" in batch_response.responses[2].message
+        assert batch_response.person_ids == {}
+        assert calendar.version == 0
+        assert calendar.calendars == {}
+
+    def test_best_effort_batch_applies_valid_requests(self):
+        calendar = FullCalendar()
+        batch_response = calendar.process_frontend_requests(
+            [
+                self.add_person_request,
+                {**self.add_trip_request("2025-01-01", "2025-01-05"), "person_alias": "unknown"},
+                self.add_trip_request("2025-01-03", "2025-01-08"),
+            ],
+            atomic=False,
+        )
+
+        assert [response.code for response in batch_response.responses] == [200, 400, 200]
+        assert "No person added with alias unknown" in batch_response.responses[1].message
+        assert batch_response.num_applied == 2
+        assert len(calendar.single_person_calendars[0].trip_list) == 1
+
+    def test_batch_written_in_one_transaction(self):
+        with self.session_maker() as session:
+            calendar = FullCalendar(database_repository=CalendarRepository(session))
+            calendar.load_from_repository()
+            batch_response = calendar.process_frontend_requests([
+                self.add_person_request,
+                self.add_trip_request("2025-01-01", "2025-01-05"),
+                self.add_trip_request("2025-02-01", "2025-02-05"),
+                {**self.add_person_request, "last_name": "familyname", "alias": "other"},
+                {REQUEST_TYPE_ID: RequestType.REMOVE_PERSON, "person_alias": "other"},
+            ])  # fmt: skip
+            assert batch_response.code == 200
+            assert calendar.version == CalendarRepository(session).get_version() == 4  # People and trips added at once
+
+        with self.session_maker() as session:
+            reloaded = FullCalendar(database_repository=CalendarRepository(session))
+            reloaded.load_from_repository()
+        assert reloaded.version == calendar.version
+        assert reloaded.people_sorted_by_name == calendar.people_sorted_by_name
+        assert len(reloaded.single_person_calendars[0].trip_list) == 2
+
+    def test_failed_batch_write_rolls_back(self, monkeypatch):
+        def fail(*_):
+            raise CalendarError(message="Database unavailable.")
+
+        with self.session_maker() as session:
+            repository = CalendarRepository(session)
+            monkeypatch.setattr(repository, "add_trips", fail)
+            calendar = FullCalendar(database_repository=repository)
+            calendar.load_from_repository()
+            batch_response = calendar.process_frontend_requests([
+                self.add_person_request,
+                self.add_trip_request("2025-01-01", "2025-01-05"),
+            ])  # fmt: skip
+
+            assert [response.code for response in batch_response.responses] == [400, 400]
+            assert "Failed to save batch: Database unavailable." in batch_response.responses[0].message
+            assert calendar.version == repository.get_version() == 0
+            assert repository.get_all_people() == []
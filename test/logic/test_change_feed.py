@@ -0,0 +1,156 @@
+"""Test the feed of changes that viewers follow."""
+
+import asyncio
+import datetime as dt
+import json
+import threading
+
+from schedules.logic.calendar import CalendarState, FullCalendar
+from schedules.logic.change_feed import KEEP_ALIVE_EVENT, ChangeFeed, ChangeKind, ChangeStream, iter_change_events
+from schedules.logic.memory_storage import InMemoryRepository
+from schedules.logic.objects import Country, Location, Person, RecurringTrip, StrID, Trip
+
+
+def sample_person(last_name: str = "lastname") -> Person:
+    return Person(
+        unique_id=StrID(f"{last_name}-id"),
+        last_name=StrID(last_name),
+        first_name=StrID("firstname"),
+        home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+    )
+
+
+def sample_trip(trip_id: str, start_day: int, end_day: int) -> Trip:
+    return Trip(
+        unique_id=StrID(trip_id),
+        location=Location(Country.SWITZERLAND, StrID("zurich")),
+        start_date=dt.date(2025, 6, start_day),
+        end_date=dt.date(2025, 6, end_day),
+    )
+
+
+def parse_event(event: str) -> tuple[str, dict]:
+    fields = dict(line.split(": ", 1) for line in event.strip().split("\n"))
+    return fields["event"], json.loads(fields["data"])
+
+
+class TestChangeFeed:
+    def test_calendar_publishes_changes(self):
+        feed = ChangeFeed()
+        subscription = feed.subscribe()
+        calendar = FullCalendar(state=CalendarState(change_feed=feed))
+        person = sample_person()
+        calendar._add_person(person)
+        calendar._add_trip(person, sample_trip("trip", 10, 12))
+        calendar._remove_trip(person.unique_id, StrID("trip"))
+        calendar._remove_person(person)
+
+        changes = [subscription.get(timeout=0) for _ in range(4)]
+        assert [change.kind for change in changes if change] == [
+            ChangeKind.PERSON_ADDED,
+            ChangeKind.TRIP_ADDED,
+            ChangeKind.TRIP_REMOVED,
+            ChangeKind.PERSON_REMOVED,
+        ]
+        assert [change.version for change in changes if change] == [1, 2, 3, 4]
+        assert subscription.get(timeout=0) is None
+
+    def test_reload_published_after_loading(self):
+        feed = ChangeFeed()
+        subscription = feed.subscribe()
+        repository = InMemoryRepository()
+        repository.add_person(sample_person())
+        FullCalendar(database_repository=repository, state=CalendarState(change_feed=feed)).load_from_repository()
+        change = subscription.get(timeout=0)
+        assert change is not None and (change.kind, change.version) == (ChangeKind.RELOAD, 1)
+
+    def test_cells_only_for_changed_dates_between_viewer_dates(self):
+        feed = ChangeFeed()
+        subscription = feed.subscribe()
+        calendar = FullCalendar(state=CalendarState(change_feed=feed))
+        person, other = sample_person(), sample_person("other")
+        for someone in (person, other):
+            calendar._add_person(someone)
+        calendar._add_trip(person, sample_trip("before", 1, 3))
+        calendar._add_trip(person, sample_trip("trip", 10, 12))
+        while subscription.get(timeout=0) is not None:
+            pass
+
+        calendar._add_trip(person, sample_trip("after", 12, 20))  # Starts on the last day of the previous trip
+        stream = ChangeStream(subscription, (dt.date(2025, 6, 11), dt.date(2025, 6, 30)), None, calendar.version)
+        kind, data = parse_event(stream.next_event(subscription.get(timeout=0)))
+        assert (kind, data["person_id"], data["trip_id"]) == ("trip_added", "lastname-id", "after")
+
+        # From the start of the trip before, cut off at the viewer's start date, to the end of the new trip
+        daily_calendars = calendar.snapshot.get_daily_calendars(dt.date(2025, 6, 11), dt.date(2025, 6, 20))
+        assert [cell["date"] for cell in data["cells"]] == [day.isoformat() for day in daily_calendars]
+        assert [cell["end"] for cell in data["cells"]] == [
+            people_days[person].end.display_name_frontend for people_days in daily_calendars.values()
+        ]
+        assert data["together"]["2025-06-11"] is False
+        assert data["together"]["2025-06-20"] is True  # Both end the day at home
+
+    def test_recurring_trip_cells_outside_viewer_dates(self):
+        feed = ChangeFeed()
+        subscription = feed.subscribe()
+        calendar = FullCalendar(state=CalendarState(change_feed=feed))
+        person = sample_person()
+        calendar._add_person(person)
+        commute = RecurringTrip(
+            unique_id=StrID("commute"),
+            location=Location(Country.UNITED_KINGDOM, StrID("london")),
+            start_date=dt.date(2025, 7, 7),
+            end_date=dt.date(2025, 7, 9),
+            until_date=dt.date(2025, 8, 31),
+            every_weeks=1,
+        )
+        calendar._add_trip(person, commute)
+        subscription.get(timeout=0)
+        stream = ChangeStream(subscription, (dt.date(2025, 1, 1), dt.date(2025, 1, 31)), None, 1)
+        _, data = parse_event(stream.next_event(subscription.get(timeout=0)))
+        assert data["cells"] == [] and data["together"] == {}
+
+    def test_slow_subscription_evicted(self):
+        feed = ChangeFeed(max_queued=2)
+        slow, fast = feed.subscribe(), feed.subscribe()
+        calendar = FullCalendar(state=CalendarState(change_feed=feed))
+        for idx in range(3):
+            calendar._add_person(sample_person(f"lastname{idx}"))
+            assert fast.get(timeout=0) is not None
+
+        assert slow.is_evicted and not fast.is_evicted
+        assert slow.get(timeout=0) is None
+        assert (feed.num_subscriptions, feed.num_evicted) == (1, 1)
+
+        stream = ChangeStream(slow, (None, None), None, 3)
+        event, _ = parse_event(stream.next_event(None))
+        assert event == "reload" and stream.is_done
+
+    def test_async_subscription_woken_from_other_thread(self):
+        async def test() -> None:
+            feed = ChangeFeed()
+            subscription = feed.subscribe(asyncio.get_running_loop())
+            assert await subscription.get_async(timeout=0.01) is None
+            calendar = FullCalendar(state=CalendarState(change_feed=feed))
+            threading.Timer(0.01, calendar._add_person, [sample_person()]).start()
+            change = await subscription.get_async(timeout=5)
+            assert change is not None and change.kind == ChangeKind.PERSON_ADDED
+
+        asyncio.run(test())
+
+
+class TestChangeStream:
+    def test_reload_if_page_out_of_date(self):
+        feed = ChangeFeed()
+        stream = ChangeStream(feed.subscribe(), (None, None), known_version=1, version=2)
+        events = list(iter_change_events(stream, keep_alive_seconds=0))
+        assert events[0].startswith("retry: ")
+        assert parse_event(events[1])[0] == "reload"
+        assert feed.num_subscriptions == 0
+
+    def test_keep_alive_until_newer_version_announced(self):
+        announced_versions = iter([None, 1, 2])
+        stream = ChangeStream(ChangeFeed().subscribe(), (None, None), 1, 1, lambda: next(announced_versions))
+        events = list(iter_change_events(stream, keep_alive_seconds=0))
+        assert events[1:3] == [KEEP_ALIVE_EVENT, KEEP_ALIVE_EVENT]
+        assert parse_event(events[3]) == ("reload", {"version": 1})
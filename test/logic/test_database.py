@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from schedules.logic.database import (
+    SQLITE_PRAGMAS,
+    PoolMetrics,
+    PoolSettings,
+    create_database_engine,
+    create_read_only_engine,
+    warm_up_pool,
+)
+
+
+class TestPoolSettings:
+    def test_from_environment_defaults(self):
+        settings = PoolSettings.from_environment(dict())
+
+        assert settings == PoolSettings()
+        assert settings.engine_arguments("sqlite:///database.db") == dict(pool_pre_ping=False)
+
+    def test_from_environment(self):
+        environment = dict(
+            DATABASE_POOL_SIZE="3",
+            DATABASE_MAX_OVERFLOW="0",
+            DATABASE_POOL_TIMEOUT="2.5",
+            DATABASE_POOL_RECYCLE="300",
+            DATABASE_POOL_PRE_PING="true",
+            DATABASE_STATEMENT_CACHE_SIZE="0",
+            DATABASE_WARM_UP_CONNECTIONS="2",
+        )
+
+        settings = PoolSettings.from_environment(environment)
+
+        assert settings == PoolSettings(
+            pool_size=3,
+            max_overflow=0,
+            pool_timeout=2.5,
+            pool_recycle=300,
+            pool_pre_ping=True,
+            statement_cache_size=0,
+            warm_up_connections=2,
+        )
+
+    def test_statement_cache_size_for_asyncpg(self):
+        arguments = PoolSettings(statement_cache_size=0).engine_arguments("postgresql+asyncpg://user@host/database")
+
+        assert arguments["query_cache_size"] == 0
+        assert arguments["connect_args"] == dict(prepared_statement_cache_size=0)
+
+    def test_engine_uses_settings(self, tmp_path):
+        settings = PoolSettings(pool_size=2, max_overflow=1, pool_timeout=1.5, pool_recycle=60, pool_pre_ping=True)
+
+        engine = create_database_engine(f"sqlite:///{tmp_path}/database.db", settings, PoolMetrics())
+
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == 2
+        assert engine.pool._max_overflow == 1
+        assert engine.pool._timeout == 1.5
+        assert engine.pool._recycle == 60
+        assert engine.pool._pre_ping
+
+
+class TestPoolMetrics:
+    def test_records_checkouts(self, tmp_path):
+        metrics = PoolMetrics()
+        engine = create_database_engine(f"sqlite:///{tmp_path}/database.db", metrics=metrics)
+
+        for _ in range(3):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+        assert metrics.num_checkouts == 3
+        assert metrics.num_slow_checkouts == 0
+
+    def test_records_wait_for_free_connection(self, tmp_path):
+        metrics = PoolMetrics()
+        settings = PoolSettings(pool_size=1, max_overflow=0)
+        engine = create_database_engine(f"sqlite:///{tmp_path}/database.db", settings, metrics)
+        connection = engine.connect()
+        waited = threading.Event()
+
+        def wait_for_connection():
+            with engine.connect():
+                waited.set()
+
+        thread = threading.Thread(target=wait_for_connection)
+        thread.start()
+        time.sleep(0.2)
+        assert not waited.is_set()
+        connection.close()
+        thread.join()
+
+        assert metrics.num_checkouts == 2
+        assert metrics.num_slow_checkouts == 1
+        assert metrics.max_wait_seconds == pytest.approx(0.2, abs=0.15)
+
+    def test_metrics_survive_dispose(self, tmp_path):
+        metrics = PoolMetrics()
+        engine = create_database_engine(f"sqlite:///{tmp_path}/database.db", metrics=metrics)
+
+        engine.dispose()
+        with engine.connect():
+            pass
+
+        assert metrics.num_checkouts == 1
+
+
+def test_warm_up_pool(tmp_path):
+    metrics = PoolMetrics()
+    engine = create_database_engine(f"sqlite:///{tmp_path}/database.db", PoolSettings(pool_size=3), metrics)
+
+    warm_up_pool(engine, num_connections=3)
+
+    assert engine.pool.checkedin() == 3
+    assert metrics.num_checkouts == 3
+
+
+class TestSQLite:
+    def test_pragmas(self, tmp_path):
+        engine = create_database_engine(f"sqlite:///{tmp_path}/database.db")
+
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert connection.execute(text("PRAGMA mmap_size")).scalar() == SQLITE_PRAGMAS["mmap_size"]
+            assert connection.execute(text("PRAGMA cache_size")).scalar() == SQLITE_PRAGMAS["cache_size"]
+
+    def test_untuned(self, tmp_path):
+        settings = PoolSettings(sqlite_tuned=False)
+        engine = create_database_engine(f"sqlite:///{tmp_path}/database.db", settings)
+
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+        assert create_read_only_engine(f"sqlite:///{tmp_path}/database.db", settings) is None
+
+    def test_read_only_engine(self, tmp_path):
+        create_database_engine(f"sqlite:///{tmp_path}/database.db")
+        engine = create_read_only_engine(f"sqlite:///{tmp_path}/database.db")
+        assert engine is not None
+
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA query_only")).scalar() == 1
+            with pytest.raises(OperationalError):
+                connection.execute(text("CREATE TABLE test (id INTEGER)"))
+
+    @pytest.mark.parametrize("database_url", ["sqlite://", "sqlite:///:memory:", "postgresql://user@host/database"])
+    def test_no_read_only_engine(self, database_url):
+        assert create_read_only_engine(database_url) is None
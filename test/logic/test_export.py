@@ -0,0 +1,124 @@
+"""Test exports of calendar snapshots."""
+
+import csv
+import datetime as dt
+import gzip
+
+import pytest
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.export import ExportFormat, _fold, encode_chunks, iter_export
+from schedules.logic.objects import Country, Location, Person, RecurringTrip, StrID, Trip
+
+STAMP = dt.datetime(2025, 1, 1, 12, 0, tzinfo=dt.UTC)
+
+
+def sample_calendar() -> FullCalendar:
+    calendar = FullCalendar()
+    for last_name in ["lastname", "müller"]:
+        person = Person(
+            unique_id=StrID(f"{last_name}-id"),
+            last_name=StrID(last_name),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        calendar._add_person(person)
+        calendar._add_trip(
+            person,
+            Trip(
+                unique_id=StrID(f"{last_name}-trip"),
+                location=Location(Country.SWITZERLAND, StrID("zürich")),
+                start_date=dt.date(2025, 6, 1),
+                end_date=dt.date(2025, 6, 10),
+            ),
+        )
+        calendar._add_trip(
+            person,
+            RecurringTrip(
+                unique_id=StrID(f"{last_name}-commute"),
+                location=Location(Country.UNITED_KINGDOM, StrID("london")),
+                start_date=dt.date(2025, 7, 7),
+                end_date=dt.date(2025, 7, 9),
+                until_date=dt.date(2025, 8, 31),
+                every_weeks=2,
+            ),
+        )
+    return calendar
+
+
+def get_events(lines: list[str]) -> list[dict[str, str]]:
+    """Parse the events of an iCalendar file, unfolding its lines."""
+    unfolded = "".join(lines).replace("\r\n ", "").split("\r\n")
+    events: list[dict[str, str]] = []
+    for line in unfolded:
+        if line == "BEGIN:VEVENT":
+            events.append(dict())
+        elif events and ":" in line and line != "END:VEVENT" and not line.startswith("END:VCALENDAR"):
+            name, _, value = line.partition(":")
+            events[-1][name] = value
+    return events
+
+
+class TestExport:
+    def test_trips_ics(self):
+        lines = list(iter_export(ExportFormat.TRIPS_ICS, sample_calendar().snapshot, stamp=STAMP))
+        assert lines[0] == "BEGIN:VCALENDAR\r\n" and lines[-1] == "END:VCALENDAR\r\n"
+        assert all(line.endswith("\r\n") and len(line.encode("utf-8")) <= 75 + 2 for line in lines)
+
+        events = get_events(lines)
+        assert len(events) == 4
+        assert events[0]["SUMMARY"] == "Firstname Lastname in Zürich\\, Che"
+        assert (events[0]["DTSTART;VALUE=DATE"], events[0]["DTEND;VALUE=DATE"]) == ("20250601", "20250611")
+        assert events[1]["RRULE"] == "FREQ=WEEKLY;INTERVAL=2;COUNT=4"
+        assert events[1]["DTSTAMP"] == "20250101T120000Z"
+
+    def test_segments_ics(self):
+        snapshot = sample_calendar().snapshot
+        lines = list(iter_export(ExportFormat.SEGMENTS_ICS, snapshot, dt.date(2025, 6, 5), dt.date(2025, 7, 8)))
+        events = get_events(lines)
+        assert [(event["DTSTART;VALUE=DATE"], event["DTEND;VALUE=DATE"]) for event in events[:3]] == [
+            ("20250605", "20250610"),  # Cut off at the start date
+            ("20250610", "20250611"),  # Travel home
+            ("20250707", "20250708"),  # Travel to the first occurrence
+        ]
+        assert events[1]["SUMMARY"] == "Firstname Lastname from Zürich\\, Che to Amsterdam\\, Nld"
+        assert len(events) == 2 * 4  # Days at home are left out
+
+    def test_daily_csv(self):
+        snapshot = sample_calendar().snapshot
+        start_date, end_date = dt.date(2025, 5, 30), dt.date(2025, 9, 1)
+        rows = list(csv.DictReader(iter_export(ExportFormat.DAILY_CSV, snapshot, start_date, end_date)))
+
+        expected = [
+            (day.isoformat(), str(person.unique_id), day_location.start.city, day_location.end.city)
+            for day, people_days in snapshot.get_daily_calendars(start_date, end_date).items()
+            for person, day_location in people_days.items()
+        ]
+        assert [(row["date"], row["person_id"], row["start_city"], row["end_city"]) for row in rows] == expected
+
+    def test_long_lines_folded(self):
+        line = "SUMMARY:" + "ü" * 100
+        folded = _fold(line)
+        assert all(len(part.encode("utf-8")) <= 75 for part in folded.removesuffix("\r\n").split("\r\n"))
+        assert folded.replace("\r\n ", "") == line + "\r\n"
+
+    def test_needs_dates(self):
+        snapshot = sample_calendar().snapshot
+        with pytest.raises(ValueError):
+            iter_export(ExportFormat.DAILY_CSV, snapshot)
+        with pytest.raises(ValueError):
+            iter_export(ExportFormat.SEGMENTS_ICS, snapshot, dt.date(2025, 2, 1), dt.date(2025, 1, 1))
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_encode_chunks(self, compress: bool):
+        lines = [f"line {idx}, ü\n" for idx in range(10_000)]
+        chunks = list(encode_chunks(lines, compress=compress, chunk_size=1000))
+        assert len(chunks) > 1
+        data = b"".join(chunks)
+        assert (gzip.decompress(data) if compress else data) == "".join(lines).encode("utf-8")
+        if not compress:
+            assert all(1000 <= len(chunk) < 1100 for chunk in chunks[:-1])
+
+    def test_encode_nothing(self):
+        assert list(encode_chunks([])) == []
+        assert gzip.decompress(b"".join(encode_chunks([], compress=True))) == b""
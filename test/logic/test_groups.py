@@ -0,0 +1,30 @@
+"""Test keeping the calendars of the most recently used groups."""
+
+from schedules.logic.groups import GroupCache, is_valid_group_id
+
+
+def test_valid_group_ids():
+    assert is_valid_group_id("team-a_1")
+    assert not is_valid_group_id("")
+    assert not is_valid_group_id("team/a")
+    assert not is_valid_group_id("a" * 65)
+
+
+def test_least_recently_used_group_evicted():
+    created, evicted = [], []
+
+    def create(group_id: str) -> list[str]:
+        created.append(group_id)
+        return [group_id]
+
+    cache = GroupCache(create, max_groups=2, evict=evicted.append)
+    first = cache.get("a")
+    cache.get("b")
+    assert cache.get("a") is first  # Now used more recently than "b"
+    cache.get("c")
+
+    assert evicted == [["b"]]
+    assert (len(cache), cache.num_evicted) == (2, 1)
+    cache.get("b")
+    assert created == ["a", "b", "c", "b"]
+    assert evicted == [["b"], ["a"]]
@@ -0,0 +1,196 @@
+"""Test the write-behind repository and its journal."""
+
+import contextlib
+import datetime
+import fcntl
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.errors import CalendarError
+from schedules.logic.journal import WriteBehindRepository
+from schedules.logic.objects import Country, Location, Person, StrID, Trip
+from schedules.logic.storage import Base, CalendarRepository
+
+
+def sample_person() -> Person:
+    return Person(
+        unique_id=StrID("person-0"),
+        last_name=StrID("lastname"),
+        first_name=StrID("firstname"),
+        home=Location(country=Country.NETHERLANDS, city=StrID("Amsterdam")),
+    )
+
+
+def sample_trip(index: int) -> Trip:
+    start_date = datetime.date(2025, 8, 5) + datetime.timedelta(days=7 * index)
+    return Trip(
+        unique_id=StrID(f"trip-{index}"),
+        location=Location(country=Country.AUSTRIA, city=StrID("Sankt-Anton")),
+        start_date=start_date,
+        end_date=start_date + datetime.timedelta(days=3),
+    )
+
+
+@pytest.fixture
+def session_maker(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/database.db")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def open_repository(session_maker):
+    @contextlib.contextmanager
+    def open_repository():
+        with session_maker() as session:
+            yield CalendarRepository(session)
+
+    return open_repository
+
+
+@pytest.fixture
+def journal_directory(tmp_path):
+    return tmp_path / "journal"
+
+
+@pytest.fixture
+def repository(open_repository, journal_directory):
+    write_behind_repository = WriteBehindRepository(open_repository, journal_directory, flush_interval=3600)
+    yield write_behind_repository
+    write_behind_repository.close()
+
+
+def database_trip_ids(open_repository) -> list[str]:
+    with open_repository() as repository:
+        return sorted(trip.unique_id for trip in repository.get_trips_for_person(sample_person()))
+
+
+class TestWriteBehindRepository:
+    def test_reads_include_pending_writes(self, repository, open_repository):
+        assert repository.add_person(sample_person()) == 1
+        assert repository.add_trips(sample_person(), [sample_trip(0), sample_trip(1)]) == 2
+        assert repository.remove_trip(sample_trip(0)) == 3
+
+        assert repository.num_pending == 3
+        assert database_trip_ids(open_repository) == []
+        assert [person.unique_id for person in repository.get_all_people()] == ["person-0"]
+        assert repository.get_trips_for_person(sample_person()) == [sample_trip(1)]
+        assert repository.get_version() == 3
+
+    def test_remove_person_removes_flushed_trips(self, repository):
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip(0))
+        repository.flush()
+        repository.remove_person(sample_person())
+
+        assert repository.get_all_trips() == dict()
+
+    def test_flush_in_one_transaction(self, repository, open_repository, session_maker):
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip(0))
+        repository.add_trip(sample_person(), sample_trip(1))
+        commits = []
+        event.listen(session_maker.kw["bind"], "commit", lambda connection: commits.append(connection))
+
+        assert repository.flush() == 3
+        assert len(commits) == 1
+        assert repository.num_pending == 0
+        assert database_trip_ids(open_repository) == ["trip-0", "trip-1"]
+        assert repository.get_version() == 3  # Unchanged by the flush
+        assert repository.journal_path.read_bytes() == b""
+
+    def test_background_flush(self, open_repository, journal_directory):
+        repository = WriteBehindRepository(open_repository, journal_directory, flush_interval=3600, flush_batch_size=2)
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip(0))  # A full batch wakes up the background thread
+        repository.flush()  # Waits for the background flush
+        assert database_trip_ids(open_repository) == ["trip-0"]
+        repository.close()
+
+    def test_rejected_write_is_dropped(self, repository, open_repository):
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip(0))
+        repository.add_trip(sample_person(), sample_trip(0))  # Duplicate id, which the database rejects
+        repository.add_trip(sample_person(), sample_trip(1))
+
+        assert repository.flush() == 4
+        assert repository.num_pending == 0
+        assert database_trip_ids(open_repository) == ["trip-0", "trip-1"]
+
+    def test_version_moves_on_when_write_is_dropped(self, repository):
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip(0))
+        assert repository.add_trip(sample_person(), sample_trip(0)) == 3  # Rejected once flushed
+
+        # A calendar at version 3 still shows the rejected write, so it must see a newer version and load again
+        repository.flush()
+        assert repository.get_version() == 4
+        assert repository.add_trip(sample_person(), sample_trip(1)) == 5
+        assert repository.get_version() == 5
+
+    def test_close_flushes(self, open_repository, journal_directory):
+        repository = WriteBehindRepository(open_repository, journal_directory, flush_interval=3600)
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip(0))
+        repository.close()
+
+        assert database_trip_ids(open_repository) == ["trip-0"]
+        assert list(journal_directory.iterdir()) == []
+        with pytest.raises(CalendarError):
+            repository.add_trip(sample_person(), sample_trip(1))
+
+    def test_take_over_stopped_journal(self, open_repository, journal_directory):
+        stopped = WriteBehindRepository(open_repository, journal_directory, flush_interval=3600)
+        stopped.add_person(sample_person())
+        stopped.add_trip(sample_person(), sample_trip(0))
+
+        running = WriteBehindRepository(open_repository, journal_directory, flush_interval=3600)
+        assert running.num_pending == 0  # The journal is locked while its process runs
+
+        # Stop without flushing, as if the process was killed
+        stopped._closed = True
+        stopped._wake_up.set()
+        stopped._thread.join()
+        fcntl.flock(stopped._lock_file.fileno(), fcntl.LOCK_UN)
+
+        repository = WriteBehindRepository(open_repository, journal_directory, flush_interval=3600)
+        assert repository.num_pending == 2
+        assert repository.get_trips_for_person(sample_person()) == [sample_trip(0)]
+        assert not stopped.journal_path.exists()
+        repository.close()
+        running.close()
+        assert database_trip_ids(open_repository) == ["trip-0"]
+
+    def test_database_unavailable(self, journal_directory):
+        @contextlib.contextmanager
+        def open_unavailable_repository():
+            engine = create_engine("sqlite:////nonexistent/database.db")
+            with sessionmaker(bind=engine)() as session:
+                yield CalendarRepository(session)
+
+        repository = WriteBehindRepository(open_unavailable_repository, journal_directory, flush_interval=3600)
+        repository.add_person(sample_person())
+        assert repository.flush() == 0
+        assert repository.num_pending == 1
+        assert repository.journal_path.read_bytes() != b""
+
+
+class TestBatch:
+    def test_commits_once(self, open_repository):
+        with open_repository() as repository:
+            with repository.batch():
+                assert repository.add_person(sample_person()) == 1
+                assert repository.add_trip(sample_person(), sample_trip(0)) == 2
+        assert database_trip_ids(open_repository) == ["trip-0"]
+
+    def test_rolls_back_on_failure(self, open_repository):
+        with open_repository() as repository:
+            repository.add_person(sample_person())
+            with pytest.raises(CalendarError), repository.batch():
+                repository.add_trip(sample_person(), sample_trip(0))
+                repository.add_trip(sample_person(), sample_trip(0))
+            assert repository.get_version() == 1
+        assert database_trip_ids(open_repository) == []
@@ -1,4 +1,9 @@
-from schedules.logic.objects import Country, Location, Person, StrID
+import datetime as dt
+
+import pytest
+
+from schedules.logic.errors import CalendarError, RequestError
+from schedules.logic.objects import Country, Location, Person, RecurringTrip, StrID
 
 
 class TestStrID:
@@ -48,3 +53,55 @@ class TestPerson:
             home=Location(Country.NETHERLANDS, city=StrID("amsterdam")),
         )
         assert person_1 == person_2
+
+    def test_equal_people_have_same_hash(self):
+        person_1 = Person(
+            unique_id=StrID("a"),
+            last_name=StrID("lastname"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, city=StrID("amsterdam")),
+        )
+        person_2 = Person(
+            unique_id=StrID("b"),
+            last_name=StrID("LastName"),
+            first_name=StrID("FirstName"),
+            home=Location(Country.NORWAY, city=StrID("oslo")),
+        )
+        assert hash(person_1) == hash(person_2)
+        assert person_2 in {person_1}
+
+
+class TestRecurringTrip:
+    def sample_recurring_trip(self, end_date: dt.date = dt.date(2025, 1, 10), every_weeks: int = 1) -> RecurringTrip:
+        return RecurringTrip(
+            unique_id=StrID("commute"),
+            location=Location(country=Country.SWITZERLAND, city=StrID("Zurich")),
+            start_date=dt.date(2025, 1, 6),
+            end_date=end_date,
+            until_date=dt.date(2025, 3, 3),
+            every_weeks=every_weeks,
+        )
+
+    def test_occurrences(self):
+        trip = self.sample_recurring_trip()
+        assert trip.num_occurrences == 9
+        assert trip.last_end_date == dt.date(2025, 3, 7)
+
+        occurrences = trip.get_occurrences(dt.date(2025, 1, 10), dt.date(2025, 1, 20))
+        assert [(occurrence.start_date, occurrence.end_date) for occurrence in occurrences] == [
+            (dt.date(2025, 1, 6), dt.date(2025, 1, 10)),
+            (dt.date(2025, 1, 13), dt.date(2025, 1, 17)),
+            (dt.date(2025, 1, 20), dt.date(2025, 1, 24)),
+        ]
+        assert trip.get_occurrences(dt.date(2025, 1, 11), dt.date(2025, 1, 12)) == []
+        assert trip.get_occurrences(dt.date(2025, 3, 8), dt.date(2030, 1, 1)) == []
+        assert trip.get_first_occurrence(dt.date(2000, 1, 1), dt.date(2030, 1, 1)) == trip.get_occurrence(0)
+
+    def test_raises_if_occurrences_touch(self):
+        with pytest.raises(CalendarError):
+            self.sample_recurring_trip(end_date=dt.date(2025, 1, 13))
+        self.sample_recurring_trip(end_date=dt.date(2025, 1, 19), every_weeks=2)
+        with pytest.raises(RequestError):
+            self.sample_recurring_trip(every_weeks=0)
+        with pytest.raises(RequestError):
+            self.sample_recurring_trip(every_weeks=70000)
@@ -0,0 +1,96 @@
+"""Test computing daily calendars on several workers."""
+
+import datetime
+
+import pytest
+
+from schedules.logic.calendar import CalendarSnapshot, SinglePersonCalendar
+from schedules.logic.objects import Country, Location, Person, RecurringTrip, StrID, Trip
+from schedules.logic.parallel import ParallelDailyCalendars, ParallelSettings
+
+
+def sample_snapshot(num_people: int) -> CalendarSnapshot:
+    calendars = {}
+    for person_idx in range(num_people):
+        person = Person(
+            unique_id=StrID(f"person-{person_idx}"),
+            last_name=StrID(f"lastname-{person_idx}"),
+            first_name=StrID("firstname"),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        trips = []
+        for trip_idx in range(person_idx % 4):
+            start_date = datetime.date(2025, 1, 1) + datetime.timedelta(days=10 * trip_idx + person_idx)
+            city = StrID("zurich") if trip_idx % 2 else StrID("bern")
+            trips.append(
+                Trip(
+                    unique_id=StrID(f"trip-{person_idx}-{trip_idx}"),
+                    location=Location(Country.SWITZERLAND, city),
+                    start_date=start_date,
+                    end_date=start_date + datetime.timedelta(days=9 if trip_idx == 1 else 3),  # Trip 2 follows on
+                )
+            )
+        if person_idx % 3 == 0:
+            trips.append(
+                RecurringTrip(
+                    unique_id=StrID(f"recurring-trip-{person_idx}"),
+                    location=Location(Country.AUSTRIA, StrID("vienna")),
+                    start_date=datetime.date(2025, 2, 1) + datetime.timedelta(days=person_idx),
+                    end_date=datetime.date(2025, 2, 3) + datetime.timedelta(days=person_idx),
+                    until_date=datetime.date(2025, 4, 1),
+                )
+            )
+        calendars[person] = SinglePersonCalendar.from_valid_trips(person, trips)
+    return CalendarSnapshot.create(version=1, calendars=calendars)
+
+
+@pytest.fixture(params=[False, True], ids=["threads", "processes"])
+def parallel(request):
+    parallel_daily_calendars = ParallelDailyCalendars(
+        ParallelSettings(num_workers=2, use_processes=request.param, min_person_days=0)
+    )
+    yield parallel_daily_calendars
+    parallel_daily_calendars.shut_down()
+
+
+class TestParallelDailyCalendars:
+    def test_same_as_sequential(self, parallel):
+        snapshot = sample_snapshot(num_people=13)
+        start_date, end_date = datetime.date(2024, 12, 25), datetime.date(2025, 3, 1)
+
+        expected = snapshot.get_daily_calendars(start_date, end_date)
+        daily_calendars = snapshot.get_daily_calendars(start_date, end_date, parallel)
+        assert daily_calendars == expected
+        assert list(daily_calendars) == list(expected)
+        for day, people_days in daily_calendars.items():
+            assert list(people_days) == list(expected[day])
+
+    def test_shares_locations(self, parallel):
+        snapshot = sample_snapshot(num_people=4)
+        person = snapshot.people_sorted_by_name[3]
+        daily_calendars = snapshot.get_daily_calendars(datetime.date(2025, 1, 1), datetime.date(2025, 1, 31), parallel)
+        assert daily_calendars[datetime.date(2025, 1, 1)][person].start is person.home
+
+    def test_only_above_threshold(self):
+        parallel = ParallelDailyCalendars(ParallelSettings(num_workers=2, min_person_days=100))
+        assert not parallel.is_worthwhile(num_people=10, num_days=9)
+        assert parallel.is_worthwhile(num_people=10, num_days=10)
+        assert not parallel.is_worthwhile(num_people=1, num_days=1000)
+        assert not ParallelDailyCalendars(ParallelSettings(num_workers=1, min_person_days=0)).is_worthwhile(10, 10)
+
+        # Below the threshold, no workers are started
+        sample_snapshot(num_people=3).get_daily_calendars(
+            datetime.date(2025, 1, 1), datetime.date(2025, 1, 2), parallel
+        )
+        assert parallel._executor is None
+
+    def test_settings_from_environment(self):
+        assert ParallelSettings.from_environment(dict()) == ParallelSettings()
+        settings = ParallelSettings.from_environment(
+            dict(
+                CALENDAR_PARALLEL_WORKERS="4",
+                CALENDAR_PARALLEL_KIND="thread",
+                CALENDAR_PARALLEL_MIN_PERSON_DAYS="1000",
+            )
+        )
+        assert settings == ParallelSettings(num_workers=4, use_processes=False, min_person_days=1000)
@@ -0,0 +1,195 @@
+"""Test that all repositories behave the same."""
+
+import datetime
+import multiprocessing
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from schedules.logic.calendar import FullCalendar
+from schedules.logic.errors import CalendarError
+from schedules.logic.file_storage import AppendOnlyFileRepository
+from schedules.logic.memory_storage import InMemoryRepository
+from schedules.logic.objects import Country, Location, Person, RecurringTrip, StrID, Trip
+from schedules.logic.repository import Repository
+from schedules.logic.storage import Base, CalendarRepository
+
+
+@pytest.fixture(params=["database", "memory", "file"])
+def repository(request, tmp_path):
+    if request.param == "database":
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        with sessionmaker(bind=engine)() as session:
+            yield CalendarRepository(session)
+    elif request.param == "memory":
+        yield InMemoryRepository()
+    else:
+        file_repository = AppendOnlyFileRepository(tmp_path / "calendar.jsonl")
+        yield file_repository
+        file_repository.close()
+
+
+def sample_person(index: int = 0) -> Person:
+    return Person(
+        unique_id=StrID(f"person-{index}"),
+        last_name=StrID(f"lastname-{index}"),
+        first_name=StrID("firstname"),
+        home=Location(country=Country.NETHERLANDS, city=StrID("Amsterdam")),
+    )
+
+
+def sample_trip(index: int = 0) -> Trip:
+    start_date = datetime.date(2025, 8, 5) + datetime.timedelta(days=7 * index)
+    return Trip(
+        unique_id=StrID(f"trip-{index}"),
+        location=Location(country=Country.AUSTRIA, city=StrID("Sankt-Anton")),
+        start_date=start_date,
+        end_date=start_date + datetime.timedelta(days=3),
+    )
+
+
+def sample_recurring_trip() -> RecurringTrip:
+    return RecurringTrip(
+        unique_id=StrID("recurring-trip"),
+        location=Location(country=Country.SWITZERLAND, city=StrID("Zurich")),
+        start_date=datetime.date(2025, 9, 1),
+        end_date=datetime.date(2025, 9, 5),
+        until_date=datetime.date(2025, 12, 31),
+        every_weeks=2,
+    )
+
+
+class TestRepository:
+    def test_empty(self, repository: Repository):
+        assert repository.get_version() == 0
+        assert repository.get_all_people() == []
+        assert repository.get_all_trips() == dict()
+
+    def test_people(self, repository: Repository):
+        assert repository.add_person(sample_person(0)) == 1
+        assert repository.add_people([sample_person(1), sample_person(2)]) == 2
+        assert repository.remove_person(sample_person(1)) == 3
+
+        assert sorted(person.unique_id for person in repository.get_all_people()) == ["person-0", "person-2"]
+        assert repository.get_version() == 3
+
+    def test_trips(self, repository: Repository):
+        person, other_person = sample_person(0), sample_person(1)
+        repository.add_people([person, other_person])
+
+        repository.add_trip(person, sample_trip(0))
+        repository.add_trips(person, [sample_trip(1), sample_trip(2)])
+        repository.add_trip(other_person, sample_trip(3))
+        repository.remove_trip(sample_trip(1))
+
+        assert sorted(trip.unique_id for trip in repository.get_trips_for_person(person)) == ["trip-0", "trip-2"]
+        all_trips = repository.get_all_trips()
+        assert sorted(all_trips) == ["person-0", "person-1"]
+        assert sorted(trip.unique_id for trip in all_trips[StrID("person-0")]) == ["trip-0", "trip-2"]
+        assert all_trips[StrID("person-1")] == [sample_trip(3)]
+        assert repository.get_version() == 5
+
+    def test_recurring_trips(self, repository: Repository):
+        repository.add_person(sample_person(0))
+        repository.add_trips(sample_person(0), [sample_trip(0), sample_recurring_trip()])
+
+        trips = repository.get_trips_for_person(sample_person(0))
+        assert sorted(trips, key=lambda trip: trip.start_date) == [sample_trip(0), sample_recurring_trip()]
+
+        repository.remove_trip(sample_recurring_trip())
+        assert repository.get_all_trips() == {StrID("person-0"): [sample_trip(0)]}
+
+    def test_remove_person_removes_trips(self, repository: Repository):
+        repository.add_people([sample_person(0), sample_person(1)])
+        repository.add_trips(sample_person(0), [sample_trip(0), sample_trip(1)])
+        repository.add_trip(sample_person(1), sample_trip(2))
+
+        repository.remove_person(sample_person(0))
+
+        assert repository.get_trips_for_person(sample_person(0)) == []
+        assert repository.get_all_trips() == {StrID("person-1"): [sample_trip(2)]}
+
+    def test_duplicate_ids(self, repository: Repository):
+        repository.add_person(sample_person(0))
+        repository.add_trip(sample_person(0), sample_trip(0))
+
+        with pytest.raises(CalendarError):
+            repository.add_person(sample_person(0))
+        with pytest.raises(CalendarError):
+            repository.add_trips(sample_person(0), [sample_trip(1), sample_trip(0)])
+
+        assert repository.get_version() == 2
+        assert repository.get_trips_for_person(sample_person(0)) == [sample_trip(0)]
+
+    def test_remove_nonexistent(self, repository: Repository):
+        with pytest.raises(CalendarError):
+            repository.remove_person(sample_person(0))
+        with pytest.raises(CalendarError):
+            repository.remove_trip(sample_trip(0))
+        assert repository.get_version() == 0
+
+    def test_full_calendar(self, repository: Repository):
+        repository.add_people([sample_person(0), sample_person(1)])
+        repository.add_trips(sample_person(0), [sample_trip(0), sample_trip(1)])
+
+        calendar = FullCalendar(database_repository=repository)
+        calendar.load_from_repository()
+
+        assert calendar.version == 2
+        assert [trip.unique_id for trip in calendar.calendars[sample_person(0)].trip_list] == ["trip-0", "trip-1"]
+        assert calendar.calendars[sample_person(1)].trip_list == []
+
+
+def add_person_in_other_process(path: str, index: int) -> None:
+    repository = AppendOnlyFileRepository(path)
+    repository.add_person(sample_person(index))
+    repository.close()
+
+
+class TestAppendOnlyFileRepository:
+    def test_replayed_when_opened_again(self, tmp_path):
+        repository = AppendOnlyFileRepository(tmp_path / "calendar.jsonl")
+        repository.add_people([sample_person(0), sample_person(1)])
+        repository.add_trip(sample_person(0), sample_trip(0))
+        repository.remove_person(sample_person(1))
+        repository.close()
+
+        reopened = AppendOnlyFileRepository(tmp_path / "calendar.jsonl")
+
+        assert reopened.get_version() == 3
+        assert reopened.get_all_people() == [sample_person(0)]
+        assert reopened.get_all_trips() == {StrID("person-0"): [sample_trip(0)]}
+
+    def test_sees_writes_of_other_processes(self, tmp_path):
+        path = str(tmp_path / "calendar.jsonl")
+        repository = AppendOnlyFileRepository(path)
+        repository.add_person(sample_person(0))
+
+        processes = [
+            multiprocessing.get_context("spawn").Process(target=add_person_in_other_process, args=(path, index))
+            for index in range(1, 4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        assert repository.get_version() == 4
+        assert sorted(person.unique_id for person in repository.get_all_people()) == [
+            f"person-{index}" for index in range(4)
+        ]
+
+    def test_incomplete_and_invalid_lines(self, tmp_path):
+        path = tmp_path / "calendar.jsonl"
+        repository = AppendOnlyFileRepository(path)
+        repository.add_person(sample_person(0))
+        with open(path, "ab") as file:
+            file.write(b'{"operation": "unknown"}\n')
+            file.write(b'{"operation": "add_people", "peo')  # Another process is still appending this line
+
+        assert repository.get_version() == 1
+        with open(path, "ab") as file:
+            file.write(b'ple": []}\n')
+        assert repository.get_version() == 2
@@ -0,0 +1,140 @@
+"""Test snapshot files of full calendars."""
+
+import datetime as dt
+import threading
+import time
+
+from schedules.logic.calendar import CalendarState, FullCalendar
+from schedules.logic.objects import Country, Location, Person, RecurringTrip, StrID, Trip
+from schedules.logic.snapshot_file import SnapshotWriter, read_snapshot_file, write_snapshot_file
+
+
+def sample_calendar() -> FullCalendar:
+    calendar = FullCalendar()
+    for last_name, first_name in [("lastname", "firstname"), ("müller", "zoë")]:
+        person = Person(
+            unique_id=StrID(f"{last_name}-id"),
+            last_name=StrID(last_name),
+            first_name=StrID(first_name),
+            home=Location(Country.NETHERLANDS, StrID("amsterdam")),
+        )
+        calendar._add_person(person)
+        calendar._add_trip(
+            person,
+            Trip(
+                unique_id=StrID(f"{last_name}-trip-1"),
+                location=Location(Country.SWITZERLAND, StrID("zürich")),
+                start_date=dt.date(2025, 6, 1),
+                end_date=dt.date(2025, 6, 10),
+            ),
+        )
+        calendar._add_trip(
+            person,
+            Trip(
+                unique_id=StrID(f"{last_name}-trip-2"),
+                location=Location(Country.UNITED_KINGDOM, StrID("london")),
+                start_date=dt.date(2025, 6, 3),
+                end_date=dt.date(2025, 6, 5),
+            ),
+        )
+        calendar._add_trip(
+            person,
+            RecurringTrip(
+                unique_id=StrID(f"{last_name}-commute"),
+                location=Location(Country.SWITZERLAND, StrID("bern")),
+                start_date=dt.date(2025, 6, 16),
+                end_date=dt.date(2025, 6, 19),
+                until_date=dt.date(2025, 12, 31),
+                every_weeks=2,
+            ),
+        )
+    return calendar
+
+
+class TestSnapshotFile:
+    def test_round_trip(self, tmp_path):
+        snapshot = sample_calendar().snapshot
+        write_snapshot_file(tmp_path / "calendar.snapshot", snapshot)
+
+        snapshot_read_back = read_snapshot_file(tmp_path / "calendar.snapshot")
+
+        assert snapshot_read_back is not None
+        assert snapshot_read_back.version == snapshot.version
+        assert snapshot_read_back.people_sorted_by_name == snapshot.people_sorted_by_name
+        assert snapshot_read_back.get_trips_to_display() == snapshot.get_trips_to_display()
+        dates = (dt.date(2025, 5, 30), dt.date(2025, 7, 12))
+        assert snapshot_read_back.get_daily_calendars(*dates) == snapshot.get_daily_calendars(*dates)
+
+    def test_read_back_into_calendar(self, tmp_path):
+        write_snapshot_file(tmp_path / "calendar.snapshot", sample_calendar().snapshot)
+        state = CalendarState()
+        state.snapshot = read_snapshot_file(tmp_path / "calendar.snapshot")  # type: ignore
+        calendar = FullCalendar(state=state)
+
+        person = calendar.snapshot.people_sorted_by_name[0]
+        calendar._remove_trip(person.unique_id, calendar.calendars[person].trip_list[0].unique_id)
+
+        assert len(calendar.calendars[person].trip_list) == 1
+
+    def test_missing_file(self, tmp_path):
+        assert read_snapshot_file(tmp_path / "calendar.snapshot") is None
+
+    def test_empty_file(self, tmp_path):
+        (tmp_path / "calendar.snapshot").write_bytes(b"")
+        assert read_snapshot_file(tmp_path / "calendar.snapshot") is None
+
+    def test_corrupt_file(self, tmp_path):
+        write_snapshot_file(tmp_path / "calendar.snapshot", sample_calendar().snapshot)
+        data = bytearray((tmp_path / "calendar.snapshot").read_bytes())
+        data[-1] ^= 0xFF
+        (tmp_path / "calendar.snapshot").write_bytes(data)
+        assert read_snapshot_file(tmp_path / "calendar.snapshot") is None
+
+    def test_truncated_file(self, tmp_path):
+        write_snapshot_file(tmp_path / "calendar.snapshot", sample_calendar().snapshot)
+        data = (tmp_path / "calendar.snapshot").read_bytes()
+        (tmp_path / "calendar.snapshot").write_bytes(data[:-10])
+        assert read_snapshot_file(tmp_path / "calendar.snapshot") is None
+
+
+class TestSnapshotWriter:
+    def test_only_writes_changed_version(self, tmp_path):
+        calendar = sample_calendar()
+        writer = SnapshotWriter(calendar._state, tmp_path / "calendar.snapshot")
+
+        writer.write_if_changed()
+        modified_time = (tmp_path / "calendar.snapshot").stat().st_mtime_ns
+        writer.write_if_changed()
+
+        assert (tmp_path / "calendar.snapshot").stat().st_mtime_ns == modified_time
+        assert read_snapshot_file(tmp_path / "calendar.snapshot").version == calendar.version  # type: ignore
+
+    def test_skips_snapshot_with_too_long_string(self, tmp_path):
+        calendar = sample_calendar()
+        writer = SnapshotWriter(calendar._state, tmp_path / "calendar.snapshot")
+        writer.write_if_changed()
+        person = Person(StrID("long-id"), StrID("x" * 70000), StrID("firstname"), Location(Country.NORWAY, "oslo"))
+        calendar._add_person(person)
+
+        writer.write_if_changed()  # Only logs an error
+        assert read_snapshot_file(tmp_path / "calendar.snapshot").version == calendar.version - 1  # type: ignore
+
+    def test_keeps_writing_after_unexpected_error(self, tmp_path, monkeypatch):
+        calendar = sample_calendar()
+        writer = SnapshotWriter(calendar._state, tmp_path / "calendar.snapshot", interval=3600)
+        written = threading.Event()
+        calls = []
+
+        def write_if_changed() -> None:
+            calls.append(None)
+            if len(calls) == 1:
+                raise RuntimeError("unexpected")
+            written.set()
+
+        monkeypatch.setattr(writer, "write_if_changed", write_if_changed)
+        writer.start()
+        writer.notify()
+        while not calls:
+            time.sleep(0.001)
+        writer.notify()
+        assert written.wait(timeout=5)
@@ -1,14 +1,28 @@
 """Test interactions with persistent storage, such as a database."""
 
+import dataclasses
 import datetime
+import random
+import sqlite3
+import threading
 
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, Session
 
+from schedules.logic.calendar import FullCalendar, SinglePersonCalendar
+from schedules.logic.database import create_database_engine, create_read_only_engine, create_replica_engine
 from schedules.logic.errors import CalendarError
-from schedules.logic.objects import Country, Location, Person, StrID, Trip
-from schedules.logic.storage import Base, CalendarRepository
+from schedules.logic.objects import Country, DayLocation, Location, LocationSegment, Person, RecurringTrip, StrID, Trip
+from schedules.logic.storage import (
+    Base,
+    CalendarRepository,
+    RecentWrites,
+    RecurringTripDBEntry,
+    TripDBEntry,
+    create_schema,
+)
 
 
 @pytest.fixture
@@ -184,6 +198,17 @@ class TestStorageTrip:
         assert trip1 in trips
         assert trip2 in trips
 
+    def test_loaded_trips_share_locations_and_dates(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        person = sample_person()
+        repository.add_person(person)
+        trips = [dataclasses.replace(sample_trip(), unique_id=StrID(f"trip{idx}")) for idx in range(2)]
+        repository.add_trips(person, [trips[0], dataclasses.replace(trips[1], start_date=datetime.date(2025, 8, 1))])
+
+        first, second = sorted(repository.get_trips_for_person(person), key=lambda trip: trip.unique_id)
+        assert first.location is second.location
+        assert first.end_date is second.end_date
+
     def test_duplicate_trip_id(self, database_session: Session):
         """Test that adding trip with same ID raises error."""
         repository = CalendarRepository(database_session)
@@ -259,3 +284,457 @@ class TestStorageTrip:
         trips = repository.get_trips_for_person(person)
 
         assert trips == []
+
+
+class TestStorageVersion:
+    def test_empty_database_version(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        assert repository.get_version() == 0
+
+    def test_every_write_bumps_version(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        person = sample_person()
+        trip = sample_trip()
+
+        assert repository.add_person(person) == 1
+        assert repository.add_trip(person, trip) == 2
+        assert repository.remove_trip(trip) == 3
+        assert repository.remove_person(person) == 4
+        assert repository.get_version() == 4
+
+    def test_failed_write_does_not_bump_version(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        with pytest.raises(CalendarError):
+            repository.remove_trip(sample_trip())
+        assert repository.get_version() == 0
+
+
+class TestStorageOrphanedTrips:
+    def add_orphaned_trips(self, session: Session, num_trips: int) -> None:
+        # As left behind by versions that didn't delete the trips of removed people
+        for index in range(num_trips):
+            trip = Trip(
+                unique_id=StrID(f"orphaned_trip_{index}"),
+                location=sample_location(),
+                start_date=datetime.date(2025, 8, 5),
+                end_date=datetime.date(2025, 8, 9),
+            )
+            session.add(TripDBEntry.from_python(sample_person(), trip))
+        session.commit()
+
+    def test_purge_in_batches(self, database_session: Session):
+        self.add_orphaned_trips(database_session, 5)
+        repository = CalendarRepository(database_session)
+        person = Person(
+            unique_id=StrID("other_person_id"),
+            last_name=StrID("other"),
+            first_name=StrID("firstname"),
+            home=sample_location(),
+        )
+        repository.add_person(person)
+        repository.add_trip(person, sample_trip())
+
+        result = repository.purge_orphaned_trips(batch_size=2)
+
+        assert result.num_trips == 5
+        assert result.num_bytes == sum(
+            len(f"orphaned_trip_{index}test_person_idNLDAmsterdam") + 16 for index in range(5)
+        )
+        assert repository.get_version() == 2 + 3  # One write per batch
+        assert repository.get_all_trips() == {StrID("other_person_id"): [sample_trip()]}
+
+    def test_purge_recurring_trips(self, database_session: Session):
+        trip = RecurringTrip(
+            unique_id=StrID("orphaned_recurring_trip"),
+            location=sample_location(),
+            start_date=datetime.date(2025, 8, 5),
+            end_date=datetime.date(2025, 8, 9),
+            until_date=datetime.date(2025, 12, 31),
+        )
+        database_session.add(RecurringTripDBEntry.from_python(sample_person(), trip))
+        database_session.commit()
+
+        result = CalendarRepository(database_session).purge_orphaned_trips()
+
+        assert result == (1, len("orphaned_recurring_triptest_person_idNLDAmsterdam") + 32)
+
+    def test_nothing_to_purge(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip())
+
+        assert repository.purge_orphaned_trips() == (0, 0)
+        assert repository.get_version() == 2
+
+
+class TestStorageSegments:
+    def trip(self, index: int, start_day: int, num_days: int, city: str = "Zurich") -> Trip:
+        start_date = datetime.date(2025, 1, 1) + datetime.timedelta(days=start_day)
+        return Trip(
+            unique_id=StrID(f"trip_{index}"),
+            location=Location(country=Country.SWITZERLAND, city=StrID(city)),
+            start_date=start_date,
+            end_date=start_date + datetime.timedelta(days=num_days),
+        )
+
+    def all_segments(self, repository: CalendarRepository) -> list[LocationSegment]:
+        return repository.get_segments(datetime.date.min, datetime.date.max).get(sample_person().unique_id, [])
+
+    def test_not_maintained_by_default(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        repository.add_person(sample_person())
+        assert self.all_segments(repository) == []
+
+    def test_same_locations_as_daily_calendar(self, database_session: Session):
+        repository = CalendarRepository(database_session, maintain_segments=True)
+        repository.add_person(sample_person())
+        trips = [self.trip(0, 10, 5), self.trip(1, 15, 3, "Bern"), self.trip(2, 16, 1, "Basel"), self.trip(3, 30, 2)]
+        repository.add_trips(sample_person(), trips)
+
+        start_date, end_date = datetime.date(2025, 1, 5), datetime.date(2025, 2, 5)
+        segments = repository.get_segments(start_date, end_date)[sample_person().unique_id]
+
+        daily_calendar = SinglePersonCalendar.from_valid_trips(sample_person(), trips).get_daily_calendar(
+            start_date, end_date
+        )
+        for day, day_location in daily_calendar.items():
+            assert [segment.location for segment in segments if segment.from_date <= day <= segment.to_date] == [
+                day_location
+            ]
+
+    def test_incremental_updates_same_as_rebuild(self, database_session: Session):
+        repository = CalendarRepository(database_session, maintain_segments=True)
+        repository.add_person(sample_person())
+        calendar = SinglePersonCalendar(sample_person())
+        rng = random.Random(0)
+        for index in range(200):
+            if calendar.trip_list and rng.random() < 0.3:
+                trip = calendar.remove_trip(rng.choice(calendar.trip_list).unique_id)
+                repository.remove_trip(trip)
+            else:
+                trip = self.trip(index, rng.randrange(60), rng.randrange(1, 10), rng.choice(["Zurich", "Bern"]))
+                try:
+                    calendar.add_trip(trip)
+                except CalendarError:
+                    continue
+                repository.add_trip(sample_person(), trip)
+            assert self.all_segments(repository) == calendar.get_segments()
+
+        repository.rebuild_segments()
+        assert self.all_segments(repository) == calendar.get_segments()
+
+    def test_recurring_trips(self, database_session: Session):
+        repository = CalendarRepository(database_session, maintain_segments=True)
+        repository.add_person(sample_person())
+        calendar = SinglePersonCalendar(sample_person())
+        recurring_trip = RecurringTrip(
+            unique_id=StrID("recurring_trip"),
+            location=Location(country=Country.SWITZERLAND, city=StrID("Basel")),
+            start_date=datetime.date(2025, 1, 20),
+            end_date=datetime.date(2025, 1, 22),
+            until_date=datetime.date(2025, 3, 1),
+        )
+        for trip in [self.trip(0, 5, 10), recurring_trip, self.trip(1, 43, 2), self.trip(2, 10, 2, "Bern")]:
+            calendar.add_trip(trip)
+            repository.add_trip(sample_person(), trip)
+            assert self.all_segments(repository) == calendar.get_segments()
+
+        repository.remove_trip(calendar.remove_trip(recurring_trip.unique_id))
+        assert self.all_segments(repository) == calendar.get_segments()
+
+    def test_removed_with_person(self, database_session: Session):
+        repository = CalendarRepository(database_session, maintain_segments=True)
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip())
+        assert len(self.all_segments(repository)) == 5  # Home, travel there, stay, travel back, home
+
+        repository.remove_person(sample_person())
+        assert self.all_segments(repository) == []
+
+    def test_rebuild(self, database_session: Session):
+        CalendarRepository(database_session).add_person(sample_person())
+        repository = CalendarRepository(database_session, maintain_segments=True)
+
+        assert repository.rebuild_segments() == 1
+        home = DayLocation(start=sample_location(), end=sample_location())
+        assert self.all_segments(repository) == [LocationSegment(datetime.date.min, datetime.date.max, home)]
+
+
+class TestStorageArchive:
+    CUTOFF = datetime.date(2025, 1, 1)
+
+    def trip(self, unique_id: str, start_date: datetime.date, end_date: datetime.date, city: str = "Zurich") -> Trip:
+        return Trip(StrID(unique_id), Location(country=Country.SWITZERLAND, city=StrID(city)), start_date, end_date)
+
+    def sample_trips(self) -> list[Trip]:
+        return [
+            self.trip("old", datetime.date(2024, 1, 1), datetime.date(2024, 1, 5)),
+            RecurringTrip(
+                unique_id=StrID("old_commute"),
+                location=Location(country=Country.SWITZERLAND, city=StrID("Basel")),
+                start_date=datetime.date(2024, 2, 5),
+                end_date=datetime.date(2024, 2, 9),
+                until_date=datetime.date(2024, 6, 30),
+            ),
+            self.trip("before_new_year", datetime.date(2024, 12, 20), datetime.date(2024, 12, 28)),
+            self.trip("over_new_year", datetime.date(2024, 12, 28), datetime.date(2025, 1, 3), city="Bern"),
+            self.trip("new", datetime.date(2025, 2, 1), datetime.date(2025, 2, 5)),
+        ]
+
+    def test_archive_trips(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        repository.add_person(sample_person())
+        repository.add_trips(sample_person(), self.sample_trips())
+        calendar = SinglePersonCalendar.from_valid_trips(sample_person(), self.sample_trips())
+
+        result = repository.archive_trips(self.CUTOFF, batch_size=2)
+        assert (result.num_trips, result.num_people) == (3, 1)
+        assert repository.get_version() == 1 + 1 + 2
+        remaining_trips = repository.get_trips_for_person(sample_person())
+        assert {trip.unique_id for trip in remaining_trips} == {"over_new_year", "new"}
+
+        # Nothing changes from the cutoff on
+        remaining_calendar = SinglePersonCalendar.from_valid_trips(sample_person(), remaining_trips)
+        end_date = datetime.date(2025, 12, 31)
+        assert remaining_calendar.get_daily_calendar(self.CUTOFF, end_date) == calendar.get_daily_calendar(
+            self.CUTOFF, end_date
+        )
+
+        # Archived trips can still be loaded
+        assert repository.get_archived_trips(sample_person()) == self.sample_trips()[:3]
+        archived_trips = repository.get_archived_trips(sample_person(), datetime.date(2024, 6, 1), self.CUTOFF)
+        assert [trip.unique_id for trip in archived_trips] == ["old_commute", "before_new_year"]
+
+        assert repository.archive_trips(self.CUTOFF) == (0, 0)
+
+    def test_keeps_trips_nested_in_trip_over_cutoff(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        repository.add_person(sample_person())
+        trips = [
+            self.trip("old", datetime.date(2024, 12, 1), datetime.date(2024, 12, 5)),
+            Trip(
+                StrID("long"),
+                Location(country=Country.NETHERLANDS, city=StrID("Amsterdam")),
+                datetime.date(2025, 1, 1),
+                datetime.date(2025, 2, 1),
+            ),
+            self.trip("before_cutoff", datetime.date(2025, 1, 2), datetime.date(2025, 1, 4), city="Bern"),
+            self.trip("after_cutoff", datetime.date(2025, 1, 20), datetime.date(2025, 1, 25), city="Basel"),
+        ]
+        repository.add_trips(sample_person(), trips)
+        calendar = SinglePersonCalendar.from_valid_trips(sample_person(), trips)
+
+        # The next trip's travel depends on the trip before it, which a trip over the cutoff may enclose
+        cutoff = datetime.date(2025, 1, 5)
+        assert repository.archive_trips(cutoff) == (1, 1)
+        remaining_trips = repository.get_trips_for_person(sample_person())
+        assert {trip.unique_id for trip in remaining_trips} == {"long", "before_cutoff", "after_cutoff"}
+        remaining_calendar = SinglePersonCalendar.from_valid_trips(sample_person(), remaining_trips)
+        end_date = datetime.date(2025, 12, 31)
+        assert remaining_calendar.get_daily_calendar(cutoff, end_date) == calendar.get_daily_calendar(cutoff, end_date)
+
+    def test_day_after_cutoff_same_with_trip_at_boundary(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        repository.add_person(sample_person())
+        cutoff = datetime.date(2025, 1, 10)
+        trips = [
+            self.trip("to_boundary", datetime.date(2025, 1, 5), cutoff - datetime.timedelta(days=1)),
+            self.trip(
+                "from_boundary", cutoff - datetime.timedelta(days=1), cutoff + datetime.timedelta(days=2), "Bern"
+            ),
+        ]
+        repository.add_trips(sample_person(), trips)
+        calendar = FullCalendar(database_repository=repository)
+        calendar.load_from_repository()
+        before = calendar.snapshot.get_daily_calendars(cutoff, cutoff + datetime.timedelta(days=3))
+
+        # The trip ending the day before the cutoff is archived, the one it travels straight to stays
+        assert repository.archive_trips(cutoff) == (1, 1)
+        calendar.load_from_repository()
+        assert calendar.snapshot.get_daily_calendars(cutoff, cutoff + datetime.timedelta(days=3)) == before
+        bern = Location(country=Country.SWITZERLAND, city=StrID("Bern"))
+        assert before[cutoff][sample_person()] == DayLocation(start=bern, end=bern)
+
+    def test_archive_again_with_earlier_cutoff(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        repository.add_person(sample_person())
+        repository.add_trips(sample_person(), self.sample_trips())
+        repository.archive_trips(self.CUTOFF)
+
+        repository.add_trip(sample_person(), self.trip("older", datetime.date(2023, 1, 1), datetime.date(2023, 1, 5)))
+        assert repository.archive_trips(datetime.date(2024, 1, 1)) == (1, 1)
+        assert len(repository.get_archived_trips(sample_person())) == 4
+
+    def test_removed_with_person(self, database_session: Session):
+        repository = CalendarRepository(database_session)
+        repository.add_person(sample_person())
+        repository.add_trips(sample_person(), self.sample_trips())
+        repository.archive_trips(self.CUTOFF)
+
+        repository.remove_person(sample_person())
+        assert repository.get_archived_trips(sample_person()) == []
+
+    def test_segments_maintained(self, database_session: Session):
+        repository = CalendarRepository(database_session, maintain_segments=True)
+        repository.add_person(sample_person())
+        repository.add_trips(sample_person(), self.sample_trips())
+        repository.archive_trips(self.CUTOFF)
+
+        segments = repository.get_segments(datetime.date.min, datetime.date.max)[sample_person().unique_id]
+        remaining_trips = repository.get_trips_for_person(sample_person())
+        assert segments == SinglePersonCalendar.from_valid_trips(sample_person(), remaining_trips).get_segments()
+
+
+class TestStorageGroups:
+    def other_person(self) -> Person:
+        return Person(StrID("other_person_id"), StrID("other"), StrID("firstname"), sample_location())
+
+    def test_groups_only_see_their_own_data(self, database_session: Session):
+        repository = CalendarRepository(database_session, maintain_segments=True)
+        other_repository = CalendarRepository(database_session, maintain_segments=True, group_id="other")
+        repository.add_person(sample_person())
+        repository.add_trip(sample_person(), sample_trip())
+        other_repository.add_person(self.other_person())
+
+        assert repository.get_all_people() == [sample_person()]
+        assert other_repository.get_all_people() == [self.other_person()]
+        assert other_repository.get_all_trips() == {}
+        assert other_repository.get_trips_for_person(sample_person()) == []
+        assert other_repository.get_segments(datetime.date.min, datetime.date.max).keys() == {"other_person_id"}
+        assert (repository.get_version(), other_repository.get_version()) == (2, 1)
+
+        # Nor can they remove other groups' data
+        with pytest.raises(CalendarError):
+            other_repository.remove_trip(sample_trip())
+        with pytest.raises(CalendarError):
+            other_repository.remove_person(sample_person())
+        assert repository.get_all_trips() == {sample_person().unique_id: [sample_trip()]}
+
+    def test_upgrade_database_from_before_groups(self):
+        engine = create_engine("sqlite:///:memory:")
+        with engine.begin() as connection:  # As made by versions before groups
+            connection.execute(
+                text(
+                    "CREATE TABLE person (id VARCHAR PRIMARY KEY, last_name VARCHAR NOT NULL, "
+                    "first_name VARCHAR NOT NULL, country VARCHAR NOT NULL, city VARCHAR NOT NULL)"
+                )
+            )
+            connection.execute(
+                text("INSERT INTO person VALUES ('test_person_id', 'lastname', 'firstname', 'NLD', 'Amsterdam')")
+            )
+            connection.execute(
+                text("CREATE TABLE calendar_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)")
+            )
+            connection.execute(text("INSERT INTO calendar_version VALUES (1, 7)"))
+
+        for _ in range(2):  # Upgrading again changes nothing
+            with engine.begin() as connection:
+                create_schema(connection)
+        with sessionmaker(bind=engine)() as session:
+            repository = CalendarRepository(session)
+            assert repository.get_all_people() == [sample_person()]
+            assert repository.get_version() == 7
+            repository.add_trip(sample_person(), sample_trip())
+            assert repository.get_version() == 8
+        assert "ix_person_group_id" in {index["name"] for index in inspect(engine).get_indexes("person")}
+
+
+class TestStorageSQLiteFile:
+    @pytest.fixture
+    def database_url(self, tmp_path) -> str:
+        database_url = f"sqlite:///{tmp_path}/database.db"
+        Base.metadata.create_all(create_database_engine(database_url))
+        return database_url
+
+    def test_reads_from_read_only_session(self, database_url: str):
+        read_engine = create_read_only_engine(database_url)
+        assert read_engine is not None
+        with (
+            sessionmaker(bind=create_database_engine(database_url))() as session,
+            sessionmaker(bind=read_engine)() as read_session,
+        ):
+            repository = CalendarRepository(session, read_session=read_session)
+            assert repository.get_all_people() == []
+
+            repository.add_person(sample_person())
+
+            assert repository.get_all_people() == [sample_person()]
+            assert repository.get_version() == 1
+            with pytest.raises(OperationalError, match="readonly"):
+                read_session.execute(text("DELETE FROM person"))
+
+    def test_write_retried_while_database_busy(self, database_url: str):
+        # Fail immediately rather than waiting in SQLite while the database is locked, so the repository retries
+        engine = create_engine(database_url, connect_args=dict(timeout=0))
+        other_connection = sqlite3.connect(database_url.removeprefix("sqlite:///"), check_same_thread=False)
+        other_connection.execute("BEGIN IMMEDIATE")  # Hold the write lock
+        release_timer = threading.Timer(0.05, other_connection.rollback)
+        release_timer.start()
+
+        with sessionmaker(bind=engine)() as session:
+            version = CalendarRepository(session).add_person(sample_person())
+
+        release_timer.join()
+        other_connection.close()
+        assert version == 1
+
+    def test_write_fails_if_database_stays_busy(self, database_url: str):
+        engine = create_engine(database_url, connect_args=dict(timeout=0))
+        other_connection = sqlite3.connect(database_url.removeprefix("sqlite:///"))
+        other_connection.execute("BEGIN IMMEDIATE")
+
+        with sessionmaker(bind=engine)() as session:
+            repository = CalendarRepository(session)
+            with pytest.raises(CalendarError) as error:
+                repository.add_person(sample_person())
+            assert "database is locked" in error.value.message
+
+        other_connection.rollback()
+        other_connection.close()
+        with sessionmaker(bind=engine)() as session:
+            assert CalendarRepository(session).get_version() == 0
+
+
+class TestStorageReadReplica:
+    """With two SQLite files standing in for a primary and a read replica, which only catches up when replicated."""
+
+    @pytest.fixture(autouse=True)
+    def set_up(self, tmp_path):
+        self.primary_path, self.replica_path = tmp_path / "primary.db", tmp_path / "replica.db"
+        primary_engine = create_database_engine(f"sqlite:///{self.primary_path}")
+        Base.metadata.create_all(primary_engine)
+        self.replicate()
+        self.time = 0.0
+        self.recent_writes = RecentWrites(window=5, clock=lambda: self.time)
+        with (
+            sessionmaker(bind=primary_engine)() as session,
+            sessionmaker(bind=create_replica_engine(f"sqlite:///{self.replica_path}"))() as read_session,
+        ):
+            self.repository = CalendarRepository(session, read_session=read_session, recent_writes=self.recent_writes)
+            yield
+
+    def replicate(self) -> None:
+        with sqlite3.connect(self.primary_path) as primary, sqlite3.connect(self.replica_path) as replica:
+            primary.backup(replica)
+
+    def test_reads_from_primary_shortly_after_write(self):
+        self.repository.add_person(sample_person())
+        self.repository.add_trip(sample_person(), sample_trip())
+        assert self.repository.get_all_people() == [sample_person()]
+        assert self.repository.get_trips_for_person(sample_person()) == [sample_trip()]
+        assert self.repository.get_version() == 2
+
+    def test_reads_from_replica_otherwise(self):
+        self.repository.add_person(sample_person())
+        self.time = 5
+        assert self.repository.get_all_people() == []  # Not replicated yet
+        assert self.repository.get_version() == 0
+
+        self.replicate()
+        self.repository.read_session.rollback()  # Start a new read transaction, which sees the replicated data
+        assert self.repository.get_all_people() == [sample_person()]
+        assert self.repository.get_version() == 1
+
+    def test_replica_is_read_only(self):
+        with pytest.raises(OperationalError, match="readonly"):
+            self.repository.read_session.execute(text("DELETE FROM person"))
@@ -0,0 +1,72 @@
+"""Test deciding when to check the data version."""
+
+from schedules.logic.version_check import VersionChecker, VersionFile
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+class TestVersionFile:
+    def test_publish_and_read(self, tmp_path):
+        version_file = VersionFile(tmp_path / "version")
+        assert version_file.read() is None
+
+        version_file.publish(3)
+        assert version_file.read() == 3
+
+        # Another process's file sees the same
+        VersionFile(tmp_path / "version").publish(4)
+        assert version_file.read() == 4
+
+    def test_only_publishes_newer_versions(self, tmp_path):
+        version_file = VersionFile(tmp_path / "version")
+        version_file.publish(3)
+        VersionFile(tmp_path / "version").publish(2)  # E.g. from a process whose calendar is older
+        assert version_file.read() == 3
+
+    def test_invalid_file(self, tmp_path):
+        (tmp_path / "version").write_text("not a version")
+        assert VersionFile(tmp_path / "version").read() is None
+
+    def test_publish_to_missing_directory(self, tmp_path):
+        version_file = VersionFile(tmp_path / "missing" / "version")
+        version_file.publish(1)  # Only logs a warning
+        assert version_file.read() is None
+
+
+class TestVersionChecker:
+    def test_checks_every_time_by_default(self):
+        checker = VersionChecker()
+        for _ in range(3):
+            assert checker.is_check_due(known_version=1)
+            checker.checked()
+
+    def test_checks_at_most_every_interval(self):
+        clock = FakeClock()
+        checker = VersionChecker(interval=10, clock=clock)
+        assert checker.is_check_due(known_version=1)
+        checker.checked()
+
+        clock.time = 9.9
+        assert not checker.is_check_due(known_version=1)
+        clock.time = 10
+        assert checker.is_check_due(known_version=1)
+        assert (checker.num_checks, checker.num_skipped) == (2, 1)
+
+    def test_checks_when_newer_version_announced(self, tmp_path):
+        clock = FakeClock()
+        writer = VersionChecker(interval=10, version_file=VersionFile(tmp_path / "version"), clock=clock)
+        reader = VersionChecker(interval=10, version_file=VersionFile(tmp_path / "version"), clock=clock)
+        reader.checked()
+        assert not reader.is_check_due(known_version=1)
+
+        writer.notify(2)
+        assert reader.is_check_due(known_version=1)
+        reader.checked()
+        assert not reader.is_check_due(known_version=2)
+        assert not reader.is_check_due(known_version=3)  # E.g. after loading a later write from another host
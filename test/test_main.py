@@ -1,6 +1,15 @@
 """Test main function(s)."""
 
+import gc
+import gzip
+import http.client
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
 from schedules.frontend import create_app
+from schedules.logic.calendar import FullCalendar
 
 
 def test_create_site():
@@ -8,3 +17,344 @@ def test_create_site():
     with app.test_client() as client:
         response = client.get("/")
         assert response.status_code == 200
+
+
+def test_repeat_view_served_from_fragment_cache():
+    app = create_app()
+    with app.test_client() as client:
+        client.get("/")
+        misses = app.fragment_cache.misses
+        response = client.get("/")
+        assert response.status_code == 200
+        assert app.fragment_cache.misses == misses
+
+
+def test_start_from_snapshot_file(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    monkeypatch.setenv("CALENDAR_SNAPSHOT_PATH", str(tmp_path / "calendar.snapshot"))
+    app = create_app()
+    with app.test_client() as client:
+        client.post(
+            "/",
+            data={
+                "request_type": "ADD_PERSON",
+                "last_name": "lastname",
+                "first_name": "firstname",
+                "country": "NETHERLANDS",
+                "city": "Amsterdam",
+            },
+        )
+    app.snapshot_writer.write_if_changed()  # type: ignore
+
+    # A new instance starts from the snapshot file and does not need to load from the database
+    loads = []
+    monkeypatch.setattr(FullCalendar, "load_from_repository", lambda calendar: loads.append(calendar))
+    new_app = create_app()
+    with new_app.test_client() as client:
+        response = client.get("/")
+    assert "Firstname Lastname" in response.text
+    assert loads == []
+
+
+def test_storage_file_instead_of_database(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("CALENDAR_STORAGE_FILE", str(tmp_path / "calendar.jsonl"))
+    app = create_app()
+    with app.test_client() as client:
+        client.post(
+            "/",
+            data={
+                "request_type": "ADD_PERSON",
+                "last_name": "lastname",
+                "first_name": "firstname",
+                "country": "NETHERLANDS",
+                "city": "Amsterdam",
+            },
+        )
+
+    # A new instance replays the file
+    with create_app().test_client() as client:
+        response = client.get("/")
+    assert "Firstname Lastname" in response.text
+    assert app._database is None
+
+
+def test_purge_orphaned_trips_command(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    result = create_app().test_cli_runner().invoke(args=["purge-orphaned-trips", "--batch-size", "10"])
+    assert result.exit_code == 0
+    assert result.output == "Purged 0 orphaned trips, 0 bytes of data.\n"
+
+
+def test_archive_trips_command(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    result = create_app().test_cli_runner().invoke(args=["archive-trips", "--before", "2025-01-01"])
+    assert result.exit_code == 0
+    assert result.output == "Archived 0 trips of 0 people.\n"
+
+
+def test_segments_table(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    app = create_app()
+    with app.test_client() as client:
+        client.post(
+            "/",
+            data={
+                "request_type": "ADD_PERSON",
+                "last_name": "lastname",
+                "first_name": "firstname",
+                "country": "NETHERLANDS",
+                "city": "Amsterdam",
+            },
+        )
+
+    # Turned on after the person was added, so the table needs rebuilding
+    monkeypatch.setenv("CALENDAR_SEGMENTS_TABLE", "1")
+    app = create_app()
+    assert app.maintain_segments
+    result = app.test_cli_runner().invoke(args=["rebuild-segments"])
+    assert result.output == "Rebuilt 1 segments.\n"
+
+
+def test_export(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    app = create_app()
+    with app.test_client() as client:
+        client.post(
+            "/",
+            data={
+                "request_type": "ADD_PERSON",
+                "last_name": "lastname",
+                "first_name": "firstname",
+                "country": "NETHERLANDS",
+                "city": "Amsterdam",
+            },
+        )
+        response = client.get("/export/daily.csv?start=2025-01-01&end=2025-01-02", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.mimetype == "text/csv"
+        lines = gzip.decompress(response.data).decode("utf-8").splitlines()
+        assert len(lines) == 1 + 2
+        assert lines[1].startswith("2025-01-01,") and lines[1].endswith(",NLD,amsterdam,NLD,amsterdam")
+
+        assert "BEGIN:VCALENDAR" in client.get("/export/trips.ics").text
+        assert client.get("/export/daily.csv").status_code == 400
+        assert client.get("/export/daily.csv?start=yesterday&end=2025-01-01").status_code == 400
+        assert client.get("/export/other.csv").status_code == 404
+
+    arguments = ["export", "segments.ics", "--start", "2025-01-01", "--end", "2025-12-31"]
+    result = app.test_cli_runner().invoke(args=arguments)
+    assert result.exit_code == 0
+    assert result.stdout_bytes.startswith(b"BEGIN:VCALENDAR\r\n")
+
+
+def test_change_stream(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    monkeypatch.setenv("CALENDAR_CHANGE_STREAM", "1")
+    app = create_app()
+    with app.test_client() as client:
+        client.post(
+            "/",
+            data={
+                "request_type": "ADD_PERSON",
+                "last_name": "lastname",
+                "first_name": "firstname",
+                "country": "NETHERLANDS",
+                "city": "Amsterdam",
+            },
+        )
+        dates = {"request_type": "UPDATE_DAILY_CALENDARS_DATES", "start_date": "2025-06-01", "end_date": "2025-06-30"}
+        assert 'data-version="1"' in client.post("/", data=dates, follow_redirects=True).text
+
+        response = client.get("/changes?version=1", buffered=False)
+        assert response.mimetype == "text/event-stream"
+        events = response.iter_encoded()
+        assert next(events).startswith(b"retry: ")
+
+        person_id = app.calendar_state.snapshot.people_sorted_by_name[0].unique_id
+        trip = {"person_id": person_id, "country": "SWITZERLAND", "city": "Zurich"}
+        client.post(
+            "/", data={"request_type": "ADD_TRIP", **trip, "start_date": "2025-06-10", "end_date": "2025-06-12"}
+        )
+        event = next(events).decode("utf-8")
+        assert event.startswith("id: 2\nevent: trip_added\n")
+        assert '"cells":[{"date":"2025-06-10","start":"Amsterdam, Nld","end":"Zurich, Che"}' in event
+        response.close()
+        assert app.change_feed.num_subscriptions == 0
+
+        # A page older than the current version is told to reload
+        assert "event: reload" in client.get("/changes?version=1").text
+
+
+@pytest.mark.parametrize("change_stream, threaded", [("", False), ("1", True)])
+def test_page_served_while_change_stream_open(
+    tmp_path, monkeypatch: pytest.MonkeyPatch, change_stream: str, threaded: bool
+):
+    """Without threads, as gunicorn's default worker, pages don't open a stream, which would block the worker."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    monkeypatch.setenv("CALENDAR_CHANGE_STREAM", change_stream)
+    server = make_server("127.0.0.1", 0, create_app(), threaded=threaded)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        connection.request("GET", "/")
+        page = connection.getresponse().read().decode("utf-8")
+        assert ("data-change-stream" in page) == bool(change_stream)
+
+        # Follow changes as the page does, only if it says to
+        stream = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        stream.request("GET", "/changes?version=0")
+        stream_response = stream.getresponse()
+        if change_stream:
+            assert stream_response.status == 200
+            assert stream_response.readline().startswith(b"retry: ")
+        else:
+            assert stream_response.status == 404
+            stream_response.read()
+
+        connection.request("GET", "/")
+        assert connection.getresponse().status == 200
+        stream.close()
+        connection.close()
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def test_post_redirects_to_page(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    app = create_app()
+    with app.test_client() as client:
+        response = client.post("/", data={"request_type": "REMOVE_PERSON", "person_id": "nonexistent_id"})
+        assert response.status_code == 303
+        assert response.headers["Location"] == "/"
+        assert "Error (400): Failed to remove person" in client.get("/").text
+        assert "Failed to remove person" not in client.get("/").text  # Only shown once
+
+
+def test_only_writes_announce_version(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    monkeypatch.setenv("CALENDAR_VERSION_FILE", str(tmp_path / "version"))
+    app = create_app()
+    with app.test_client() as client:
+        client.post("/requests", data={"request_type": "REMOVE_PERSON", "person_id": "nonexistent_id"})
+        assert not (tmp_path / "version").exists()
+        client.post(
+            "/requests",
+            data={
+                "request_type": "ADD_PERSON",
+                "last_name": "lastname",
+                "first_name": "firstname",
+                "country": "NETHERLANDS",
+                "city": "Amsterdam",
+            },
+        )
+        assert (tmp_path / "version").read_text() == "1"
+
+
+def test_request_patch(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    app = create_app()
+    with app.test_client() as client:
+        person = {"last_name": "lastname", "first_name": "firstname", "country": "NETHERLANDS", "city": "Amsterdam"}
+        assert client.post("/requests", data={"request_type": "ADD_PERSON", **person}).json["reload"]
+        dates = {"request_type": "UPDATE_DAILY_CALENDARS_DATES", "start_date": "2025-06-01", "end_date": "2025-06-30"}
+        assert client.post("/requests", data=dates).json["reload"]
+
+        person_id = app.calendar_state.snapshot.people_sorted_by_name[0].unique_id
+        trip = {"request_type": "ADD_TRIP", "person_id": person_id, "country": "SWITZERLAND", "city": "Zurich"}
+        response = client.post("/requests", data={**trip, "start_date": "2025-06-20", "end_date": "2025-06-22"})
+        assert response.status_code == 200
+        patch = response.json
+        assert (patch["reload"], patch["kind"], patch["before_trip_id"]) == (False, "trip_added", None)
+        later_trip_id = patch["change"]["trip_id"]
+        assert f'value="{later_trip_id}"' in patch["trip_row"]
+        assert [cell["date"] for cell in patch["change"]["cells"]] == ["2025-06-20", "2025-06-21", "2025-06-22"]
+
+        patch = client.post("/requests", data={**trip, "start_date": "2025-06-10", "end_date": "2025-06-12"}).json
+        assert patch["before_trip_id"] == later_trip_id
+
+        remove = {"request_type": "REMOVE_TRIP", "person_id": person_id, "trip_id": later_trip_id}
+        patch = client.post("/requests", data=remove).json
+        assert patch["kind"] == "trip_removed" and "trip_row" not in patch
+
+        response = client.post("/requests", data=remove)
+        assert response.status_code == 400
+        assert response.json["message"].startswith("Error (400): Failed to remove trip")
+        assert not response.json["reload"]
+
+
+def test_groups(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    app = create_app()
+    with app.test_client() as client:
+        person = {"last_name": "lastname", "first_name": "firstname", "country": "NETHERLANDS", "city": "Amsterdam"}
+        response = client.post("/groups/team-a/", data={"request_type": "ADD_PERSON", **person})
+        assert response.headers["Location"] == "/groups/team-a/"
+        page = client.get("/groups/team-a/").text
+        assert "Firstname Lastname" in page and 'data-group-path="/groups/team-a"' in page
+        assert "Firstname Lastname" not in client.get("/").text
+        assert "Firstname Lastname" not in client.get("/groups/team-b/").text
+        assert "lastname" in client.get("/groups/team-a/export/daily.csv?start=2025-01-01&end=2025-01-01").text
+        assert client.get("/groups/team%2Fa/").status_code == 404
+
+        result = app.test_cli_runner().invoke(args=["export", "trips.ics", "--group", "team-a"])
+        assert result.exit_code == 0
+
+
+def test_groups_need_database(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("CALENDAR_STORAGE_FILE", str(tmp_path / "calendar.jsonl"))
+    with create_app().test_client() as client:
+        assert client.get("/groups/team-a/").status_code == 404
+
+
+def test_batch(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    monkeypatch.setenv("CALENDAR_MAX_BATCH_REQUESTS", "3")
+    app = create_app()
+    with app.test_client() as client:
+        person = {"last_name": "lastname", "first_name": "firstname", "country": "NETHERLANDS", "city": "Amsterdam"}
+        trip = {"request_type": "ADD_TRIP", "person_alias": "new", "country": "SWITZERLAND", "city": "Zurich"}
+        requests = [
+            {"request_type": "ADD_PERSON", "alias": "new", **person},
+            {**trip, "start_date": "2025-06-10", "end_date": "2025-06-12"},
+            {**trip, "start_date": "2025-06-20", "end_date": "2025-06-22"},
+        ]
+        response = client.post("/batch", json={"requests": requests})
+        assert response.status_code == 200
+        result = response.json
+        assert (result["num_applied"], result["version"]) == (3, 2)
+        assert result["responses"][0]["message"].startswith("Success: Added person")
+        assert str(app.calendar_state.snapshot.people_sorted_by_name[0].unique_id) == result["person_ids"]["new"]
+        assert client.get("/export/trips.ics").text.count("SUMMARY:Firstname Lastname in Zurich") == 2
+
+        response = client.post("/groups/team-a/batch", json={"requests": requests[1:], "atomic": False})
+        assert response.status_code == 400
+        assert response.json["num_applied"] == 0
+
+        assert client.post("/batch", json={"requests": requests * 2}).status_code == 400  # Too many
+        assert "Failed to parse batch" in client.post("/batch", data="not json").json["message"]
+
+
+def test_preload(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'database.db'}")
+    with create_app().test_client() as client:
+        person = {"last_name": "lastname", "first_name": "firstname", "country": "NETHERLANDS", "city": "Amsterdam"}
+        client.post("/", data={"request_type": "ADD_PERSON", **person})
+
+    app = create_app()
+    app.preload()
+    try:
+        assert app.calendar_state.snapshot.version == 1
+        assert gc.get_freeze_count() > 0
+        misses = app.fragment_cache.misses
+
+        # As in a forked worker: the version is checked again, and the page is served from what was preloaded
+        app.after_fork()
+        app.warm_up()
+        with app.test_client() as client:
+            assert "Firstname Lastname" in client.get("/").text
+        assert app.fragment_cache.misses == misses
+    finally:
+        gc.unfreeze()
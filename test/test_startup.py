@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+from schedules.logic.objects import Country, Location, Person, StrID
+
+# Generous, so that only real regressions fail, e.g. a heavy module imported at the top of the package again
+STARTUP_BUDGET_SECONDS = 2.0
+
+MEASURE_STARTUP = """
+import json, sys, time
+
+start_time = time.perf_counter()
+from schedules.frontend import create_app
+app = create_app()
+print(json.dumps(dict(startup_time=time.perf_counter() - start_time, modules=sorted(sys.modules))))
+"""
+
+
+def sample_person() -> Person:
+    return Person(
+        unique_id=StrID("1"),
+        last_name=StrID("Smith"),
+        first_name=StrID("John"),
+        home=Location(Country.NETHERLANDS, StrID("Amsterdam")),
+    )
+
+
+def measure_startup(tmp_path) -> dict:
+    environment = dict(os.environ, FLASK_KEY="x", DATABASE_URL=f"sqlite:///{tmp_path}/database.db")
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_STARTUP], env=environment, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_create_app_does_not_set_up_database(tmp_path):
+    result = measure_startup(tmp_path)
+
+    assert "sqlalchemy" not in result["modules"]
+    assert "schedules.logic.storage" not in result["modules"]
+    assert not (tmp_path / "database.db").exists()
+
+
+def test_startup_time_within_budget(tmp_path):
+    startup_time = min(measure_startup(tmp_path)["startup_time"] for _ in range(3))
+
+    assert startup_time < STARTUP_BUDGET_SECONDS
+
+
+def test_warm_up_loads_calendar(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLASK_KEY", "x")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/database.db")
+    monkeypatch.setenv("DATABASE_WARM_UP_CONNECTIONS", "2")
+    from schedules.frontend import create_app
+
+    app = create_app()
+    with app.calendar_repository() as repository:
+        repository.add_person(sample_person())
+    app.warm_up()
+
+    assert app.database_engine.pool.checkedin() == 2
+    assert app.calendar_state.snapshot.version == 1
+    assert [person.unique_id for person in app.calendar_state.snapshot.people_sorted_by_name] == ["1"]